@@ -129,6 +129,9 @@ SPECTACULAR_SETTINGS = {
 
 HEALTHCHECK_BASE_URL = "https://hc-ping.com"
 HEALTHCHECK_MONITORING_PATH_MAP: dict[str, str] = {
+    "compact_processed_items": os.environ.get(
+        "HEALTHCHECK_ID_COMPACT_PROCESSED_ITEMS", ""
+    ),
     "delete_unused_hardware_status": os.environ.get(
         "HEALTHCHECK_ID_DELETE_UNUSED_HARDWARE_STATUS", ""
     ),
@@ -227,6 +230,14 @@ else:
                 "--monitoring-id=delete_unused_hardware_status",
             ],
         ),
+        (
+            "30 0 * * 1",
+            "django.core.management.call_command",
+            [
+                "compact_processed_items",
+                "--monitoring-id=compact_processed_items",
+            ],
+        ),
         (
             "10 0 * * 6",
             "kernelCI_app.queries.notifications.warm_metrics_cache",
@@ -309,12 +320,28 @@ if DEBUG_DB_VARS:
 
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
+# Compression of the large cache entries: zstd (requires the zstandard package),
+# zlib or none
+CACHE_COMPRESSION = os.environ.get("CACHE_COMPRESSION", "zlib")
+
+# Seconds that small and hot query results, and the versions of their commits, are
+# also kept in the memory of each worker, in front of Redis, see get_query_cache
+CACHE_LOCAL_TIMEOUT = int(os.environ.get("CACHE_LOCAL_TIMEOUT", "30"))
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "kernelCI_app.helpers.cacheBackends.RedisCache",
         "LOCATION": f"redis://{REDIS_HOST}:6379",
-    }
+        "OPTIONS": {
+            "serializer": "kernelCI_app.helpers.cacheCodec.QueryRowsSerializer",
+        },
+    },
+    "local": {
+        "BACKEND": "kernelCI_app.helpers.cacheBackends.LocalObjectCache",
+        "LOCATION": "local-query-cache",
+        "TIMEOUT": CACHE_LOCAL_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": 512, "CULL_FREQUENCY": 4},
+    },
 }
 
 # Password validation
@@ -372,6 +399,11 @@ CORS_ALLOW_ALL_ORIGINS = is_boolean_or_string_true(
 )
 
 CACHE_TIMEOUT = int(os.environ.get("CACHE_TIMEOUT", "180"))
+# Timeout of the cached queries of specific checkouts, which are evicted when the
+# data of those checkouts changes
+CACHE_TAGGED_TIMEOUT = int(os.environ.get("CACHE_TAGGED_TIMEOUT", "21600"))  # 6 hours
+# Timeout of the cached queries that returned no rows, if shorter than the above
+CACHE_EMPTY_TIMEOUT = int(os.environ.get("CACHE_EMPTY_TIMEOUT", "60"))
 
 if DEBUG:
     CORS_ALLOWED_ORIGIN_REGEXES = [
@@ -382,6 +414,9 @@ if DEBUG:
     SECURE_SSL_REDIRECT = False
     SECURE_HSTS_SECONDS = 3600
     CACHE_TIMEOUT = 0
+    CACHE_TAGGED_TIMEOUT = 0
+    CACHE_LOCAL_TIMEOUT = 0
+    CACHE_EMPTY_TIMEOUT = 0
 
 
 # Base logging configuration. Individual loggers must be set in order to log messages.
@@ -50,7 +50,11 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "test-cache",
-    }
+    },
+    "local": {
+        "BACKEND": "kernelCI_app.helpers.cacheBackends.LocalObjectCache",
+        "LOCATION": "test-local-cache",
+    },
 }
 
 # Disable CORS for tests
@@ -58,6 +62,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 # Shorter cache timeout for tests
 CACHE_TIMEOUT = 60
+CACHE_TAGGED_TIMEOUT = 60
+CACHE_LOCAL_TIMEOUT = 5
 
 # Disable security features for tests
 SESSION_COOKIE_SECURE = False
@@ -1,19 +1,54 @@
 import json
-from typing import Optional
+import threading
+import time
+import uuid
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Sequence
 
 from django.conf import settings
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.utils.connection import ConnectionProxy
+from prometheus_client import Counter
 
 from kernelCI_app.utils import stable_hash
 
-timeout = settings.CACHE_TIMEOUT
+query_timeout = settings.CACHE_TIMEOUT
+tagged_query_timeout = settings.CACHE_TAGGED_TIMEOUT
+local_query_timeout = settings.CACHE_LOCAL_TIMEOUT
+empty_query_timeout = settings.CACHE_EMPTY_TIMEOUT
+
+local_cache = ConnectionProxy(caches, "local")
+"""In-memory cache of each worker, in front of Redis for the small and hot queries.
+It keeps the decoded rows and the version stamps of the commits they are tagged with"""
+LOCAL_CACHE_MAX_ROWS = 1000
+"""Larger results are only cached in Redis, to bound the memory of the workers"""
 DISCORD_NOTIFICATION_COOLDOWN = 600
 
 DISCORD_NOTIFICATION_KEY = "discord_notification"
 
-_commit_lookup = {}
-_build_lookup = {}
-_test_lookup = {}
+COMMIT_VERSION_KEY = "query_cache_version-commit"
+"""Prefix of the version stamp of the cached queries of a commit hash"""
+
+UNSET_VERSION = "0"
+MAX_READ_VERSIONS = 256
+
+STALE_TIMEOUT = 10 * 60
+"""Seconds that single-flight rows are still served after their timeout, while they
+are computed again"""
+SINGLE_FLIGHT_LOCK_TIMEOUT = 5 * 60
+"""Seconds after which the lock of a worker computing rows is released anyway"""
+SINGLE_FLIGHT_WAIT = 10
+"""Seconds a worker waits for the rows that another worker is computing"""
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+QUERY_CACHE_REQUESTS = Counter(
+    "query_cache_requests_total",
+    "Lookups of single-flight cached queries",
+    ["key", "result"],  # values: "hit", "stale", "coalesced", "miss"
+)
+
+# Versions read by get_query_cache, by cache key, until set_query_cache stores the
+# result computed from them
+_read_versions = threading.local()
 
 
 def _create_cache_params_hash(params: dict) -> str:
@@ -21,34 +56,262 @@ def _create_cache_params_hash(params: dict) -> str:
     return stable_hash(params_string)
 
 
+def _create_cache_key(key, params: Optional[dict]) -> str:
+    if params is not None:
+        return "%s-%s" % (key, _create_cache_params_hash(params))
+    return "%s" % key
+
+
+def _commit_version_keys(commit_hash: Optional[str | Sequence[str]]) -> list[str]:
+    if commit_hash is None:
+        return []
+    hashes = [commit_hash] if isinstance(commit_hash, str) else commit_hash
+    return sorted({f"{COMMIT_VERSION_KEY}-{hash}" for hash in hashes if hash})
+
+
+def _get_versions_hash(version_keys: list[str], *, local: bool = False) -> str:
+    """
+    Hashes the current versions of the commits. With `local`, the versions are
+    read from the memory of the worker, and the ones missing there are read from
+    Redis and kept in the worker for CACHE_LOCAL_TIMEOUT.
+    """
+    versions = local_cache.get_many(version_keys) if local else {}
+    missing_keys = [key for key in version_keys if key not in versions]
+    if missing_keys:
+        redis_versions = cache.get_many(missing_keys)
+        missing_versions = {
+            key: redis_versions.get(key, UNSET_VERSION) for key in missing_keys
+        }
+        versions.update(missing_versions)
+        if local and local_query_timeout > 0:
+            local_cache.set_many(missing_versions, local_query_timeout)
+    return stable_hash(
+        ",".join(versions.get(key, UNSET_VERSION) for key in version_keys)
+    )
+
+
+def _remember_versions(cache_key: str, versions_hash: str) -> None:
+    read_versions = getattr(_read_versions, "by_key", None)
+    if read_versions is None or len(read_versions) >= MAX_READ_VERSIONS:
+        read_versions = _read_versions.by_key = {}
+    read_versions[cache_key] = versions_hash
+
+
+def _pop_versions(cache_key: str) -> Optional[str]:
+    return getattr(_read_versions, "by_key", {}).pop(cache_key, None)
+
+
+class EmptyRows(NamedTuple):
+    """
+    Cached instead of an empty result, so that it can't be mistaken for a miss,
+    also by the caches that treat empty values as missing
+    """
+
+    rows: Any
+    """The empty result, returned by get_query_cache"""
+
+
+def _is_empty(rows) -> bool:
+    return rows is not None and not rows
+
+
+def _set_local_query_cache(cache_key: str, value, timeout: int) -> None:
+    timeout = min(timeout, local_query_timeout)
+    if timeout > 0 and (type(value) is EmptyRows or len(value) <= LOCAL_CACHE_MAX_ROWS):
+        local_cache.set(cache_key, value, timeout)
+
+
+def _from_cache(value):
+    return value.rows if type(value) is EmptyRows else value
+
+
 def set_query_cache(
     *,
     key,
     params=None,
     rows,
-    commit_hash=None,
-    build_id=None,
-    test_id=None,
-    timeout=timeout,
+    commit_hash: Optional[str | Sequence[str]] = None,
+    timeout: Optional[int] = None,
+    local: bool = False,
 ):
-    if params is not None:
-        params_hash = _create_cache_params_hash(params)
-        hash_key = "%s-%s" % (key, params_hash)
-    else:
-        hash_key = "%s" % key
+    """
+    Caches the rows of a query. Rows tagged with the commit hashes of the checkouts
+    they come from are kept for CACHE_TAGGED_TIMEOUT instead of CACHE_TIMEOUT, since
+    invalidate_query_cache evicts them when the data of those checkouts changes.
 
-    _add_to_lookup(hash_key, commit_hash, _commit_lookup)
-    _add_to_lookup(hash_key, build_id, _build_lookup)
-    _add_to_lookup(hash_key, test_id, _test_lookup)
+    The rows are stored with the versions of the commits that get_query_cache read
+    before they were queried, so that a change committed meanwhile isn't hidden.
 
-    return cache.set(hash_key, rows, timeout)
+    With `local`, small rows are also kept in the memory of the worker for
+    CACHE_LOCAL_TIMEOUT, see get_query_cache. They must not be modified after.
 
+    Empty results are cached too, so that the queries without data aren't run on
+    every request, but only for CACHE_EMPTY_TIMEOUT since they are likely to get
+    data soon. Callers must tell them from a miss with `is not None`.
+    """
+    cache_key = _create_cache_key(key, params)
+    version_keys = _commit_version_keys(commit_hash)
+    if version_keys:
+        versions_hash = _pop_versions(cache_key) or _get_versions_hash(
+            version_keys, local=local
+        )
+        cache_key = f"{cache_key}-{versions_hash}"
+    if timeout is None:
+        timeout = tagged_query_timeout if version_keys else query_timeout
+    value = rows
+    if _is_empty(rows):
+        value = EmptyRows(rows=rows)
+        timeout = min(timeout, empty_query_timeout)
 
-def get_query_cache(key, params: Optional[dict] = None):
-    if params is not None:
-        params_hash = _create_cache_params_hash(params)
-        return cache.get("%s-%s" % (key, params_hash))
-    return cache.get("%s" % key)
+    cache.set(cache_key, value, timeout)
+    if local:
+        _set_local_query_cache(cache_key, value, timeout)
+
+
+def get_query_cache(
+    key,
+    params: Optional[dict] = None,
+    *,
+    commit_hash: Optional[str | Sequence[str]] = None,
+    local: bool = False,
+):
+    """
+    Returns the cached rows of a query, or None. `commit_hash` must be the same
+    that the rows were cached with.
+
+    With `local`, the rows and the versions of their commits are first looked up
+    in the memory of the worker, which saves the round trips to Redis and the
+    decoding of the rows for the small results that are read by most requests.
+    The returned rows are then shared by the worker and must not be modified. They
+    may be CACHE_LOCAL_TIMEOUT seconds older than the ones in Redis, also after
+    invalidate_query_cache was called by another process.
+    """
+    base_key = _create_cache_key(key, params)
+    version_keys = _commit_version_keys(commit_hash)
+    versions_hash = (
+        _get_versions_hash(version_keys, local=local) if version_keys else None
+    )
+    cache_key = base_key if versions_hash is None else f"{base_key}-{versions_hash}"
+
+    if local:
+        value = local_cache.get(cache_key)
+        if value is not None:
+            return _from_cache(value)
+
+    value = cache.get(cache_key)
+    if value is None:
+        if versions_hash is not None:
+            _remember_versions(base_key, versions_hash)
+    elif local:
+        _set_local_query_cache(cache_key, value, local_query_timeout)
+    return _from_cache(value)
+
+
+class _CachedRows(NamedTuple):
+    rows: Any
+    fresh_until: float
+    """Time after which the rows are stale"""
+
+
+def _acquire_lock(lock_key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, SINGLE_FLIGHT_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release_lock(lock_key: str, token: str) -> None:
+    # The lock may have expired and been taken by another worker
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _wait_for_rows(cache_key: str) -> Optional[_CachedRows]:
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_set_query_cache(
+    *,
+    key,
+    params: Optional[dict] = None,
+    compute: Callable[[], Any],
+    commit_hash: Optional[str | Sequence[str]] = None,
+    timeout: Optional[int] = None,
+):
+    """
+    Returns the cached rows of a query, or computes them with `compute` and caches
+    them like set_query_cache. Only one worker at a time computes the rows of a key,
+    the others don't run the same query at once:
+
+    - once the rows time out, they are stale for STALE_TIMEOUT more seconds; the
+      worker that takes the lock computes them again while the others get the
+      stale rows;
+    - when there are no rows, the others wait up to SINGLE_FLIGHT_WAIT seconds for
+      the rows of the worker that took the lock, then compute them themselves.
+
+    Only use it for keys that get_query_cache doesn't read, the rows are stored
+    along with their freshness.
+    """
+    cache_key = _create_cache_key(key, params)
+    version_keys = _commit_version_keys(commit_hash)
+    if version_keys:
+        cache_key = f"{cache_key}-{_get_versions_hash(version_keys)}"
+    if timeout is None:
+        timeout = tagged_query_timeout if version_keys else query_timeout
+    if timeout <= 0:
+        return compute()
+
+    entry: Optional[_CachedRows] = cache.get(cache_key)
+    if entry is not None and entry.fresh_until > time.time():
+        QUERY_CACHE_REQUESTS.labels(key=key, result="hit").inc()
+        return entry.rows
+
+    lock_key = f"{cache_key}-lock"
+    lock_token = _acquire_lock(lock_key)
+    if lock_token is None:
+        if entry is not None:
+            QUERY_CACHE_REQUESTS.labels(key=key, result="stale").inc()
+            return entry.rows
+        entry = _wait_for_rows(cache_key)
+        if entry is not None:
+            QUERY_CACHE_REQUESTS.labels(key=key, result="coalesced").inc()
+            return entry.rows
+
+    QUERY_CACHE_REQUESTS.labels(key=key, result="miss").inc()
+    try:
+        rows = compute()
+        if _is_empty(rows):
+            timeout = min(timeout, empty_query_timeout)
+        cache.set(
+            cache_key,
+            _CachedRows(rows=rows, fresh_until=time.time() + timeout),
+            timeout + STALE_TIMEOUT,
+        )
+    finally:
+        if lock_token is not None:
+            _release_lock(lock_key, lock_token)
+    return rows
+
+
+def invalidate_query_cache(*, commit_hashes: Iterable[str]) -> None:
+    """
+    Evicts the cached queries tagged with any of the commit hashes, by giving them
+    a new version. The versions outlive the tagged entries, so an entry can't be
+    read again once its version changed. The other workers may keep their local
+    copy of the old versions for CACHE_LOCAL_TIMEOUT, see get_query_cache.
+    """
+    version_keys = _commit_version_keys(list(commit_hashes))
+    if not version_keys:
+        return
+    version = uuid.uuid4().hex
+    cache.set_many({key: version for key in version_keys}, tagged_query_timeout)
+    local_cache.delete_many(version_keys)
 
 
 def set_notification_cache(*, notification: str) -> None:
@@ -61,12 +324,3 @@ def get_notification_cache(*, notification: str) -> str:
     notification_hash = stable_hash(notification)
     hash_key = f"{DISCORD_NOTIFICATION_KEY}-{notification_hash}"
     return cache.get(hash_key)
-
-
-def _add_to_lookup(cache_key, property_key, lookup):
-    if property_key is None:
-        return
-
-    lookup_property_key = lookup.get(property_key, set())
-    lookup_property_key.add(cache_key)
-    lookup[property_key] = lookup_property_key
@@ -28,7 +28,25 @@ STORAGE_BASE_URL = os.environ.get(
 UPLOAD_URL = f"{STORAGE_BASE_URL}/upload"
 
 CACHE_LOGS_SIZE_LIMIT = int(os.environ.get("CACHE_LOGS_SIZE_LIMIT", 100000))
-"""Arbitrary limit for cache_logs size, adjust as needed. Default: 100000"""
+"""Max number of log_excerpt hashes kept in the uploads cache, the least recently
+used ones are removed first. Default: 100000"""
+
+CACHE_LOGS_PATH = os.environ.get(
+    "CACHE_LOGS_PATH",
+    os.path.join(
+        os.environ.get("BACKEND_VOLUME_DIR", "/volume_data"), "logexcerpt_cache.sqlite3"
+    ),
+)
+"""Sqlite file that maps log_excerpt hashes to their uploaded url.
+It is shared by all ingester workers and kept between restarts.
+Default: $BACKEND_VOLUME_DIR/logexcerpt_cache.sqlite3"""
+
+try:
+    LOGEXCERPT_UPLOAD_WORKERS = int(os.environ.get("LOGEXCERPT_UPLOAD_WORKERS", "8"))
+except (ValueError, TypeError):
+    logger.warning("Invalid LOGEXCERPT_UPLOAD_WORKERS, using default 8")
+    LOGEXCERPT_UPLOAD_WORKERS = 8
+"""Max concurrent log_excerpt uploads in each ingester worker. Default: 8"""
 
 INGESTER_TREES_FILEPATH = f"/app/{TREE_NAMES_FILENAME}"
 
@@ -49,8 +67,26 @@ try:
 except (ValueError, TypeError):
     logger.warning("Invalid INGEST_CYCLE_BATCH_SIZE, using default 50000")
     INGEST_CYCLE_BATCH_SIZE = 50000
-"""Max files to process per cycle from cached scandir results.
-Avoids re-scanning huge directories between cycles. Default: 50000"""
+"""Max files taken from the spool queue per call to the ingestion. Default: 50000"""
+
+try:
+    INGEST_SPOOL_RESCAN_SEC = float(os.environ.get("INGEST_SPOOL_RESCAN_SEC", "600"))
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_SPOOL_RESCAN_SEC, using default 600")
+    INGEST_SPOOL_RESCAN_SEC = 600.0
+"""Seconds between full scans of the spool directory. New files are found through
+inotify (or by polling) in between; the full scan only picks up files that were
+missed or left in the spool. Default: 600"""
+
+INGEST_SPOOL_WATCHER_MODES = ("inotify", "poll")
+INGEST_SPOOL_WATCHER = os.environ.get("INGEST_SPOOL_WATCHER", "inotify").lower()
+if INGEST_SPOOL_WATCHER not in INGEST_SPOOL_WATCHER_MODES:
+    logger.warning("Invalid INGEST_SPOOL_WATCHER, using default inotify")
+    INGEST_SPOOL_WATCHER = "inotify"
+"""How new files in the spool directory are found.
+`inotify` is notified by the kernel and falls back to `poll` when inotify is not
+available, `poll` scans the spool every --interval seconds while it is idle.
+Default: inotify"""
 
 try:
     INGESTER_METRICS_PORT = int(os.environ.get("INGESTER_METRICS_PORT", 8002))
@@ -64,12 +100,41 @@ try:
 except (ValueError, TypeError):
     logger.warning("Invalid INGEST_BATCH_SIZE, using default 10000")
     INGEST_BATCH_SIZE = 10000
+"""Max rows in a table buffer before the buffers are flushed. The actual threshold
+adapts between INGEST_MIN_BATCH_SIZE and this value. Default: 10000"""
+
+try:
+    INGEST_MIN_BATCH_SIZE = int(os.environ.get("INGEST_MIN_BATCH_SIZE", "500"))
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_MIN_BATCH_SIZE, using default 500")
+    INGEST_MIN_BATCH_SIZE = 500
+"""Lowest row threshold the adaptive flush can choose. Default: 500"""
 
 try:
     INGEST_FLUSH_TIMEOUT_SEC = float(os.environ.get("INGEST_FLUSH_TIMEOUT_SEC", "2.0"))
 except (ValueError, TypeError):
     logger.warning("Invalid INGEST_FLUSH_TIMEOUT_SEC, using default 2.0")
     INGEST_FLUSH_TIMEOUT_SEC = 2.0
+"""Max seconds that ingested data waits in the buffers before being flushed. Default: 2.0"""
+
+try:
+    INGEST_FLUSH_MAX_BYTES = int(
+        os.environ.get("INGEST_FLUSH_MAX_BYTES", str(128 * 1024 * 1024))
+    )
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_FLUSH_MAX_BYTES, using default 128MiB")
+    INGEST_FLUSH_MAX_BYTES = 128 * 1024 * 1024
+"""Max size of the submission files waiting in the buffers before they are flushed.
+Default: 128MiB"""
+
+try:
+    INGEST_FLUSH_TARGET_LATENCY_SEC = float(
+        os.environ.get("INGEST_FLUSH_TARGET_LATENCY_SEC", "1.0")
+    )
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_FLUSH_TARGET_LATENCY_SEC, using default 1.0")
+    INGEST_FLUSH_TARGET_LATENCY_SEC = 1.0
+"""Flush duration that the adaptive batch size aims for. Default: 1.0"""
 
 try:
     INGEST_QUEUE_MAXSIZE = int(os.environ.get("INGEST_QUEUE_MAXSIZE", "5000"))
@@ -77,6 +142,60 @@ except (ValueError, TypeError):
     logger.warning("Invalid INGEST_QUEUE_MAXSIZE, using default 5000")
     INGEST_QUEUE_MAXSIZE = 5000
 
+try:
+    INGEST_PARSED_QUEUE_MAXSIZE = int(
+        os.environ.get("INGEST_PARSED_QUEUE_MAXSIZE", "200")
+    )
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_PARSED_QUEUE_MAXSIZE, using default 200")
+    INGEST_PARSED_QUEUE_MAXSIZE = 200
+"""Max parsed files waiting for a DB worker in the pipelined ingestion.
+Parse workers block when it is full. Default: 200"""
+
+try:
+    INGEST_WORKER_DRAIN_TIMEOUT_SEC = float(
+        os.environ.get("INGEST_WORKER_DRAIN_TIMEOUT_SEC", "60")
+    )
+except (ValueError, TypeError):
+    logger.warning("Invalid INGEST_WORKER_DRAIN_TIMEOUT_SEC, using default 60")
+    INGEST_WORKER_DRAIN_TIMEOUT_SEC = 60.0
+"""Seconds that long-lived ingester workers have to flush their buffers and exit
+when the ingester stops, before they are killed. Default: 60"""
+
+INGEST_STREAMING_PARSER = is_boolean_or_string_true(
+    os.environ.get("INGEST_STREAMING_PARSER", False)
+)
+"""Toggle to parse, validate and convert submission items one at a time instead of
+loading the whole file in memory. Default: False"""
+
+INGEST_FLUSH_BISECT = is_boolean_or_string_true(
+    os.environ.get("INGEST_FLUSH_BISECT", True)
+)
+"""Toggle to retry a failed flush by halves of its files, so that only the files that
+fail on their own are moved to the failed directory. Default: True"""
+
+INGEST_INLINE_AGGREGATION = is_boolean_or_string_true(
+    os.environ.get("INGEST_INLINE_AGGREGATION", False)
+)
+"""Toggle to add the tests and builds of a flush to the aggregate tables in the flush
+transaction, when their build and checkout are known. Only the other ones are queued
+in the pending tables for process_pending_aggregations. Default: False"""
+
+INGEST_STRICT_VALIDATION = is_boolean_or_string_true(
+    os.environ.get("INGEST_STRICT_VALIDATION", False)
+)
+"""Toggle to validate submissions only with kcidb_io instead of the schema validator
+compiled by the ingester. Default: False"""
+
+INGEST_LOADER_MODES = ("executemany", "copy")
+INGEST_LOADER_MODE = os.environ.get("INGEST_LOADER_MODE", "executemany").lower()
+if INGEST_LOADER_MODE not in INGEST_LOADER_MODES:
+    logger.warning("Invalid INGEST_LOADER_MODE, using default executemany")
+    INGEST_LOADER_MODE = "executemany"
+"""How the ingester writes buffers to the database.
+`executemany` sends one upsert per row, `copy` streams rows into a staging table
+with COPY and merges them with a single upsert. Default: executemany"""
+
 AUTOMATIC_LABS = re.compile(r"^(shell|k8s.*)$")
 """Regex pattern to find labs that were named automatically and should not be in the real lab/runtime field"""
 AUTOMATIC_LAB_FIELD = "automatic_lab"
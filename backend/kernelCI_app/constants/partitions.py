@@ -0,0 +1,32 @@
+# Clock skew tolerated between the start time of a build or test, given by its
+# origin, and its first ingestion, when the queries skip the partitions of the
+# builds and tests ingested before the time range they look at
+PARTITION_PRUNING_MARGIN = "7 days"
+
+# Seconds during which the queries assume that a table is still (un)partitioned.
+# Until then, a table that was just partitioned is read without pruning
+PARTITIONED_TABLES_CACHE_SEC = 300
+
+# Monthly partitions created ahead of the current month by partition_tables
+PARTITION_MONTHS_AHEAD = 3
+
+# Rows copied per transaction while converting a table to a partitioned one
+PARTITION_COPY_BATCH_SIZE = 10000
+
+# Time, in milliseconds, a chunk of copied rows can wait for the rows written by
+# the ingester, kept below deadlock_timeout so that the copy gives up before a
+# deadlock would be detected, and the seconds to wait before trying it again
+PARTITION_COPY_LOCK_TIMEOUT_MS = 200
+PARTITION_COPY_RETRY_SEC = 0.5
+
+# Time, in milliseconds, partition_tables can wait for the lock of the table it
+# converts, so the ingester isn't stuck behind it, and the number of attempts to
+# swap the tables before giving up
+PARTITION_LOCK_TIMEOUT_MS = 2000
+PARTITION_SWAP_ATTEMPTS = 5
+
+# Key of the transaction advisory locks taken by the ingester on the items it
+# upserts into a partitioned table, with the hash of the table and item id as second
+# key, so that two transactions can't both insert a new item with their own _created.
+# Follows the keys of constants/process_pending.py
+PARTITIONED_ITEM_LOCK = 72108
@@ -7,3 +7,43 @@ ROLLUP_STATUS_FIELDS = {
     "DONE": "done_tests",
     "NULL": "null_tests",
 }
+
+# Keys of the postgres advisory locks used to share the pending queue between
+# process_pending_aggregations workers, as the first key of two-key locks
+SHARD_JOIN_LOCK = 72101
+SHARD_OWNER_LOCK = 72102
+SHARD_RESERVED_LOCK = 72103
+SHARD_MEMBER_LOCK = 72104
+SHARD_AUTO_MEMBER_LOCK = 72105
+
+# Key of the transaction advisory locks taken on the builds whose tests are being
+# aggregated, by process_pending_aggregations and by the ingester, with the hash of
+# the build id as second key
+AGGREGATION_BUILD_LOCK = 72106
+
+# Key of the advisory lock taken in shared mode by the transactions that write to
+# the active slot of the pending queue (see the pending_queue_slot() function of
+# migration 0020), and in exclusive mode to rotate the slots
+PENDING_QUEUE_LOCK = 72107
+
+# Slots of pending_test and pending_builds. Items whose build or checkout isn't in
+# the database are parked until it arrives.
+PENDING_QUEUE_SLOTS = (0, 1)
+PENDING_PARKED_SLOT = 2
+
+# Age of the checkouts whose entries are kept in processed_items. Items of older
+# checkouts are not expected in the pending queue anymore.
+PROCESSED_ITEMS_HORIZON = "90 days"
+
+# Trees rebuilt by populate_tree_tests_rollup are rebuilt again if they have tests
+# ingested after this time before their rebuild, which covers the time between the
+# ingestion of a test and its commit, and the clock skew of the ingester
+ROLLUP_REBUILD_CATCH_UP_MARGIN = "5 minutes"
+
+# Passes rebuilding the trees that received tests during the rebuild while
+# process_pending_aggregations can still write to tree_tests_rollup, before the last
+# one, made while it is blocked
+ROLLUP_REBUILD_CATCH_UP_PASSES = 3
+
+# Tests read and queued per transaction by backfill_hardware_aggregations
+BACKFILL_BATCH_SIZE = 10000
@@ -0,0 +1,16 @@
+# Bounds of the batch size of prune_db --throttle, which starts from the smallest
+# batch and adapts it so that a batch takes around PRUNE_TARGET_BATCH_SEC
+PRUNE_MIN_BATCH_SIZE = 100
+PRUNE_TARGET_BATCH_SEC = 0.5
+
+# Replication lag, in seconds, above which prune_db --throttle waits for the replicas
+PRUNE_MAX_REPLICA_LAG_SEC = 30
+PRUNE_REPLICA_LAG_CHECK_INTERVAL_SEC = 5
+
+# Time, in milliseconds, a batch or a partition detach of prune_db can wait for a
+# lock before giving up, so the ingester isn't stuck behind it
+PRUNE_LOCK_TIMEOUT_MS = 2000
+
+# Tree commits whose tree_tests_rollup and tree_listing rows are deleted in a single
+# statement, which has one condition per tree commit
+PRUNE_MAX_TREE_COMMITS_BATCH = 1000
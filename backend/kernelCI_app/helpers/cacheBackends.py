@@ -0,0 +1,76 @@
+"""
+Cache backends that count their lookups in the django_prometheus cache metrics, see
+CACHES in the settings. django_prometheus only has a Redis backend for django-redis,
+which isn't a dependency, so the one of Django is wrapped here the same way.
+"""
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+from django_prometheus.cache.metrics import (
+    django_cache_get_fail_total,
+    django_cache_get_total,
+    django_cache_hits_total,
+    django_cache_misses_total,
+)
+
+
+class RedisCache(DjangoRedisCache):
+    def get(self, key, default=None, version=None):
+        django_cache_get_total.labels(backend="redis").inc()
+        try:
+            result = super().get(key, default=None, version=version)
+        except Exception:
+            django_cache_get_fail_total.labels(backend="redis").inc()
+            raise
+        if result is not None:
+            django_cache_hits_total.labels(backend="redis").inc()
+            return result
+        django_cache_misses_total.labels(backend="redis").inc()
+        return default
+
+
+class LocalObjectCache(LocMemCache):
+    """
+    In-memory cache of the worker that keeps the cached objects themselves, instead
+    of pickling them like LocMemCache, so that a hit doesn't decode them again.
+    The cached objects are shared by every caller and must not be modified.
+    Like LocMemCache, the least recently used entries are evicted past MAX_ENTRIES.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key):
+                self._set(key, value, timeout)
+                return True
+            return False
+
+    def get(self, key, default=None, version=None):
+        django_cache_get_total.labels(backend="local").inc()
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key):
+                self._delete(key)
+                django_cache_misses_total.labels(backend="local").inc()
+                return default
+            value = self._cache[key]
+            self._cache.move_to_end(key, last=False)
+        django_cache_hits_total.labels(backend="local").inc()
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            self._set(key, value, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key):
+                self._delete(key)
+                raise ValueError("Key '%s' not found" % key)
+            value = self._cache[key] + delta
+            self._cache[key] = value
+            self._cache.move_to_end(key, last=False)
+        return value
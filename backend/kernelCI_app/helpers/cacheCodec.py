@@ -0,0 +1,142 @@
+"""
+Serializer of the Redis cache, see CACHES in the settings.
+
+Cached query rows are mostly lists of tuples from cursor.fetchall() or of dicts from
+dict_fetchall, where each row repeats the same shape. They are pickled as one array
+of values per column, so that the similar values of a column are next to each
+other, and large entries are compressed with CACHE_COMPRESSION. Rows are rebuilt as
+plain lists when read, since the views expect lists.
+
+Entries pickled by Django's RedisSerializer are still read, so the serializer can be
+changed without flushing the cache.
+"""
+
+import pickle
+import zlib
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = 1024
+"""Entries smaller than this, in bytes, are stored uncompressed"""
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# Prefixes of the compressed entries, pickled entries start with the PROTO opcode
+_PICKLE_PREFIX = pickle.PROTO
+_ZLIB_PREFIX = b"z"
+_ZSTD_PREFIX = b"s"
+
+
+def _rows_from_tuple_columns(columns: list[tuple]) -> list[tuple]:
+    return list(zip(*columns, strict=True))
+
+
+def _rows_from_dict_columns(header: tuple, columns: list[tuple]) -> list[dict]:
+    return [
+        dict(zip(header, values, strict=True)) for values in zip(*columns, strict=True)
+    ]
+
+
+class _ColumnarRows:
+    """Pickles a list of rows of the same shape as one array of values per column"""
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def __reduce__(self):
+        rows = self.rows
+        first = rows[0]
+        if type(first) is tuple and first:
+            width = len(first)
+            if all(type(row) is tuple and len(row) == width for row in rows):
+                return _rows_from_tuple_columns, (list(zip(*rows, strict=True)),)
+        elif type(first) is dict and first:
+            header = tuple(first)
+            if all(type(row) is dict and tuple(row) == header for row in rows):
+                columns = list(zip(*(row.values() for row in rows), strict=True))
+                return _rows_from_dict_columns, (header, columns)
+        return list, (rows,)
+
+
+def _to_columns(value: Any) -> Any:
+    if type(value) is list and len(value) > 1:
+        return _ColumnarRows(value)
+    # NamedTuples wrapping rows, such as the entries of get_or_set_query_cache
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return value._make(_to_columns(field) for field in value)
+    return value
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    if zstandard is None:
+        raise ImproperlyConfigured(
+            "A cache entry is compressed with zstd, install the zstandard package"
+        )
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _compressor(compression: str) -> Optional[tuple[bytes, Callable[[bytes], bytes]]]:
+    match compression:
+        case "none":
+            return None
+        case "zlib":
+            return _ZLIB_PREFIX, lambda data: zlib.compress(data, ZLIB_LEVEL)
+        case "zstd":
+            if zstandard is None:
+                raise ImproperlyConfigured(
+                    "CACHE_COMPRESSION=zstd requires the zstandard package"
+                )
+            return _ZSTD_PREFIX, _zstd_compress
+    raise ImproperlyConfigured(
+        f"Unknown CACHE_COMPRESSION {compression!r}, use zstd, zlib or none"
+    )
+
+
+class QueryRowsSerializer:
+    """
+    Drop-in replacement of Django's RedisSerializer: integers are stored as they
+    are, for incr and decr, everything else is pickled with its rows by column.
+    """
+
+    def __init__(self, protocol: Optional[int] = None, compression=None):
+        self.protocol = pickle.HIGHEST_PROTOCOL if protocol is None else protocol
+        self.compressor = _compressor(
+            settings.CACHE_COMPRESSION if compression is None else compression
+        )
+
+    def dumps(self, obj: Any) -> bytes | int:
+        # Like RedisSerializer, only exact integers, bool is pickled
+        if type(obj) is int:
+            return obj
+        data = pickle.dumps(_to_columns(obj), self.protocol)
+        if self.compressor is None or len(data) < COMPRESSION_MIN_SIZE:
+            return data
+        prefix, compress = self.compressor
+        return prefix + compress(data)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return int(data)
+        except ValueError:
+            pass
+        prefix = data[:1]
+        if prefix == _ZLIB_PREFIX:
+            data = zlib.decompress(memoryview(data)[1:])
+        elif prefix == _ZSTD_PREFIX:
+            data = _zstd_decompress(memoryview(data)[1:])
+        elif prefix != _PICKLE_PREFIX:
+            raise ValueError(f"Unknown cache entry prefix {prefix!r}")
+        return pickle.loads(data)  # noqa: S301 - written by this serializer
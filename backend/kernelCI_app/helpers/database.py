@@ -1,3 +1,15 @@
+import time
+
+from django.db import connection
+
+from kernelCI_app.constants.partitions import (
+    PARTITION_PRUNING_MARGIN,
+    PARTITIONED_TABLES_CACHE_SEC,
+)
+
+_partitioned_tables: dict[str, tuple[float, bool]] = {}
+
+
 def dict_fetchall(cursor) -> list[dict]:
     """
     Return all rows from a cursor as a dict.
@@ -18,3 +30,44 @@ def debug_query(cursor, query, params) -> tuple[str, str]:
 
 def print_debug_query(cursor, query, params):
     print("{}\n{}\n".format(*debug_query(cursor, query, params)))
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    """Whether the table is partitioned, see the partition_tables command."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    return cursor.fetchone() == ("p",)
+
+
+def is_partitioned_cached(table: str) -> bool:
+    """
+    Like is_partitioned, on the default connection, but the answer is reused for
+    PARTITIONED_TABLES_CACHE_SEC in the process.
+    """
+    now = time.monotonic()
+    cached = _partitioned_tables.get(table)
+    if cached is None or cached[0] < now:
+        with connection.cursor() as cursor:
+            cached = (now + PARTITIONED_TABLES_CACHE_SEC, is_partitioned(cursor, table))
+        _partitioned_tables[table] = cached
+    return cached[1]
+
+
+def forget_partitioned(table: str) -> None:
+    """Makes the next is_partitioned_cached of `table` look it up again."""
+    _partitioned_tables.pop(table, None)
+
+
+def partition_filter(table: str, *, alias: str, start: str) -> str:
+    """
+    Condition on the partition key of `table` (builds or tests), aliased `alias`,
+    for rows that started after `start`, an SQL expression. It lets the planner skip
+    the partitions of the rows ingested before them, and is empty if the table
+    isn't partitioned. Rows are ingested after they start, up to
+    PARTITION_PRUNING_MARGIN of clock skew.
+    """
+    if not is_partitioned_cached(table):
+        return ""
+    return (
+        f"AND {alias}._created >= "
+        f"COALESCE(({start}) - INTERVAL '{PARTITION_PRUNING_MARGIN}', '-infinity')"
+    )
@@ -1,25 +1,34 @@
+import multiprocessing
 import time
-from datetime import timedelta
-from typing import Any, Callable, Sequence
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Iterable, Optional
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from django.db.models.query import QuerySet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
 from django.utils import timezone
 
+from kernelCI_app.constants.process_pending import BACKFILL_BATCH_SIZE
 from kernelCI_app.helpers.logger import out
-from kernelCI_app.management.commands.helpers.aggregation_helpers import (
-    aggregate_checkouts,
-    aggregate_tests,
-)
-from kernelCI_app.models import (
-    Checkouts,
-    LatestCheckout,
-    PendingTest,
-    Tests,
+from kernelCI_app.management.commands.helpers.hardware_backfill import (
+    backfill_latest_checkout,
+    backfill_pending_tests,
+    day_ranges,
+    truncate_hardware_aggregations,
 )
 
 
+def _backfill_day(
+    day: tuple[datetime, datetime], batch_size: int
+) -> tuple[datetime, int, Optional[str]]:
+    """Queues the tests of a day, returns its start, the tests queued and the error."""
+    start, end = day
+    try:
+        return start, backfill_pending_tests(start, end, batch_size=batch_size), None
+    except Exception as e:
+        return start, 0, str(e)
+
+
 class Command(BaseCommand):
     help = """
         Backfill hardware aggregations (LatestCheckout and PendingTest)
@@ -42,92 +51,81 @@ class Command(BaseCommand):
         parser.add_argument(
             "--batch-size",
             type=int,
-            default=2000,
-            help="Batch size for processing (default: 2000)",
+            default=BACKFILL_BATCH_SIZE,
+            help=f"Tests queued per transaction (default: {BACKFILL_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes backfilling days in parallel (default: 1)",
         )
 
     def handle(self, *args: Any, **options: Any) -> None:
         days = options["days"]
         truncate = options["truncate"]
         batch_size = options["batch_size"]
+        workers = options["workers"]
+
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if workers < 1:
+            raise CommandError("--workers must be at least 1")
 
-        cutoff_date = timezone.now() - timedelta(days=days)
+        now = timezone.now()
+        cutoff_date = now - timedelta(days=days)
         out(f"Backfilling hardware aggregations since {cutoff_date}...")
 
         if truncate:
             out("Truncating LatestCheckout and PendingTest tables...")
-            LatestCheckout.objects.all().delete()
-            PendingTest.objects.all().delete()
+            truncate_hardware_aggregations()
             out("Truncation complete.")
 
         out("Backfilling LatestCheckout...")
-        checkouts_qs = Checkouts.objects.filter(start_time__gte=cutoff_date).order_by(
-            "-start_time"
-        )
-
-        # Process checkouts to insert into latest_checkout table
-        self.process_queryset(
-            checkouts_qs, aggregate_checkouts, batch_size, "Checkouts"
-        )
+        t0 = time.time()
+        with transaction.atomic():
+            upserted = backfill_latest_checkout(cutoff_date)
+        out(f"Upserted {upserted} LatestCheckout in {time.time() - t0:.2f}s")
 
-        out("Backfilling PendingTest...")
-        tests_qs = (
-            Tests.objects.filter(
-                start_time__gte=cutoff_date,
-                environment_misc__platform__isnull=False,
-                build__checkout__id__in=LatestCheckout.objects.values_list(
-                    "checkout_id", flat=True
-                ),
-            )
-            .select_related("build")
-            .order_by("start_time")
+        out(f"Backfilling PendingTest with {workers} workers...")
+        self.backfill_tests(
+            day_ranges(cutoff_date, now), workers=workers, batch_size=batch_size
         )
 
-        # Process tests to insert into pending_tests table
-        self.process_queryset(tests_qs, aggregate_tests, batch_size, "Tests")
-
         out("Backfill complete.")
 
-    def process_queryset(
-        self,
-        queryset: QuerySet[Any],
-        aggregator_func: Callable[[Sequence[Any]], None],
-        batch_size: int,
-        label: str,
+    def backfill_tests(
+        self, days: list[tuple[datetime, datetime]], *, workers: int, batch_size: int
     ) -> None:
-        """
-        Process a queryset in batches using the provided aggregator function
-
-        Iterates through the queryset in chunks, collects items into batches,
-        and processes each batch using the aggregator function within a transaction
-        """
-        count = 0
+        """Queues the tests of the days, in `workers` processes."""
+        backfill_day = partial(_backfill_day, batch_size=batch_size)
+        if workers == 1:
+            self._collect(map(backfill_day, days))
+            return
+
+        # Workers inherit the connection when forked
+        connection.close()
+        with multiprocessing.Pool(workers, initializer=connections.close_all) as pool:
+            self._collect(pool.imap_unordered(backfill_day, days))
+
+    def _collect(self, results: Iterable[tuple[datetime, int, Optional[str]]]) -> None:
+        t0 = time.time()
         total_processed = 0
-        batch = []
+        failed_days = 0
 
-        t0 = time.time()
-        for item in queryset.iterator(chunk_size=batch_size):
-            try:
-                batch.append(item)
-                count += 1
-                if count >= batch_size:
-                    with transaction.atomic():
-                        aggregator_func(batch)
-                    total_processed += count
-                    out(
-                        f"Processed {total_processed} {label} (elapsed time: {time.time() - t0:.2f}s)"
-                    )
-                    batch = []
-                    count = 0
-            except Exception as e:
-                out(f"Error processing {label}: {e}")
-                batch = []
-                count = 0
+        for start, queued, error in results:
+            if error is not None:
+                out(f"Error processing Tests of {start:%Y-%m-%d %H:%M}: {error}")
+                failed_days += 1
                 continue
-
-        if batch:
-            aggregator_func(batch)
-            total_processed += count
+            total_processed += queued
             out(
-                f"Processed {total_processed} {label} (elapsed time: {time.time() - t0:.2f}s)"
+                f"Processed {queued} Tests of {start:%Y-%m-%d %H:%M}, "
+                f"{total_processed} in total (elapsed time: {time.time() - t0:.2f}s)"
+            )
+
+        if failed_days:
+            raise CommandError(
+                f"{failed_days} days failed to be backfilled, run the command again "
+                "without --truncate to retry them"
             )
@@ -0,0 +1,133 @@
+"""
+Management command to compact the processed_items table.
+
+Removes the processed_items entries of checkouts older than the aggregation horizon,
+and of checkouts that no longer exist. The entries are keyed by checkout first, so
+the checkouts are listed with a loose index scan and their entries are deleted with
+index range scans, one batch of checkouts per transaction.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from kernelCI_app.constants.process_pending import PROCESSED_ITEMS_HORIZON
+from kernelCI_app.management.commands.helpers.healthcheck import (
+    MONITORING_ID_PARAM_HELP_TEXT,
+    run_with_healthcheck_monitoring,
+)
+from kernelCI_app.management.commands.helpers.intervals import parse_interval
+
+# Walks the distinct checkout_ids of the primary key, one index lookup per checkout
+EXPIRED_CHECKOUTS_QUERY = """
+WITH RECURSIVE processed_checkouts AS (
+    SELECT min(checkout_id) AS checkout_id FROM processed_items
+    UNION ALL
+    SELECT (
+        SELECT min(p.checkout_id) FROM processed_items p
+        WHERE p.checkout_id > processed_checkouts.checkout_id
+    )
+    FROM processed_checkouts
+    WHERE processed_checkouts.checkout_id IS NOT NULL
+)
+SELECT pc.checkout_id
+FROM processed_checkouts pc
+LEFT JOIN checkouts c ON c.id = pc.checkout_id
+WHERE pc.checkout_id IS NOT NULL
+    AND (c.id IS NULL OR c._timestamp < %(cutoff)s)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete processed_items entries of checkouts older than the aggregation "
+        "horizon or that no longer exist"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=str,
+            default=PROCESSED_ITEMS_HORIZON,
+            help="Delete the entries of checkouts older than this age ('x days' or "
+            f"'x hours' format, default: '{PROCESSED_ITEMS_HORIZON}')",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would be deleted without actually deleting",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of checkouts whose entries are deleted per batch "
+            "(default: 100)",
+        )
+        parser.add_argument(
+            "--monitoring-id",
+            type=str,
+            default=None,
+            help=MONITORING_ID_PARAM_HELP_TEXT,
+        )
+
+    def handle(self, *args, **options):
+        try:
+            cutoff = parse_interval(options["older_than"])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        if options["batch_size"] < 1:
+            raise CommandError(
+                f"--batch-size must be at least 1 (got {options['batch_size']})."
+            )
+
+        return run_with_healthcheck_monitoring(
+            monitoring_id=options.get("monitoring_id"),
+            action=lambda: self._run_action(cutoff, options),
+        )
+
+    def _run_action(self, cutoff, options):
+        dry_run = options["dry_run"]
+        batch_size = options["batch_size"]
+
+        with connection.cursor() as cursor:
+            cursor.execute(EXPIRED_CHECKOUTS_QUERY, {"cutoff": cutoff})
+            checkout_ids = [row[0] for row in cursor.fetchall()]
+
+        if not checkout_ids:
+            self.stdout.write(
+                self.style.SUCCESS("No processed_items entries to compact.")
+            )
+            return
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"[DRY RUN] Would delete the processed_items entries of "
+                    f"{len(checkout_ids)} checkouts older than {cutoff.isoformat()} "
+                    "or missing. Run without --dry-run to execute deletion."
+                )
+            )
+            return
+
+        total_deleted = 0
+        for start in range(0, len(checkout_ids), batch_size):
+            batch_ids = checkout_ids[start : start + batch_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM processed_items WHERE checkout_id = ANY(%s)",
+                    [batch_ids],
+                )
+                deleted = cursor.rowcount
+            total_deleted += deleted
+            self.stdout.write(
+                f"Deleted processed_items(n={deleted}) entries of "
+                f"{len(batch_ids)} checkouts (total: {total_deleted})"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully deleted processed_items(n={total_deleted}) entries of "
+                f"{len(checkout_ids)} checkouts."
+            )
+        )
@@ -13,7 +13,7 @@ from kernelCI_app.management.commands.helpers.healthcheck import (
     MONITORING_ID_PARAM_HELP_TEXT,
     run_with_healthcheck_monitoring,
 )
-from kernelCI_app.models import HardwareStatus, LatestCheckout, ProcessedListingItems
+from kernelCI_app.models import HardwareStatus, LatestCheckout, ProcessedItems
 
 logger = logging.getLogger(__name__)
 
@@ -65,10 +65,8 @@ class Command(BaseCommand):
             orphaned_hardware_count = orphaned_hardware_entries.count()
 
             orphaned_processed_hardware_entries = (
-                ProcessedListingItems.objects.exclude(
-                    checkout_id__in=valid_checkout_ids
-                )
-            ).values_list("listing_item_key", flat=True)
+                ProcessedItems.objects.exclude(checkout_id__in=valid_checkout_ids)
+            ).values_list("checkout_id", flat=True)
 
             orphaned_processed_hardware_count = (
                 orphaned_processed_hardware_entries.count()
@@ -77,7 +75,7 @@ class Command(BaseCommand):
             if orphaned_hardware_count == 0 and orphaned_processed_hardware_count == 0:
                 self.stdout.write(
                     self.style.SUCCESS(
-                        "No orphaned HardwareStatus/ProcessedListingItems entries found."
+                        "No orphaned HardwareStatus/ProcessedItems entries found."
                     )
                 )
                 return
@@ -86,7 +84,7 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.WARNING(
                         f"[DRY RUN] Would delete {orphaned_hardware_count} HardwareStatus entries and "
-                        f"{orphaned_processed_hardware_count} ProcessedListingItems entries "
+                        f"{orphaned_processed_hardware_count} ProcessedItems entries "
                         "Run without --dry-run to execute deletion."
                     )
                 )
@@ -94,7 +92,7 @@ class Command(BaseCommand):
 
             self.stdout.write(
                 f"Found {orphaned_hardware_count} HardwareStatus entries "
-                f"and {orphaned_processed_hardware_count} ProcessedListingItems entries "
+                f"and {orphaned_processed_hardware_count} ProcessedItems entries "
                 "with no corresponding LatestCheckout."
             )
 
@@ -120,11 +118,9 @@ class Command(BaseCommand):
                     total_hardware_deleted += hardware_delete_count
 
                 if processed_hardware_batch_ids:
-                    processed_hardware_delete_count = (
-                        ProcessedListingItems.objects.filter(
-                            listing_item_key__in=processed_hardware_batch_ids
-                        ).delete()[0]
-                    )
+                    processed_hardware_delete_count = ProcessedItems.objects.filter(
+                        checkout_id__in=processed_hardware_batch_ids
+                    ).delete()[0]
 
                     total_processed_hardware_deleted += processed_hardware_delete_count
 
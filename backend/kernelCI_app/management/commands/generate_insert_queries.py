@@ -2,10 +2,14 @@ import os
 from datetime import datetime
 
 from django.core.management.base import BaseCommand
+from django.db.models import NOT_PROVIDED
 from jinja2 import Template
 
 from kernelCI_app.typeModels.modelTypes import MODEL_MAP
 
+# Column by which the tables can be partitioned, see the partition_tables command
+PARTITION_KEY = "_created"
+
 
 class Command(BaseCommand):
     help = """
@@ -28,10 +32,17 @@ class Command(BaseCommand):
             updateable_model_fields: list[str] = []
             updateable_db_fields: list[str] = []
             query_params_properties: list[tuple[str, str]] = []
+            partition_key = None
 
             for field in model._meta.fields:
                 if field.generated:
                     continue
+                # Fields filled by the database, such as the partition key, are
+                # never sent by the ingester nor updated
+                if field.db_default is not NOT_PROVIDED:
+                    if field.db_column == PARTITION_KEY:
+                        partition_key = field.db_column
+                    continue
 
                 field_name = (
                     field.name + "_id"
@@ -70,11 +81,83 @@ class Command(BaseCommand):
                 DO UPDATE SET{",".join(conflict_clauses)};
             """
 
+            # Queries for the COPY loader: rows are streamed into a session-local
+            # staging table and then merged with the same conflict rules as above.
+            # The staging table is emptied before each COPY since a bisected flush
+            # writes several batches in the same transaction
+            staging_table = f"ingest_staging_{table_name}"
+            staging_query = f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging_table}
+                (LIKE {table_name} INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM {staging_table};
+            """
+
+            copy_query = f"""
+                COPY {staging_table} ({",".join(updateable_db_fields_clauses)}
+                )
+                FROM STDIN
+            """
+
+            merge_query = f"""
+                INSERT INTO {table_name} ({",".join(updateable_db_fields_clauses)}
+                )
+                SELECT{",".join(updateable_db_fields_clauses)}
+                FROM {staging_table}
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET{",".join(conflict_clauses)};
+            """
+
+            if partition_key is not None:
+                # Once the table is partitioned the primary key includes the
+                # partition key, so the rows keep the partition key of the row
+                # they update to find it
+                partitioned_query = f"""
+                INSERT INTO {table_name} ({",".join(updateable_db_fields_clauses)},
+                    {partition_key}
+                )
+                VALUES (
+                    {", ".join(["%s"] * len(updateable_db_fields))},
+                    COALESCE(
+                        (SELECT {partition_key} FROM {table_name} WHERE id = %s),
+                        now()
+                    )
+                )
+                ON CONFLICT (id, {partition_key})
+                DO UPDATE SET{",".join(conflict_clauses)};
+            """
+
+                partitioned_merge_query = f"""
+                UPDATE {staging_table} staging
+                SET {partition_key} = existing.{partition_key}
+                FROM {table_name} existing
+                WHERE existing.id = staging.id;
+
+                INSERT INTO {table_name} ({",".join(updateable_db_fields_clauses)},
+                    {partition_key}
+                )
+                SELECT{",".join(updateable_db_fields_clauses)},
+                    {partition_key}
+                FROM {staging_table}
+                ORDER BY id
+                ON CONFLICT (id, {partition_key})
+                DO UPDATE SET{",".join(conflict_clauses)};
+            """
+
             var_insert_queries[table_name] = {}
             var_insert_queries[table_name]["updateable_model_fields"] = (
                 updateable_model_fields
             )
             var_insert_queries[table_name]["query"] = query
+            var_insert_queries[table_name]["staging_query"] = staging_query
+            var_insert_queries[table_name]["copy_query"] = copy_query
+            var_insert_queries[table_name]["merge_query"] = merge_query
+            if partition_key is not None:
+                var_insert_queries[table_name]["partitioned_query"] = partitioned_query
+                var_insert_queries[table_name]["partitioned_merge_query"] = (
+                    partitioned_merge_query
+                )
 
         # Read the template file
         template_path = os.path.join(
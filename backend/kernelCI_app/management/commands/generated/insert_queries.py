@@ -4,7 +4,7 @@ which fields are actually updateable for each model"""
 
 # Automatically generated by generate_insert_queries.py.
 # Do not edit manually.
-# Last updated on 2025-12-01 18:25:36.652906.
+# Last updated on 2026-10-19 00:24:30.349470.
 
 # flake8: noqa: E501  # Ignores long lines for better readability
 
@@ -85,6 +85,112 @@ INSERT_QUERIES = {
                     origin_builds_finish_time = COALESCE(checkouts.origin_builds_finish_time, EXCLUDED.origin_builds_finish_time),
                     origin_tests_finish_time = COALESCE(checkouts.origin_tests_finish_time, EXCLUDED.origin_tests_finish_time);
             """,
+        "staging_query": """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_staging_checkouts
+                (LIKE checkouts INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM ingest_staging_checkouts;
+            """,
+        "copy_query": """
+                COPY ingest_staging_checkouts (
+                    _timestamp,
+                    id,
+                    origin,
+                    tree_name,
+                    git_repository_url,
+                    git_commit_hash,
+                    git_commit_name,
+                    git_repository_branch,
+                    patchset_files,
+                    patchset_hash,
+                    message_id,
+                    comment,
+                    start_time,
+                    log_url,
+                    log_excerpt,
+                    valid,
+                    misc,
+                    git_commit_message,
+                    git_repository_branch_tip,
+                    git_commit_tags,
+                    origin_builds_finish_time,
+                    origin_tests_finish_time
+                )
+                FROM STDIN
+            """,
+        "merge_query": """
+                INSERT INTO checkouts (
+                    _timestamp,
+                    id,
+                    origin,
+                    tree_name,
+                    git_repository_url,
+                    git_commit_hash,
+                    git_commit_name,
+                    git_repository_branch,
+                    patchset_files,
+                    patchset_hash,
+                    message_id,
+                    comment,
+                    start_time,
+                    log_url,
+                    log_excerpt,
+                    valid,
+                    misc,
+                    git_commit_message,
+                    git_repository_branch_tip,
+                    git_commit_tags,
+                    origin_builds_finish_time,
+                    origin_tests_finish_time
+                )
+                SELECT
+                    _timestamp,
+                    id,
+                    origin,
+                    tree_name,
+                    git_repository_url,
+                    git_commit_hash,
+                    git_commit_name,
+                    git_repository_branch,
+                    patchset_files,
+                    patchset_hash,
+                    message_id,
+                    comment,
+                    start_time,
+                    log_url,
+                    log_excerpt,
+                    valid,
+                    misc,
+                    git_commit_message,
+                    git_repository_branch_tip,
+                    git_commit_tags,
+                    origin_builds_finish_time,
+                    origin_tests_finish_time
+                FROM ingest_staging_checkouts
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(checkouts._timestamp, EXCLUDED._timestamp),
+                    tree_name = COALESCE(checkouts.tree_name, EXCLUDED.tree_name),
+                    git_repository_url = COALESCE(checkouts.git_repository_url, EXCLUDED.git_repository_url),
+                    git_commit_hash = COALESCE(checkouts.git_commit_hash, EXCLUDED.git_commit_hash),
+                    git_commit_name = COALESCE(checkouts.git_commit_name, EXCLUDED.git_commit_name),
+                    git_repository_branch = COALESCE(checkouts.git_repository_branch, EXCLUDED.git_repository_branch),
+                    patchset_files = COALESCE(checkouts.patchset_files, EXCLUDED.patchset_files),
+                    patchset_hash = COALESCE(checkouts.patchset_hash, EXCLUDED.patchset_hash),
+                    message_id = COALESCE(checkouts.message_id, EXCLUDED.message_id),
+                    comment = COALESCE(checkouts.comment, EXCLUDED.comment),
+                    start_time = COALESCE(checkouts.start_time, EXCLUDED.start_time),
+                    log_url = COALESCE(checkouts.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(checkouts.log_excerpt, EXCLUDED.log_excerpt),
+                    valid = COALESCE(checkouts.valid, EXCLUDED.valid),
+                    misc = COALESCE(checkouts.misc, EXCLUDED.misc),
+                    git_commit_message = COALESCE(checkouts.git_commit_message, EXCLUDED.git_commit_message),
+                    git_repository_branch_tip = COALESCE(checkouts.git_repository_branch_tip, EXCLUDED.git_repository_branch_tip),
+                    git_commit_tags = COALESCE(checkouts.git_commit_tags, EXCLUDED.git_commit_tags),
+                    origin_builds_finish_time = COALESCE(checkouts.origin_builds_finish_time, EXCLUDED.origin_builds_finish_time),
+                    origin_tests_finish_time = COALESCE(checkouts.origin_tests_finish_time, EXCLUDED.origin_tests_finish_time);
+            """,
     },
     "issues": {
         "updateable_model_fields": [
@@ -131,6 +237,71 @@ INSERT_QUERIES = {
                     misc = COALESCE(issues.misc, EXCLUDED.misc),
                     categories = COALESCE(issues.categories, EXCLUDED.categories);
             """,
+        "staging_query": """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_staging_issues
+                (LIKE issues INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM ingest_staging_issues;
+            """,
+        "copy_query": """
+                COPY ingest_staging_issues (
+                    _timestamp,
+                    id,
+                    version,
+                    origin,
+                    report_url,
+                    report_subject,
+                    culprit_code,
+                    culprit_tool,
+                    culprit_harness,
+                    comment,
+                    misc,
+                    categories
+                )
+                FROM STDIN
+            """,
+        "merge_query": """
+                INSERT INTO issues (
+                    _timestamp,
+                    id,
+                    version,
+                    origin,
+                    report_url,
+                    report_subject,
+                    culprit_code,
+                    culprit_tool,
+                    culprit_harness,
+                    comment,
+                    misc,
+                    categories
+                )
+                SELECT
+                    _timestamp,
+                    id,
+                    version,
+                    origin,
+                    report_url,
+                    report_subject,
+                    culprit_code,
+                    culprit_tool,
+                    culprit_harness,
+                    comment,
+                    misc,
+                    categories
+                FROM ingest_staging_issues
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(issues._timestamp, EXCLUDED._timestamp),
+                    report_url = COALESCE(issues.report_url, EXCLUDED.report_url),
+                    report_subject = COALESCE(issues.report_subject, EXCLUDED.report_subject),
+                    culprit_code = COALESCE(issues.culprit_code, EXCLUDED.culprit_code),
+                    culprit_tool = COALESCE(issues.culprit_tool, EXCLUDED.culprit_tool),
+                    culprit_harness = COALESCE(issues.culprit_harness, EXCLUDED.culprit_harness),
+                    comment = COALESCE(issues.comment, EXCLUDED.comment),
+                    misc = COALESCE(issues.misc, EXCLUDED.misc),
+                    categories = COALESCE(issues.categories, EXCLUDED.categories);
+            """,
     },
     "builds": {
         "updateable_model_fields": [
@@ -172,12 +343,215 @@ INSERT_QUERIES = {
                     log_url,
                     log_excerpt,
                     misc,
-                    status
-                )
-                VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                    status
+                )
+                VALUES (
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                )
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(builds._timestamp, EXCLUDED._timestamp),
+                    comment = COALESCE(builds.comment, EXCLUDED.comment),
+                    start_time = COALESCE(builds.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(builds.duration, EXCLUDED.duration),
+                    architecture = COALESCE(builds.architecture, EXCLUDED.architecture),
+                    command = COALESCE(builds.command, EXCLUDED.command),
+                    compiler = COALESCE(builds.compiler, EXCLUDED.compiler),
+                    input_files = COALESCE(builds.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(builds.output_files, EXCLUDED.output_files),
+                    config_name = COALESCE(builds.config_name, EXCLUDED.config_name),
+                    config_url = COALESCE(builds.config_url, EXCLUDED.config_url),
+                    log_url = COALESCE(builds.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(builds.log_excerpt, EXCLUDED.log_excerpt),
+                    misc = COALESCE(builds.misc, EXCLUDED.misc),
+                    status = COALESCE(builds.status, EXCLUDED.status);
+            """,
+        "staging_query": """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_staging_builds
+                (LIKE builds INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM ingest_staging_builds;
+            """,
+        "copy_query": """
+                COPY ingest_staging_builds (
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status
+                )
+                FROM STDIN
+            """,
+        "merge_query": """
+                INSERT INTO builds (
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status
+                )
+                SELECT
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status
+                FROM ingest_staging_builds
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(builds._timestamp, EXCLUDED._timestamp),
+                    comment = COALESCE(builds.comment, EXCLUDED.comment),
+                    start_time = COALESCE(builds.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(builds.duration, EXCLUDED.duration),
+                    architecture = COALESCE(builds.architecture, EXCLUDED.architecture),
+                    command = COALESCE(builds.command, EXCLUDED.command),
+                    compiler = COALESCE(builds.compiler, EXCLUDED.compiler),
+                    input_files = COALESCE(builds.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(builds.output_files, EXCLUDED.output_files),
+                    config_name = COALESCE(builds.config_name, EXCLUDED.config_name),
+                    config_url = COALESCE(builds.config_url, EXCLUDED.config_url),
+                    log_url = COALESCE(builds.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(builds.log_excerpt, EXCLUDED.log_excerpt),
+                    misc = COALESCE(builds.misc, EXCLUDED.misc),
+                    status = COALESCE(builds.status, EXCLUDED.status);
+            """,
+        "partitioned_query": """
+                INSERT INTO builds (
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status,
+                    _created
+                )
+                VALUES (
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                    COALESCE(
+                        (SELECT _created FROM builds WHERE id = %s),
+                        now()
+                    )
+                )
+                ON CONFLICT (id, _created)
+                DO UPDATE SET
+                    _timestamp = GREATEST(builds._timestamp, EXCLUDED._timestamp),
+                    comment = COALESCE(builds.comment, EXCLUDED.comment),
+                    start_time = COALESCE(builds.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(builds.duration, EXCLUDED.duration),
+                    architecture = COALESCE(builds.architecture, EXCLUDED.architecture),
+                    command = COALESCE(builds.command, EXCLUDED.command),
+                    compiler = COALESCE(builds.compiler, EXCLUDED.compiler),
+                    input_files = COALESCE(builds.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(builds.output_files, EXCLUDED.output_files),
+                    config_name = COALESCE(builds.config_name, EXCLUDED.config_name),
+                    config_url = COALESCE(builds.config_url, EXCLUDED.config_url),
+                    log_url = COALESCE(builds.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(builds.log_excerpt, EXCLUDED.log_excerpt),
+                    misc = COALESCE(builds.misc, EXCLUDED.misc),
+                    status = COALESCE(builds.status, EXCLUDED.status);
+            """,
+        "partitioned_merge_query": """
+                UPDATE ingest_staging_builds staging
+                SET _created = existing._created
+                FROM builds existing
+                WHERE existing.id = staging.id;
+
+                INSERT INTO builds (
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status,
+                    _created
                 )
-                ON CONFLICT (id)
+                SELECT
+                    _timestamp,
+                    checkout_id,
+                    id,
+                    origin,
+                    comment,
+                    start_time,
+                    duration,
+                    architecture,
+                    command,
+                    compiler,
+                    input_files,
+                    output_files,
+                    config_name,
+                    config_url,
+                    log_url,
+                    log_excerpt,
+                    misc,
+                    status,
+                    _created
+                FROM ingest_staging_builds
+                ORDER BY id
+                ON CONFLICT (id, _created)
                 DO UPDATE SET
                     _timestamp = GREATEST(builds._timestamp, EXCLUDED._timestamp),
                     comment = COALESCE(builds.comment, EXCLUDED.comment),
@@ -211,13 +585,13 @@ INSERT_QUERIES = {
             "status",
             "start_time",
             "duration",
+            "input_files",
             "output_files",
             "misc",
             "number_value",
             "environment_compatible",
             "number_prefix",
             "number_unit",
-            "input_files",
         ],
         "query": """
                 INSERT INTO tests (
@@ -234,13 +608,13 @@ INSERT_QUERIES = {
                     status,
                     start_time,
                     duration,
+                    input_files,
                     output_files,
                     misc,
                     number_value,
                     environment_compatible,
                     number_prefix,
-                    number_unit,
-                    input_files
+                    number_unit
                 )
                 VALUES (
                     %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
@@ -257,13 +631,234 @@ INSERT_QUERIES = {
                     status = COALESCE(tests.status, EXCLUDED.status),
                     start_time = COALESCE(tests.start_time, EXCLUDED.start_time),
                     duration = COALESCE(tests.duration, EXCLUDED.duration),
+                    input_files = COALESCE(tests.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(tests.output_files, EXCLUDED.output_files),
+                    misc = COALESCE(tests.misc, EXCLUDED.misc),
+                    number_value = COALESCE(tests.number_value, EXCLUDED.number_value),
+                    environment_compatible = COALESCE(tests.environment_compatible, EXCLUDED.environment_compatible),
+                    number_prefix = COALESCE(tests.number_prefix, EXCLUDED.number_prefix),
+                    number_unit = COALESCE(tests.number_unit, EXCLUDED.number_unit);
+            """,
+        "staging_query": """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_staging_tests
+                (LIKE tests INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM ingest_staging_tests;
+            """,
+        "copy_query": """
+                COPY ingest_staging_tests (
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit
+                )
+                FROM STDIN
+            """,
+        "merge_query": """
+                INSERT INTO tests (
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit
+                )
+                SELECT
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit
+                FROM ingest_staging_tests
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(tests._timestamp, EXCLUDED._timestamp),
+                    environment_comment = COALESCE(tests.environment_comment, EXCLUDED.environment_comment),
+                    environment_misc = COALESCE(tests.environment_misc, EXCLUDED.environment_misc),
+                    path = COALESCE(tests.path, EXCLUDED.path),
+                    comment = COALESCE(tests.comment, EXCLUDED.comment),
+                    log_url = COALESCE(tests.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(tests.log_excerpt, EXCLUDED.log_excerpt),
+                    status = COALESCE(tests.status, EXCLUDED.status),
+                    start_time = COALESCE(tests.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(tests.duration, EXCLUDED.duration),
+                    input_files = COALESCE(tests.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(tests.output_files, EXCLUDED.output_files),
+                    misc = COALESCE(tests.misc, EXCLUDED.misc),
+                    number_value = COALESCE(tests.number_value, EXCLUDED.number_value),
+                    environment_compatible = COALESCE(tests.environment_compatible, EXCLUDED.environment_compatible),
+                    number_prefix = COALESCE(tests.number_prefix, EXCLUDED.number_prefix),
+                    number_unit = COALESCE(tests.number_unit, EXCLUDED.number_unit);
+            """,
+        "partitioned_query": """
+                INSERT INTO tests (
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit,
+                    _created
+                )
+                VALUES (
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                    COALESCE(
+                        (SELECT _created FROM tests WHERE id = %s),
+                        now()
+                    )
+                )
+                ON CONFLICT (id, _created)
+                DO UPDATE SET
+                    _timestamp = GREATEST(tests._timestamp, EXCLUDED._timestamp),
+                    environment_comment = COALESCE(tests.environment_comment, EXCLUDED.environment_comment),
+                    environment_misc = COALESCE(tests.environment_misc, EXCLUDED.environment_misc),
+                    path = COALESCE(tests.path, EXCLUDED.path),
+                    comment = COALESCE(tests.comment, EXCLUDED.comment),
+                    log_url = COALESCE(tests.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(tests.log_excerpt, EXCLUDED.log_excerpt),
+                    status = COALESCE(tests.status, EXCLUDED.status),
+                    start_time = COALESCE(tests.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(tests.duration, EXCLUDED.duration),
+                    input_files = COALESCE(tests.input_files, EXCLUDED.input_files),
+                    output_files = COALESCE(tests.output_files, EXCLUDED.output_files),
+                    misc = COALESCE(tests.misc, EXCLUDED.misc),
+                    number_value = COALESCE(tests.number_value, EXCLUDED.number_value),
+                    environment_compatible = COALESCE(tests.environment_compatible, EXCLUDED.environment_compatible),
+                    number_prefix = COALESCE(tests.number_prefix, EXCLUDED.number_prefix),
+                    number_unit = COALESCE(tests.number_unit, EXCLUDED.number_unit);
+            """,
+        "partitioned_merge_query": """
+                UPDATE ingest_staging_tests staging
+                SET _created = existing._created
+                FROM tests existing
+                WHERE existing.id = staging.id;
+
+                INSERT INTO tests (
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit,
+                    _created
+                )
+                SELECT
+                    _timestamp,
+                    build_id,
+                    id,
+                    origin,
+                    environment_comment,
+                    environment_misc,
+                    path,
+                    comment,
+                    log_url,
+                    log_excerpt,
+                    status,
+                    start_time,
+                    duration,
+                    input_files,
+                    output_files,
+                    misc,
+                    number_value,
+                    environment_compatible,
+                    number_prefix,
+                    number_unit,
+                    _created
+                FROM ingest_staging_tests
+                ORDER BY id
+                ON CONFLICT (id, _created)
+                DO UPDATE SET
+                    _timestamp = GREATEST(tests._timestamp, EXCLUDED._timestamp),
+                    environment_comment = COALESCE(tests.environment_comment, EXCLUDED.environment_comment),
+                    environment_misc = COALESCE(tests.environment_misc, EXCLUDED.environment_misc),
+                    path = COALESCE(tests.path, EXCLUDED.path),
+                    comment = COALESCE(tests.comment, EXCLUDED.comment),
+                    log_url = COALESCE(tests.log_url, EXCLUDED.log_url),
+                    log_excerpt = COALESCE(tests.log_excerpt, EXCLUDED.log_excerpt),
+                    status = COALESCE(tests.status, EXCLUDED.status),
+                    start_time = COALESCE(tests.start_time, EXCLUDED.start_time),
+                    duration = COALESCE(tests.duration, EXCLUDED.duration),
+                    input_files = COALESCE(tests.input_files, EXCLUDED.input_files),
                     output_files = COALESCE(tests.output_files, EXCLUDED.output_files),
                     misc = COALESCE(tests.misc, EXCLUDED.misc),
                     number_value = COALESCE(tests.number_value, EXCLUDED.number_value),
                     environment_compatible = COALESCE(tests.environment_compatible, EXCLUDED.environment_compatible),
                     number_prefix = COALESCE(tests.number_prefix, EXCLUDED.number_prefix),
-                    number_unit = COALESCE(tests.number_unit, EXCLUDED.number_unit),
-                    input_files = COALESCE(tests.input_files, EXCLUDED.input_files);
+                    number_unit = COALESCE(tests.number_unit, EXCLUDED.number_unit);
             """,
     },
     "incidents": {
@@ -304,5 +899,61 @@ INSERT_QUERIES = {
                     comment = COALESCE(incidents.comment, EXCLUDED.comment),
                     misc = COALESCE(incidents.misc, EXCLUDED.misc);
             """,
+        "staging_query": """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_staging_incidents
+                (LIKE incidents INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                DELETE FROM ingest_staging_incidents;
+            """,
+        "copy_query": """
+                COPY ingest_staging_incidents (
+                    _timestamp,
+                    id,
+                    origin,
+                    issue_id,
+                    issue_version,
+                    build_id,
+                    test_id,
+                    present,
+                    comment,
+                    misc
+                )
+                FROM STDIN
+            """,
+        "merge_query": """
+                INSERT INTO incidents (
+                    _timestamp,
+                    id,
+                    origin,
+                    issue_id,
+                    issue_version,
+                    build_id,
+                    test_id,
+                    present,
+                    comment,
+                    misc
+                )
+                SELECT
+                    _timestamp,
+                    id,
+                    origin,
+                    issue_id,
+                    issue_version,
+                    build_id,
+                    test_id,
+                    present,
+                    comment,
+                    misc
+                FROM ingest_staging_incidents
+                ORDER BY id
+                ON CONFLICT (id)
+                DO UPDATE SET
+                    _timestamp = GREATEST(incidents._timestamp, EXCLUDED._timestamp),
+                    build_id = COALESCE(incidents.build_id, EXCLUDED.build_id),
+                    test_id = COALESCE(incidents.test_id, EXCLUDED.test_id),
+                    present = COALESCE(incidents.present, EXCLUDED.present),
+                    comment = COALESCE(incidents.comment, EXCLUDED.comment),
+                    misc = COALESCE(incidents.misc, EXCLUDED.misc);
+            """,
     },
 }
@@ -1,9 +1,18 @@
 import time
 from typing import Optional, Sequence
 
-from django.db import connections
+from django.db import OperationalError, connections, transaction
+from psycopg.errors import DeadlockDetected
 
+from kernelCI_app.constants.ingester import INGEST_INLINE_AGGREGATION
 from kernelCI_app.helpers.logger import out
+from kernelCI_app.management.commands.helpers.process_submissions import IngestRow
+from kernelCI_app.management.commands.helpers.sql_aggregation import (
+    INGESTED_BUILDS_TABLE,
+    INGESTED_TESTS_TABLE,
+    aggregate_ingested_items,
+    prepare_ingested_tables,
+)
 from kernelCI_app.management.commands.helpers.tree_listing import (
     CheckoutRow,
     tree_listing_sort_key,
@@ -11,7 +20,6 @@ from kernelCI_app.management.commands.helpers.tree_listing import (
 from kernelCI_app.models import (
     Builds,
     Checkouts,
-    PendingBuilds,
     PendingTest,
     SimplifiedStatusChoices,
     StatusChoices,
@@ -31,15 +39,6 @@ def simplify_status(status: Optional[StatusChoices]) -> SimplifiedStatusChoices:
         return SimplifiedStatusChoices.INCONCLUSIVE
 
 
-def convert_build(b: Builds) -> PendingBuilds:
-    return PendingBuilds(
-        build_id=b.id,
-        origin=b.origin,
-        checkout_id=b.checkout_id,
-        status=simplify_status(b.status),
-    )
-
-
 def convert_test(t: Tests) -> PendingTest:
     misc = t.misc or {}
     return PendingTest(
@@ -57,7 +56,7 @@ def convert_test(t: Tests) -> PendingTest:
     )
 
 
-def update_tree_listing(checkouts_instances: Sequence[Checkouts]):
+def update_tree_listing(checkouts_instances: Sequence[Checkouts | IngestRow]):
     """
     Whenever a checkout updates the latest_checkout table,
     we update the tree_listing table, zeroing the counts.
@@ -116,7 +115,9 @@ def update_tree_listing(checkouts_instances: Sequence[Checkouts]):
     )
 
 
-def aggregate_checkouts(checkouts_instances: Sequence[Checkouts]) -> None:
+def aggregate_checkouts(
+    checkouts_instances: Sequence[Checkouts | IngestRow],
+) -> None:
     """
     Insert checkouts on latest_checkouts table,
     maintaining only the latest ones for each
@@ -155,88 +156,217 @@ def aggregate_checkouts(checkouts_instances: Sequence[Checkouts]) -> None:
         out(f"inserted {len(checkouts_instances)} checkouts in {time.time() - t0:.3f}s")
 
 
+def _pending_test_values(test: PendingTest) -> tuple:
+    return (
+        test.test_id,
+        test.origin,
+        test.platform,
+        test.compatible,
+        test.build_id,
+        test.status,
+        test.is_boot,
+        test.path,
+        test.start_time,
+        test.lab,
+        test.full_status,
+    )
+
+
+def _pending_test_row_values(t: IngestRow) -> tuple:
+    """Same values as convert_test, taken from an ingest row (see make_test_row)"""
+    return (
+        t.id,
+        t.origin,
+        t.platform,
+        t.environment_compatible,
+        t.build_id,
+        simplify_status(t.status),
+        is_boot(t.path) if t.path else False,
+        t.path,
+        t.start_time,
+        t.lab,
+        t.status,
+    )
+
+
+PENDING_TEST_COLUMNS = """
+    test_id, origin, platform, compatible,
+    build_id, status, is_boot,
+    path, start_time, lab, full_status
+"""
+
+# A test sent again only fills the fields that were still null. The slot is filled
+# by the database with the active slot of the queue, see pending_queue.py.
+UPSERT_PENDING_TEST_SQL = """
+    ON CONFLICT (test_id, slot)
+    DO UPDATE SET
+        platform = COALESCE({table}.platform, EXCLUDED.platform),
+        compatible = COALESCE({table}.compatible, EXCLUDED.compatible),
+        status = COALESCE({table}.status, EXCLUDED.status),
+        path = COALESCE({table}.path, EXCLUDED.path),
+        start_time = COALESCE({table}.start_time, EXCLUDED.start_time),
+        lab = COALESCE({table}.lab, EXCLUDED.lab),
+        full_status = COALESCE({table}.full_status, EXCLUDED.full_status)
+"""
+
+PENDING_BUILD_COLUMNS = "build_id, origin, checkout_id, status"
+
+UPSERT_PENDING_BUILD_SQL = """
+    ON CONFLICT (build_id, slot)
+    DO UPDATE SET
+        status = COALESCE({table}.status, EXCLUDED.status)
+"""
+
+
+def _upsert_pending_tests(values: list[tuple], table: str = "pending_test") -> None:
+    query = f"""
+        INSERT INTO {table} ({PENDING_TEST_COLUMNS})
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        {UPSERT_PENDING_TEST_SQL.format(table=table)}
+    """
+
+    with connections["default"].cursor() as cursor:
+        cursor.executemany(query, values)
+
+
 def aggregate_tests(
     tests_instances: Sequence[Tests],
 ) -> None:
     """Insert tests data on pending_tests table to be processed later"""
     t0 = time.time()
-    pending_tests = (convert_test(test) for test in tests_instances)
-    values = [
-        (
-            test.test_id,
-            test.origin,
-            test.platform,
-            test.compatible,
-            test.build_id,
-            test.status,
-            test.is_boot,
-            test.path,
-            test.start_time,
-            test.lab,
-            test.full_status,
-        )
-        for test in pending_tests
-    ]
+    values = [_pending_test_values(convert_test(test)) for test in tests_instances]
 
-    if pending_tests:
-        query = """
-            INSERT INTO pending_test (
-                test_id, origin, platform, compatible,
-                build_id, status, is_boot,
-                path, start_time, lab, full_status
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (test_id)
-            DO UPDATE SET
-                platform = COALESCE(pending_test.platform, EXCLUDED.platform),
-                compatible = COALESCE(pending_test.compatible, EXCLUDED.compatible),
-                status = COALESCE(pending_test.status, EXCLUDED.status),
-                path = COALESCE(pending_test.path, EXCLUDED.path),
-                start_time = COALESCE(pending_test.start_time, EXCLUDED.start_time),
-                lab = COALESCE(pending_test.lab, EXCLUDED.lab),
-                full_status = COALESCE(pending_test.full_status, EXCLUDED.full_status)
-        """
+    if values:
+        _upsert_pending_tests(values)
+        out(f"bulk_create pending_tests in {time.time() - t0:.3f}s")
 
-        with connections["default"].cursor() as cursor:
-            cursor.executemany(query, values)
+
+def aggregate_test_rows(test_rows: Sequence[IngestRow]) -> None:
+    """Same as aggregate_tests, but for the ingester rows, without going through models"""
+    t0 = time.time()
+    values = [_pending_test_row_values(test) for test in test_rows]
+
+    if values:
+        _upsert_pending_tests(values)
         out(f"bulk_create pending_tests in {time.time() - t0:.3f}s")
 
 
+def _pending_build_values(build: Builds | IngestRow) -> tuple:
+    return (
+        build.id,
+        build.origin,
+        build.checkout_id,
+        simplify_status(build.status),
+    )
+
+
+def _upsert_pending_builds(values: list[tuple], table: str = "pending_builds") -> None:
+    query = f"""
+        INSERT INTO {table} ({PENDING_BUILD_COLUMNS})
+        VALUES (%s, %s, %s, %s)
+        {UPSERT_PENDING_BUILD_SQL.format(table=table)}
+    """
+
+    with connections["default"].cursor() as cursor:
+        cursor.executemany(query, values)
+
+
 def aggregate_builds(
-    build_instances: Sequence[Builds],
+    build_instances: Sequence[Builds | IngestRow],
 ) -> None:
-    """Insert builds data on pending_builds table to be processed later"""
+    """Insert builds data on pending_builds table to be processed later.
+    Only reads attributes that builds models and ingest rows have in common."""
     t0 = time.time()
-    pending_builds = (convert_build(build) for build in build_instances)
-    values = [
-        (
-            build.build_id,
-            build.origin,
-            build.checkout_id,
-            build.status,
-        )
-        for build in pending_builds
-    ]
+    values = [_pending_build_values(build) for build in build_instances]
 
-    if pending_builds:
-        query = """
-            INSERT INTO pending_builds (
-                build_id, origin, checkout_id, status
-            ) VALUES (%s, %s, %s, %s)
-            ON CONFLICT (build_id)
-            DO UPDATE SET
-                status = COALESCE(pending_builds.status, EXCLUDED.status)
-        """
-        with connections["default"].cursor() as cursor:
-            cursor.executemany(query, values)
+    if values:
+        _upsert_pending_builds(values)
         out(f"bulk_create pending_builds in {time.time() - t0:.3f}s")
 
 
+def _queue_not_aggregated() -> tuple[int, int]:
+    """
+    Moves the staged tests and builds that weren't aggregated to the pending tables.
+    Returns the number of tests and builds queued.
+    """
+    with connections["default"].cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO pending_test ({PENDING_TEST_COLUMNS})
+            SELECT {PENDING_TEST_COLUMNS} FROM {INGESTED_TESTS_TABLE} t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM aggregation_ready_tests r WHERE r.test_id = t.test_id
+            )
+            ORDER BY test_id
+            {UPSERT_PENDING_TEST_SQL.format(table="pending_test")}
+            """
+        )
+        tests_count = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO pending_builds ({PENDING_BUILD_COLUMNS})
+            SELECT {PENDING_BUILD_COLUMNS} FROM {INGESTED_BUILDS_TABLE} b
+            WHERE NOT EXISTS (
+                SELECT 1 FROM aggregation_ready_builds r WHERE r.build_id = b.build_id
+            )
+            ORDER BY build_id
+            {UPSERT_PENDING_BUILD_SQL.format(table="pending_builds")}
+            """
+        )
+        return tests_count, cursor.rowcount
+
+
+def aggregate_rows_inline(
+    test_rows: Sequence[IngestRow], build_rows: Sequence[IngestRow]
+) -> None:
+    """
+    Adds the tests and builds of a flush to the aggregate tables right away, in the
+    flush transaction, when their build and checkout are known. The other ones are
+    queued in the pending tables, like aggregate_test_rows and aggregate_builds do.
+
+    If the aggregation deadlocks with another ingester or process_pending_aggregations,
+    everything is queued in the pending tables instead, without failing the flush.
+    """
+    t0 = time.time()
+    test_values = [_pending_test_row_values(test) for test in test_rows]
+    build_values = [_pending_build_values(build) for build in build_rows]
+    if not test_values and not build_values:
+        return
+
+    try:
+        with transaction.atomic():
+            prepare_ingested_tables()
+            _upsert_pending_tests(test_values, table=INGESTED_TESTS_TABLE)
+            _upsert_pending_builds(build_values, table=INGESTED_BUILDS_TABLE)
+            result = aggregate_ingested_items()
+            pending_tests, pending_builds = _queue_not_aggregated()
+    except OperationalError as e:
+        if (
+            not isinstance(e.__cause__, DeadlockDetected)
+            or connections["default"].needs_rollback
+        ):
+            raise
+        out("Deadlock aggregating the flush, queueing its items as pending")
+        _upsert_pending_tests(test_values)
+        _upsert_pending_builds(build_values)
+        return
+
+    out(
+        f"aggregated tests(n={result.tests_count}) builds(n={result.builds_count}), "
+        f"queued pending tests(n={pending_tests}) builds(n={pending_builds}) "
+        f"in {time.time() - t0:.3f}s"
+    )
+
+
 def aggregate_checkouts_and_pendings(
-    checkouts_instances: Sequence[Checkouts],
-    tests_instances: Sequence[Tests],
-    build_instances: Sequence[Builds],
+    checkout_rows: Sequence[IngestRow],
+    test_rows: Sequence[IngestRow],
+    build_rows: Sequence[IngestRow],
 ) -> None:
-    aggregate_checkouts(checkouts_instances)
-    update_tree_listing(checkouts_instances)
-    aggregate_tests(tests_instances)
-    aggregate_builds(build_instances)
+    aggregate_checkouts(checkout_rows)
+    update_tree_listing(checkout_rows)
+    if INGEST_INLINE_AGGREGATION:
+        aggregate_rows_inline(test_rows, build_rows)
+    else:
+        aggregate_test_rows(test_rows)
+        aggregate_builds(build_rows)
@@ -0,0 +1,269 @@
+"""
+Partitioning of the pending aggregation queue between process_pending_aggregations
+workers.
+
+Pending builds and tests are split in shards by the tree and commit of their
+checkout, which is part of the key of every aggregate they update (tree_listing,
+tree_tests_rollup, and hardware_status through the checkout id). A shard has a
+single owner at a time, so each aggregate row has a single writer and workers never
+claim the same pending rows.
+
+Shard ownership uses postgres session advisory locks, so it is released as soon as
+the worker's connection ends, even if the worker is killed. Workers either own a
+fixed shard (`--shard N/M`) or let the coordinator assign them an even share of
+the shards that are not reserved by fixed workers (`--shard auto/M`), which is
+adjusted before every batch as workers join or leave.
+"""
+
+import argparse
+import math
+from typing import NamedTuple, Optional
+
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from kernelCI_app.constants.process_pending import (
+    SHARD_AUTO_MEMBER_LOCK,
+    SHARD_JOIN_LOCK,
+    SHARD_MEMBER_LOCK,
+    SHARD_OWNER_LOCK,
+    SHARD_RESERVED_LOCK,
+)
+from kernelCI_app.helpers.logger import out
+
+# The shard must only depend on columns that are part of the tree_listing key
+_CHECKOUT_SHARD_SQL = """
+    mod(
+        hashtextextended(
+            concat_ws(
+                '|', c.origin, c.tree_name, c.git_repository_url,
+                c.git_repository_branch, c.git_commit_hash
+            ),
+            0
+        ) & 9223372036854775807,
+        %s
+    )
+"""
+
+_PENDING_TEST_SHARD_SQL = (
+    "SELECT"
+    + _CHECKOUT_SHARD_SQL
+    + """
+    FROM builds b JOIN checkouts c ON c.id = b.checkout_id
+    WHERE b.id = pending_test.build_id
+    """
+)
+
+_PENDING_BUILD_SHARD_SQL = (
+    "SELECT"
+    + _CHECKOUT_SHARD_SQL
+    + """
+    FROM checkouts c
+    WHERE c.id = pending_builds.checkout_id
+    """
+)
+
+_ADVISORY_LOCKS_SQL = """
+    FROM pg_locks
+    WHERE locktype = 'advisory'
+        AND granted
+        AND objsubid = 2
+        AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+
+class ShardSpec(NamedTuple):
+    index: Optional[int]
+    """Shard owned by the worker, None if it is assigned by the coordinator"""
+    count: int
+
+    def __str__(self) -> str:
+        return f"{'auto' if self.index is None else self.index}/{self.count}"
+
+
+UNSHARDED = ShardSpec(index=0, count=1)
+"""A single worker owning the whole queue"""
+
+
+def parse_shard(value: str) -> ShardSpec:
+    """Parses a `N/M` or `auto/M` shard argument."""
+    index, separator, count = value.partition("/")
+    try:
+        shard = ShardSpec(
+            index=None if index == "auto" else int(index), count=int(count)
+        )
+    except ValueError:
+        shard = None
+
+    if (
+        shard is None
+        or not separator
+        or shard.count < 1
+        or (shard.index is not None and not 0 <= shard.index < shard.count)
+    ):
+        raise argparse.ArgumentTypeError(
+            f"invalid shard {value!r}, expected N/M (0 <= N < M) or auto/M"
+        )
+    return shard
+
+
+def pending_test_shard(count: int) -> RawSQL:
+    """Shard of a pending test, NULL if its build or checkout isn't in the database."""
+    return RawSQL(_PENDING_TEST_SHARD_SQL, [count])  # noqa: S611 - constant SQL
+
+
+def pending_build_shard(count: int) -> RawSQL:
+    """Shard of a pending build, NULL if its checkout isn't in the database."""
+    return RawSQL(_PENDING_BUILD_SHARD_SQL, [count])  # noqa: S611 - constant SQL
+
+
+def target_shard_count(count: int, reserved: int, auto_members: int) -> int:
+    """
+    Number of shards each `auto` worker should own so that every shard that is not
+    reserved by a fixed worker has an owner.
+    """
+    if auto_members <= 0:
+        return 0
+    return math.ceil(max(count - reserved, 0) / auto_members)
+
+
+def _try_lock(key: int, value: int) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", [key, value])
+        return cursor.fetchone()[0]
+
+
+def _unlock(key: int, value: int) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [key, value])
+
+
+def _held_locks(key: int, *, own: bool = False) -> list[int]:
+    """
+    Returns the second key of the locks held with `key`, once per holder.
+    If `own` is set, only the locks held by this connection are returned.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT objid::bigint {_ADVISORY_LOCKS_SQL}
+                AND classid::bigint = %s
+                AND (NOT %s OR pid = pg_backend_pid())
+            """,
+            [key, own],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class ShardCoordinator:
+    """
+    Claims and releases the shards of a worker. `join` registers the worker,
+    `rebalance` must be called between batches and returns the shards to process,
+    and `leave` releases everything.
+
+    A fixed worker reserves its shard when it joins; `auto` workers that own it
+    release it on their next rebalance, and until then the fixed worker gets no
+    shard to process.
+    """
+
+    def __init__(self, spec: ShardSpec) -> None:
+        self.spec = spec
+        self.shards: list[int] = []
+
+    def join(self) -> None:
+        """
+        Registers the worker and reserves its fixed shard. Raises CommandError if other
+        workers use a different number of shards or the fixed shard is reserved.
+        """
+        # Serializes joins, so that two workers can't start with different shard counts
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, 0)", [SHARD_JOIN_LOCK])
+            other_counts = set(_held_locks(SHARD_MEMBER_LOCK)) - {self.spec.count}
+            if other_counts:
+                raise CommandError(
+                    "Other workers are running with %s shard(s), can't start with %d"
+                    % (", ".join(map(str, sorted(other_counts))), self.spec.count)
+                )
+            cursor.execute(
+                "SELECT pg_advisory_lock_shared(%s, %s)",
+                [SHARD_MEMBER_LOCK, self.spec.count],
+            )
+            if self.spec.index is None:
+                cursor.execute(
+                    "SELECT pg_advisory_lock_shared(%s, %s)",
+                    [SHARD_AUTO_MEMBER_LOCK, self.spec.count],
+                )
+
+        if self.spec.index is not None and not _try_lock(
+            SHARD_RESERVED_LOCK, self.spec.index
+        ):
+            self.leave()
+            raise CommandError(f"Shard {self.spec} is already taken by another worker")
+
+    def rebalance(self) -> list[int]:
+        """Adjusts the shards owned by the worker and returns them."""
+        owned = set(_held_locks(SHARD_OWNER_LOCK, own=True))
+
+        if self.spec.index is not None:
+            # Also retaken if the connection was reset
+            if self.spec.index in owned or _try_lock(SHARD_OWNER_LOCK, self.spec.index):
+                shards = [self.spec.index]
+            else:
+                shards = []
+            if shards != self.shards:
+                out(
+                    f"Aggregating shard {self.spec}"
+                    if shards
+                    else f"Waiting for shard {self.spec} to be released"
+                )
+            self.shards = shards
+            return shards
+
+        reserved = set(_held_locks(SHARD_RESERVED_LOCK))
+        auto_members = len(_held_locks(SHARD_AUTO_MEMBER_LOCK))
+        target = target_shard_count(self.spec.count, len(reserved), auto_members)
+
+        extra = len(owned) - target
+        for shard in sorted(owned, key=lambda shard: (shard not in reserved, -shard)):
+            if shard not in reserved and extra <= 0:
+                break
+            _unlock(SHARD_OWNER_LOCK, shard)
+            owned.discard(shard)
+            extra -= 1
+        for shard in range(self.spec.count):
+            if len(owned) >= target:
+                break
+            if (
+                shard not in owned
+                and shard not in reserved
+                and _try_lock(SHARD_OWNER_LOCK, shard)
+            ):
+                owned.add(shard)
+
+        shards = sorted(owned)
+        if shards != self.shards:
+            out(
+                f"Aggregating shards {shards} of {self.spec.count} "
+                f"({auto_members} auto workers, {len(reserved)} reserved shards)"
+            )
+        self.shards = shards
+        return shards
+
+    def leave(self) -> None:
+        """Releases the shards and the membership of the worker."""
+        for shard in _held_locks(SHARD_OWNER_LOCK, own=True):
+            _unlock(SHARD_OWNER_LOCK, shard)
+        for shard in _held_locks(SHARD_RESERVED_LOCK, own=True):
+            _unlock(SHARD_RESERVED_LOCK, shard)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock_shared(%s, %s)",
+                [SHARD_MEMBER_LOCK, self.spec.count],
+            )
+            if self.spec.index is None:
+                cursor.execute(
+                    "SELECT pg_advisory_unlock_shared(%s, %s)",
+                    [SHARD_AUTO_MEMBER_LOCK, self.spec.count],
+                )
+        self.shards = []
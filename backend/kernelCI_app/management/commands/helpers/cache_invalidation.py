@@ -0,0 +1,93 @@
+"""
+Invalidation of the cached queries of the checkouts whose data is written by the
+ingester and process_pending_aggregations, see invalidate_query_cache.
+
+Cached queries are tagged with the commit hashes of the checkouts they read, so the
+builds, tests and incidents that are written are traced back to the commit hash of
+their checkout. The tree details can be requested by a tag of the commit as well, so
+the tags of the checkouts are invalidated too.
+"""
+
+from typing import Iterable, Optional, Sequence
+
+from django.db import connection, transaction
+
+from kernelCI_app.cache import invalidate_query_cache
+from kernelCI_app.management.commands.helpers.process_submissions import IngestRow
+
+# Checkouts of builds, of the builds of tests, and of the tests of incidents
+_WRITTEN_COMMITS_SQL = """
+    SELECT DISTINCT commit
+    FROM checkouts c, unnest(c.git_commit_tags || c.git_commit_hash) AS commit
+    WHERE commit IS NOT NULL AND c.id IN (
+        SELECT unnest(%(checkout_ids)s::text[])
+        UNION
+        SELECT b.checkout_id FROM builds b
+        WHERE b.id IN (
+            SELECT unnest(%(build_ids)s::text[])
+            UNION
+            SELECT t.build_id FROM tests t WHERE t.id = ANY(%(test_ids)s)
+        )
+    )
+"""
+
+
+def checkout_commits(git_commit_hash: Optional[str], git_commit_tags) -> set[str]:
+    """The commit hash and the tags of a checkout, as they can be requested"""
+    return {commit for commit in [git_commit_hash, *(git_commit_tags or [])] if commit}
+
+
+def invalidate_cached_commits(commit_hashes: Iterable[str]) -> None:
+    """
+    Evicts the cached queries of the commits once the current transaction commits,
+    or right away outside of a transaction. Errors are logged instead of raised, so
+    that the cache never fails the writes.
+    """
+    commit_hashes = set(commit_hashes)
+    if not commit_hashes:
+        return
+
+    def invalidate() -> None:
+        invalidate_query_cache(commit_hashes=commit_hashes)
+
+    transaction.on_commit(invalidate, robust=True)
+
+
+def invalidate_written_commits(
+    *,
+    checkout_rows: Sequence[IngestRow],
+    build_rows: Sequence[IngestRow],
+    test_rows: Sequence[IngestRow],
+    incident_rows: Sequence[IngestRow],
+) -> None:
+    """
+    Evicts the cached queries of the checkouts of the rows of an ingester flush once
+    it commits. Must be called in the transaction of the flush, after the rows were
+    written, so that the items that reference each other are found.
+    """
+    commit_hashes = set().union(
+        *(
+            checkout_commits(row.git_commit_hash, row.git_commit_tags)
+            for row in checkout_rows
+        )
+    )
+    checkout_ids = list({row.checkout_id for row in build_rows})
+    build_ids = list(
+        {row.build_id for row in test_rows}
+        | {row.build_id for row in incident_rows if row.build_id}
+    )
+    test_ids = list({row.test_id for row in incident_rows if row.test_id})
+
+    if checkout_ids or build_ids or test_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _WRITTEN_COMMITS_SQL,
+                {
+                    "checkout_ids": checkout_ids,
+                    "build_ids": build_ids,
+                    "test_ids": test_ids,
+                },
+            )
+            commit_hashes.update(commit for (commit,) in cursor.fetchall())
+
+    invalidate_cached_commits(commit_hashes)
@@ -37,6 +37,15 @@ def move_file_to_failed_dir(filename: str, failed_dir: str) -> None:
         raise e
 
 
+def write_failure_reason(failed_dir: str, filename: str, reason: str) -> None:
+    """Writes why a file failed next to it in the failed directory, as `<filename>.error`."""
+    try:
+        with open(os.path.join(failed_dir, filename + ".error"), "w") as f:
+            f.write(reason)
+    except OSError as e:
+        logger.error("Error writing failure reason of file %s: %s", filename, e)
+
+
 def verify_dir(dir: str) -> None:
     if not os.path.exists(dir):
         logger.error("Directory %s does not exist", dir)
@@ -0,0 +1,105 @@
+import time
+from typing import Optional
+
+from typing_extensions import Literal
+
+from kernelCI_app.constants.ingester import (
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_MAX_BYTES,
+    INGEST_FLUSH_TARGET_LATENCY_SEC,
+    INGEST_FLUSH_TIMEOUT_SEC,
+    INGEST_MIN_BATCH_SIZE,
+)
+
+type FlushReason = Literal["rows", "bytes", "timeout", "final"]
+
+MAX_BATCH_SIZE_STEP = 2
+"""Max factor by which the batch size can grow or shrink after a single flush"""
+
+
+class FlushPolicy:
+    """
+    Decides when an ingester worker flushes its buffers: when a buffer reaches
+    `batch_size` rows, when the pending submissions reach `max_bytes`, or when
+    the oldest pending data has waited for `timeout_sec`, whichever comes first.
+
+    After each flush the batch size is adapted to the measured flush latency,
+    so that flushes take around `target_latency_sec`. This keeps the batches
+    as large as possible (which is what gives throughput) while a slow database
+    doesn't leave the data of a batch waiting for too long.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_batch_size: int,
+        min_batch_size: int,
+        max_bytes: int,
+        timeout_sec: float,
+        target_latency_sec: float,
+    ) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.min_batch_size = min(max(1, min_batch_size), self.max_batch_size)
+        self.max_bytes = max_bytes
+        self.timeout_sec = timeout_sec
+        self.target_latency_sec = target_latency_sec
+
+        self.batch_size = self.max_batch_size
+        self.pending_bytes = 0
+        self.pending_since: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls) -> "FlushPolicy":
+        return cls(
+            max_batch_size=INGEST_BATCH_SIZE,
+            min_batch_size=INGEST_MIN_BATCH_SIZE,
+            max_bytes=INGEST_FLUSH_MAX_BYTES,
+            timeout_sec=INGEST_FLUSH_TIMEOUT_SEC,
+            target_latency_sec=INGEST_FLUSH_TARGET_LATENCY_SEC,
+        )
+
+    def add_pending(self, size: int) -> None:
+        """Registers that a submission of `size` bytes is waiting to be flushed."""
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+        self.pending_bytes += size
+
+    def has_pending(self) -> bool:
+        return self.pending_since is not None
+
+    def seconds_until_timeout(self) -> Optional[float]:
+        """Time left until the pending data must be flushed, None if nothing is pending."""
+        if self.pending_since is None:
+            return None
+        return max(0.0, self.pending_since + self.timeout_sec - time.monotonic())
+
+    def flush_reason(self, largest_buffer: int) -> Optional[FlushReason]:
+        """Returns why the buffers should be flushed now, or None if they can wait."""
+        if largest_buffer >= self.batch_size:
+            return "rows"
+        if self.pending_since is None:
+            return None
+        if self.pending_bytes >= self.max_bytes:
+            return "bytes"
+        if time.monotonic() - self.pending_since >= self.timeout_sec:
+            return "timeout"
+        return None
+
+    def record_flush(self, largest_buffer: int, duration: float) -> None:
+        """Resets the pending data and adapts the batch size to the flush latency."""
+        self.pending_bytes = 0
+        self.pending_since = None
+
+        # Small flushes are dominated by fixed costs and say little about the latency
+        if largest_buffer < self.min_batch_size or duration <= 0:
+            return
+
+        estimate = largest_buffer * self.target_latency_sec / duration
+        # Limits the step so that a single outlier (e.g. a lock wait) can't collapse the batch
+        estimate = min(
+            max(estimate, self.batch_size / MAX_BATCH_SIZE_STEP),
+            self.batch_size * MAX_BATCH_SIZE_STEP,
+        )
+        self.batch_size = int(
+            min(max(estimate, self.min_batch_size), self.max_batch_size)
+        )
@@ -0,0 +1,155 @@
+"""
+Backfill of the hardware aggregations, latest_checkout and pending_test, from the
+checkouts and tests of an interval, see the backfill_hardware_aggregations command.
+
+latest_checkout is filled by a single statement. The tests are read one day at a
+time, so that the days can be backfilled in parallel: each day is streamed from a
+server-side cursor over a connection of its own, and the pending tests are copied in
+batches to a temporary table and upserted from it to pending_test, one transaction
+per batch.
+"""
+
+from datetime import datetime, timedelta
+from typing import Sequence
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from kernelCI_app.helpers.database import partition_filter
+from kernelCI_app.management.commands.helpers.aggregation_helpers import (
+    PENDING_TEST_COLUMNS,
+    UPSERT_PENDING_TEST_SQL,
+    simplify_status,
+)
+from kernelCI_app.utils import is_boot
+
+BACKFILL_TESTS_TABLE = "backfill_pending_tests"
+
+_CREATE_BACKFILL_TESTS_TABLE_SQL = f"""
+    CREATE TEMPORARY TABLE IF NOT EXISTS {BACKFILL_TESTS_TABLE} (
+        LIKE pending_test INCLUDING DEFAULTS
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Same rule as aggregate_checkouts: the checkout that started last of each tree
+_BACKFILL_LATEST_CHECKOUT_SQL = """
+    INSERT INTO latest_checkout (
+        checkout_id, origin, tree_name,
+        git_repository_url, git_repository_branch, start_time
+    )
+    SELECT DISTINCT ON (origin, tree_name, git_repository_url, git_repository_branch)
+        id, origin, tree_name,
+        git_repository_url, git_repository_branch, start_time
+    FROM checkouts
+    WHERE start_time >= %s
+    ORDER BY origin, tree_name, git_repository_url, git_repository_branch,
+        start_time DESC, id
+    ON CONFLICT (origin, tree_name, git_repository_url, git_repository_branch)
+    DO UPDATE SET
+        start_time = EXCLUDED.start_time,
+        checkout_id = EXCLUDED.checkout_id
+    WHERE latest_checkout.start_time < EXCLUDED.start_time
+"""
+
+# Tests with a platform, of the latest checkouts, with the fields of convert_test
+_BACKFILL_TESTS_SQL = """
+    SELECT
+        t.id, t.origin, t.environment_misc ->> 'platform', t.environment_compatible,
+        t.build_id, t.status, t.path, t.start_time, t.misc ->> 'runtime'
+    FROM tests t
+    JOIN builds b ON b.id = t.build_id
+    WHERE t.start_time >= %s AND t.start_time < %s
+        AND t.environment_misc ? 'platform'
+        AND EXISTS (
+            SELECT 1 FROM latest_checkout lc WHERE lc.checkout_id = b.checkout_id
+        )
+        {partition_filter}
+"""
+
+
+def day_ranges(start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+    """Splits [start, end) into days, the most recent first."""
+    ranges = []
+    while end > start:
+        ranges.append((max(end - timedelta(days=1), start), end))
+        end -= timedelta(days=1)
+    return ranges
+
+
+def truncate_hardware_aggregations() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("TRUNCATE latest_checkout, pending_test")
+
+
+def backfill_latest_checkout(since: datetime) -> int:
+    """Upserts the latest checkout of each tree started since `since`."""
+    with connection.cursor() as cursor:
+        cursor.execute(_BACKFILL_LATEST_CHECKOUT_SQL, [since])
+        return cursor.rowcount
+
+
+def _pending_test_values(row: tuple) -> tuple:
+    """Values of PENDING_TEST_COLUMNS from a row of _BACKFILL_TESTS_SQL"""
+    test_id, origin, platform, compatible, build_id, status, path, start_time, lab = row
+    return (
+        test_id,
+        origin,
+        platform,
+        compatible,
+        build_id,
+        simplify_status(status),
+        is_boot(path) if path else False,
+        path,
+        start_time,
+        lab,
+        status,
+    )
+
+
+def queue_pending_tests(rows: Sequence[tuple]) -> None:
+    """
+    Upserts tests, rows of _BACKFILL_TESTS_SQL, into pending_test, through a
+    temporary table filled with COPY. Runs in a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_CREATE_BACKFILL_TESTS_TABLE_SQL)
+        with cursor.copy(
+            f"COPY {BACKFILL_TESTS_TABLE} ({PENDING_TEST_COLUMNS}) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(_pending_test_values(row))
+        cursor.execute(
+            f"""
+            INSERT INTO pending_test ({PENDING_TEST_COLUMNS})
+            SELECT {PENDING_TEST_COLUMNS} FROM {BACKFILL_TESTS_TABLE}
+            ORDER BY test_id
+            {UPSERT_PENDING_TEST_SQL.format(table="pending_test")}
+            """
+        )
+
+
+def backfill_pending_tests(start: datetime, end: datetime, *, batch_size: int) -> int:
+    """
+    Queues the tests that started in [start, end) in pending_test, `batch_size`
+    tests per transaction. Returns the number of tests queued.
+
+    The tests are read from a server-side cursor, in a transaction of a connection
+    of its own, so that the batches can be committed while it is read.
+    """
+    tests_partition_filter = partition_filter("tests", alias="t", start="%s")
+    query = _BACKFILL_TESTS_SQL.format(partition_filter=tests_partition_filter)
+    params = [start, end] + ([start] if tests_partition_filter else [])
+
+    reader = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        # Outside of autocommit, the cursor is streamed instead of materialized
+        reader.set_autocommit(False)
+        queued = 0
+        with reader.chunked_cursor() as tests_cursor:
+            tests_cursor.execute(query, params)
+            while rows := tests_cursor.fetchmany(batch_size):
+                with transaction.atomic():
+                    queue_pending_tests(rows)
+                queued += len(rows)
+        return queued
+    finally:
+        reader.close()
@@ -0,0 +1,430 @@
+"""
+Long-lived ingester workers.
+
+`ingest_submissions_parallel` starts new worker processes on every call, and each
+of them connects to the database again. `IngestWorkerPool` starts the workers once
+and keeps feeding them files as they arrive, so they keep their database connection
+(and the statements prepared on it) for the whole run.
+"""
+
+import logging
+import multiprocessing
+import signal
+import time
+from queue import Empty, Full
+from typing import Any, Callable, Optional, Self
+
+from kernelCI_app.constants.ingester import (
+    INGEST_PARSED_QUEUE_MAXSIZE,
+    INGEST_QUEUE_MAXSIZE,
+    INGEST_WORKER_DRAIN_TIMEOUT_SEC,
+)
+from kernelCI_app.helpers.logger import out
+from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
+    DEFAULT_DB_WORKERS,
+    INGESTER_DIRS,
+    CycleTracker,
+    SubmissionFileMetadata,
+    build_file_batches,
+    parse_batch,
+    print_ingest_progress,
+    process_batch,
+    record_worker_exit,
+    update_queue_gauges,
+    write_batches,
+)
+
+logger = logging.getLogger("ingester")
+
+CYCLE_WAIT_SEC = 0.1
+"""How often the pool is polled while files are being ingested"""
+RESPAWN_DELAY_SEC = 1.0
+"""Min time between two starts of a worker, so that a crashing worker can't spin"""
+STALL_TIMEOUT_SEC = 5.0
+"""Time without progress after which the messages lost by crashed workers are
+written off, once nothing is queued or held by the workers anymore"""
+PROGRESS_EVERY_SEC = 2.0
+TERMINATE_TIMEOUT_SEC = 5.0
+"""Time given to a terminated worker to exit before it is killed"""
+
+
+def _run_worker(target: Callable[..., None], *args: Any) -> None:
+    # Ctrl+C reaches the whole process group; the pool stops the workers itself,
+    # after they flush what they have buffered
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The handler inherited from monitor_submissions only stops its loop, the
+    # workers must exit when the pool terminates them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    target(*args)
+
+
+class _WorkerStage:
+    """Workers that read from the same queue, replaced when they exit."""
+
+    def __init__(
+        self,
+        name: str,
+        count: int,
+        target: Callable[..., None],
+        make_args: Callable[[int], tuple[Any, ...]],
+        queue: multiprocessing.Queue,
+        cycle: CycleTracker,
+    ) -> None:
+        self.name = name
+        self.target = target
+        self.make_args = make_args
+        self.queue = queue
+        self.cycle = cycle
+        self.workers: list[Optional[multiprocessing.Process]] = [None] * count
+        self.started_at = [0.0] * count
+        # Last change of the remaining messages, to find stalls
+        self.last_remaining = 0
+        self.last_change = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def start_worker(self, slot: int) -> None:
+        worker = multiprocessing.Process(
+            target=_run_worker, args=(self.target, *self.make_args(slot))
+        )
+        worker.start()
+        self.workers[slot] = worker
+        self.started_at[slot] = time.monotonic()
+
+    def start(self) -> None:
+        for slot in range(len(self.workers)):
+            self.start_worker(slot)
+
+    def replace_exited_workers(self) -> int:
+        """Restarts the workers that exited. Returns how many exited since the last call."""
+        exited = 0
+        for slot, worker in enumerate(self.workers):
+            if worker is not None and not worker.is_alive():
+                worker.join()
+                record_worker_exit(worker)
+                exited += 1
+                lost = self.cycle.release(slot)
+                logger.error(
+                    "%s worker %s exited, restarting it (%d messages lost)",
+                    self.name,
+                    worker.pid,
+                    lost,
+                )
+                self.workers[slot] = None
+
+            if (
+                self.workers[slot] is None
+                and time.monotonic() - self.started_at[slot] >= RESPAWN_DELAY_SEC
+            ):
+                self.start_worker(slot)
+        return exited
+
+    def write_off_stalled(self, after_failures: bool) -> None:
+        """
+        Writes off the remaining messages when there is no progress for
+        STALL_TIMEOUT_SEC `after_failures` of workers, while nothing is queued or held.
+        """
+        now = time.monotonic()
+        remaining = self.cycle.remaining.value
+        if remaining != self.last_remaining:
+            self.last_remaining, self.last_change = remaining, now
+        elif (
+            remaining > 0
+            and after_failures
+            and now - self.last_change > STALL_TIMEOUT_SEC
+            and self.queue.empty()
+            and self.cycle.held_total() == 0
+        ):
+            # A worker died between taking a message and registering it, or
+            # between registering a message for the next stage and sending it
+            logger.warning(
+                "%s stage stalled after worker failures, writing off %d messages",
+                self.name,
+                remaining,
+            )
+            self.cycle.add(-remaining)
+
+    def stop(self, deadline: float) -> None:
+        """Asks the workers to flush and exit, terminating them after `deadline`."""
+        alive = [worker for worker in self.workers if worker is not None]
+        for _ in alive:
+            try:
+                # Poison pill to signal the end of the queue
+                self.queue.put(None, timeout=max(deadline - time.monotonic(), 0))
+            except Full:
+                logger.error("%s queue is still full, stopping its workers", self.name)
+                break
+        for worker in alive:
+            worker.join(timeout=max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                logger.error(
+                    "%s worker %s didn't stop in time, terminating it",
+                    self.name,
+                    worker.pid,
+                )
+                worker.terminate()
+                worker.join(timeout=TERMINATE_TIMEOUT_SEC)
+                if worker.is_alive():
+                    logger.error(
+                        "%s worker %s didn't terminate, killing it",
+                        self.name,
+                        worker.pid,
+                    )
+                    worker.kill()
+                    worker.join()
+            record_worker_exit(worker)
+        self.workers = [None] * len(self.workers)
+
+
+class IngestWorkerPool:
+    """
+    Pool of long-lived ingester workers. Files are queued with `submit` while the
+    workers run, and `poll`, to be called regularly, keeps the workers running and
+    tells when all the submitted files are archived or failed. A cycle starts when
+    files are submitted to an idle pool and lasts until all files are done, and its
+    progress is reported.
+
+    Like `ingest_submissions_parallel`, each of the `max_workers` workers parses and
+    writes files, unless `parse_workers` or `db_workers` is set, in which case the
+    ingestion is pipelined. Workers that exit are replaced, and the files they held
+    stay in the spool for a later cycle. `close` lets the workers flush their
+    buffers and exit, killing them after INGEST_WORKER_DRAIN_TIMEOUT_SEC.
+
+    `submit` takes a `should_stop` check, so that a shutdown doesn't wait for a
+    full queue, and `close` discards the files that weren't taken by a worker yet,
+    leaving them in the spool.
+    """
+
+    def __init__(
+        self,
+        tree_names: dict[str, str],
+        dirs: dict[INGESTER_DIRS, str],
+        max_workers: int = 5,
+        parse_workers: Optional[int] = None,
+        db_workers: Optional[int] = None,
+    ) -> None:
+        self.pipelined = parse_workers is not None or db_workers is not None
+        self.process_queue: multiprocessing.Queue = multiprocessing.Queue(
+            maxsize=INGEST_QUEUE_MAXSIZE
+        )
+        self.rows_queue: Optional[multiprocessing.Queue] = None
+        self.stat_ok = multiprocessing.Value("i", 0)
+        self.stat_fail = multiprocessing.Value("i", 0)
+        self.processed = multiprocessing.Value("i", 0)
+        self.counter_lock = multiprocessing.Lock()
+        # Workers that exited during the current cycle
+        self.exited_workers = 0
+        self.in_cycle = False
+        self.cycle_start = 0.0
+        self.last_progress = 0.0
+        self.total_files = 0
+        self.total_bytes = 0
+        self.processed_start = 0
+        self.ok_start = 0
+        self.fail_start = 0
+
+        # Stages in the order that files go through them
+        self.stages: list[_WorkerStage] = []
+        if self.pipelined:
+            rows_queue = multiprocessing.Queue(maxsize=INGEST_PARSED_QUEUE_MAXSIZE)
+            self.rows_queue = rows_queue
+            parse_count = parse_workers or max_workers
+            db_count = db_workers or DEFAULT_DB_WORKERS
+            parse_cycle = CycleTracker(parse_count)
+            db_cycle = CycleTracker(db_count)
+            self.stages.append(
+                _WorkerStage(
+                    "Parse",
+                    parse_count,
+                    parse_batch,
+                    lambda slot: (
+                        self.process_queue,
+                        rows_queue,
+                        tree_names,
+                        dirs,
+                        self.processed,
+                        self.stat_fail,
+                        self.counter_lock,
+                        parse_cycle,
+                        slot,
+                        db_cycle,
+                    ),
+                    self.process_queue,
+                    parse_cycle,
+                )
+            )
+            self.stages.append(
+                _WorkerStage(
+                    "DB",
+                    db_count,
+                    write_batches,
+                    lambda slot: (
+                        rows_queue,
+                        dirs,
+                        self.stat_ok,
+                        self.stat_fail,
+                        self.counter_lock,
+                        db_cycle,
+                        slot,
+                    ),
+                    rows_queue,
+                    db_cycle,
+                )
+            )
+        else:
+            cycle = CycleTracker(max_workers)
+            self.stages.append(
+                _WorkerStage(
+                    "Ingest",
+                    max_workers,
+                    process_batch,
+                    lambda slot: (
+                        self.process_queue,
+                        tree_names,
+                        dirs,
+                        self.processed,
+                        self.stat_ok,
+                        self.stat_fail,
+                        self.counter_lock,
+                        cycle,
+                        slot,
+                    ),
+                    self.process_queue,
+                    cycle,
+                )
+            )
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> None:
+        # Consumers first, so that nothing waits on a queue without readers
+        for stage in reversed(self.stages):
+            stage.start()
+        out(
+            "Started long-lived workers: %s"
+            % ", ".join(f"{len(stage)} {stage.name.lower()}" for stage in self.stages)
+        )
+
+    def close(self) -> None:
+        """
+        Lets the workers flush their buffers and exit, in the order of the stages.
+        The files that no worker took yet are left in the spool.
+        """
+        discarded = self._discard_queued_batches()
+        if discarded:
+            out("Left %d queued files in the spool" % discarded)
+        deadline = time.monotonic() + INGEST_WORKER_DRAIN_TIMEOUT_SEC
+        for stage in self.stages:
+            stage.stop(deadline)
+        out("Workers stopped.")
+
+    def _replace_exited_workers(self) -> int:
+        return sum(stage.replace_exited_workers() for stage in self.stages)
+
+    def _queue_batch(
+        self, batch: list[SubmissionFileMetadata], should_stop: Callable[[], bool]
+    ) -> bool:
+        """Queues a batch for the first stage. Returns False if stopped before that."""
+        cycle = self.stages[0].cycle
+        cycle.add(1)
+        while not should_stop():
+            try:
+                self.process_queue.put(batch, timeout=CYCLE_WAIT_SEC)
+                return True
+            except Full:
+                self.poll()
+        cycle.add(-1)
+        return False
+
+    def _discard_queued_batches(self) -> int:
+        """Removes the batches that no worker took yet. Returns how many files they had."""
+        batches = files = 0
+        while True:
+            try:
+                batch = self.process_queue.get_nowait()
+            except Empty:
+                break
+            batches += 1
+            files += len(batch)
+        self.stages[0].cycle.add(-batches)
+        return files
+
+    def _start_cycle(self) -> None:
+        self.in_cycle = True
+        self.cycle_start = time.time()
+        self.last_progress = time.monotonic()
+        self.total_files = self.total_bytes = 0
+        self.exited_workers = 0
+        with self.counter_lock:
+            self.processed_start = self.processed.value
+            self.ok_start = self.stat_ok.value
+            self.fail_start = self.stat_fail.value
+
+    def _report_progress(self) -> None:
+        print_ingest_progress(
+            self.processed.value - self.processed_start,
+            self.total_files,
+            self.total_bytes,
+            self.stat_ok.value - self.ok_start,
+            self.stat_fail.value - self.fail_start,
+            time.time() - self.cycle_start,
+            self.process_queue.qsize(),
+        )
+        update_queue_gauges(self.process_queue, self.rows_queue)
+
+    def submit(
+        self,
+        json_files: list[str],
+        should_stop: Callable[[], bool] = lambda: False,
+    ) -> None:
+        """
+        Queues files for the workers without waiting for them to be ingested. Only
+        blocks while the queue is full, until `should_stop` returns True.
+        """
+        if not self.in_cycle:
+            self._start_cycle()
+        file_batches, total_bytes = build_file_batches(json_files)
+        self.total_files += len(json_files)
+        self.total_bytes += total_bytes
+
+        first_cycle = self.stages[0].cycle
+        first_cycle.input_done.clear()
+        for batch in file_batches:
+            if not self._queue_batch(batch, should_stop):
+                break
+        # Workers flush as soon as the queue is empty, unless more files are submitted
+        first_cycle.finish_input()
+
+    def poll(self) -> bool:
+        """
+        Replaces the workers that exited, writes off the messages they lost and
+        reports the progress. Returns whether all submitted files are done.
+        """
+        self.exited_workers += self._replace_exited_workers()
+
+        previous_done = True
+        for index, stage in enumerate(self.stages):
+            if index > 0:
+                # Each stage only gets more messages while the previous one is running
+                if previous_done:
+                    stage.cycle.finish_input()
+                else:
+                    stage.cycle.input_done.clear()
+            stage.write_off_stalled(self.exited_workers > 0)
+            previous_done = previous_done and stage.cycle.remaining.value == 0
+
+        if self.in_cycle:
+            now = time.monotonic()
+            if previous_done:
+                self.in_cycle = False
+                self._report_progress()
+            elif now - self.last_progress > PROGRESS_EVERY_SEC:
+                self.last_progress = now
+                self._report_progress()
+        return previous_done
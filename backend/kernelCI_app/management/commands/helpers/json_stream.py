@@ -0,0 +1,149 @@
+import json
+from typing import IO, Any, Container, Iterator
+
+JSON_WHITESPACE = " \t\n\r"
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+# Values that raise "Expecting value" while they are only partially in the window
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+# Length of a \uXXXX escape from its "u". An escape that ends the window raises
+# too, since the decoder reads past it.
+_UNICODE_ESCAPE_LENGTH = 5
+
+
+def _is_truncated(error: json.JSONDecodeError, buffer: str) -> bool:
+    """Whether decoding may have failed only because the value goes past `buffer`."""
+    if error.pos >= len(buffer) or error.msg.startswith("Unterminated string"):
+        return True
+    rest = buffer[error.pos :]
+    if error.msg == "Expecting value":
+        return any(literal.startswith(rest) for literal in _LITERALS)
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(rest) <= _UNICODE_ESCAPE_LENGTH
+    return False
+
+
+class _ChunkedJsonReader:
+    """
+    Keeps a sliding window over a text file so that json values can be decoded
+    one at a time with `raw_decode`, without reading the whole file at once.
+    """
+
+    def __init__(self, file: IO[str], chunk_size: int) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self, size: int) -> bool:
+        if self.eof:
+            return False
+
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # Drop what was already consumed so the window doesn't grow with the file
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or '' at the end of the file."""
+        while True:
+            buffer_len = len(self.buffer)
+            while self.pos < buffer_len and self.buffer[self.pos] in JSON_WHITESPACE:
+                self.pos += 1
+            if self.pos < buffer_len:
+                return self.buffer[self.pos]
+            if not self._read_more(self.chunk_size):
+                return ""
+
+    def expect(self, accepted: str) -> str:
+        char = self.peek()
+        if not char or char not in accepted:
+            raise json.JSONDecodeError(
+                f"Expecting one of {accepted!r}", self.buffer, self.pos
+            )
+        self.pos += 1
+        return char
+
+    def decode_value(self) -> Any:
+        """
+        Decodes the next json value. If the value is not entirely in the window yet,
+        more data is read (doubling the read size each time) and decoding is retried.
+        Errors that more data can't fix are raised right away, without reading the
+        rest of the file.
+        """
+        read_size = self.chunk_size
+        while True:
+            self.peek()
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A value that ends exactly at the window's end could be a truncated number
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof or not _is_truncated(e, self.buffer):
+                    raise
+
+            if self._read_more(read_size):
+                read_size *= 2
+
+
+def iter_json_object_items(
+    file: IO[str],
+    stream_keys: Container[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[str, Any]]:
+    """
+    Incrementally parses a file containing a single json object.
+
+    For keys in `stream_keys` the value must be an array, and each of its elements
+    is yielded separately as `(key, element)`. Any other key is yielded once as
+    `(key, value)`. Memory use depends on the size of the biggest value yielded,
+    not on the size of the file.
+
+    Raises `json.JSONDecodeError` on malformed json and `ValueError` if a
+    streamed key doesn't hold an array.
+    """
+    reader = _ChunkedJsonReader(file, chunk_size)
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+
+    while True:
+        key = reader.decode_value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError(
+                "Expecting property name", reader.buffer, reader.pos
+            )
+        reader.expect(":")
+
+        if key in stream_keys:
+            if reader.peek() != "[":
+                raise ValueError(f"Expected an array for {key!r}")
+            reader.pos += 1
+
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield key, reader.decode_value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            yield key, reader.decode_value()
+
+        if reader.expect(",}") == "}":
+            break
+
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buffer, reader.pos)
@@ -2,16 +2,18 @@ import json
 import logging
 import multiprocessing
 import os
+import sys
 import time
 import traceback
+from functools import partial
 from multiprocessing.sharedctypes import Synchronized
 from multiprocessing.synchronize import Lock as ProcessLock
-from queue import Queue
-from typing import Any, Optional, TypedDict
+from queue import Empty, Queue
+from typing import Any, Callable, Iterator, NamedTuple, Optional, TypedDict
 
 import kcidb_io
-from django.db import connections, transaction
-from prometheus_client import Counter
+from django.db import DatabaseError, connections, transaction
+from prometheus_client import Counter, Gauge
 from typing_extensions import Literal
 
 from kernelCI_app.constants.ingester import (
@@ -20,28 +22,59 @@ from kernelCI_app.constants.ingester import (
     CONVERT_LOG_EXCERPT,
     INGEST_BATCH_SIZE,
     INGEST_FILES_BATCH_SIZE,
+    INGEST_FLUSH_BISECT,
+    INGEST_LOADER_MODE,
+    INGEST_PARSED_QUEUE_MAXSIZE,
     INGEST_QUEUE_MAXSIZE,
+    INGEST_STREAMING_PARSER,
     INGESTER_GRAFANA_LABEL,
     VERBOSE,
 )
+from kernelCI_app.constants.partitions import PARTITIONED_ITEM_LOCK
+from kernelCI_app.helpers.database import forget_partitioned, is_partitioned_cached
 from kernelCI_app.helpers.logger import out
 from kernelCI_app.management.commands.generated.insert_queries import INSERT_QUERIES
 from kernelCI_app.management.commands.helpers.aggregation_helpers import (
     aggregate_checkouts_and_pendings,
 )
-from kernelCI_app.management.commands.helpers.file_utils import move_file_to_failed_dir
+from kernelCI_app.management.commands.helpers.cache_invalidation import (
+    invalidate_written_commits,
+)
+from kernelCI_app.management.commands.helpers.file_utils import (
+    move_file_to_failed_dir,
+    write_failure_reason,
+)
+from kernelCI_app.management.commands.helpers.flush_policy import (
+    FlushPolicy,
+    FlushReason,
+)
+from kernelCI_app.management.commands.helpers.json_stream import (
+    iter_json_object_items,
+)
 from kernelCI_app.management.commands.helpers.log_excerpt_utils import (
     extract_log_excerpt,
+    iter_items_with_uploaded_log_excerpts,
 )
 from kernelCI_app.management.commands.helpers.process_submissions import (
+    INGEST_ROW_SPECS,
+    IngestRow,
+    ProcessedSubmission,
     TableNames,
-    build_instances_from_submission,
+    build_row_from_item,
+    build_rows_from_submission,
+)
+from kernelCI_app.management.commands.helpers.schema_validation import (
+    validate_submission,
 )
-from kernelCI_app.models import Builds, Checkouts, Incidents, Issues, Tests
-from kernelCI_app.typeModels.modelTypes import TableModels
 
 type INGESTER_DIRS = Literal["archive", "failed", "pending_retry"]
 
+DEFAULT_DB_WORKERS = 2
+"""DB workers used by the pipelined ingestion when only the parse workers are set"""
+
+CYCLE_IDLE_CHECK_SEC = 0.2
+"""How often long-lived workers with pending data check whether the cycle is over"""
+
 
 class SubmissionFileMetadata(TypedDict):
     path: str
@@ -49,12 +82,50 @@ class SubmissionFileMetadata(TypedDict):
     size: int
 
 
+class SubmissionsInstances(TypedDict):
+    issues: list[IngestRow]
+    checkouts: list[IngestRow]
+    builds: list[IngestRow]
+    tests: list[IngestRow]
+    incidents: list[IngestRow]
+
+
+type BufferFile = tuple[str, str]
+"""`(name, path)` of a file whose rows are in the flush buffers"""
+
+
+class FileRows(NamedTuple):
+    """The buffered rows of a single file"""
+
+    file: BufferFile
+    rows: SubmissionsInstances
+
+
 logger = logging.getLogger("ingester")
 
+SUBMISSION_SECTIONS: tuple[TableNames, ...] = (
+    "issues",
+    "checkouts",
+    "builds",
+    "tests",
+    "incidents",
+)
+
 
 FILES_INGESTER_COUNTER = Counter(
     "kcidb_ingestions", "Number of files ingested", ["ingester"]
 )
+FLUSHES_COUNTER = Counter(
+    "kcidb_ingester_flushes",
+    "Number of buffer flushes done by the ingester workers",
+    ["ingester", "reason"],
+)
+BATCH_SIZE_GAUGE = Gauge(
+    "kcidb_ingester_batch_size",
+    "Row threshold chosen by the adaptive flush of the ingester workers",
+    ["ingester"],
+    multiprocess_mode="livemax",
+)
 
 CHECKOUTS_COUNTER = Counter(
     "kcidb_checkouts", "Number of checkouts ingested", ["ingester", "origin"]
@@ -71,6 +142,23 @@ TESTS_COUNTER = Counter(
 INCIDENTS_COUNTER = Counter(
     "kcidb_incidents", "Number of incidents ingested", ["ingester", "origin"]
 )
+FILES_QUEUE_GAUGE = Gauge(
+    "kcidb_ingester_files_queue",
+    "Number of file batches waiting for an ingester worker",
+    ["ingester"],
+    multiprocess_mode="livemax",
+)
+PARSED_QUEUE_GAUGE = Gauge(
+    "kcidb_ingester_parsed_queue",
+    "Number of parsed files waiting for an ingester DB worker",
+    ["ingester"],
+    multiprocess_mode="livemax",
+)
+FLUSH_RETRIES_COUNTER = Counter(
+    "kcidb_ingester_flush_retries",
+    "Number of times a failed flush was split in halves to isolate the failing files",
+    ["ingester"],
+)
 WORKER_FAILURES_COUNTER = Counter(
     "kcidb_ingester_worker_failures",
     "Number of ingester worker processes that exited abnormally",
@@ -141,6 +229,10 @@ def _extract_origins_info(data: Optional[dict[str, Any]]) -> str:
                 origin = item.get("origin")
                 if origin:
                     origins.add(origin)
+    return _format_origins_info(origins)
+
+
+def _format_origins_info(origins: set[str]) -> str:
     return f" [origins: {', '.join(sorted(origins))}]" if origins else ""
 
 
@@ -175,7 +267,7 @@ def prepare_file_data(
         if CONVERT_LOG_EXCERPT:
             extract_log_excerpt(data)
         standardize_tree_names(data, tree_names)
-        kcidb_io.schema.V5_3.validate(data)
+        validate_submission(data)
         kcidb_io.schema.V5_3.upgrade(data)
         standardize_labs(data)
 
@@ -193,51 +285,334 @@ def prepare_file_data(
         }
 
 
-def consume_buffer(buffer: list[TableModels], table_name: TableNames) -> None:
+def _merge_duplicate_rows(
+    params: list[tuple[Any, ...]], fields: list[str]
+) -> list[tuple[Any, ...]]:
+    """
+    Collapses rows that share the same id into a single row.
+
+    A single `INSERT ... SELECT ... ON CONFLICT` can't update the same row twice,
+    so duplicates are merged the same way consecutive upserts would merge them:
+    the first non-null value of each field is kept and the latest _timestamp wins.
+    """
+    id_idx = fields.index("id")
+    timestamp_idx = fields.index("field_timestamp")
+
+    merged: dict[Any, list[Any]] = {}
+    for row in params:
+        current = merged.get(row[id_idx])
+        if current is None:
+            merged[row[id_idx]] = list(row)
+            continue
+
+        for idx, value in enumerate(row):
+            if value is None:
+                continue
+            if current[idx] is None:
+                current[idx] = value
+            elif idx == timestamp_idx and value > current[idx]:
+                current[idx] = value
+
+    return [tuple(row) for row in merged.values()]
+
+
+LOCK_PARTITIONED_ITEMS_SQL = """
+    SELECT count(pg_advisory_xact_lock(%(lock)s, item_hash))
+    FROM (
+        SELECT DISTINCT hashtext(%(table)s || ':' || id) AS item_hash
+        FROM unnest(%(ids)s::text[]) AS id
+        ORDER BY item_hash
+    ) items
+"""
+
+
+def _lock_partitioned_items(
+    cursor, table_name: TableNames, params: list[tuple[Any, ...]]
+) -> None:
+    """
+    Waits until no other transaction is upserting these items. The primary key of a
+    partitioned table includes _created, so two transactions inserting the same new
+    item would each add a row with their own _created.
+    The locks are released at the end of the transaction.
+    """
+    id_idx = INSERT_QUERIES[table_name]["updateable_model_fields"].index("id")
+    cursor.execute(
+        LOCK_PARTITIONED_ITEMS_SQL,
+        {
+            "lock": PARTITIONED_ITEM_LOCK,
+            "table": table_name,
+            "ids": [row[id_idx] for row in params],
+        },
+    )
+
+
+def _copy_buffer(
+    cursor,
+    table_name: TableNames,
+    params: list[tuple[Any, ...]],
+    *,
+    partitioned: bool = False,
+) -> None:
+    """
+    Streams the rows into a temporary staging table with COPY and merges them
+    into the real table with a single upsert.
+    The staging table is created once per connection and is emptied before each
+    COPY, so the batches of a bisected flush don't merge each other's rows.
+    """
+    insert_props = INSERT_QUERIES[table_name]
+    rows = _merge_duplicate_rows(params, insert_props["updateable_model_fields"])
+    merge_query = insert_props[
+        "partitioned_merge_query" if partitioned else "merge_query"
+    ]
+
+    with transaction.atomic(savepoint=False):
+        cursor.execute(insert_props["staging_query"])
+        # COPY isn't wrapped by Django's cursor, its errors must be DatabaseErrors
+        # like the ones of execute for the flush to bisect them
+        with (
+            cursor.db.wrap_database_errors,
+            cursor.copy(insert_props["copy_query"]) as copy,
+        ):
+            for row in rows:
+                copy.write_row(row)
+        cursor.execute(merge_query)
+
+
+def prepare_item(
+    section: TableNames,
+    item: Any,
+    header: dict[str, Any],
+    tree_names: dict[str, str],
+) -> dict[str, Any]:
+    """
+    Prepares a single item the same way prepare_file_data prepares a whole file,
+    except for the log_excerpt, which is handled by iter_prepared_items.
+    The item is wrapped in a submission with the file header (e.g. the version),
+    so that the same helpers and schema validation can be reused per item.
+
+    Raises if the item is not valid.
+    """
+    submission = {**header, section: [item]}
+
+    standardize_tree_names(submission, tree_names)
+    validate_submission(submission)
+    submission = kcidb_io.schema.V5_3.upgrade(submission, copy=False)
+    standardize_labs(submission)
+
+    return submission[section][0]
+
+
+def iter_prepared_items(
+    file: SubmissionFileMetadata, tree_names: dict[str, str]
+) -> Iterator[tuple[TableNames, dict[str, Any]]]:
+    """
+    Incrementally reads a submission file, yielding its items one at a time
+    already prepared and validated.
+    Raises on the first invalid item.
+    """
+    header: dict[str, Any] = {}
+    # kcidb writes the version first, but json doesn't guarantee the order of keys
+    waiting_header: list[tuple[TableNames, Any]] = []
+
+    with open(file["path"], "r") as f:
+        items = iter_json_object_items(f, SUBMISSION_SECTIONS)
+        if CONVERT_LOG_EXCERPT:
+            items = iter_items_with_uploaded_log_excerpts(items)
+
+        for key, value in items:
+            if key not in SUBMISSION_SECTIONS:
+                header[key] = value
+                if key == "version":
+                    for section, item in waiting_header:
+                        yield section, prepare_item(section, item, header, tree_names)
+                    waiting_header.clear()
+                continue
+
+            if "version" not in header:
+                waiting_header.append((key, value))
+                continue
+
+            yield key, prepare_item(key, value, header, tree_names)
+
+    for section, item in waiting_header:
+        yield section, prepare_item(section, item, header, tree_names)
+
+    # Also validates the header alone, which matters for files without items
+    validate_submission(header)
+
+
+def load_file_streaming(
+    file: SubmissionFileMetadata,
+    tree_names: dict[str, str],
+    instances_dict: SubmissionsInstances,
+    flush: Callable[[], bool],
+    batch_size: Optional[int] = None,
+) -> tuple[bool, Optional[dict[str, Any]]]:
     """
-    Consume a buffer of items and insert them into the database.
+    Streaming counterpart of prepare_file_data + build_rows_from_submission.
+
+    Items are read, validated and converted one at a time and appended straight
+    into the flush buffers, so only the rows of the file are kept in memory instead
+    of the whole decoded file. Whenever a buffer reaches `batch_size` rows
+    (INGEST_BATCH_SIZE by default), `flush` is called for the rows of the files
+    loaded before this one. The rows of this file are only flushed once it has been
+    read and validated entirely, so that a file is either ingested or failed as a
+    whole.
+
+    Returns `loaded, metadata`, with the same metadata as prepare_file_data.
+    If an error happens, the rows of this file are removed from the buffers.
+    """
+    fsize = file["size"]
+
+    if fsize == 0:
+        if VERBOSE:
+            logger.info("File %s is empty, skipping, deleting", file["path"])
+        os.remove(file["path"])
+        return False, None
+
+    if batch_size is None:
+        batch_size = INGEST_BATCH_SIZE
+
+    start_time = time.time()
+    if VERBOSE:
+        logger.info("Streaming file %s, size: %d", file["name"], fsize)
+
+    start_lengths = {table: len(instances_dict[table]) for table in instances_dict}
+    origins: set[str] = set()
+    try:
+        for table_name, item in iter_prepared_items(file, tree_names):
+            if origin := item.get("origin"):
+                origins.add(origin)
+
+            row = build_row_from_item(item, table_name, MAP_TABLENAMES_TO_COUNTER)
+            if row is None:
+                continue
+
+            buffer = instances_dict[table_name]
+            buffer.append(row)
+            if len(buffer) >= batch_size and any(start_lengths.values()):
+                _flush_previous_files(instances_dict, start_lengths, flush)
+                start_lengths = dict.fromkeys(start_lengths, 0)
+
+        processing_time = time.time() - start_time
+        return True, {
+            "fsize": fsize,
+            "processing_time": processing_time,
+        }
+    except Exception as e:
+        for table, length in start_lengths.items():
+            del instances_dict[table][length:]
+        logger.error(
+            "Error streaming data from %s%s: %s",
+            file["name"],
+            _format_origins_info(origins),
+            e,
+        )
+        logger.error(traceback.format_exc())
+        return False, {
+            "error": str(e),
+        }
+
+
+def _flush_previous_files(
+    instances_dict: SubmissionsInstances,
+    start_lengths: dict[TableNames, int],
+    flush: Callable[[], bool],
+) -> None:
+    """
+    Flushes the rows before `start_lengths`, which belong to the files loaded
+    before the current one, keeping the rows of the current file in the buffers.
+    Files whose rows fail to be inserted are failed by the flush itself.
+    """
+    current_rows = {
+        table: instances_dict[table][length:] for table, length in start_lengths.items()
+    }
+    for table, length in start_lengths.items():
+        del instances_dict[table][length:]
+    flush()
+    for table, rows in current_rows.items():
+        instances_dict[table].extend(rows)
+
+
+def consume_buffer(buffer: list[IngestRow], table_name: TableNames) -> None:
+    """
+    Consume a buffer of rows and insert them into the database.
     This function is called by the db_worker thread.
+
+    Rows already follow the insert columns order with json fields serialized,
+    so they are sent as they are, only dropping the extra aggregation values.
+
+    Depending on INGEST_LOADER_MODE the rows are either upserted one by one
+    with executemany or bulk loaded through COPY and merged in a single query.
+
+    Once the table is partitioned by the partition_tables command, the rows are
+    written with the partition key of the row they update, so that they land in
+    its partition, while holding a lock on their ids. The locks are held until the
+    end of the transaction, so the caller must run this in one. Whether the table is
+    partitioned is cached for PARTITIONED_TABLES_CACHE_SEC, and looked up again
+    after a failed write, since the tables can be swapped during the ingestion.
     """
     if not buffer:
         return
 
     insert_props = INSERT_QUERIES[table_name]
-    updateable_model_fields = insert_props["updateable_model_fields"]
-    query = insert_props["query"]
-
-    params = []
-    for obj in buffer:
-        obj_values = []
-        for field in updateable_model_fields:
-            value = getattr(obj, field)
-            model_field = obj._meta.get_field(field)
-            if model_field.get_internal_type() == "JSONField" and value is not None:
-                value = json.dumps(value)
-            obj_values.append(value)
-        params.append(tuple(obj_values))
+
+    row_spec = INGEST_ROW_SPECS[table_name]
+    if row_spec.extra_fields:
+        row_width = len(row_spec.fields)
+        params = [row[:row_width] for row in buffer]
+    else:
+        params = buffer
 
     t0 = time.time()
+    partitioned = "partitioned_query" in insert_props and is_partitioned_cached(
+        table_name
+    )
     with connections["default"].cursor() as cursor:
-        cursor.executemany(query, params)
+        try:
+            if partitioned:
+                _lock_partitioned_items(cursor, table_name, params)
+            if INGEST_LOADER_MODE == "copy":
+                _copy_buffer(cursor, table_name, params, partitioned=partitioned)
+            elif partitioned:
+                id_idx = insert_props["updateable_model_fields"].index("id")
+                cursor.executemany(
+                    insert_props["partitioned_query"],
+                    [(*row, row[id_idx]) for row in params],
+                )
+            else:
+                cursor.executemany(insert_props["query"], params)
+        except DatabaseError:
+            # The table may have been swapped since it was looked up, the retries
+            # of the flush write it the right way
+            forget_partitioned(table_name)
+            raise
 
     out("bulk_create %s: n=%d in %.3fs" % (table_name, len(buffer), time.time() - t0))
 
 
 def flush_buffers(
     *,
-    issues_buf: list[Issues],
-    checkouts_buf: list[Checkouts],
-    builds_buf: list[Builds],
-    tests_buf: list[Tests],
-    incidents_buf: list[Incidents],
-    buffer_files: set[tuple[str, str]],
+    issues_buf: list[IngestRow],
+    checkouts_buf: list[IngestRow],
+    builds_buf: list[IngestRow],
+    tests_buf: list[IngestRow],
+    incidents_buf: list[IngestRow],
+    buffer_files: set[BufferFile],
     dirs: dict[INGESTER_DIRS, str],
     stat_ok: Synchronized,
     stat_fail: Synchronized,
     counter_lock: ProcessLock,
-) -> None:
+    split_by_file: Optional[Callable[[], list[FileRows]]] = None,
+) -> bool:
     """
     Consumes the list of objects and tries to insert them into the database.
+    Returns whether the data was inserted.
+
+    With `split_by_file` (returning the same rows, split by file) and
+    INGEST_FLUSH_BISECT, a failed insert is retried by halves to find the files
+    that cause it; only those are moved to the failed directory. The rows are only
+    split once the insert of all of them failed.
     """
     total = (
         len(issues_buf)
@@ -247,40 +622,54 @@ def flush_buffers(
         + len(incidents_buf)
     )
 
-    if total == 0:
-        return
+    # Files without any rows still have to be archived
+    if total == 0 and not buffer_files:
+        return True
 
     # Insert in dependency-safe order
     flush_start = time.time()
     try:
+        failures: dict[BufferFile, str] = {}
+        rows: SubmissionsInstances = {
+            "issues": issues_buf,
+            "checkouts": checkouts_buf,
+            "builds": builds_buf,
+            "tests": tests_buf,
+            "incidents": incidents_buf,
+        }
         # Single transaction for all tables in the flush
         with transaction.atomic():
-            consume_buffer(issues_buf, "issues")
-            consume_buffer(checkouts_buf, "checkouts")
-            consume_buffer(builds_buf, "builds")
-            consume_buffer(tests_buf, "tests")
-            consume_buffer(incidents_buf, "incidents")
-            aggregate_checkouts_and_pendings(
-                checkouts_instances=checkouts_buf,
-                tests_instances=tests_buf,
-                build_instances=builds_buf,
-            )
+            if (
+                INGEST_FLUSH_BISECT
+                and split_by_file is not None
+                and len(buffer_files) > 1
+            ):
+                _write_or_bisect(rows, split_by_file, failures)
+            else:
+                _write_rows(rows)
         for filename, filepath in buffer_files:
+            if (filename, filepath) in failures:
+                continue
             os.rename(filepath, os.path.join(dirs["archive"], filename))
 
         with counter_lock:
-            stat_ok.value += len(buffer_files)
+            stat_ok.value += len(buffer_files) - len(failures)
+        if failures:
+            _fail_isolated_files(failures, dirs, stat_fail, counter_lock)
+        return not failures
     except Exception as e:
         logger.error("Error during buffer flush: %s", e)
         try:
             for filename, filepath in buffer_files:
                 os.rename(filepath, os.path.join(dirs["failed"], filename))
+                write_failure_reason(dirs["failed"], filename, str(e))
             out("Moved %d files to pending retry directory" % len(buffer_files))
             with counter_lock:
                 stat_fail.value += len(buffer_files)
         except OSError as oe:
             logger.error("OS error during buffer file pending retry move: %s", oe)
             logger.error("Removing files from buffer set, they should be retried")
+        return False
     finally:
         flush_dur = time.time() - flush_start
         rate = total / flush_dur if flush_dur > 0 else 0.0
@@ -306,6 +695,104 @@ def flush_buffers(
         buffer_files.clear()
 
 
+def _merge_file_rows(file_rows: list[FileRows]) -> SubmissionsInstances:
+    merged: SubmissionsInstances = {table: [] for table in SUBMISSION_SECTIONS}
+    for _, rows in file_rows:
+        for table in SUBMISSION_SECTIONS:
+            merged[table].extend(rows[table])
+    # Sort instances to prevent deadlocks when multiple transactions update the same rows
+    for buffer in merged.values():
+        buffer.sort(key=lambda x: x.id)
+    return merged
+
+
+def _write_rows(rows: SubmissionsInstances) -> None:
+    """Inserts the rows in dependency-safe order and updates what depends on them."""
+    for table in SUBMISSION_SECTIONS:
+        consume_buffer(rows[table], table)
+    aggregate_checkouts_and_pendings(
+        checkout_rows=rows["checkouts"],
+        test_rows=rows["tests"],
+        build_rows=rows["builds"],
+    )
+    invalidate_written_commits(
+        checkout_rows=rows["checkouts"],
+        build_rows=rows["builds"],
+        test_rows=rows["tests"],
+        incident_rows=rows["incidents"],
+    )
+
+
+def _write_or_bisect(
+    rows: SubmissionsInstances,
+    split_by_file: Callable[[], list[FileRows]],
+    failures: dict[BufferFile, str],
+) -> None:
+    """
+    Inserts all the rows in a savepoint. If that fails, they are split by file and
+    retried by halves with _write_bisecting. Must run inside a transaction.
+    """
+    try:
+        with transaction.atomic():
+            _write_rows(rows)
+    except DatabaseError:
+        # The savepoint couldn't be rolled back (e.g. lost connection), so the
+        # whole transaction fails
+        if connections["default"].needs_rollback:
+            raise
+        FLUSH_RETRIES_COUNTER.labels(ingester=INGESTER_GRAFANA_LABEL).inc()
+        file_rows = split_by_file()
+        middle = len(file_rows) // 2
+        _write_bisecting(file_rows[:middle], failures)
+        _write_bisecting(file_rows[middle:], failures)
+
+
+def _write_bisecting(
+    file_rows: list[FileRows], failures: dict[BufferFile, str]
+) -> None:
+    """
+    Inserts the rows of the files in a savepoint. If that fails, the files are
+    split in halves that are retried the same way, until the files that fail on
+    their own are found. Their errors are recorded in `failures`.
+    Must run inside a transaction.
+    """
+    try:
+        with transaction.atomic():
+            _write_rows(_merge_file_rows(file_rows))
+    except DatabaseError as e:
+        # The savepoint couldn't be rolled back (e.g. lost connection), so the
+        # whole transaction fails
+        if connections["default"].needs_rollback:
+            raise
+        if len(file_rows) == 1:
+            failures[file_rows[0].file] = str(e)
+            return
+        FLUSH_RETRIES_COUNTER.labels(ingester=INGESTER_GRAFANA_LABEL).inc()
+        middle = len(file_rows) // 2
+        _write_bisecting(file_rows[:middle], failures)
+        _write_bisecting(file_rows[middle:], failures)
+
+
+def _fail_isolated_files(
+    failures: dict[BufferFile, str],
+    dirs: dict[INGESTER_DIRS, str],
+    stat_fail: Synchronized,
+    counter_lock: ProcessLock,
+) -> None:
+    """Moves the files that failed to be inserted to the failed directory."""
+    for (filename, filepath), reason in failures.items():
+        logger.error("Error inserting rows of %s: %s", filename, reason)
+        try:
+            move_file_to_failed_dir(filepath, dirs["failed"])
+            write_failure_reason(dirs["failed"], filename, reason)
+        except OSError:
+            logger.error("File %s should be retried", filename)
+            continue
+        with counter_lock:
+            stat_fail.value += 1
+    out("Isolated %d files that failed to be inserted" % len(failures))
+
+
 MAP_TABLENAMES_TO_COUNTER: dict[TableNames, Counter] = {
     "checkouts": CHECKOUTS_COUNTER,
     "issues": ISSUES_COUNTER,
@@ -315,12 +802,282 @@ MAP_TABLENAMES_TO_COUNTER: dict[TableNames, Counter] = {
 }
 
 
-class SubmissionsInstances(TypedDict):
-    issues: list[Issues]
-    checkouts: list[Checkouts]
-    builds: list[Builds]
-    tests: list[Tests]
-    incidents: list[Incidents]
+class CycleTracker:
+    """
+    Shared state that lets long-lived workers report when the messages of an
+    ingestion cycle are done, so that the pool knows when the cycle is over.
+
+    `remaining` counts the messages of the current cycle that are not done yet and
+    `held[slot]` the ones taken by the worker in `slot`, so that the messages of a
+    worker that crashed can be written off. `input_done` is set when nothing else
+    will be queued in the cycle, telling the workers to flush as soon as they are idle.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self.lock = multiprocessing.Lock()
+        self.remaining = multiprocessing.Value("i", 0, lock=False)
+        self.held = multiprocessing.Array("i", slots, lock=False)
+        self.input_done = multiprocessing.Event()
+
+    def add(self, count: int) -> None:
+        """Registers messages that are about to be queued."""
+        with self.lock:
+            self.remaining.value += count
+
+    def take(self, slot: int) -> None:
+        with self.lock:
+            self.held[slot] += 1
+
+    def done(self, slot: int, count: int) -> None:
+        with self.lock:
+            self.held[slot] -= count
+            self.remaining.value -= count
+
+    def release(self, slot: int) -> int:
+        """Writes off the messages held by a worker that exited. Returns how many."""
+        with self.lock:
+            count = self.held[slot]
+            self.held[slot] = 0
+            self.remaining.value -= count
+        return count
+
+    def held_total(self) -> int:
+        with self.lock:
+            return sum(self.held)
+
+    def finish_input(self) -> None:
+        self.input_done.set()
+
+    def is_idle(self, queue: Queue) -> bool:
+        """Whether nothing else will reach the workers through `queue` in this cycle."""
+        return self.input_done.is_set() and queue.empty()
+
+
+class IngestBuffers:
+    """
+    Rows waiting to be written by a worker, together with the files they came from.
+    Files are only archived after their rows are flushed, and flushes follow a
+    FlushPolicy (row count, pending bytes or elapsed time).
+    """
+
+    def __init__(
+        self,
+        dirs: dict[INGESTER_DIRS, str],
+        stat_ok: Synchronized,
+        stat_fail: Synchronized,
+        counter_lock: ProcessLock,
+        on_flushed: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.instances: SubmissionsInstances = {
+            "issues": [],
+            "checkouts": [],
+            "builds": [],
+            "tests": [],
+            "incidents": [],
+        }
+        self.files: set[BufferFile] = set()
+        # Where the rows of each file end in the buffers, in the order they were added
+        self.file_ends: list[tuple[BufferFile, dict[TableNames, int]]] = []
+        self.dirs = dirs
+        self.stat_ok = stat_ok
+        self.stat_fail = stat_fail
+        self.counter_lock = counter_lock
+        # Messages whose files are all in the buffers, reported through on_flushed
+        self.completed_messages = 0
+        self.on_flushed = on_flushed
+
+        self.policy = FlushPolicy.from_settings()
+        BATCH_SIZE_GAUGE.labels(ingester=INGESTER_GRAFANA_LABEL).set(
+            self.policy.batch_size
+        )
+
+    def largest_buffer(self) -> int:
+        return max(len(buffer) for buffer in self.instances.values())
+
+    def has_pending(self) -> bool:
+        return bool(self.files) or self.largest_buffer() > 0
+
+    def add_file(
+        self, file: SubmissionFileMetadata, rows: Optional[ProcessedSubmission]
+    ) -> None:
+        """Adds a loaded file to the buffers. Its rows may already be in the buffers."""
+        if rows is not None:
+            self.instances["issues"].extend(rows["issues"])
+            self.instances["checkouts"].extend(rows["checkouts"])
+            self.instances["builds"].extend(rows["builds"])
+            self.instances["tests"].extend(rows["tests"])
+            self.instances["incidents"].extend(rows["incidents"])
+
+        buffer_file = (file["name"], file["path"])
+        self.files.add(buffer_file)
+        self.file_ends.append(
+            (
+                buffer_file,
+                {table: len(buffer) for table, buffer in self.instances.items()},
+            )
+        )
+        self.policy.add_pending(file["size"])
+
+    def file_rows(self) -> list[FileRows]:
+        """
+        Splits the buffered rows by the file they came from. Only valid while the
+        buffers keep the order in which the files were added.
+        """
+        file_rows = []
+        starts = dict.fromkeys(self.instances, 0)
+        for buffer_file, ends in self.file_ends:
+            file_rows.append(
+                FileRows(
+                    buffer_file,
+                    {
+                        table: buffer[starts[table] : ends[table]]
+                        for table, buffer in self.instances.items()
+                    },
+                )
+            )
+            starts = ends
+        return file_rows
+
+    def flush(self, reason: FlushReason = "rows") -> bool:
+        rows = self.largest_buffer()
+        # Sort instances to prevent deadlocks when multiple transactions update the same rows.
+        # The buffers keep the order of the files, so that the rows can still be
+        # split by file if the flush fails
+        sorted_instances = {
+            table: sorted(buffer, key=lambda x: x.id)
+            for table, buffer in self.instances.items()
+        }
+
+        flush_start = time.monotonic()
+        flushed = flush_buffers(
+            issues_buf=sorted_instances["issues"],
+            checkouts_buf=sorted_instances["checkouts"],
+            builds_buf=sorted_instances["builds"],
+            tests_buf=sorted_instances["tests"],
+            incidents_buf=sorted_instances["incidents"],
+            buffer_files=self.files,
+            dirs=self.dirs,
+            stat_ok=self.stat_ok,
+            stat_fail=self.stat_fail,
+            counter_lock=self.counter_lock,
+            split_by_file=self.file_rows,
+        )
+        self.file_ends.clear()
+        for buffer in self.instances.values():
+            buffer.clear()
+        self.policy.record_flush(rows, time.monotonic() - flush_start)
+        self._report_completed()
+
+        FLUSHES_COUNTER.labels(ingester=INGESTER_GRAFANA_LABEL, reason=reason).inc()
+        BATCH_SIZE_GAUGE.labels(ingester=INGESTER_GRAFANA_LABEL).set(
+            self.policy.batch_size
+        )
+        if VERBOSE:
+            logger.info(
+                "Flushed buffers (reason=%s), next batch size: %d",
+                reason,
+                self.policy.batch_size,
+            )
+        return flushed
+
+    def _report_completed(self) -> None:
+        if self.on_flushed is not None and self.completed_messages:
+            self.on_flushed(self.completed_messages)
+        self.completed_messages = 0
+
+    def complete_message(self) -> None:
+        """
+        Registers that all files of a queue message were added (or failed to load).
+        The message is reported as done once its files are flushed.
+        """
+        self.completed_messages += 1
+        if not self.has_pending():
+            self._report_completed()
+
+    def flush_if_needed(self, cycle_idle: bool = False) -> None:
+        """
+        Flushes if the flush policy says so. With `cycle_idle`, nothing else will be
+        received in the current cycle, so pending data is flushed right away.
+        """
+        if cycle_idle and self.has_pending():
+            self.flush("final")
+            return
+        reason = self.policy.flush_reason(self.largest_buffer())
+        if reason is not None:
+            self.flush(reason)
+
+    def get_timeout(self, cycle: Optional[CycleTracker]) -> Optional[float]:
+        """How long a worker can wait for the next message before checking its buffers."""
+        timeout = self.policy.seconds_until_timeout()
+        if cycle is not None and timeout is not None:
+            # Checks regularly whether the cycle is over, to flush without waiting
+            return min(timeout, CYCLE_IDLE_CHECK_SEC)
+        return timeout
+
+    def finish(self) -> None:
+        """Flushes whatever is left when the worker stops."""
+        if self.has_pending():
+            out("Process finished, flushing remaining buffers")
+            self.flush("final")
+
+
+def load_file(
+    file: SubmissionFileMetadata,
+    tree_names: dict[str, str],
+    dirs: dict[INGESTER_DIRS, str],
+    instances_dict: SubmissionsInstances,
+    flush: Callable[[], bool],
+    batch_size: int,
+    processed: Synchronized,
+    stat_fail: Synchronized,
+    counter_lock: ProcessLock,
+) -> tuple[bool, Optional[ProcessedSubmission]]:
+    """
+    Loads a file with the configured parser and updates the progress counters.
+    Invalid files are moved to the failed directory.
+
+    Returns `loaded, rows`. When streaming, the rows are appended straight into
+    `instances_dict` (flushing through `flush` when a buffer reaches `batch_size`)
+    and `rows` is None.
+    """
+    data = None
+    if INGEST_STREAMING_PARSER:
+        loaded, metadata = load_file_streaming(
+            file, tree_names, instances_dict, flush, batch_size
+        )
+    else:
+        data, metadata = prepare_file_data(file, tree_names)
+        loaded = data is not None
+
+    if metadata and metadata.get("error"):
+        try:
+            move_file_to_failed_dir(file["path"], dirs["failed"])
+        except Exception:
+            pass
+        with counter_lock:
+            stat_fail.value += 1
+            processed.value += 1
+        return False, None
+
+    with counter_lock:
+        processed.value += 1
+    if not loaded:
+        return False, None
+
+    FILES_INGESTER_COUNTER.labels(ingester=INGESTER_GRAFANA_LABEL).inc()
+    if data is None:
+        return True, None
+    return True, build_rows_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
+
+
+def _is_cycle_idle(cycle: Optional[CycleTracker], queue: Queue) -> bool:
+    return cycle is not None and cycle.is_idle(queue)
+
+
+def _report_done(
+    cycle: Optional[CycleTracker], slot: int
+) -> Optional[Callable[[int], None]]:
+    return partial(cycle.done, slot) if cycle is not None else None
 
 
 def process_batch(
@@ -331,112 +1088,156 @@ def process_batch(
     stat_ok: Synchronized,
     stat_fail: Synchronized,
     counter_lock: ProcessLock,
+    cycle: Optional[CycleTracker] = None,
+    slot: int = 0,
 ) -> None:
+    """
+    Worker loop: loads the files of each queued batch into the buffers and
+    writes them to the database.
+
+    Long-lived workers get a `cycle` tracker, to which they report each batch
+    once its files are flushed; the worker in `slot` uses `cycle.held[slot]`.
+    """
     # Ensure that the new process has a unique connection to the database
     connections.close_all()
 
-    instances_dict: SubmissionsInstances = {
-        "issues": [],
-        "checkouts": [],
-        "builds": [],
-        "tests": [],
-        "incidents": [],
-    }
+    buffers = IngestBuffers(
+        dirs, stat_ok, stat_fail, counter_lock, _report_done(cycle, slot)
+    )
 
-    buffer_files = set()
+    while True:
+        try:
+            # Waits for the next batch only until the pending data must be flushed
+            batch = process_queue.get(timeout=buffers.get_timeout(cycle))
+        except Empty:
+            buffers.flush_if_needed(_is_cycle_idle(cycle, process_queue))
+            continue
+
+        if batch is None or len(batch) == 0:
+            break
+
+        if cycle is not None:
+            cycle.take(slot)
+        for file in batch:
+            loaded, rows = load_file(
+                file,
+                tree_names,
+                dirs,
+                buffers.instances,
+                buffers.flush,
+                buffers.policy.batch_size,
+                processed,
+                stat_fail,
+                counter_lock,
+            )
+            if loaded:
+                buffers.add_file(file, rows)
+            buffers.flush_if_needed()
+        buffers.complete_message()
+        buffers.flush_if_needed(_is_cycle_idle(cycle, process_queue))
+
+    buffers.finish()
+
+
+def parse_batch(
+    process_queue: Queue,
+    rows_queue: Queue,
+    tree_names: dict[str, str],
+    dirs: dict[INGESTER_DIRS, str],
+    processed: Synchronized,
+    stat_fail: Synchronized,
+    counter_lock: ProcessLock,
+    cycle: Optional[CycleTracker] = None,
+    slot: int = 0,
+    rows_cycle: Optional[CycleTracker] = None,
+) -> None:
+    """
+    Parse stage of the pipelined ingester: loads the files of each queued batch and
+    sends their rows to the DB writers through `rows_queue`, one message per file.
+    Doesn't use the database, and blocks while `rows_queue` is full.
+
+    Long-lived workers report each batch to `cycle` once its rows are sent, and
+    register the messages they send in `rows_cycle`.
+    """
+    # The parse stage never queries the database, inherited connections are just closed
+    connections.close_all()
 
     while True:
         batch = process_queue.get()
-
         if batch is None or len(batch) == 0:
             break
 
+        if cycle is not None:
+            cycle.take(slot)
         for file in batch:
-            data, metadata = prepare_file_data(file, tree_names)
-
-            if metadata and metadata.get("error"):
-                try:
-                    move_file_to_failed_dir(file["path"], dirs["failed"])
-                except Exception:
-                    pass
-                with counter_lock:
-                    stat_fail.value += 1
-                    processed.value += 1
-                continue
+            instances_dict: SubmissionsInstances = {
+                "issues": [],
+                "checkouts": [],
+                "builds": [],
+                "tests": [],
+                "incidents": [],
+            }
+            # All rows of a file travel together, so that the writer that archives
+            # the file is the one that inserted all of them
+            loaded, rows = load_file(
+                file,
+                tree_names,
+                dirs,
+                instances_dict,
+                lambda: True,
+                sys.maxsize,
+                processed,
+                stat_fail,
+                counter_lock,
+            )
+            if loaded:
+                if rows_cycle is not None:
+                    rows_cycle.add(1)
+                rows_queue.put((file, rows if rows is not None else instances_dict))
+        if cycle is not None:
+            cycle.done(slot, 1)
 
-            if data is None:
-                with counter_lock:
-                    processed.value += 1
-                continue
 
-            with counter_lock:
-                processed.value += 1
-            FILES_INGESTER_COUNTER.labels(ingester=INGESTER_GRAFANA_LABEL).inc()
-
-            instances = build_instances_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
-
-            instances_dict["issues"].extend(instances["issues"])
-            instances_dict["checkouts"].extend(instances["checkouts"])
-            instances_dict["builds"].extend(instances["builds"])
-            instances_dict["tests"].extend(instances["tests"])
-            instances_dict["incidents"].extend(instances["incidents"])
-
-            buffer_files.add((file["name"], file["path"]))
-
-        # Sort instances to prevent deadlocks when multiple transactions update the same rows
-        instances_dict["issues"].sort(key=lambda x: x.id)
-        instances_dict["checkouts"].sort(key=lambda x: x.id)
-        instances_dict["builds"].sort(key=lambda x: x.id)
-        instances_dict["tests"].sort(key=lambda x: x.id)
-        instances_dict["incidents"].sort(key=lambda x: x.id)
-
-        flush_buffers(
-            issues_buf=(
-                instances_dict["issues"]
-                if len(instances_dict["issues"]) >= INGEST_BATCH_SIZE
-                else []
-            ),
-            checkouts_buf=(
-                instances_dict["checkouts"]
-                if len(instances_dict["checkouts"]) >= INGEST_BATCH_SIZE
-                else []
-            ),
-            builds_buf=(
-                instances_dict["builds"]
-                if len(instances_dict["builds"]) >= INGEST_BATCH_SIZE
-                else []
-            ),
-            tests_buf=(
-                instances_dict["tests"]
-                if len(instances_dict["tests"]) >= INGEST_BATCH_SIZE
-                else []
-            ),
-            incidents_buf=(
-                instances_dict["incidents"]
-                if len(instances_dict["incidents"]) >= INGEST_BATCH_SIZE
-                else []
-            ),
-            buffer_files=buffer_files,
-            dirs=dirs,
-            stat_ok=stat_ok,
-            stat_fail=stat_fail,
-            counter_lock=counter_lock,
-        )
+def write_batches(
+    rows_queue: Queue,
+    dirs: dict[INGESTER_DIRS, str],
+    stat_ok: Synchronized,
+    stat_fail: Synchronized,
+    counter_lock: ProcessLock,
+    cycle: Optional[CycleTracker] = None,
+    slot: int = 0,
+) -> None:
+    """
+    DB stage of the pipelined ingester: buffers the rows sent by the parse workers
+    and writes them to the database, archiving their files.
 
-    if any(len(instances_dict[table]) for table in instances_dict):
-        out("Process finished, flushing remaining buffers")
-        flush_buffers(
-            issues_buf=instances_dict["issues"],
-            checkouts_buf=instances_dict["checkouts"],
-            builds_buf=instances_dict["builds"],
-            tests_buf=instances_dict["tests"],
-            incidents_buf=instances_dict["incidents"],
-            buffer_files=buffer_files,
-            dirs=dirs,
-            stat_ok=stat_ok,
-            stat_fail=stat_fail,
-            counter_lock=counter_lock,
-        )
+    Long-lived workers report each file to `cycle` once it is flushed.
+    """
+    # Ensure that the new process has a unique connection to the database
+    connections.close_all()
+
+    buffers = IngestBuffers(
+        dirs, stat_ok, stat_fail, counter_lock, _report_done(cycle, slot)
+    )
+
+    while True:
+        try:
+            message = rows_queue.get(timeout=buffers.get_timeout(cycle))
+        except Empty:
+            buffers.flush_if_needed(_is_cycle_idle(cycle, rows_queue))
+            continue
+
+        if message is None:
+            break
+
+        if cycle is not None:
+            cycle.take(slot)
+        file, rows = message
+        buffers.add_file(file, rows)
+        buffers.complete_message()
+        buffers.flush_if_needed(_is_cycle_idle(cycle, rows_queue))
+
+    buffers.finish()
 
 
 def print_ingest_progress(
@@ -490,24 +1291,66 @@ def print_ingest_progress(
     out(msg)
 
 
-def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multiprocessing
-    json_files: list[str],
-    tree_names: dict[str, str],
-    dirs: dict[INGESTER_DIRS, str],
-    max_workers: int = 5,
+def _start_workers(
+    count: int, target: Callable[..., None], args: tuple[Any, ...]
+) -> list[multiprocessing.Process]:
+    workers = []
+    for _ in range(count):
+        worker = multiprocessing.Process(target=target, args=args)
+        workers.append(worker)
+        worker.start()
+    return workers
+
+
+def record_worker_exit(worker: multiprocessing.Process) -> None:
+    """Logs and counts the exit of a joined worker if it exited abnormally."""
+    if worker.exitcode:
+        reason = "signal" if worker.exitcode < 0 else "exception"
+        logger.error(
+            "Worker %s exited with code %s (%s)",
+            worker.pid,
+            worker.exitcode,
+            reason,
+        )
+        WORKER_FAILURES_COUNTER.labels(
+            ingester=INGESTER_GRAFANA_LABEL, reason=reason
+        ).inc()
+
+
+def _join_workers(workers: list[multiprocessing.Process]) -> None:
+    for worker in workers:
+        worker.join()
+        record_worker_exit(worker)
+
+
+def _terminate_workers(workers: list[multiprocessing.Process]) -> None:
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join()
+
+
+def update_queue_gauges(
+    process_queue: multiprocessing.Queue, rows_queue: Optional[multiprocessing.Queue]
 ) -> None:
+    FILES_QUEUE_GAUGE.labels(ingester=INGESTER_GRAFANA_LABEL).set(process_queue.qsize())
+    if rows_queue is not None:
+        PARSED_QUEUE_GAUGE.labels(ingester=INGESTER_GRAFANA_LABEL).set(
+            rows_queue.qsize()
+        )
+
+
+def build_file_batches(
+    json_files: list[str],
+) -> tuple[list[list[SubmissionFileMetadata]], int]:
     """
-    Ingest submissions in parallel using child processes for I/O and database operations.
+    Splits the files in batches of INGEST_FILES_BATCH_SIZE for the worker queue.
+    Returns `batches, total_bytes`.
     """
-    cycle_start = time.time()
     total_bytes = 0
-    total_files_count = len(json_files)
-
-    process_queue: multiprocessing.Queue[Optional[list[SubmissionFileMetadata]]] = (
-        multiprocessing.Queue(maxsize=INGEST_QUEUE_MAXSIZE)
-    )
-
-    batch = []
+    batches: list[list[SubmissionFileMetadata]] = []
+    batch: list[SubmissionFileMetadata] = []
     for file_path in json_files:
         try:
             file_size = os.path.getsize(file_path)
@@ -522,11 +1365,11 @@ def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multipro
                 size=file_size,
             )
         )
-
-        batch_len = len(batch)
-        if batch_len >= INGEST_FILES_BATCH_SIZE or batch_len >= total_files_count:
-            process_queue.put(batch)
+        if len(batch) >= INGEST_FILES_BATCH_SIZE:
+            batches.append(batch)
             batch = []
+    if batch:
+        batches.append(batch)
 
     out(
         "Spool status: %d .json files queued (%.2f MB)"
@@ -535,6 +1378,36 @@ def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multipro
             total_bytes / (1024 * 1024) if total_bytes else 0.0,
         )
     )
+    return batches, total_bytes
+
+
+def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multiprocessing
+    json_files: list[str],
+    tree_names: dict[str, str],
+    dirs: dict[INGESTER_DIRS, str],
+    max_workers: int = 5,
+    parse_workers: Optional[int] = None,
+    db_workers: Optional[int] = None,
+) -> None:
+    """
+    Ingest submissions in parallel using child processes for I/O and database operations.
+
+    By default each of the `max_workers` processes parses files and writes them to the
+    database. If `parse_workers` or `db_workers` is set, the ingestion is pipelined
+    instead: `parse_workers` processes (default: `max_workers`) parse the files and
+    send their rows through a bounded queue to `db_workers` processes
+    (default: DEFAULT_DB_WORKERS), which are the only ones connecting to the database.
+    """
+    cycle_start = time.time()
+    total_files_count = len(json_files)
+
+    process_queue: multiprocessing.Queue[Optional[list[SubmissionFileMetadata]]] = (
+        multiprocessing.Queue(maxsize=INGEST_QUEUE_MAXSIZE)
+    )
+
+    file_batches, total_bytes = build_file_batches(json_files)
+    for batch in file_batches:
+        process_queue.put(batch)
 
     stat_ok = multiprocessing.Value("i", 0)
     stat_fail = multiprocessing.Value("i", 0)
@@ -543,12 +1416,45 @@ def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multipro
     last_progress = cycle_start
     progress_every_sec = 2.0
 
-    writers = []
+    pipelined = parse_workers is not None or db_workers is not None
+    rows_queue: Optional[
+        multiprocessing.Queue[
+            Optional[tuple[SubmissionFileMetadata, ProcessedSubmission]]
+        ]
+    ] = None
+    # Workers that read from process_queue, and the DB writers when pipelined
+    workers: list[multiprocessing.Process] = []
+    writers: list[multiprocessing.Process] = []
     try:
-        for _ in range(max_workers):
-            writer = multiprocessing.Process(
-                target=process_batch,
-                args=(
+        if pipelined:
+            rows_queue = multiprocessing.Queue(maxsize=INGEST_PARSED_QUEUE_MAXSIZE)
+            writers = _start_workers(
+                db_workers or DEFAULT_DB_WORKERS,
+                write_batches,
+                (rows_queue, dirs, stat_ok, stat_fail, counter_lock),
+            )
+            workers = _start_workers(
+                parse_workers or max_workers,
+                parse_batch,
+                (
+                    process_queue,
+                    rows_queue,
+                    tree_names,
+                    dirs,
+                    processed,
+                    stat_fail,
+                    counter_lock,
+                ),
+            )
+            out(
+                "Pipelined ingestion: %d parse workers, %d DB workers"
+                % (len(workers), len(writers))
+            )
+        else:
+            workers = _start_workers(
+                max_workers,
+                process_batch,
+                (
                     process_queue,
                     tree_names,
                     dirs,
@@ -558,11 +1464,14 @@ def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multipro
                     counter_lock,
                 ),
             )
-            writers.append(writer)
-            writer.start()
+        for _ in workers:
             process_queue.put(None)  # Poison pill to signal the end of the queue
 
-        while not process_queue.empty():
+        # When pipelined, parse workers may still be blocked on a full rows_queue
+        # after process_queue is empty, so they are waited for as well
+        while not process_queue.empty() or (
+            pipelined and any(w.is_alive() for w in workers)
+        ):
             if time.time() - last_progress > progress_every_sec:
                 print_ingest_progress(
                     processed.value,
@@ -573,33 +1482,28 @@ def ingest_submissions_parallel(  # noqa: C901 - orchestrator with IO + multipro
                     time.time() - cycle_start,
                     process_queue.qsize(),
                 )
+                update_queue_gauges(process_queue, rows_queue)
                 last_progress = time.time()
-            if not any(w.is_alive() for w in writers):
+            if not any(w.is_alive() for w in workers):
                 if not process_queue.empty():
                     logger.error("All workers exited while queue still has items")
                 break
+            if pipelined and not any(w.is_alive() for w in writers):
+                logger.error("All DB workers exited, stopping parse workers")
+                _terminate_workers(workers)
+                break
             time.sleep(1)
 
-        for writer in writers:
-            writer.join()
-            if writer.exitcode:
-                reason = "signal" if writer.exitcode < 0 else "exception"
-                logger.error(
-                    "Worker %s exited with code %s (%s)",
-                    writer.pid,
-                    writer.exitcode,
-                    reason,
-                )
-                WORKER_FAILURES_COUNTER.labels(
-                    ingester=INGESTER_GRAFANA_LABEL, reason=reason
-                ).inc()
+        _join_workers(workers)
+        if rows_queue is not None:
+            if any(w.is_alive() for w in writers):
+                for _ in writers:
+                    rows_queue.put(None)
+            _join_workers(writers)
+            update_queue_gauges(process_queue, rows_queue)
     except KeyboardInterrupt:
         out("\nKeyboardInterrupt: terminating workers...")
-        for writer in writers:
-            if writer.is_alive():
-                writer.terminate()
-        for writer in writers:
-            writer.join()
+        _terminate_workers(workers + writers)
         out("Workers terminated.")
 
     elapsed = time.time() - cycle_start
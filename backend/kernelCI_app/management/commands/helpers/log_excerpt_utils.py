@@ -2,25 +2,113 @@ import gzip
 import hashlib
 import logging
 import os
-import tempfile
+import sqlite3
 import threading
-from typing import Any, Literal, Optional
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from typing import Any, Iterable, Iterator, Literal, Optional
 
 import requests
 from kernelCI_app.constants.general import REQUESTS_TIMEOUT_UPLOAD_IN_SECONDS
 from kernelCI_app.constants.ingester import (
+    CACHE_LOGS_PATH,
     CACHE_LOGS_SIZE_LIMIT,
     LOGEXCERPT_THRESHOLD,
+    LOGEXCERPT_UPLOAD_WORKERS,
     STORAGE_BASE_URL,
     STORAGE_TOKEN,
     UPLOAD_URL,
     VERBOSE,
 )
 
-CACHE_LOGS = {}
 cache_logs_lock = threading.Lock()
 logger = logging.getLogger("ingester")
 
+UPLOAD_LOOKAHEAD = 4 * LOGEXCERPT_UPLOAD_WORKERS
+"""How many items iter_items_with_uploaded_log_excerpts reads ahead while uploads run"""
+CACHE_LOGS_TOUCH_INTERVAL_SEC = 3600
+"""How old the last use of a cached log excerpt must be for a hit to update it"""
+UPLOAD_CLAIM_TIMEOUT_SEC = 2 * REQUESTS_TIMEOUT_UPLOAD_IN_SECONDS
+"""How long an upload claimed by another worker is waited for before taking it over"""
+UPLOAD_CLAIM_POLL_SEC = 0.5
+"""How often the cache is checked while another worker uploads the same excerpt"""
+
+# Url of the cache entries of the excerpts that are being uploaded
+_CLAIMED_URL = ""
+
+_CACHE_LOGS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS logexcerpt_cache (
+        hash TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS logexcerpt_cache_last_used
+    ON logexcerpt_cache (last_used);
+"""
+
+# Connections, sessions and threads can't be shared with forked processes,
+# so each of them is tied to the pid that created it
+_cache_connection: Optional[tuple[int, sqlite3.Connection]] = None
+_upload_executor: Optional[tuple[int, ThreadPoolExecutor]] = None
+_thread_local = threading.local()
+
+_pending_uploads: dict[str, Future[Optional[str]]] = {}
+_pending_uploads_lock = threading.Lock()
+
+
+def _connect_cache_logs(path: str) -> sqlite3.Connection:
+    try:
+        connection = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.Error as e:
+        logger.warning(
+            "Could not open log excerpt cache at %s, using memory instead: %s", path, e
+        )
+        connection = sqlite3.connect(
+            ":memory:", isolation_level=None, check_same_thread=False
+        )
+    connection.executescript(_CACHE_LOGS_SCHEMA)
+    return connection
+
+
+def _get_cache_connection() -> sqlite3.Connection:
+    """Returns the cache connection of the current process, opening it if needed.
+    Must be called with cache_logs_lock held."""
+    global _cache_connection
+    pid = os.getpid()
+    if _cache_connection is None or _cache_connection[0] != pid:
+        _cache_connection = (pid, _connect_cache_logs(CACHE_LOGS_PATH))
+    return _cache_connection[1]
+
+
+def _get_session() -> requests.Session:
+    """Returns a keep-alive session for the current thread"""
+    session = getattr(_thread_local, "session", None)
+    pid = os.getpid()
+    if session is None or _thread_local.pid != pid:
+        session = requests.Session()
+        _thread_local.session = session
+        _thread_local.pid = pid
+    return session
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    pid = os.getpid()
+    if _upload_executor is None or _upload_executor[0] != pid:
+        _upload_executor = (
+            pid,
+            ThreadPoolExecutor(
+                max_workers=LOGEXCERPT_UPLOAD_WORKERS,
+                thread_name_prefix="logexcerpt_upload",
+            ),
+        )
+    return _upload_executor[1]
+
 
 def upload_logexcerpt(logexcerpt: str, id: str) -> str:
     """
@@ -36,29 +124,24 @@ def upload_logexcerpt(logexcerpt: str, id: str) -> str:
     """
     if VERBOSE:
         logger.info("Uploading logexcerpt for %s to %s", id, UPLOAD_URL)
-    # make temporary file with logexcerpt data
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".logexcerpt") as temp_file:
-        logexcerpt_filename = temp_file.name
-        logexcerpt_compressed = gzip.compress(logexcerpt.encode("utf-8"))
-        temp_file.write(logexcerpt_compressed)
-        temp_file.flush()
-    with open(logexcerpt_filename, "rb") as f:
-        hdr = {
-            "Authorization": f"Bearer {STORAGE_TOKEN}",
-        }
-        files = {"file0": ("logexcerpt.txt.gz", f), "path": f"logexcerpt/{id}"}
-        try:
-            r = requests.post(
-                UPLOAD_URL,
-                headers=hdr,
-                files=files,
-                timeout=REQUESTS_TIMEOUT_UPLOAD_IN_SECONDS,
-            )
-        except Exception as e:
-            logger.error("Error uploading logexcerpt for %s: %s", id, e)
-            os.remove(logexcerpt_filename)
-            return logexcerpt  # Return original logexcerpt if upload fails
-    os.remove(logexcerpt_filename)
+    logexcerpt_compressed = gzip.compress(logexcerpt.encode("utf-8"))
+    hdr = {
+        "Authorization": f"Bearer {STORAGE_TOKEN}",
+    }
+    files = {
+        "file0": ("logexcerpt.txt.gz", logexcerpt_compressed),
+        "path": f"logexcerpt/{id}",
+    }
+    try:
+        r = _get_session().post(
+            UPLOAD_URL,
+            headers=hdr,
+            files=files,
+            timeout=REQUESTS_TIMEOUT_UPLOAD_IN_SECONDS,
+        )
+    except Exception as e:
+        logger.error("Error uploading logexcerpt for %s: %s", id, e)
+        return logexcerpt  # Return original logexcerpt if upload fails
     if r.status_code != 200:
         logger.error(
             "Failed to upload logexcerpt for %s: %d : %s", id, r.status_code, r.text
@@ -70,25 +153,103 @@ def upload_logexcerpt(logexcerpt: str, id: str) -> str:
 
 def get_from_cache(log_hash: str) -> Optional[str]:
     """
-    Check if log_hash is in the cache
+    Check if log_hash is in the cache, marking it as recently used.
+    Errors of the cache are logged and counted as a miss.
 
     Returns:
-        str|None: The log_excerpt if it exists in cache, None otherwise
+        str|None: The url of the uploaded log_excerpt if it exists in cache, None otherwise
     """
     with cache_logs_lock:
-        return CACHE_LOGS.get(log_hash)
+        try:
+            connection = _get_cache_connection()
+            row = connection.execute(
+                "SELECT url, last_used FROM logexcerpt_cache WHERE hash = ? AND url <> ?",
+                (log_hash, _CLAIMED_URL),
+            ).fetchone()
+            if row is None:
+                return None
+            url, last_used = row
+            # Only the order of the entries matters for the eviction, so the hits
+            # don't all need a write
+            now = time.time()
+            if now - last_used > CACHE_LOGS_TOUCH_INTERVAL_SEC:
+                connection.execute(
+                    "UPDATE logexcerpt_cache SET last_used = ? WHERE hash = ?",
+                    (now, log_hash),
+                )
+            return url
+        except sqlite3.Error as e:
+            logger.warning("Could not read log excerpt %s from cache: %s", log_hash, e)
+            return None
 
 
-def set_in_cache(log_hash: str, log_excerpt: str) -> None:
+def set_in_cache(log_hash: str, url: str) -> None:
     """
-    Set log_hash in the cache with the given log_excerpt.
-    Ideally, the log_excerpt will arrive as a reference URL to where it was stored.
-    It can arrive as the entire log_excerpt though.
+    Set log_hash in the cache with the url where its log_excerpt was stored.
+    The cache is shared by all workers, so other processes can reuse the upload.
+    Errors of the cache are logged and the entry isn't cached.
     """
     with cache_logs_lock:
-        CACHE_LOGS[log_hash] = log_excerpt
+        try:
+            _get_cache_connection().execute(
+                """
+                INSERT INTO logexcerpt_cache (hash, url, last_used) VALUES (?, ?, ?)
+                ON CONFLICT (hash) DO UPDATE SET
+                    url = excluded.url,
+                    last_used = excluded.last_used
+                """,
+                (log_hash, url, time.time()),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Could not cache log excerpt %s: %s", log_hash, e)
+            return
         if VERBOSE:
-            logger.info("Cached log excerpt with hash %s as %s", log_hash, log_excerpt)
+            logger.info("Cached log excerpt with hash %s as %s", log_hash, url)
+
+
+def _claim_upload(log_hash: str) -> bool:
+    """
+    Claims the upload of log_hash in the cache, so that the other workers wait for it
+    instead of uploading the same excerpt. Claims older than UPLOAD_CLAIM_TIMEOUT_SEC
+    (e.g. of a killed worker) are taken over.
+    Returns False if the excerpt is claimed by another worker or already cached.
+    Errors of the cache are logged and the upload counts as claimed.
+    """
+    now = time.time()
+    with cache_logs_lock:
+        try:
+            connection = _get_cache_connection()
+            claimed = connection.execute(
+                """
+                INSERT OR IGNORE INTO logexcerpt_cache (hash, url, last_used)
+                VALUES (?, ?, ?)
+                """,
+                (log_hash, _CLAIMED_URL, now),
+            ).rowcount
+            if not claimed:
+                claimed = connection.execute(
+                    """
+                    UPDATE logexcerpt_cache SET last_used = ?
+                    WHERE hash = ? AND url = ? AND last_used < ?
+                    """,
+                    (now, log_hash, _CLAIMED_URL, now - UPLOAD_CLAIM_TIMEOUT_SEC),
+                ).rowcount
+            return claimed > 0
+        except sqlite3.Error as e:
+            logger.warning("Could not claim log excerpt %s in cache: %s", log_hash, e)
+            return True
+
+
+def _release_claim(log_hash: str) -> None:
+    """Removes the claim of a failed upload, so that other workers can retry it."""
+    with cache_logs_lock:
+        try:
+            _get_cache_connection().execute(
+                "DELETE FROM logexcerpt_cache WHERE hash = ? AND url = ?",
+                (log_hash, _CLAIMED_URL),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Could not release log excerpt %s in cache: %s", log_hash, e)
 
 
 def set_log_excerpt_ofile(item: dict[str, Any], url: str) -> dict[str, Any]:
@@ -110,47 +271,108 @@ def set_log_excerpt_ofile(item: dict[str, Any], url: str) -> dict[str, Any]:
     return item
 
 
-def process_log_excerpt_from_item(
+def _upload_and_cache(log_excerpt: str, log_hash: str) -> Optional[str]:
+    while not _claim_upload(log_hash):
+        # Another worker is uploading the same excerpt, its url is reused
+        time.sleep(UPLOAD_CLAIM_POLL_SEC)
+        url = get_from_cache(log_hash)
+        if url:
+            return url
+
+    url = upload_logexcerpt(log_excerpt, log_hash)
+    if url == log_excerpt:
+        # Failed uploads are not cached, so that they are retried on the next file
+        _release_claim(log_hash)
+        return None
+    set_in_cache(log_hash, url)
+    return url
+
+
+def _forget_pending_upload(log_hash: str) -> None:
+    with _pending_uploads_lock:
+        _pending_uploads.pop(log_hash, None)
+
+
+def start_log_excerpt_upload(
     item: dict[str, Any], item_type: Literal["build", "test"]
-) -> None:
+) -> Optional[Future[Optional[str]]]:
     """
-    Process log_excerpt from a single build or test (item).
-    If log_excerpt is large, upload it to storage and replace with a reference.
+    Starts the upload of the log_excerpt of a single build or test (item) if it is large.
+    Excerpts are identified by their sha256, so an excerpt that is already in the cache
+    or that is being uploaded by this process is not uploaded again. An excerpt being
+    uploaded by another worker is waited for through its claim in the cache.
+
+    Returns None if the log_excerpt doesn't need to be uploaded, otherwise a future
+    with the url of the upload (or None if the upload failed).
     """
     id = item.get("id", "unknown")
     log_excerpt = item["log_excerpt"]
 
-    if isinstance(log_excerpt, str) and len(log_excerpt) > LOGEXCERPT_THRESHOLD:
-        log_hash = hashlib.sha256(log_excerpt.encode("utf-8")).hexdigest()
+    if not isinstance(log_excerpt, str) or len(log_excerpt) <= LOGEXCERPT_THRESHOLD:
+        return None
+
+    log_hash = hashlib.sha256(log_excerpt.encode("utf-8")).hexdigest()
+    # check if log_excerpt already uploaded (by hash as key)
+    cached_url = get_from_cache(log_hash)
+    if cached_url:
         if VERBOSE:
             logger.info(
-                "Uploading log_excerpt for %s id %s hash %s with size %d bytes",
+                "Log excerpt for %s %s already uploaded, using cached URL",
                 item_type,
                 id,
-                log_hash,
-                len(log_excerpt),
             )
-        # check if log_excerpt already uploaded (by hash as key)
-        cached_url = get_from_cache(log_hash)
-        if cached_url:
-            if VERBOSE:
-                logger.info(
-                    "Log excerpt for %s %s already uploaded, using cached URL",
-                    item_type,
-                    id,
-                )
-            set_log_excerpt_ofile(item, cached_url)
-        else:
-            cached_url = upload_logexcerpt(log_excerpt, log_hash)
-            # TODO: if upload_logexcerpt fails, should we be caching the entire logexcerpt?
-            set_in_cache(log_hash, cached_url)
-            set_log_excerpt_ofile(item, cached_url)
+        future: Future[Optional[str]] = Future()
+        future.set_result(cached_url)
+        return future
+
+    if VERBOSE:
+        logger.info(
+            "Uploading log_excerpt for %s id %s hash %s with size %d bytes",
+            item_type,
+            id,
+            log_hash,
+            len(log_excerpt),
+        )
+    with _pending_uploads_lock:
+        future = _pending_uploads.get(log_hash)
+        if future is not None:
+            return future
+        future = _get_upload_executor().submit(_upload_and_cache, log_excerpt, log_hash)
+        _pending_uploads[log_hash] = future
+    future.add_done_callback(lambda _: _forget_pending_upload(log_hash))
+    return future
+
+
+def finish_log_excerpt_upload(
+    item: dict[str, Any], upload: Future[Optional[str]]
+) -> None:
+    """
+    Waits for an upload started by start_log_excerpt_upload and replaces the
+    log_excerpt of the item with a reference. If the upload failed the
+    original log_excerpt is kept.
+    """
+    url = upload.result()
+    if url:
+        set_log_excerpt_ofile(item, url)
+
+
+def process_log_excerpt_from_item(
+    item: dict[str, Any], item_type: Literal["build", "test"]
+) -> None:
+    """
+    Process log_excerpt from a single build or test (item).
+    If log_excerpt is large, upload it to storage and replace with a reference.
+    """
+    upload = start_log_excerpt_upload(item, item_type)
+    if upload is not None:
+        finish_log_excerpt_upload(item, upload)
 
 
 def extract_log_excerpt(input_data: dict[str, Any]) -> None:
     """
     Extract log_excerpt from builds and tests, if it is large,
     upload to storage and replace with a reference.
+    All the uploads of the submission are started before waiting for any of them.
     """
     if not STORAGE_TOKEN:
         logger.warning("STORAGE_TOKEN is not set, log_excerpts will not be uploaded")
@@ -159,25 +381,83 @@ def extract_log_excerpt(input_data: dict[str, Any]) -> None:
     builds: list[dict[str, Any]] = input_data.get("builds", [])
     tests: list[dict[str, Any]] = input_data.get("tests", [])
 
-    for build in builds:
-        if build.get("log_excerpt"):
-            process_log_excerpt_from_item(item=build, item_type="build")
+    uploads: list[tuple[dict[str, Any], Future[Optional[str]]]] = []
+    for items, item_type in ((builds, "build"), (tests, "test")):
+        for item in items:
+            if item.get("log_excerpt"):
+                upload = start_log_excerpt_upload(item=item, item_type=item_type)
+                if upload is not None:
+                    uploads.append((item, upload))
 
-    for test in tests:
-        if test.get("log_excerpt"):
-            process_log_excerpt_from_item(item=test, item_type="test")
+    for item, upload in uploads:
+        finish_log_excerpt_upload(item, upload)
 
 
-def cache_logs_maintenance() -> None:
+def iter_items_with_uploaded_log_excerpts(
+    items: Iterable[tuple[str, Any]],
+) -> Iterator[tuple[str, Any]]:
     """
-    Periodically clean up the cache logs to prevent memory leak and slow down.
-    If CACHE_LOGS grow over 100k entries, clear it.
+    Streaming counterpart of extract_log_excerpt, for `(section, item)` pairs such as
+    the ones from iter_json_object_items.
+
+    Uploads are started as soon as builds/tests are read, reading up to
+    UPLOAD_LOOKAHEAD items ahead, and items are yielded in their original
+    order once their log_excerpt was replaced.
     """
+    if not STORAGE_TOKEN:
+        logger.warning("STORAGE_TOKEN is not set, log_excerpts will not be uploaded")
+        yield from items
+        return
 
-    # Limit the size of the cache to prevent memory leaks
-    # (we don't really need lock, as workers idle, but just in case)
-    with cache_logs_lock:
-        if len(CACHE_LOGS) > CACHE_LOGS_SIZE_LIMIT:
-            CACHE_LOGS.clear()
-            if VERBOSE:
-                logger.info("Cache logs cleared")
+    waiting: deque[tuple[str, Any, Optional[Future[Optional[str]]]]] = deque()
+
+    def pop_waiting() -> tuple[str, Any]:
+        section, item, upload = waiting.popleft()
+        if upload is not None:
+            finish_log_excerpt_upload(item, upload)
+        return section, item
+
+    for section, item in items:
+        upload = None
+        if (
+            section in ("builds", "tests")
+            and isinstance(item, dict)
+            and item.get("log_excerpt")
+        ):
+            upload = start_log_excerpt_upload(item, section.removesuffix("s"))
+        waiting.append((section, item, upload))
+
+        while waiting and (
+            len(waiting) > UPLOAD_LOOKAHEAD
+            or waiting[0][2] is None
+            or waiting[0][2].done()
+        ):
+            yield pop_waiting()
+
+    while waiting:
+        yield pop_waiting()
+
+
+def cache_logs_maintenance() -> None:
+    """
+    Periodically clean up the cache logs to prevent it from growing forever.
+    Only the CACHE_LOGS_SIZE_LIMIT most recently used entries are kept.
+    """
+    try:
+        # Short-lived connection, so that no connection is inherited by forked workers
+        with closing(_connect_cache_logs(CACHE_LOGS_PATH)) as connection:
+            deleted = connection.execute(
+                """
+                DELETE FROM logexcerpt_cache WHERE hash IN (
+                    SELECT hash FROM logexcerpt_cache
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (CACHE_LOGS_SIZE_LIMIT,),
+            ).rowcount
+    except sqlite3.Error as e:
+        logger.warning("Could not clean up the log excerpt cache: %s", e)
+        return
+    if VERBOSE and deleted > 0:
+        logger.info("Removed %d entries from the cache logs", deleted)
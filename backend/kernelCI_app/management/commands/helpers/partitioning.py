@@ -0,0 +1,397 @@
+"""
+Online conversion of the builds and tests tables to tables partitioned by month of
+their first ingestion (`_created`).
+
+The partitioned table is created next to the live one, with the same columns and
+indexes, suffixed by `_partitioned`. Triggers on the live table mirror every write
+to it, and the rows that existed before are then copied in chunks, in id order,
+each chunk committed together with the last id copied in a progress table, so a
+conversion that stops is resumed where it stopped. Finally, the live table is
+locked for a moment to swap the tables: it is kept as `<table>_unpartitioned`
+until it is dropped.
+
+`_timestamp` changes on every upsert of a row and a row can't move between
+partitions on conflict, so the partition key is `_created`, which is set once.
+The rows ingested before it existed are put in the partition of their
+`_timestamp`, or of the start of the conversion without one, which the triggers
+keep in `_created` as soon as the row changes, so that the copy and the triggers
+always agree on the partition of a row.
+"""
+
+from datetime import date, datetime, timezone
+from typing import NamedTuple
+
+from django.db import connection
+
+PARTITION_KEY = "_created"
+PARTITIONABLE_TABLES = ("builds", "tests")
+
+PARTITIONED_SUFFIX = "_partitioned"
+UNPARTITIONED_SUFFIX = "_unpartitioned"
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+class ConversionProgress(NamedTuple):
+    last_id: str
+    copied: int
+    started_at: datetime
+
+
+def _add_months(month: date, months: int) -> date:
+    year, month_idx = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_idx + 1, 1)
+
+
+def month_partitions(table: str, first: date, last: date) -> list[Partition]:
+    """Monthly partitions of `table`, from the month of `first` to the one of `last`."""
+    partitions = []
+    month = first.replace(day=1)
+    while month <= last:
+        next_month = _add_months(month, 1)
+        partitions.append(
+            Partition(
+                name=f"{table}_p{month:%Y_%m}",
+                start=datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+                end=datetime(next_month.year, next_month.month, 1, tzinfo=timezone.utc),
+            )
+        )
+        month = next_month
+    return partitions
+
+
+def partitioned_index_statement(indexdef: str, table: str) -> str:
+    """
+    Definition of an index of `table`, from pg_indexes, for the partitioned table,
+    with the name of the index suffixed like the one of the table.
+    """
+    prefix, _, definition = indexdef.partition(" INDEX ")
+    name, _, definition = definition.partition(" ON ")
+    _, _, definition = definition.partition(" USING ")
+    return (
+        f"{prefix} INDEX {name}{PARTITIONED_SUFFIX} "
+        f"ON {table}{PARTITIONED_SUFFIX} USING {definition}"
+    )
+
+
+def _progress_table(table: str) -> str:
+    return f"{table}_partitioning"
+
+
+def _partition_key_sql(table: str, row: str) -> str:
+    """Partition key of a row of `table` that is being converted."""
+    return (
+        f"COALESCE({row}.{PARTITION_KEY}, {row}._timestamp, "
+        f"(SELECT started_at FROM {_progress_table(table)}))"
+    )
+
+
+def _mirror_function(table: str) -> str:
+    return f"{table}_partitioning_mirror"
+
+
+def _key_function(table: str) -> str:
+    return f"{table}_partitioning_key"
+
+
+def _columns(cursor, table: str) -> list[str]:
+    """Columns of the table that can be written, in order."""
+    cursor.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0
+            AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+        """,
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _indexes(cursor, table: str) -> list[tuple[str, str]]:
+    """Names and definitions of the indexes of the table, other than its primary key."""
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = %s
+            AND indexname <> %s
+        ORDER BY indexname
+        """,
+        [table, f"{table}_pkey"],
+    )
+    return cursor.fetchall()
+
+
+def referencing_foreign_keys(table: str) -> list[str]:
+    """
+    Foreign keys that reference the table. A partitioned table can't be referenced
+    by its id alone, so they have to be dropped before the conversion.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conrelid::regclass || '.' || conname FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = %s::regclass
+            ORDER BY 1
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def conversion_exists(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [_progress_table(table)])
+        return cursor.fetchone()[0]
+
+
+def unpartitioned_exists(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL", [f"{table}{UNPARTITIONED_SUFFIX}"]
+        )
+        return cursor.fetchone()[0]
+
+
+def _create_partitions(
+    cursor, parent: str, table: str, partitions: list[Partition]
+) -> list[str]:
+    created = []
+    for partition in partitions:
+        cursor.execute("SELECT to_regclass(%s) IS NULL", [partition.name])
+        if not cursor.fetchone()[0]:
+            continue
+        cursor.execute(
+            f"CREATE TABLE {partition.name} PARTITION OF {parent} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [partition.start, partition.end],
+        )
+        created.append(partition.name)
+    return created
+
+
+def create_partitions(table: str, *, months_ahead: int) -> list[str]:
+    """
+    Creates the monthly partitions of the partitioned table, from the current month
+    to `months_ahead` months ahead, that don't exist yet.
+    Returns their names.
+    """
+    today = datetime.now(timezone.utc).date()
+    partitions = month_partitions(table, today, _add_months(today, months_ahead))
+    with connection.cursor() as cursor:
+        return _create_partitions(cursor, table, table, partitions)
+
+
+def start_conversion(table: str, *, months_ahead: int) -> int:
+    """
+    Creates the partitioned table with monthly partitions from the oldest row of
+    `table` to `months_ahead` months ahead, the triggers that mirror the writes to
+    `table` and the progress table.
+    Must run in a transaction, with a lock_timeout since the triggers lock `table`.
+    Returns the number of partitions.
+    """
+    new_table = f"{table}{PARTITIONED_SUFFIX}"
+
+    with connection.cursor() as cursor:
+        columns = _columns(cursor, table)
+        cursor.execute(
+            f"""
+            CREATE TABLE {new_table} (
+                LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE
+            ) PARTITION BY RANGE ({PARTITION_KEY})
+            """
+        )
+        cursor.execute(
+            f"ALTER TABLE {new_table} ALTER COLUMN {PARTITION_KEY} SET NOT NULL"
+        )
+        cursor.execute(
+            f"ALTER TABLE {new_table} ADD CONSTRAINT {table}_pkey{PARTITIONED_SUFFIX} "
+            f"PRIMARY KEY (id, {PARTITION_KEY})"
+        )
+        for _, indexdef in _indexes(cursor, table):
+            cursor.execute(partitioned_index_statement(indexdef, table))
+
+        cursor.execute(f"SELECT min(_timestamp) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        today = datetime.now(timezone.utc).date()
+        partitions = month_partitions(
+            table,
+            oldest.astimezone(timezone.utc).date() if oldest else today,
+            _add_months(today, months_ahead),
+        )
+        _create_partitions(cursor, new_table, table, partitions)
+        # Rows out of the monthly partitions, such as rows ingested in the future
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {new_table} DEFAULT")
+
+        cursor.execute(
+            f"""
+            CREATE TABLE {_progress_table(table)} (
+                last_id text NOT NULL,
+                copied bigint NOT NULL,
+                started_at timestamptz NOT NULL DEFAULT now()
+            )
+            """
+        )
+        cursor.execute(
+            f"INSERT INTO {_progress_table(table)} (last_id, copied) VALUES ('', 0)"
+        )
+
+        for statement in _trigger_statements(table, columns):
+            cursor.execute(statement)
+
+    return len(partitions) + 1
+
+
+def _trigger_statements(table: str, columns: list[str]) -> list[str]:
+    """
+    The key trigger keeps the partition key of a row without `_created` when it
+    changes, since `_timestamp` changes. The mirror trigger
+    then writes the row, or deletes it, in the partitioned table.
+    """
+    new_table = f"{table}{PARTITIONED_SUFFIX}"
+    values = ", ".join(
+        (
+            _partition_key_sql(table, "NEW")
+            if column == PARTITION_KEY
+            else f"NEW.{column}"
+        )
+        for column in columns
+    )
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}"
+        for column in columns
+        if column not in ("id", PARTITION_KEY)
+    )
+
+    return [
+        f"""
+        CREATE FUNCTION {_key_function(table)}() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.{PARTITION_KEY} := {_partition_key_sql(table, "OLD")};
+            RETURN NEW;
+        END
+        $$
+        """,
+        f"""
+        CREATE FUNCTION {_mirror_function(table)}() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM {new_table}
+                WHERE id = OLD.id
+                    AND {PARTITION_KEY} = {_partition_key_sql(table, "OLD")};
+                RETURN OLD;
+            END IF;
+            INSERT INTO {new_table} ({", ".join(columns)})
+            VALUES ({values})
+            ON CONFLICT (id, {PARTITION_KEY}) DO UPDATE SET {updates};
+            RETURN NEW;
+        END
+        $$
+        """,
+        f"""
+        CREATE TRIGGER {_key_function(table)}
+        BEFORE UPDATE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {_key_function(table)}()
+        """,
+        f"""
+        CREATE TRIGGER {_mirror_function(table)}
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {_mirror_function(table)}()
+        """,
+    ]
+
+
+def conversion_progress(table: str) -> ConversionProgress:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT last_id, copied, started_at FROM {_progress_table(table)}"
+        )
+        return ConversionProgress(*cursor.fetchone())
+
+
+def copy_chunk(table: str, *, batch_size: int) -> int:
+    """
+    Copies the next `batch_size` rows of `table`, by id, to the partitioned table,
+    unless the triggers already wrote them. The rows are locked while they are
+    copied, so that a row that is deleted meanwhile isn't copied back, without
+    waiting for the rows that are being written.
+    Must run in a transaction. Returns the number of rows read, 0 once all the rows
+    were copied.
+    """
+    with connection.cursor() as cursor:
+        columns = _columns(cursor, table)
+        selected = ", ".join(
+            (
+                f"{_partition_key_sql(table, table)} AS {column}"
+                if column == PARTITION_KEY
+                else column
+            )
+            for column in columns
+        )
+        cursor.execute(
+            f"""
+            WITH chunk AS (
+                SELECT {selected}
+                FROM {table}
+                WHERE id > (SELECT last_id FROM {_progress_table(table)})
+                ORDER BY id
+                LIMIT %(batch_size)s
+                FOR SHARE NOWAIT
+            ), copied AS (
+                INSERT INTO {table}{PARTITIONED_SUFFIX} ({", ".join(columns)})
+                SELECT {", ".join(columns)} FROM chunk
+                ON CONFLICT DO NOTHING
+            )
+            UPDATE {_progress_table(table)}
+            SET last_id = COALESCE((SELECT max(id) FROM chunk), last_id),
+                copied = copied + (SELECT count(*) FROM chunk)
+            RETURNING (SELECT count(*) FROM chunk)
+            """,
+            {"batch_size": batch_size},
+        )
+        return cursor.fetchone()[0]
+
+
+def lock_table(table: str) -> None:
+    """Blocks every access to the table until the end of the transaction."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+
+
+def swap_tables(table: str) -> None:
+    """
+    Replaces `table` by the partitioned table, which then has the names of its
+    indexes, and keeps `table` as `<table>_unpartitioned`. Must run in the
+    transaction holding the lock of `lock_table`, after the last chunk was copied.
+    """
+    new_table = f"{table}{PARTITIONED_SUFFIX}"
+    old_table = f"{table}{UNPARTITIONED_SUFFIX}"
+
+    with connection.cursor() as cursor:
+        index_names = [f"{table}_pkey"] + [name for name, _ in _indexes(cursor, table)]
+
+        cursor.execute(f"DROP TRIGGER {_mirror_function(table)} ON {table}")
+        cursor.execute(f"DROP TRIGGER {_key_function(table)} ON {table}")
+        cursor.execute(f"DROP FUNCTION {_mirror_function(table)}()")
+        cursor.execute(f"DROP FUNCTION {_key_function(table)}()")
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+        for name in index_names:
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name}{UNPARTITIONED_SUFFIX}")
+
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for name in index_names:
+            cursor.execute(f"ALTER INDEX {name}{PARTITIONED_SUFFIX} RENAME TO {name}")
+
+        cursor.execute(f"DROP TABLE {_progress_table(table)}")
+
+
+def drop_unpartitioned(table: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {table}{UNPARTITIONED_SUFFIX}")
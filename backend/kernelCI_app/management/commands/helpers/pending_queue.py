@@ -0,0 +1,246 @@
+"""
+Consumption of the pending aggregation queue without deleting its rows.
+
+pending_test and pending_builds are partitioned by a `slot` column. The ingester
+writes to the active slot, which the database fills in by default, and
+process_pending_aggregations reads the other one, the sealed slot, that nobody
+writes to. Instead of deleting the items it aggregates, each shard records how far
+it went through the sealed slot in pending_queue_position, in the same transaction
+as the aggregates. Once every shard went through it, the sealed slot is truncated and
+the slots are swapped, so the consumed items leave no dead rows behind.
+
+Writers hold a shared advisory lock until their transaction ends, and the rotation
+takes it in exclusive mode, so no item is added to a slot once it is sealed.
+
+Items whose build or checkout isn't in the database yet can't be aggregated, so they
+are moved to the parked slot when their slot is sealed, and back to the next sealed
+slot once their build or checkout arrives.
+"""
+
+from typing import NamedTuple, Optional
+
+from django.db import connection, transaction
+
+from kernelCI_app.constants.process_pending import (
+    PENDING_PARKED_SLOT,
+    PENDING_QUEUE_LOCK,
+    PENDING_QUEUE_SLOTS,
+)
+from kernelCI_app.management.commands.helpers.aggregation_helpers import (
+    PENDING_BUILD_COLUMNS,
+    PENDING_TEST_COLUMNS,
+    UPSERT_PENDING_BUILD_SQL,
+    UPSERT_PENDING_TEST_SQL,
+)
+from kernelCI_app.models import PendingQueue, PendingQueuePosition
+
+_TEST_READY_SQL = """
+    EXISTS (
+        SELECT 1 FROM builds b JOIN checkouts c ON c.id = b.checkout_id
+        WHERE b.id = p.build_id
+    )
+"""
+
+_BUILD_READY_SQL = "EXISTS (SELECT 1 FROM checkouts c WHERE c.id = p.checkout_id)"
+
+_CAN_ROTATE_SQL = f"""
+    SELECT
+        NOT EXISTS (SELECT 1 FROM pending_test WHERE slot = %(sealed)s)
+            AND NOT EXISTS (SELECT 1 FROM pending_builds WHERE slot = %(sealed)s)
+            OR (
+                SELECT count(*) FROM pending_queue_position
+                WHERE generation = %(generation)s AND shard_count = %(shard_count)s
+                    AND tests_done AND builds_done
+            ) >= %(shard_count)s,
+        EXISTS (SELECT 1 FROM pending_test WHERE slot = %(active)s)
+            OR EXISTS (SELECT 1 FROM pending_builds WHERE slot = %(active)s)
+            OR EXISTS (
+                SELECT 1 FROM pending_test p
+                WHERE slot = %(parked)s AND {_TEST_READY_SQL}
+            )
+            OR EXISTS (
+                SELECT 1 FROM pending_builds p
+                WHERE slot = %(parked)s AND {_BUILD_READY_SQL}
+            )
+"""
+
+# Parked items that became ready join the slot being sealed
+_UNPARK_READY_ITEMS_SQL = (
+    f"""
+    WITH ready AS (
+        DELETE FROM pending_test p
+        WHERE slot = %(parked)s AND {_TEST_READY_SQL}
+        RETURNING {PENDING_TEST_COLUMNS}
+    )
+    INSERT INTO pending_test (slot, {PENDING_TEST_COLUMNS})
+    SELECT %(active)s, {PENDING_TEST_COLUMNS} FROM ready
+    ORDER BY test_id
+    {UPSERT_PENDING_TEST_SQL.format(table="pending_test")}
+    """,
+    f"""
+    WITH ready AS (
+        DELETE FROM pending_builds p
+        WHERE slot = %(parked)s AND {_BUILD_READY_SQL}
+        RETURNING {PENDING_BUILD_COLUMNS}
+    )
+    INSERT INTO pending_builds (slot, {PENDING_BUILD_COLUMNS})
+    SELECT %(active)s, {PENDING_BUILD_COLUMNS} FROM ready
+    ORDER BY build_id
+    {UPSERT_PENDING_BUILD_SQL.format(table="pending_builds")}
+    """,
+)
+
+# A copy of the items that aren't ready stays in the sealed slot until it is truncated
+_PARK_NOT_READY_ITEMS_SQL = (
+    f"""
+    INSERT INTO pending_test (slot, {PENDING_TEST_COLUMNS})
+    SELECT %(parked)s, {PENDING_TEST_COLUMNS} FROM pending_test p
+    WHERE slot = %(active)s AND NOT {_TEST_READY_SQL}
+    ORDER BY test_id
+    {UPSERT_PENDING_TEST_SQL.format(table="pending_test")}
+    """,
+    f"""
+    INSERT INTO pending_builds (slot, {PENDING_BUILD_COLUMNS})
+    SELECT %(parked)s, {PENDING_BUILD_COLUMNS} FROM pending_builds p
+    WHERE slot = %(active)s AND NOT {_BUILD_READY_SQL}
+    ORDER BY build_id
+    {UPSERT_PENDING_BUILD_SQL.format(table="pending_builds")}
+    """,
+)
+
+
+class QueuePosition(NamedTuple):
+    generation: int
+    slot: int
+    """Sealed slot of the generation"""
+    shard_count: int
+    shard: int
+    last_test_id: Optional[str] = None
+    last_build_id: Optional[str] = None
+    tests_done: bool = False
+    builds_done: bool = False
+
+    @property
+    def shards(self) -> Optional[list[int]]:
+        """Shard filter of the position, None if there is a single shard."""
+        return None if self.shard_count == 1 else [self.shard]
+
+
+def _other_slot(slot: int) -> int:
+    return next(other for other in PENDING_QUEUE_SLOTS if other != slot)
+
+
+def next_queue_position(
+    *, shard_count: int, shards: list[int]
+) -> Optional[QueuePosition]:
+    """
+    Returns the position of the first of `shards` that didn't go through the
+    sealed slot yet, or None if all of them did.
+    """
+    queue = PendingQueue.objects.first() or PendingQueue()
+    saved_positions = {
+        position.shard: position
+        for position in PendingQueuePosition.objects.filter(
+            generation=queue.generation, shard_count=shard_count, shard__in=shards
+        )
+    }
+
+    for shard in sorted(shards):
+        position = QueuePosition(
+            generation=queue.generation,
+            slot=_other_slot(queue.active_slot),
+            shard_count=shard_count,
+            shard=shard,
+        )
+        saved = saved_positions.get(shard)
+        if saved is not None:
+            position = position._replace(
+                last_test_id=saved.last_test_id,
+                last_build_id=saved.last_build_id,
+                tests_done=saved.tests_done,
+                builds_done=saved.builds_done,
+            )
+        if not (position.tests_done and position.builds_done):
+            return position
+    return None
+
+
+def save_queue_position(position: QueuePosition) -> None:
+    """Records the position of a shard, in the transaction of its last batch."""
+    PendingQueuePosition.objects.bulk_create(
+        [
+            PendingQueuePosition(
+                generation=position.generation,
+                shard_count=position.shard_count,
+                shard=position.shard,
+                last_test_id=position.last_test_id,
+                last_build_id=position.last_build_id,
+                tests_done=position.tests_done,
+                builds_done=position.builds_done,
+            )
+        ],
+        update_conflicts=True,
+        update_fields=["last_test_id", "last_build_id", "tests_done", "builds_done"],
+        unique_fields=["generation", "shard_count", "shard"],
+    )
+
+
+def _rotation_params(cursor, shard_count: int) -> Optional[dict]:
+    """
+    Returns the parameters of the rotation if every shard went through the sealed
+    slot and there are new items to process, None otherwise.
+    """
+    cursor.execute("SELECT active_slot, generation FROM pending_queue WHERE id = 1")
+    active_slot, generation = cursor.fetchone() or (0, 0)
+    params = {
+        "active": active_slot,
+        "sealed": _other_slot(active_slot),
+        "parked": PENDING_PARKED_SLOT,
+        "generation": generation,
+        "shard_count": shard_count,
+    }
+
+    cursor.execute(_CAN_ROTATE_SQL, params)
+    sealed_consumed, has_new_items = cursor.fetchone()
+    return params if sealed_consumed and has_new_items else None
+
+
+def rotate_pending_queue(shard_count: int) -> bool:
+    """
+    Truncates the sealed slot and swaps the slots, if every shard went through the
+    sealed slot and there are new items to process. Waits for the transactions that
+    are writing to the active slot.
+    Returns whether the queue was rotated.
+    """
+    # Checked before taking the lock, which makes the ingester wait, and outside of
+    # its transaction, which must not hold locks on the slots while waiting for it
+    with connection.cursor() as cursor:
+        if _rotation_params(cursor, shard_count) is None:
+            return False
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [PENDING_QUEUE_LOCK])
+        params = _rotation_params(cursor, shard_count)
+        if params is None:
+            return False
+
+        cursor.execute(
+            f"TRUNCATE pending_test_slot{params['sealed']}, "
+            f"pending_builds_slot{params['sealed']}"
+        )
+        for sql in (*_UNPARK_READY_ITEMS_SQL, *_PARK_NOT_READY_ITEMS_SQL):
+            cursor.execute(sql, params)
+        cursor.execute(
+            """
+            INSERT INTO pending_queue (id, active_slot, generation) VALUES (1, %s, %s)
+            ON CONFLICT (id) DO UPDATE
+            SET active_slot = EXCLUDED.active_slot, generation = EXCLUDED.generation
+            """,
+            [params["sealed"], params["generation"] + 1],
+        )
+        cursor.execute(
+            "DELETE FROM pending_queue_position WHERE generation <= %s",
+            [params["generation"]],
+        )
+
+    return True
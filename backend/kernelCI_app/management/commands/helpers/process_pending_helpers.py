@@ -1,15 +1,93 @@
-import hashlib
-from typing import NamedTuple, Optional, Sequence, TypedDict
+from collections import defaultdict
+from typing import Iterable, NamedTuple, Optional, Sequence, TypedDict
+
+from django.db import connection
 
 from kernelCI_app.constants.general import UNKNOWN_STRING
-from kernelCI_app.constants.process_pending import ROLLUP_STATUS_FIELDS
+from kernelCI_app.constants.process_pending import (
+    AGGREGATION_BUILD_LOCK,
+    ROLLUP_STATUS_FIELDS,
+)
 from kernelCI_app.helpers.logger import logger
-from kernelCI_app.models import Builds, Checkouts, Incidents, PendingTest, StatusChoices
+from kernelCI_app.models import (
+    Builds,
+    Checkouts,
+    Incidents,
+    PendingTest,
+    ProcessedItemKind,
+    ProcessedItems,
+    SimplifiedStatusChoices,
+    StatusChoices,
+)
+
+
+class ProcessedItemKey(NamedTuple):
+    """Primary key of a ProcessedItems entry"""
+
+    checkout_id: str
+    kind: ProcessedItemKind
+    entity_id: str
+
+
+def get_hardware_build_entity_id(build_id: str, test_origin: str, platform: str) -> str:
+    """
+    Entity id of a build in ProcessedItems. A build is counted once in each
+    hardware_status record of its checkout, which are keyed by test origin and platform.
+    """
+    return f"{build_id}|{test_origin}|{platform}"
+
+
+# Locks are taken in a fixed order, so that two transactions can't wait for each other
+LOCK_AGGREGATED_BUILDS_SQL = """
+    SELECT count(pg_advisory_xact_lock(%(lock)s, build_hash))
+    FROM (
+        SELECT DISTINCT hashtext(build_id) AS build_hash FROM {builds}
+        ORDER BY build_hash
+    ) builds
+"""
+
+
+def lock_aggregated_builds(build_ids: Iterable[str]) -> None:
+    """
+    Waits until no other transaction is aggregating tests of these builds. A build
+    is counted once in each hardware_status record, so the tests of a build must not
+    be aggregated by two transactions at once, e.g. by the ingester and by a worker.
+    The locks are released at the end of the transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            LOCK_AGGREGATED_BUILDS_SQL.format(
+                builds="unnest(%(build_ids)s::text[]) AS build_id"
+            ),
+            {"lock": AGGREGATION_BUILD_LOCK, "build_ids": list(build_ids)},
+        )
+
+
+def fetch_processed_items(
+    keys: set[ProcessedItemKey],
+) -> dict[ProcessedItemKey, Optional[SimplifiedStatusChoices]]:
+    """Returns the stored status of the keys that were already processed."""
+    checkout_ids: dict[ProcessedItemKind, set[str]] = defaultdict(set)
+    entity_ids: dict[ProcessedItemKind, set[str]] = defaultdict(set)
+    for key in keys:
+        checkout_ids[key.kind].add(key.checkout_id)
+        entity_ids[key.kind].add(key.entity_id)
 
+    processed: dict[ProcessedItemKey, Optional[SimplifiedStatusChoices]] = {}
+    for kind in checkout_ids:
+        # Filtering by each column keeps to a primary key index scan, the few
+        # combinations that weren't asked for are discarded below
+        rows = ProcessedItems.objects.filter(
+            checkout_id__in=checkout_ids[kind],
+            kind=kind,
+            entity_id__in=entity_ids[kind],
+        ).values_list("checkout_id", "kind", "entity_id", "status")
+        for checkout_id, kind_value, entity_id, status in rows:
+            key = ProcessedItemKey(checkout_id, kind_value, entity_id)
+            if key in keys:
+                processed[key] = status
 
-def get_rollup_key(test_id: str) -> bytes:
-    """Generate a hash (rollup key) from test_id with 'rollup|' prefix for namespacing."""
-    return hashlib.sha256(f"rollup|{test_id}".encode("utf-8")).digest()
+    return processed
 
 
 EMPTY_PATH_GROUP = "-"
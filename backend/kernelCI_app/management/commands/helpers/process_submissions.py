@@ -1,5 +1,6 @@
+import json
 import logging
-from typing import Any, TypedDict
+from typing import Any, NamedTuple, Optional, TypedDict
 
 from django.db import IntegrityError
 from django.utils import timezone
@@ -7,19 +8,26 @@ from prometheus_client import Counter
 from pydantic import ValidationError
 
 from kernelCI_app.constants.ingester import INGESTER_GRAFANA_LABEL
+from kernelCI_app.management.commands.generated.insert_queries import INSERT_QUERIES
 from kernelCI_app.models import Builds, Checkouts, Incidents, Issues, Tests
-from kernelCI_app.typeModels.modelTypes import TableNames
+from kernelCI_app.typeModels.modelTypes import MODEL_MAP, TableNames
+
+type IngestRow = tuple[Any, ...]
+"""
+Namedtuple with the values of an item in the same order as the insert columns
+of its table (see IngestRowSpec), ready to be sent to the database.
+"""
 
 
 class ProcessedSubmission(TypedDict):
-    """Stores the list of items in a single submission.
+    """Stores the list of rows in a single submission.
     Lists can't be None but can be empty."""
 
-    issues: list[Issues]
-    checkouts: list[Checkouts]
-    builds: list[Builds]
-    tests: list[Tests]
-    incidents: list[Incidents]
+    issues: list[IngestRow]
+    checkouts: list[IngestRow]
+    builds: list[IngestRow]
+    tests: list[IngestRow]
+    incidents: list[IngestRow]
 
 
 logger = logging.getLogger(__name__)
@@ -46,6 +54,64 @@ TEST_FIELDS = get_model_fields(Tests._meta.get_fields())
 INCIDENT_FIELDS = get_model_fields(Incidents._meta.get_fields())
 
 
+class IngestRowSpec(NamedTuple):
+    """
+    Precompiled layout of the rows of a table, built once from INSERT_QUERIES.
+
+    The first `len(fields)` values of a row are the insert columns, in order;
+    `extra_fields` come after them and are only used by the aggregations.
+    """
+
+    row_type: type
+    fields: tuple[str, ...]
+    extra_fields: tuple[str, ...]
+    json_fields: frozenset[str]
+    defaults: tuple[Any, ...]
+    timestamp_index: int
+
+
+ROW_EXTRA_FIELDS: dict[TableNames, tuple[str, ...]] = {
+    "tests": ("platform", "lab"),
+}
+"""Values taken out of json fields beforehand, so that the aggregations don't
+need to decode them again."""
+
+
+def _build_row_spec(table_name: TableNames) -> IngestRowSpec:
+    model = MODEL_MAP[table_name]
+    fields = tuple(INSERT_QUERIES[table_name]["updateable_model_fields"])
+    extra_fields = ROW_EXTRA_FIELDS.get(table_name, ())
+    model_fields = [model._meta.get_field(field) for field in fields]
+
+    return IngestRowSpec(
+        row_type=NamedTuple(
+            f"{model.__name__}Row", [(field, Any) for field in fields + extra_fields]
+        ),
+        fields=fields,
+        extra_fields=extra_fields,
+        json_fields=frozenset(
+            field.attname
+            for field in model_fields
+            if field.get_internal_type() == "JSONField"
+        ),
+        # Same values that the model constructor would give to missing fields
+        defaults=tuple(field.get_default() for field in model_fields),
+        timestamp_index=fields.index("field_timestamp"),
+    )
+
+
+INGEST_ROW_SPECS: dict[TableNames, IngestRowSpec] = {
+    table_name: _build_row_spec(table_name) for table_name in MODEL_MAP
+}
+
+# The row types must be reachable by name so that rows can be pickled
+IssuesRow = INGEST_ROW_SPECS["issues"].row_type
+CheckoutsRow = INGEST_ROW_SPECS["checkouts"].row_type
+BuildsRow = INGEST_ROW_SPECS["builds"].row_type
+TestsRow = INGEST_ROW_SPECS["tests"].row_type
+IncidentsRow = INGEST_ROW_SPECS["incidents"].row_type
+
+
 def flatten_dict_specific(target: dict[str, Any], target_fields: list[str]):
     """
     Flatten specific fields of a dict on a one-level-deep only.
@@ -139,11 +205,141 @@ def make_incident_instance(incident: dict[str, Any]) -> Incidents:
     return obj
 
 
-def build_instances_from_submission(
+def make_row(
+    table_name: TableNames, item: dict[str, Any], extra_values: tuple[Any, ...] = ()
+) -> IngestRow:
+    """
+    Builds the insert row of a (flattened) item without instantiating its model.
+    Unknown keys are ignored, missing fields get the model default,
+    json fields are serialized and the _timestamp is set to now.
+    """
+    spec = INGEST_ROW_SPECS[table_name]
+    json_fields = spec.json_fields
+
+    values = []
+    for field, default in zip(spec.fields, spec.defaults, strict=True):
+        value = item.get(field, default)
+        if value is not None and field in json_fields:
+            value = json.dumps(value)
+        values.append(value)
+    values[spec.timestamp_index] = timezone.now()
+    values.extend(extra_values)
+
+    return spec.row_type._make(values)
+
+
+def make_issue_row(issue: dict[str, Any]) -> IngestRow:
+    return make_row("issues", flatten_dict_specific(issue, ["culprit"]))
+
+
+def make_checkout_row(checkout: dict[str, Any]) -> IngestRow:
+    return make_row("checkouts", checkout)
+
+
+def make_build_row(build: dict[str, Any]) -> IngestRow:
+    return make_row("builds", build)
+
+
+def make_test_row(test: dict[str, Any]) -> IngestRow:
+    flattened_test = flatten_dict_specific(test, ["environment", "number"])
+
+    environment_misc = flattened_test.get("environment_misc")
+    misc = flattened_test.get("misc")
+    platform = (
+        environment_misc.get("platform") if isinstance(environment_misc, dict) else None
+    )
+    lab = misc.get("runtime") if isinstance(misc, dict) else None
+
+    return make_row("tests", flattened_test, (platform, lab))
+
+
+def make_incident_row(incident: dict[str, Any]) -> IngestRow:
+    return make_row("incidents", incident)
+
+
+def build_row_from_item(
+    item: Any, item_type: TableNames, counters: dict[TableNames, Counter]
+) -> Optional[IngestRow]:
+    """
+    Convert a single raw submission item into an insert row.
+    Errors are logged and None is returned, so that the item can be skipped.
+
+    Params:
+        item: the item data in dict format
+        item_type: the table that the item belongs to
+        counters: a dict mapping tables to its prometheus counter
+    """
+    if not isinstance(item, dict):
+        logger.warning(
+            f"{item_type.capitalize()} data is not a dict, its type is: {type(item)}"
+        )
+        return None
+    try:
+        match item_type:
+            case "issues":
+                issue = make_issue_row(item)
+                counters["issues"].labels(
+                    ingester=INGESTER_GRAFANA_LABEL, origin=issue.origin
+                ).inc()
+                return issue
+            case "checkouts":
+                checkout = make_checkout_row(item)
+                counters["checkouts"].labels(
+                    ingester=INGESTER_GRAFANA_LABEL, origin=checkout.origin
+                ).inc()
+                return checkout
+            case "builds":
+                build = make_build_row(item)
+
+                try:
+                    misc = item.get("misc")
+                    lab = misc.get("lab")
+                except AttributeError:
+                    lab = None
+
+                counters["builds"].labels(
+                    ingester=INGESTER_GRAFANA_LABEL,
+                    origin=build.origin,
+                    lab=lab,
+                ).inc()
+                return build
+            case "tests":
+                test = make_test_row(item)
+
+                try:
+                    misc = item.get("misc")
+                    lab = misc.get("lab", misc.get("runtime"))
+                except AttributeError:
+                    lab = None
+
+                counters["tests"].labels(
+                    ingester=INGESTER_GRAFANA_LABEL,
+                    origin=test.origin,
+                    lab=lab,
+                    platform=test.platform,
+                ).inc()
+                return test
+            case "incidents":
+                incident = make_incident_row(item)
+                counters["incidents"].labels(
+                    ingester=INGESTER_GRAFANA_LABEL, origin=incident.origin
+                ).inc()
+                return incident
+            case _:
+                raise ValueError(f"Unknown item type: {item_type}")
+    except ValidationError as ve:
+        logger.error(f"Validation error for {item_type} item: {ve}")
+        return None
+    except Exception as e:
+        logger.error(f"{e.__class__.__name__} error for {item_type} item: {e}")
+        return None
+
+
+def build_rows_from_submission(
     data: dict[str, Any], counters: dict[TableNames, Counter]
 ) -> ProcessedSubmission:
     """
-    Convert raw submission dicts into unsaved Django model instances, grouped by type.
+    Convert raw submission dicts into insert rows, grouped by type.
     Per-item errors are logged and the item is skipped, matching the previous behavior.
 
     Params:
@@ -162,76 +358,9 @@ def build_instances_from_submission(
         if not items:
             return
         for item in items:
-            if not isinstance(item, dict):
-                logger.warning(
-                    f"{item_type.capitalize()} data is not a dict, its type is: {type(item)}"
-                )
-                continue
-            try:
-                match item_type:
-                    case "issues":
-                        issue = make_issue_instance(item)
-                        out["issues"].append(issue)
-                        counters["issues"].labels(
-                            ingester=INGESTER_GRAFANA_LABEL, origin=issue.origin
-                        ).inc()
-                    case "checkouts":
-                        checkout = make_checkout_instance(item)
-                        out["checkouts"].append(checkout)
-                        counters["checkouts"].labels(
-                            ingester=INGESTER_GRAFANA_LABEL, origin=checkout.origin
-                        ).inc()
-                    case "builds":
-                        build = make_build_instance(item)
-                        out["builds"].append(build)
-
-                        try:
-                            misc = build.misc
-                            lab = misc.get("lab")
-                        except AttributeError:
-                            lab = None
-
-                        counters["builds"].labels(
-                            ingester=INGESTER_GRAFANA_LABEL,
-                            origin=build.origin,
-                            lab=lab,
-                        ).inc()
-                    case "tests":
-                        test = make_test_instance(item)
-                        out["tests"].append(test)
-
-                        try:
-                            misc = test.misc
-                            lab = misc.get("lab", misc.get("runtime"))
-                        except AttributeError:
-                            lab = None
-
-                        try:
-                            environment_misc = test.environment_misc
-                            platform = environment_misc.get("platform")
-                        except AttributeError:
-                            platform = None
-
-                        counters["tests"].labels(
-                            ingester=INGESTER_GRAFANA_LABEL,
-                            origin=test.origin,
-                            lab=lab,
-                            platform=platform,
-                        ).inc()
-                    case "incidents":
-                        incident = make_incident_instance(item)
-                        out["incidents"].append(incident)
-                        counters["incidents"].labels(
-                            ingester=INGESTER_GRAFANA_LABEL, origin=incident.origin
-                        ).inc()
-                    case _:
-                        raise ValueError(f"Unknown item type: {item_type}")
-            except ValidationError as ve:
-                logger.error(f"Validation error for {item_type} item: {ve}")
-                continue
-            except Exception as e:
-                logger.error(f"{e.__class__.__name__} error for {item_type} item: {e}")
-                continue
+            row = build_row_from_item(item, item_type, counters)
+            if row is not None:
+                out[item_type].append(row)
 
     _process(data.get("issues"), "issues")
     _process(data.get("checkouts"), "checkouts")
@@ -0,0 +1,79 @@
+import time
+
+from kernelCI_app.constants.prune import (
+    PRUNE_MIN_BATCH_SIZE,
+    PRUNE_REPLICA_LAG_CHECK_INTERVAL_SEC,
+    PRUNE_TARGET_BATCH_SEC,
+)
+
+MAX_BATCH_SIZE_STEP = 2
+"""Max factor by which the batch size can grow after a single batch"""
+
+
+def replica_lag(cursor) -> float:
+    """Replay lag, in seconds, of the most lagging replica, 0 without replicas."""
+    cursor.execute(
+        "SELECT COALESCE(EXTRACT(EPOCH FROM max(replay_lag)), 0) "
+        "FROM pg_stat_replication"
+    )
+    return float(cursor.fetchone()[0])
+
+
+class PruneThrottle:
+    """
+    Paces the batches of prune_db so it can run alongside the ingester.
+
+    The batch size starts small and is adapted to the measured batch duration, so
+    that a batch takes around `target_batch_sec`. It is halved when a batch waited
+    for a lock for longer than its budget, or when the replicas lag behind by more
+    than `max_replica_lag_sec`, in which case the next batch also waits for them
+    to catch up.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_batch_size: int,
+        min_batch_size: int = PRUNE_MIN_BATCH_SIZE,
+        target_batch_sec: float = PRUNE_TARGET_BATCH_SEC,
+        max_replica_lag_sec: float,
+        pause_sec: float = 0,
+    ) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.min_batch_size = min(max(1, min_batch_size), self.max_batch_size)
+        self.target_batch_sec = target_batch_sec
+        self.max_replica_lag_sec = max_replica_lag_sec
+        self.pause_sec = pause_sec
+
+        self.batch_size = self.min_batch_size
+
+    def _shrink(self) -> None:
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def record_batch(self, size: int, duration: float) -> None:
+        """Adapts the batch size to the duration of a batch of `size` rows."""
+        if duration <= 0:
+            return
+        estimate = size * self.target_batch_sec / duration
+        estimate = min(estimate, self.batch_size * MAX_BATCH_SIZE_STEP)
+        self.batch_size = int(
+            min(max(estimate, self.min_batch_size), self.max_batch_size)
+        )
+
+    def record_lock_timeout(self) -> None:
+        self._shrink()
+
+    def wait(self, cursor) -> float:
+        """
+        Sleeps before the next batch, until the replicas caught up.
+        Returns the replication lag that was waited for, 0 if there was none.
+        """
+        if self.pause_sec:
+            time.sleep(self.pause_sec)
+
+        waited_lag = 0.0
+        while (lag := replica_lag(cursor)) > self.max_replica_lag_sec:
+            waited_lag = max(waited_lag, lag)
+            self._shrink()
+            time.sleep(PRUNE_REPLICA_LAG_CHECK_INTERVAL_SEC)
+        return waited_lag
@@ -0,0 +1,403 @@
+"""
+Rebuild of tree_tests_rollup in a shadow table, while process_pending_aggregations
+keeps writing to the live one.
+
+The trees to rebuild (a commit of a tree, the scope of the rollup rows) are listed in
+a checkpoint table when the rebuild starts. Workers claim them one at a time, and
+write the rollup rows of a tree to the shadow table in the transaction that marks it
+as rebuilt, together with the processed_items entries of its tests, which are kept
+in a shadow table too, so a rebuild that stops is resumed from the trees that
+weren't rebuilt yet.
+
+Trees that received tests, builds or checkouts after they were rebuilt are rebuilt
+again, the last time while tree_tests_rollup is locked against writes, right before
+the shadow table replaces it. The rows of the trees that weren't rebuilt are copied
+from the live table at that time, and the processed_items entries of the rebuilt
+trees are merged into the live table. Until then, the live tables are only written
+to by process_pending_aggregations, so a rebuild can be abandoned by dropping its
+tables.
+"""
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.db import connection
+
+from kernelCI_app.constants.process_pending import ROLLUP_REBUILD_CATCH_UP_MARGIN
+from kernelCI_app.models import ProcessedItems, TreeTestsRollup
+
+ROLLUP_TABLE = TreeTestsRollup._meta.db_table
+SHADOW_TABLE = f"{ROLLUP_TABLE}_shadow"
+CHECKPOINT_TABLE = f"{ROLLUP_TABLE}_rebuild"
+PROCESSED_TABLE = ProcessedItems._meta.db_table
+PROCESSED_SHADOW_TABLE = f"{PROCESSED_TABLE}_shadow"
+
+TREE_COLUMNS = (
+    "origin",
+    "tree_name",
+    "git_repository_branch",
+    "git_repository_url",
+    "git_commit_hash",
+)
+
+_ROLLUP_COLUMNS = [
+    field.column
+    for field in TreeTestsRollup._meta.concrete_fields
+    if not field.primary_key
+]
+
+_UNIQUE_CONSTRAINT = TreeTestsRollup._meta.constraints[0].name
+
+_COUNT_COLUMNS = [
+    "pass_tests",
+    "fail_tests",
+    "skip_tests",
+    "error_tests",
+    "miss_tests",
+    "done_tests",
+    "null_tests",
+    "total_tests",
+]
+
+
+def _same_tree_sql(left: str, right: str) -> str:
+    return " AND ".join(
+        f"{left}.{column} IS NOT DISTINCT FROM {right}.{column}"
+        for column in TREE_COLUMNS
+    )
+
+
+_CREATE_CHECKPOINT_TABLE_SQL = f"""
+    CREATE TABLE {CHECKPOINT_TABLE} (
+        id integer GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        origin text NOT NULL,
+        tree_name text,
+        git_repository_branch text,
+        git_repository_url text,
+        git_commit_hash text,
+        rebuilt_at timestamptz,
+        failed boolean NOT NULL DEFAULT false,
+        buckets integer NOT NULL DEFAULT 0,
+        tests integer NOT NULL DEFAULT 0
+    )
+"""
+
+_CREATE_PROCESSED_SHADOW_TABLE_SQL = f"""
+    CREATE TABLE {PROCESSED_SHADOW_TABLE} (
+        LIKE {PROCESSED_TABLE},
+        PRIMARY KEY (checkout_id, kind, entity_id)
+    )
+"""
+
+# Most recent trees first, like the checkouts without a rebuild
+_LIST_TREES_SQL = f"""
+    INSERT INTO {CHECKPOINT_TABLE} ({", ".join(TREE_COLUMNS)})
+    SELECT {", ".join(TREE_COLUMNS)}
+    FROM checkouts
+    WHERE %(cutoff)s::timestamptz IS NULL OR start_time >= %(cutoff)s
+    GROUP BY {", ".join(TREE_COLUMNS)}
+    ORDER BY max(start_time) DESC NULLS LAST
+    LIMIT %(limit)s
+"""
+
+_CLAIM_TREE_SQL = f"""
+    SELECT id, {", ".join(TREE_COLUMNS)}
+    FROM {CHECKPOINT_TABLE}
+    WHERE rebuilt_at IS NULL AND NOT failed
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+"""
+
+_CLEAR_SHADOW_TREE_SQL = f"""
+    DELETE FROM {SHADOW_TABLE}
+    WHERE {" AND ".join(f"{column} IS NOT DISTINCT FROM %s" for column in TREE_COLUMNS)}
+"""
+
+_ADD_COUNTS_SQL = ", ".join(
+    f"{column} = {SHADOW_TABLE}.{column} + EXCLUDED.{column}"
+    for column in _COUNT_COLUMNS
+)
+
+# A tree can have rows that only differ by is_boot, which isn't in the constraint
+_INSERT_SHADOW_ROWS_SQL = f"""
+    INSERT INTO {SHADOW_TABLE} (
+        origin, tree_name, git_repository_branch, git_repository_url,
+        git_commit_hash, path_group, build_config_name, build_architecture,
+        build_compiler, hardware_key, test_platform, test_lab, test_origin,
+        issue_id, issue_version, issue_uncategorized, is_boot,
+        {", ".join(_COUNT_COLUMNS)}
+    )
+    VALUES (
+        %(origin)s, %(tree_name)s, %(git_repository_branch)s,
+        %(git_repository_url)s, %(git_commit_hash)s, %(path_group)s,
+        %(config)s, %(arch)s, %(compiler)s, %(hardware_key)s,
+        %(platform)s, %(lab)s, %(test_origin)s, %(issue_id)s,
+        %(issue_version)s, %(issue_uncategorized)s, %(is_boot)s,
+        {", ".join(f"%({column})s" for column in _COUNT_COLUMNS)}
+    )
+    ON CONFLICT ON CONSTRAINT {_UNIQUE_CONSTRAINT}_shadow DO UPDATE SET
+        {_ADD_COUNTS_SQL}
+"""
+
+_INSERT_PROCESSED_SHADOW_ROWS_SQL = f"""
+    INSERT INTO {PROCESSED_SHADOW_TABLE} (checkout_id, kind, entity_id, status)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (checkout_id, kind, entity_id) DO UPDATE SET status = EXCLUDED.status
+"""
+
+_MERGE_PROCESSED_SQL = f"""
+    INSERT INTO {PROCESSED_TABLE} (checkout_id, kind, entity_id, status)
+    SELECT checkout_id, kind, entity_id, status FROM {PROCESSED_SHADOW_TABLE}
+    ON CONFLICT (checkout_id, kind, entity_id) DO UPDATE SET status = EXCLUDED.status
+"""
+
+_TREE_COLUMNS_SQL = ", ".join(f"c.{column}" for column in TREE_COLUMNS)
+
+# Trees with tests, builds or checkouts ingested since they were rebuilt. A test
+# ingested before the rebuild of its tree is only aggregated once its build and
+# checkout are ingested, which can be after the rebuild.
+_REQUEUE_UPDATED_TREES_SQL = f"""
+    WITH since AS (
+        SELECT min(rebuilt_at) - %(margin)s::interval AS at FROM {CHECKPOINT_TABLE}
+    ),
+    ingested AS (
+        SELECT {_TREE_COLUMNS_SQL}, t._timestamp AS ingested_at
+        FROM tests t
+        JOIN builds b ON b.id = t.build_id
+        JOIN checkouts c ON c.id = b.checkout_id
+        WHERE t._timestamp >= (SELECT at FROM since)
+        UNION ALL
+        SELECT {_TREE_COLUMNS_SQL}, b._timestamp
+        FROM builds b
+        JOIN checkouts c ON c.id = b.checkout_id
+        WHERE b._timestamp >= (SELECT at FROM since)
+        UNION ALL
+        SELECT {_TREE_COLUMNS_SQL}, c._timestamp
+        FROM checkouts c
+        WHERE c._timestamp >= (SELECT at FROM since)
+    ),
+    updated AS (
+        SELECT {", ".join(TREE_COLUMNS)}, max(ingested_at) AS last_ingested_at
+        FROM ingested
+        GROUP BY {", ".join(TREE_COLUMNS)}
+    )
+    UPDATE {CHECKPOINT_TABLE} r
+    SET rebuilt_at = NULL
+    FROM updated u
+    WHERE {_same_tree_sql("r", "u")}
+        AND u.last_ingested_at >= r.rebuilt_at - %(margin)s::interval
+"""
+
+_COPY_NOT_REBUILT_TREES_SQL = f"""
+    INSERT INTO {SHADOW_TABLE} ({", ".join(_ROLLUP_COLUMNS)})
+    SELECT {", ".join(_ROLLUP_COLUMNS)}
+    FROM {ROLLUP_TABLE} l
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {CHECKPOINT_TABLE} r WHERE {_same_tree_sql("r", "l")}
+    )
+"""
+
+
+class RebuildTree(NamedTuple):
+    id: int
+    origin: str
+    tree_name: Optional[str]
+    git_repository_branch: Optional[str]
+    git_repository_url: Optional[str]
+    git_commit_hash: Optional[str]
+
+    @property
+    def filters(self) -> dict[str, Optional[str]]:
+        """Columns of the tree, to filter its checkouts."""
+        return {column: getattr(self, column) for column in TREE_COLUMNS}
+
+    def __str__(self) -> str:
+        return (
+            f"{self.origin}/{self.tree_name}/{self.git_repository_branch}"
+            f"@{str(self.git_commit_hash)[:12]}"
+        )
+
+
+class RebuildSummary(NamedTuple):
+    trees: int
+    rebuilt: int
+    failed: int
+    buckets: int
+    tests: int
+
+
+def _create_shadow_table_statements() -> list[str]:
+    """
+    The shadow table has the columns, constraints and indexes of tree_tests_rollup,
+    with their names suffixed by `_shadow` until it replaces it.
+    """
+    meta = TreeTestsRollup._meta
+
+    def columns(fields: list[str]) -> str:
+        return ", ".join(meta.get_field(field).column for field in fields)
+
+    statements = [
+        f"CREATE TABLE {SHADOW_TABLE} "
+        f"(LIKE {ROLLUP_TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY)",
+        f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT {ROLLUP_TABLE}_pkey_shadow "
+        f"PRIMARY KEY ({meta.pk.column})",
+    ]
+    for constraint in meta.constraints:
+        nulls = " NULLS NOT DISTINCT" if constraint.nulls_distinct is False else ""
+        statements.append(
+            f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT {constraint.name}_shadow "
+            f"UNIQUE{nulls} ({columns(constraint.fields)})"
+        )
+    for index in meta.indexes:
+        statements.append(
+            f"CREATE INDEX {index.name}_shadow ON {SHADOW_TABLE} "
+            f"({columns(index.fields)})"
+        )
+    return statements
+
+
+def rebuild_exists() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [CHECKPOINT_TABLE])
+        return cursor.fetchone()[0]
+
+
+def start_rebuild(*, cutoff: Optional[datetime], limit: Optional[int]) -> int:
+    """
+    Creates the shadow and checkpoint tables, and lists the trees of the checkouts
+    started since `cutoff`, the `limit` most recent ones.
+    Returns the number of trees to rebuild.
+    """
+    with connection.cursor() as cursor:
+        for statement in _create_shadow_table_statements():
+            cursor.execute(statement)
+        cursor.execute(_CREATE_PROCESSED_SHADOW_TABLE_SQL)
+        cursor.execute(_CREATE_CHECKPOINT_TABLE_SQL)
+        cursor.execute(_LIST_TREES_SQL, {"cutoff": cutoff, "limit": limit})
+        return cursor.rowcount
+
+
+def claim_tree() -> Optional[RebuildTree]:
+    """
+    Returns the next tree to rebuild, locked until the end of the transaction, or
+    None if there is no tree left to rebuild.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_CLAIM_TREE_SQL)
+        row = cursor.fetchone()
+    return RebuildTree(*row) if row else None
+
+
+def write_shadow_tree(tree: RebuildTree, values: list[dict]) -> None:
+    """Replaces the rollup rows of a tree in the shadow table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _CLEAR_SHADOW_TREE_SQL, [getattr(tree, column) for column in TREE_COLUMNS]
+        )
+        if values:
+            cursor.executemany(_INSERT_SHADOW_ROWS_SQL, values)
+
+
+def write_shadow_processed_items(processed_rows: list[ProcessedItems]) -> None:
+    """Records the processed_items entries of a rebuilt tree until the swap."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            _INSERT_PROCESSED_SHADOW_ROWS_SQL,
+            [
+                (row.checkout_id, row.kind, row.entity_id, row.status)
+                for row in processed_rows
+            ],
+        )
+
+
+def mark_tree_rebuilt(tree: RebuildTree, *, buckets: int, tests: int) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {CHECKPOINT_TABLE}
+            SET rebuilt_at = now(), failed = false, buckets = %s, tests = %s
+            WHERE id = %s
+            """,
+            [buckets, tests, tree.id],
+        )
+
+
+def mark_tree_failed(tree: RebuildTree) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {CHECKPOINT_TABLE} SET failed = true WHERE id = %s", [tree.id]
+        )
+
+
+def retry_failed_trees() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {CHECKPOINT_TABLE} SET failed = false WHERE failed")
+        return cursor.rowcount
+
+
+def requeue_updated_trees() -> int:
+    """
+    Marks the trees that received tests, builds or checkouts since they were
+    rebuilt to be rebuilt again. Returns their number.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _REQUEUE_UPDATED_TREES_SQL, {"margin": ROLLUP_REBUILD_CATCH_UP_MARGIN}
+        )
+        return cursor.rowcount
+
+
+def rebuild_summary() -> RebuildSummary:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT count(*), count(rebuilt_at), count(*) FILTER (WHERE failed),
+                coalesce(sum(buckets), 0), coalesce(sum(tests), 0)
+            FROM {CHECKPOINT_TABLE}
+            """
+        )
+        return RebuildSummary(*cursor.fetchone())
+
+
+def lock_rollup_table() -> None:
+    """Blocks the writes to tree_tests_rollup until the end of the transaction."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {ROLLUP_TABLE} IN EXCLUSIVE MODE")
+
+
+def swap_rollup_tables() -> None:
+    """
+    Copies the rows of the trees that weren't rebuilt to the shadow table, which
+    then replaces tree_tests_rollup, merges the processed_items entries of the
+    rebuilt trees, and drops the rebuild tables. Must run in the transaction holding
+    the lock of `lock_rollup_table`.
+    """
+    meta = TreeTestsRollup._meta
+    names = [
+        f"{ROLLUP_TABLE}_pkey",
+        *(constraint.name for constraint in meta.constraints),
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(_COPY_NOT_REBUILT_TREES_SQL)
+        cursor.execute(_MERGE_PROCESSED_SQL)
+        cursor.execute(f"DROP TABLE {PROCESSED_SHADOW_TABLE}")
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, %s), pg_get_serial_sequence(%s, %s)",
+            [ROLLUP_TABLE, meta.pk.column, SHADOW_TABLE, meta.pk.column],
+        )
+        sequence, shadow_sequence = cursor.fetchone()
+
+        cursor.execute(f"DROP TABLE {ROLLUP_TABLE}")
+        cursor.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {ROLLUP_TABLE}")
+        for name in names:
+            cursor.execute(
+                f"ALTER TABLE {ROLLUP_TABLE} RENAME CONSTRAINT {name}_shadow TO {name}"
+            )
+        for index in meta.indexes:
+            cursor.execute(f"ALTER INDEX {index.name}_shadow RENAME TO {index.name}")
+        cursor.execute(
+            f"ALTER SEQUENCE {shadow_sequence} RENAME TO {sequence.split('.')[-1]}"
+        )
+        cursor.execute(f"DROP TABLE {CHECKPOINT_TABLE}")
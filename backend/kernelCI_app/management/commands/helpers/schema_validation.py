@@ -0,0 +1,292 @@
+"""
+Fast validation of kcidb submissions.
+
+kcidb_io validates with a generic jsonschema validator, which walks the schema
+again for every one of the (tens of thousands of) tests in a submission. Here the
+schema is compiled once per process into plain python code that only answers
+whether the data is valid. Errors are still produced by kcidb_io, so invalid
+data gets the exact same error messages as before.
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+import jsonschema
+import kcidb_io
+
+from kernelCI_app.constants.ingester import INGEST_STRICT_VALIDATION
+
+logger = logging.getLogger("ingester")
+
+type SchemaVersion = type[kcidb_io.schema.abstract.Version]
+type CompiledValidator = Callable[[Any], bool]
+
+FORMAT_CHECKER = jsonschema.Draft7Validator.FORMAT_CHECKER
+"""Same format checker used by kcidb_io, so that formats are checked the same way"""
+
+_ANNOTATION_KEYWORDS = {"title", "description", "examples", "default", "$defs"}
+
+_TYPE_CHECKS = {
+    "string": "isinstance({v}, str)",
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "boolean": "isinstance({v}, bool)",
+    "null": "{v} is None",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    # Draft 7 accepts floats without a fractional part as integers
+    "integer": (
+        "((isinstance({v}, int) and not isinstance({v}, bool))"
+        " or (isinstance({v}, float) and {v}.is_integer()))"
+    ),
+}
+
+# Keywords that only apply to values of a certain type
+_STRING_KEYWORDS = {"pattern", "format", "maxLength"}
+_NUMBER_KEYWORDS = {"minimum", "maximum"}
+_OBJECT_KEYWORDS = {"properties", "required", "additionalProperties"}
+_ARRAY_KEYWORDS = {"items"}
+
+_SUPPORTED_KEYWORDS = (
+    _ANNOTATION_KEYWORDS
+    | _STRING_KEYWORDS
+    | _NUMBER_KEYWORDS
+    | _OBJECT_KEYWORDS
+    | _ARRAY_KEYWORDS
+    | {"type", "enum", "const", "$ref"}
+)
+
+
+class UnsupportedSchemaError(Exception):
+    """The schema uses a feature that the compiler doesn't handle"""
+
+
+class _SchemaCompiler:
+    """
+    Generates the source of a function that returns whether a value is valid for
+    a Draft 7 json schema. Only the keywords used by the kcidb schemas are supported,
+    anything else raises UnsupportedSchemaError.
+    """
+
+    def __init__(self, root: dict[str, Any]) -> None:
+        self.root = root
+        self.lines: list[str] = []
+        self.namespace: dict[str, Any] = {"FORMAT_CHECKER": FORMAT_CHECKER}
+        self.ref_functions: dict[str, str] = {}
+        self.pending_refs: list[tuple[str, Any]] = []
+        self.counter = 0
+
+    def _name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def _constant(self, value: Any) -> str:
+        name = self._name("_c")
+        self.namespace[name] = value
+        return name
+
+    def _emit(self, indent: int, line: str) -> None:
+        self.lines.append("    " * indent + line)
+
+    def _ref_function(self, ref: str) -> str:
+        if ref not in self.ref_functions:
+            if not ref.startswith("#/"):
+                raise UnsupportedSchemaError(f"Only local $ref are supported: {ref}")
+            schema: Any = self.root
+            for part in ref[2:].split("/"):
+                schema = schema[part.replace("~1", "/").replace("~0", "~")]
+            name = self._name("_ref")
+            self.ref_functions[ref] = name
+            self.pending_refs.append((name, schema))
+        return self.ref_functions[ref]
+
+    def _function(self, name: str, schema: Any) -> None:
+        self._emit(0, f"def {name}(v):")
+        self._schema(schema, "v", 1)
+        self._emit(1, "return True")
+        self._emit(0, "")
+
+    def compile(self) -> CompiledValidator:
+        self._function("validate", self.root)
+        while self.pending_refs:
+            self._function(*self.pending_refs.pop())
+
+        exec("\n".join(self.lines), self.namespace)  # noqa: S102 - generated code
+        return self.namespace["validate"]
+
+    def _schema(self, schema: Any, v: str, indent: int) -> None:  # noqa: C901
+        if schema is True:
+            return
+        if schema is False:
+            self._emit(indent, "return False")
+            return
+        if not isinstance(schema, dict):
+            raise UnsupportedSchemaError(f"Invalid schema: {schema!r}")
+
+        unsupported = set(schema) - _SUPPORTED_KEYWORDS
+        if unsupported:
+            raise UnsupportedSchemaError(f"Unsupported keywords: {unsupported}")
+
+        # In draft 7, $ref makes the validator ignore the other keywords
+        if "$ref" in schema:
+            function = self._ref_function(schema["$ref"])
+            self._emit(indent, f"if not {function}({v}): return False")
+            return
+
+        types = schema.get("type")
+        if isinstance(types, str):
+            types = [types]
+        if types is not None:
+            unknown_types = set(types) - set(_TYPE_CHECKS)
+            if unknown_types:
+                raise UnsupportedSchemaError(f"Unsupported types: {unknown_types}")
+            checks = " or ".join(_TYPE_CHECKS[t].format(v=v) for t in types)
+            self._emit(indent, f"if not ({checks}): return False")
+
+        if "enum" in schema:
+            self._enum(schema["enum"], v, indent)
+        if "const" in schema:
+            self._enum([schema["const"]], v, indent)
+
+        # When the type is known, keywords for other types can't apply and the
+        # ones for this type don't need to check the type again
+        single_type = types[0] if types is not None and len(types) == 1 else None
+        for keywords, json_type, python_type, emit in (
+            (_STRING_KEYWORDS, "string", "str", self._string),
+            (_NUMBER_KEYWORDS, "number", "(int, float)", self._number),
+            (_OBJECT_KEYWORDS, "object", "dict", self._object),
+            (_ARRAY_KEYWORDS, "array", "list", self._array),
+        ):
+            if not keywords & set(schema):
+                continue
+            if single_type == json_type or (
+                json_type == "number" and single_type == "integer"
+            ):
+                emit(schema, v, indent)
+            elif single_type is None:
+                guard = f"isinstance({v}, {python_type})"
+                if json_type == "number":
+                    guard += f" and not isinstance({v}, bool)"
+                self._emit(indent, f"if {guard}:")
+                emit(schema, v, indent + 1)
+
+    def _enum(self, values: list[Any], v: str, indent: int) -> None:
+        # jsonschema compares booleans and numbers strictly, only simple cases are handled
+        if all(isinstance(value, str) for value in values):
+            options = self._constant(frozenset(values))
+            self._emit(
+                indent,
+                f"if not (isinstance({v}, str) and {v} in {options}): return False",
+            )
+        elif all(
+            isinstance(value, (int, float)) and not isinstance(value, bool)
+            for value in values
+        ):
+            options = self._constant(tuple(values))
+            self._emit(
+                indent,
+                f"if isinstance({v}, bool) or not isinstance({v}, (int, float))"
+                f" or {v} not in {options}: return False",
+            )
+        else:
+            raise UnsupportedSchemaError(f"Unsupported enum: {values!r}")
+
+    def _string(self, schema: dict[str, Any], v: str, indent: int) -> None:
+        if "maxLength" in schema:
+            self._emit(
+                indent, f"if len({v}) > {int(schema['maxLength'])}: return False"
+            )
+        if "pattern" in schema:
+            pattern = self._constant(re.compile(schema["pattern"]))
+            self._emit(indent, f"if {pattern}.search({v}) is None: return False")
+        if "format" in schema:
+            self._emit(
+                indent,
+                f"if not FORMAT_CHECKER.conforms({v}, {schema['format']!r}):"
+                " return False",
+            )
+
+    def _number(self, schema: dict[str, Any], v: str, indent: int) -> None:
+        if "minimum" in schema:
+            self._emit(indent, f"if {v} < {schema['minimum']!r}: return False")
+        if "maximum" in schema:
+            self._emit(indent, f"if {v} > {schema['maximum']!r}: return False")
+
+    def _object(self, schema: dict[str, Any], v: str, indent: int) -> None:
+        for key in schema.get("required", []):
+            self._emit(indent, f"if {key!r} not in {v}: return False")
+
+        properties: dict[str, Any] = schema.get("properties", {})
+        for key, subschema in properties.items():
+            value = self._name("v")
+            self._emit(indent, f"if {key!r} in {v}:")
+            self._emit(indent + 1, f"{value} = {v}[{key!r}]")
+            self._schema(subschema, value, indent + 1)
+
+        additional = schema.get("additionalProperties", True)
+        if additional is True:
+            return
+        known = self._constant(frozenset(properties))
+        if additional is False:
+            self._emit(indent, f"if not {known}.issuperset({v}): return False")
+            return
+        key, value = self._name("k"), self._name("v")
+        self._emit(indent, f"for {key}, {value} in {v}.items():")
+        self._emit(indent + 1, f"if {key} not in {known}:")
+        self._schema(additional, value, indent + 2)
+
+    def _array(self, schema: dict[str, Any], v: str, indent: int) -> None:
+        items = schema["items"]
+        if isinstance(items, list):
+            raise UnsupportedSchemaError("Tuple validation is not supported")
+        item = self._name("v")
+        self._emit(indent, f"for {item} in {v}:")
+        self._schema(items, item, indent + 1)
+
+
+def compile_schema(schema: dict[str, Any]) -> CompiledValidator:
+    """
+    Compiles a Draft 7 json schema into a function that returns whether a value
+    is valid. Raises UnsupportedSchemaError if the schema uses unsupported features.
+    """
+    return _SchemaCompiler(schema).compile()
+
+
+@lru_cache(maxsize=None)
+def get_compiled_validator(version: SchemaVersion) -> Optional[CompiledValidator]:
+    """
+    Returns the compiled validator of a kcidb schema version, compiling it on the
+    first call of each process. Returns None if the schema can't be compiled.
+    """
+    try:
+        return compile_schema(version.json)
+    except UnsupportedSchemaError as e:
+        logger.warning("Using kcidb_io validation for %s: %s", version, e)
+        return None
+
+
+def validate_submission(
+    data: dict[str, Any],
+    schema: SchemaVersion = kcidb_io.schema.V5_3,
+    *,
+    strict: Optional[bool] = None,
+) -> None:
+    """
+    Drop-in replacement for `schema.validate(data)`.
+
+    Valid data is accepted by the compiled validator alone. Data that the compiled
+    validator rejects is validated again by kcidb_io, which raises the usual
+    `jsonschema.exceptions.ValidationError`. With `strict` (default:
+    INGEST_STRICT_VALIDATION) only kcidb_io is used.
+    """
+    if strict is None:
+        strict = INGEST_STRICT_VALIDATION
+
+    if not strict and isinstance(data, dict):
+        version = schema.get_exactly_compatible(data)
+        validator = get_compiled_validator(version) if version is not None else None
+        if validator is not None and validator(data):
+            return
+
+    schema.validate(data)
@@ -0,0 +1,125 @@
+"""
+Streaming of tables to and from the members of a snapshot archive, see the
+update_db command.
+
+A snapshot is a tar archive with a member per table, `<table>.csv.gz`: the rows of
+the table in the CSV format of COPY, with a header naming the columns, gzipped. The
+rows go from COPY straight into the compressed member and back, so memory doesn't
+grow with the size of the tables.
+"""
+
+import csv
+import gzip
+from typing import BinaryIO, Callable
+
+from django.db import connection
+
+from kernelCI_app.helpers.database import is_partitioned
+
+SNAPSHOT_MEMBER_SUFFIX = ".csv.gz"
+SNAPSHOT_COMPRESS_LEVEL = 6
+COPY_CHUNK_BYTES = 1024**2  # 1 MiB
+
+_STAGING_TABLE = "_restore_staging"
+
+
+def member_name(table: str) -> str:
+    return f"{table}{SNAPSHOT_MEMBER_SUFFIX}"
+
+
+def export_snapshot(cursor) -> str:
+    """
+    Starts a repeatable read transaction and returns the id of its snapshot, for the
+    transactions of the other connections to see the same rows, see use_snapshot.
+    The snapshot lasts as long as the transaction.
+    """
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("SELECT pg_export_snapshot()")
+    return cursor.fetchone()[0]
+
+
+def use_snapshot(cursor, snapshot_id: str) -> None:
+    """Makes the current transaction see the rows of an exported snapshot."""
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("SET TRANSACTION SNAPSHOT %s", [snapshot_id])
+
+
+def copy_query_to_file(
+    cursor,
+    query: str,
+    params: list,
+    file: BinaryIO,
+    *,
+    on_progress: Callable[[int], None],
+) -> int:
+    """
+    Writes the rows of `query` to `file` as a gzipped CSV with a header, calling
+    `on_progress` with the number of bytes of each chunk of CSV. Returns the number
+    of rows.
+    """
+    with gzip.GzipFile(
+        fileobj=file, mode="wb", compresslevel=SNAPSHOT_COMPRESS_LEVEL, mtime=0
+    ) as gz:
+        with cursor.copy(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", params
+        ) as copy:
+            for data in copy:
+                gz.write(data)
+                on_progress(len(data))
+    return cursor.rowcount
+
+
+def copy_file_to_table(
+    table: str, file: BinaryIO, *, on_progress: Callable[[int], None]
+) -> tuple[int, int]:
+    """
+    Inserts the rows of a gzipped CSV written by copy_query_to_file into `table`,
+    skipping the rows that conflict with existing ones. The rows are copied to a
+    staging table first, so it must run in a transaction. Returns the number of rows
+    read and inserted.
+
+    The primary key of a partitioned table includes the partition key, which is set
+    again on insert, so the rows whose id exists are skipped explicitly.
+    """
+    quote_name = connection.ops.quote_name
+    with gzip.GzipFile(fileobj=file, mode="rb") as gz:
+        header = gz.readline().decode()
+        columns = ", ".join(quote_name(column) for column in next(csv.reader([header])))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE {_STAGING_TABLE} ON COMMIT DROP AS
+                SELECT {columns} FROM {quote_name(table)} WITH NO DATA
+                """
+            )
+            with cursor.copy(
+                f"COPY {_STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)"
+            ) as copy:
+                while data := gz.read(COPY_CHUNK_BYTES):
+                    copy.write(data)
+                    on_progress(len(data))
+            read = cursor.rowcount
+
+            existing_condition = (
+                f"""
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {quote_name(table)} existing
+                    WHERE existing.id = {_STAGING_TABLE}.id
+                )
+                """
+                if is_partitioned(cursor, table)
+                else ""
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {quote_name(table)} ({columns})
+                SELECT {columns} FROM {_STAGING_TABLE}
+                {existing_condition}
+                ON CONFLICT DO NOTHING
+                """
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f"DROP TABLE {_STAGING_TABLE}")
+
+    return read, inserted
@@ -0,0 +1,250 @@
+"""
+Incremental watcher of the ingester spool directory.
+
+Instead of scanning the whole spool every cycle, the pending .json files are kept
+in a queue in arrival order. On Linux the queue is updated from inotify events;
+elsewhere (or if inotify can't be used) the spool is polled, but only files that
+are not queued yet are looked at.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Self
+
+from kernelCI_app.constants.ingester import INGEST_SPOOL_RESCAN_SEC
+
+logger = logging.getLogger("ingester")
+
+SUBMISSION_EXTENSION = ".json"
+
+# Values from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+"""Files are queued once they are completely written (closed) or moved into the spool.
+Files leaving the spool are not watched: every ingested file is moved out of the
+spool, and those events alone would overflow the inotify queue on large batches."""
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 1024 * 1024
+
+
+class _Inotify:
+    """Minimal inotify binding through libc, watching a single directory."""
+
+    def __init__(self, path: str) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if sys.platform != "linux" or libc_name is None:
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {path}")
+
+    def read_events(self, timeout: float) -> list[tuple[int, str]]:
+        """Waits up to `timeout` seconds for events, returning `(mask, name)` pairs."""
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + name_len].rstrip(b"\0"))
+                offset += name_len
+                events.append((mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class SpoolWatcher:
+    """
+    Queue of the submission files waiting in `spool_dir`, in arrival order.
+
+    Files are taken from the queue with `take`, which skips the files that left the
+    spool by other means (e.g. renamed or deleted) since they were queued. The whole
+    spool is only scanned on start, after an inotify queue overflow and every
+    INGEST_SPOOL_RESCAN_SEC, to pick up files that are still in the spool after being
+    taken (e.g. a file that couldn't be moved after its ingestion).
+
+    Taken files stay in the spool while they are ingested, so scans skip them until
+    `release_taken` is called, once everything taken so far is ingested or failed.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        use_inotify: bool = True,
+        rescan_interval: float = INGEST_SPOOL_RESCAN_SEC,
+    ) -> None:
+        self.spool_dir = spool_dir
+        self.rescan_interval = rescan_interval
+        self.pending: OrderedDict[str, None] = OrderedDict()
+        # Taken files that may still be ingested, which scans must not queue again
+        self.taken: set[str] = set()
+        self.last_scan = 0.0
+        self.inotify: Optional[_Inotify] = None
+
+        if use_inotify:
+            try:
+                self.inotify = _Inotify(spool_dir)
+            except OSError as e:
+                logger.warning(
+                    "Could not watch %s with inotify, polling instead: %s",
+                    spool_dir,
+                    e,
+                )
+
+        # The watch starts before the first scan so that no file is missed in between
+        self.rescan()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.inotify is not None else "poll"
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _add(self, names: Iterable[str]) -> None:
+        for name in names:
+            if name.endswith(SUBMISSION_EXTENSION) and name not in self.pending:
+                self.pending[name] = None
+
+    def _scan_new_files(self) -> list[str]:
+        """
+        Returns the files in the spool that are not queued nor taken, oldest first.
+        Taken files that left the spool are forgotten.
+        """
+        new_files = []
+        still_taken = set()
+        with os.scandir(self.spool_dir) as it:
+            for entry in it:
+                if entry.name in self.taken:
+                    still_taken.add(entry.name)
+                elif (
+                    entry.name.endswith(SUBMISSION_EXTENSION)
+                    and entry.name not in self.pending
+                ):
+                    try:
+                        if entry.is_file():
+                            new_files.append((entry.stat().st_mtime, entry.name))
+                    except FileNotFoundError:
+                        continue
+        self.taken = still_taken
+        new_files.sort()
+        return [name for _, name in new_files]
+
+    def rescan(self) -> int:
+        """
+        Adds the files in the spool that are not queued. Returns how many were added.
+        Raises PermissionError if the spool can't be read, other errors are logged.
+        """
+        try:
+            new_files = self._scan_new_files()
+        except PermissionError:
+            raise
+        except OSError:
+            logger.warning(
+                "Error scanning spool directory: %s", self.spool_dir, exc_info=True
+            )
+            return 0
+        self.last_scan = time.monotonic()
+        self._add(new_files)
+        return len(new_files)
+
+    def _handle_events(self, events: list[tuple[int, str]]) -> None:
+        for mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(
+                    "inotify queue overflowed, rescanning %s", self.spool_dir
+                )
+                self.rescan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                logger.error(
+                    "Spool directory %s was removed or moved, polling instead",
+                    self.spool_dir,
+                )
+                self.close()
+            elif mask & IN_ISDIR:
+                continue
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                # A new file, even if one with the same name was taken before
+                self.taken.discard(name)
+                self._add((name,))
+
+    def _update(self, timeout: float) -> None:
+        if time.monotonic() - self.last_scan >= self.rescan_interval:
+            self.rescan()
+
+        if self.inotify is not None:
+            events = self.inotify.read_events(0 if self.pending else timeout)
+            self._handle_events(events)
+        elif not self.pending and not self.rescan():
+            time.sleep(max(timeout, 0))
+            self.rescan()
+
+    def take(self, max_files: int, timeout: float) -> list[str]:
+        """
+        Removes up to `max_files` files from the queue, returning their paths.
+        If the queue is empty, waits up to `timeout` seconds for new files.
+        """
+        self._update(timeout)
+
+        taken = []
+        while self.pending and len(taken) < max_files:
+            name, _ = self.pending.popitem(last=False)
+            path = os.path.join(self.spool_dir, name)
+            if os.path.lexists(path):
+                taken.append(path)
+                self.taken.add(name)
+        return taken
+
+    def release_taken(self) -> None:
+        """
+        Lets the next scans queue the taken files again, to be called when all of
+        them are ingested or failed, so that only the files left in the spool by
+        their ingestion are queued.
+        """
+        self.taken.clear()
@@ -0,0 +1,693 @@
+"""
+Set-based engine of process_pending_aggregations.
+
+Instead of loading the pending items in Python, a batch of pending tests and builds
+of the sealed slot of the queue is joined to its builds and checkouts into temporary
+tables, and each
+aggregate is updated by a single `INSERT ... SELECT ... GROUP BY` statement that also
+records the processed items. Items that were already counted are excluded by joining
+processed_items on the same keys as the Python engine, so both engines produce the
+same aggregates and can be used interchangeably on the same database.
+
+The ingester uses the same statements to aggregate the tests and builds of a flush
+right away, see aggregate_ingested_items.
+
+The statements follow the Python engine (process_pending_aggregations.py) rule by
+rule, including its corner cases: hardware_status records are created for every
+test with a platform even if nothing is counted, the compatibles of a record come
+from its first test, and a build whose null status is corrected has its
+`build_inc` decremented once per counted test of the build.
+"""
+
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from kernelCI_app.constants.general import MAESTRO_DUMMY_BUILD_PREFIX, UNKNOWN_STRING
+from kernelCI_app.constants.process_pending import (
+    AGGREGATION_BUILD_LOCK,
+    ROLLUP_STATUS_FIELDS,
+)
+from kernelCI_app.management.commands.helpers.aggregation_shards import (
+    pending_build_shard,
+    pending_test_shard,
+)
+from kernelCI_app.management.commands.helpers.process_pending_helpers import (
+    EMPTY_PATH_GROUP,
+    LOCK_AGGREGATED_BUILDS_SQL,
+)
+from kernelCI_app.models import ProcessedItemKind
+
+if TYPE_CHECKING:
+    from kernelCI_app.management.commands.helpers.pending_queue import QueuePosition
+
+# Rows are deleted on commit, so each batch starts with empty tables
+_CREATE_READY_TABLES_SQL = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS aggregation_ready_tests (
+        test_id text PRIMARY KEY,
+        origin text NOT NULL,
+        platform text,
+        compatible text[],
+        build_id text NOT NULL,
+        status text,
+        is_boot boolean NOT NULL,
+        full_status text,
+        lab text,
+        path text,
+        build_status text,
+        build_architecture text,
+        build_compiler text,
+        build_config_name text,
+        checkout_id text NOT NULL,
+        checkout_origin text NOT NULL,
+        tree_name text,
+        git_repository_url text,
+        git_repository_branch text,
+        git_commit_hash text,
+        start_time timestamptz
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMPORARY TABLE IF NOT EXISTS aggregation_ready_builds (
+        build_id text PRIMARY KEY,
+        status text,
+        checkout_id text NOT NULL,
+        checkout_origin text NOT NULL,
+        tree_name text,
+        git_repository_url text,
+        git_repository_branch text,
+        git_commit_hash text
+    ) ON COMMIT DELETE ROWS;
+"""
+
+# Status of the build of a test, simplified like simplify_status
+_BUILD_STATUS_SQL = """
+    CASE
+        WHEN b.status IS NULL THEN NULL
+        WHEN b.status = 'PASS' THEN 'P'
+        WHEN b.status = 'FAIL' THEN 'F'
+        ELSE 'I'
+    END
+"""
+
+# Tests and builds of an ingester flush, with the same columns as the pending tables.
+# Their slot is the active slot of the queue, like when they are queued.
+INGESTED_TESTS_TABLE = "ingested_pending_tests"
+INGESTED_BUILDS_TABLE = "ingested_pending_builds"
+
+_CREATE_INGESTED_TABLES_SQL = f"""
+    CREATE TEMPORARY TABLE IF NOT EXISTS {INGESTED_TESTS_TABLE} (
+        LIKE pending_test INCLUDING DEFAULTS, PRIMARY KEY (test_id, slot)
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMPORARY TABLE IF NOT EXISTS {INGESTED_BUILDS_TABLE} (
+        LIKE pending_builds INCLUDING DEFAULTS, PRIMARY KEY (build_id, slot)
+    ) ON COMMIT DELETE ROWS;
+"""
+
+# A transaction of the ingester can aggregate several times (e.g. when a flush is
+# retried by halves), so the tables are emptied before each time
+_CLEAR_INGESTED_TABLES_SQL = f"""
+    DELETE FROM {INGESTED_TESTS_TABLE};
+    DELETE FROM {INGESTED_BUILDS_TABLE};
+    DELETE FROM aggregation_ready_tests;
+    DELETE FROM aggregation_ready_builds;
+"""
+
+# The batch is read like in the Python engine, the returned last id moves past the
+# tests without build or builds without checkout, which are parked by the rotation
+_READ_PENDING_TESTS_SQL = f"""
+    WITH batch AS (
+        SELECT * FROM pending_test
+        WHERE slot = %s {{filters}}
+        ORDER BY test_id
+        LIMIT %s
+    ),
+    ready AS (
+        INSERT INTO aggregation_ready_tests
+        SELECT
+            t.test_id, t.origin, t.platform, t.compatible, t.build_id, t.status,
+            t.is_boot, t.full_status, t.lab, t.path,
+            {_BUILD_STATUS_SQL},
+            b.architecture, b.compiler, b.config_name,
+            c.id, c.origin, c.tree_name, c.git_repository_url,
+            c.git_repository_branch, c.git_commit_hash, c.start_time
+        FROM batch t
+        JOIN builds b ON b.id = t.build_id
+        JOIN checkouts c ON c.id = b.checkout_id
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM batch),
+        (SELECT test_id FROM batch ORDER BY test_id DESC LIMIT 1),
+        (SELECT count(*) FROM ready)
+"""
+
+_READ_PENDING_BUILDS_SQL = """
+    WITH batch AS (
+        SELECT * FROM pending_builds
+        WHERE slot = %s {filters}
+        ORDER BY build_id
+        LIMIT %s
+    ),
+    ready AS (
+        INSERT INTO aggregation_ready_builds
+        SELECT
+            b.build_id, b.status,
+            c.id, c.origin, c.tree_name, c.git_repository_url,
+            c.git_repository_branch, c.git_commit_hash
+        FROM batch b
+        JOIN checkouts c ON c.id = b.checkout_id
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM batch),
+        (SELECT build_id FROM batch ORDER BY build_id DESC LIMIT 1),
+        (SELECT count(*) FROM ready)
+"""
+
+# Items that are already pending are left to process_pending_aggregations, which
+# may be counting them right now. The ingester holds the lock of their tests and
+# builds rows, so no other flush can add them to the pending tables meanwhile.
+_READY_INGESTED_TESTS_SQL = f"""
+    INSERT INTO aggregation_ready_tests
+    SELECT
+        t.test_id, t.origin, t.platform, t.compatible, t.build_id, t.status,
+        t.is_boot, t.full_status, t.lab, t.path,
+        {_BUILD_STATUS_SQL},
+        b.architecture, b.compiler, b.config_name,
+        c.id, c.origin, c.tree_name, c.git_repository_url,
+        c.git_repository_branch, c.git_commit_hash, c.start_time
+    FROM {INGESTED_TESTS_TABLE} t
+    JOIN builds b ON b.id = t.build_id
+    JOIN checkouts c ON c.id = b.checkout_id
+    WHERE NOT EXISTS (SELECT 1 FROM pending_test p WHERE p.test_id = t.test_id)
+"""
+
+_READY_INGESTED_BUILDS_SQL = f"""
+    INSERT INTO aggregation_ready_builds
+    SELECT
+        b.build_id, b.status,
+        c.id, c.origin, c.tree_name, c.git_repository_url,
+        c.git_repository_branch, c.git_commit_hash
+    FROM {INGESTED_BUILDS_TABLE} b
+    JOIN checkouts c ON c.id = b.checkout_id
+    WHERE NOT EXISTS (SELECT 1 FROM pending_builds p WHERE p.build_id = b.build_id)
+"""
+
+# Counts of tree_listing and hardware_status from rows of (kind, status, decrement),
+# where kind is build, boot or test and decrement is the number of inconclusive
+# counts to undo because a null status was corrected
+_LISTING_COUNTS_SQL = """
+    count(*) FILTER (WHERE kind = 'build' AND status = 'P') AS build_pass,
+    count(*) FILTER (WHERE kind = 'build' AND status = 'F') AS build_failed,
+    count(*) FILTER (WHERE kind = 'build' AND coalesce(status, 'I') NOT IN ('P', 'F'))
+        - coalesce(sum(decrement) FILTER (WHERE kind = 'build'), 0) AS build_inc,
+    count(*) FILTER (WHERE kind = 'boot' AND status = 'P') AS boot_pass,
+    count(*) FILTER (WHERE kind = 'boot' AND status = 'F') AS boot_failed,
+    count(*) FILTER (WHERE kind = 'boot' AND coalesce(status, 'I') NOT IN ('P', 'F'))
+        - coalesce(sum(decrement) FILTER (WHERE kind = 'boot'), 0) AS boot_inc,
+    count(*) FILTER (WHERE kind = 'test' AND status = 'P') AS test_pass,
+    count(*) FILTER (WHERE kind = 'test' AND status = 'F') AS test_failed,
+    count(*) FILTER (WHERE kind = 'test' AND coalesce(status, 'I') NOT IN ('P', 'F'))
+        - coalesce(sum(decrement) FILTER (WHERE kind = 'test'), 0) AS test_inc
+"""
+
+# An item is counted if it wasn't processed for its checkout yet, or if it was
+# processed with a null status and now has one (a correction)
+_NOT_PROCESSED_SQL = """
+    p.checkout_id IS NULL OR (p.status IS NULL AND {status} IS NOT NULL)
+"""
+
+_UPSERT_PROCESSED_SQL = """
+    ON CONFLICT (checkout_id, kind, entity_id) DO UPDATE SET
+        status = EXCLUDED.status
+    RETURNING 1
+"""
+
+_HARDWARE_STATUS_SQL = f"""
+    WITH context AS (
+        SELECT
+            t.*,
+            -- Like get_hardware_build_entity_id
+            concat_ws('|', t.build_id, t.origin, t.platform) AS build_entity_id
+        FROM aggregation_ready_tests t
+        WHERE t.platform IS NOT NULL
+    ),
+    tests AS (
+        SELECT c.*, p.checkout_id IS NOT NULL AS is_correction
+        FROM context c
+        LEFT JOIN processed_items p
+            ON p.checkout_id = c.checkout_id
+            AND p.kind = %(hardware_test)s
+            AND p.entity_id = c.test_id
+        WHERE {_NOT_PROCESSED_SQL.format(status="c.status")}
+    ),
+    -- Builds are only counted with their first counted test, but a corrected build
+    -- is decremented once for each of them, like in the Python engine
+    builds AS (
+        SELECT
+            t.origin, t.platform, t.checkout_id, t.build_entity_id, t.build_status,
+            p.checkout_id IS NOT NULL AS is_correction,
+            count(*) AS test_count
+        FROM tests t
+        LEFT JOIN processed_items p
+            ON p.checkout_id = t.checkout_id
+            AND p.kind = %(hardware_build)s
+            AND p.entity_id = t.build_entity_id
+        WHERE NOT starts_with(t.build_id, %(dummy_build_prefix)s)
+            AND ({_NOT_PROCESSED_SQL.format(status="t.build_status")})
+        GROUP BY 1, 2, 3, 4, 5, 6
+    ),
+    items AS (
+        SELECT
+            origin, platform, checkout_id,
+            CASE WHEN is_boot THEN 'boot' ELSE 'test' END AS kind,
+            status,
+            is_correction::int AS decrement
+        FROM tests
+        UNION ALL
+        SELECT
+            origin, platform, checkout_id, 'build', build_status,
+            CASE WHEN is_correction THEN test_count ELSE 0 END
+        FROM builds
+    ),
+    counts AS (
+        SELECT origin, platform, checkout_id, {_LISTING_COUNTS_SQL}
+        FROM items
+        GROUP BY origin, platform, checkout_id
+    ),
+    records AS (
+        SELECT DISTINCT ON (origin, platform, checkout_id)
+            origin, platform, checkout_id, compatible, start_time
+        FROM context
+        ORDER BY origin, platform, checkout_id, test_id
+    ),
+    hardware AS (
+        INSERT INTO hardware_status (
+            checkout_id, test_origin, platform, compatibles, start_time,
+            build_pass, build_failed, build_inc,
+            boot_pass, boot_failed, boot_inc,
+            test_pass, test_failed, test_inc
+        )
+        SELECT
+            r.checkout_id, r.origin, r.platform, r.compatible, r.start_time,
+            coalesce(c.build_pass, 0), coalesce(c.build_failed, 0),
+            coalesce(c.build_inc, 0), coalesce(c.boot_pass, 0),
+            coalesce(c.boot_failed, 0), coalesce(c.boot_inc, 0),
+            coalesce(c.test_pass, 0), coalesce(c.test_failed, 0),
+            coalesce(c.test_inc, 0)
+        FROM records r
+        LEFT JOIN counts c USING (origin, platform, checkout_id)
+        ON CONFLICT (test_origin, platform, checkout_id) DO UPDATE SET
+            build_pass = hardware_status.build_pass + EXCLUDED.build_pass,
+            build_failed = hardware_status.build_failed + EXCLUDED.build_failed,
+            build_inc = hardware_status.build_inc + EXCLUDED.build_inc,
+            boot_pass = hardware_status.boot_pass + EXCLUDED.boot_pass,
+            boot_failed = hardware_status.boot_failed + EXCLUDED.boot_failed,
+            boot_inc = hardware_status.boot_inc + EXCLUDED.boot_inc,
+            test_pass = hardware_status.test_pass + EXCLUDED.test_pass,
+            test_failed = hardware_status.test_failed + EXCLUDED.test_failed,
+            test_inc = hardware_status.test_inc + EXCLUDED.test_inc
+        RETURNING 1
+    ),
+    processed AS (
+        INSERT INTO processed_items (checkout_id, kind, entity_id, status)
+        SELECT checkout_id, %(hardware_test)s, test_id, status FROM tests
+        UNION ALL
+        SELECT checkout_id, %(hardware_build)s, build_entity_id, build_status
+        FROM builds
+        {_UPSERT_PROCESSED_SQL}
+    )
+    SELECT (SELECT count(*) FROM hardware), (SELECT count(*) FROM processed)
+"""
+
+_ROLLUP_COUNTER_SQL = (
+    "CASE t.full_status "
+    + " ".join(
+        f"WHEN '{status}' THEN '{field}'"
+        for status, field in ROLLUP_STATUS_FIELDS.items()
+    )
+    + " ELSE 'null_tests' END"
+)
+
+_TESTS_ROLLUP_SQL = f"""
+    WITH tests AS (
+        SELECT t.*, p.checkout_id IS NOT NULL AS is_correction
+        FROM aggregation_ready_tests t
+        LEFT JOIN processed_items p
+            ON p.checkout_id = t.checkout_id
+            AND p.kind = %(rollup_test)s
+            AND p.entity_id = t.test_id
+        WHERE {_NOT_PROCESSED_SQL.format(status="t.status")}
+    ),
+    issues AS (
+        SELECT DISTINCT ON (test_id) test_id, issue_id, issue_version
+        FROM incidents
+        WHERE test_id IN (SELECT test_id FROM tests)
+        ORDER BY test_id, _timestamp, id
+    ),
+    entries AS (
+        SELECT
+            t.checkout_origin, t.tree_name, t.git_repository_branch,
+            t.git_repository_url, t.git_commit_hash,
+            CASE
+                WHEN coalesce(t.path, '') = '' THEN %(empty_path_group)s
+                ELSE split_part(t.path, '.', 1)
+            END AS path_group,
+            coalesce(nullif(t.build_config_name, ''), %(unknown)s) AS config,
+            coalesce(nullif(t.build_architecture, ''), %(unknown)s) AS arch,
+            coalesce(nullif(t.build_compiler, ''), %(unknown)s) AS compiler,
+            CASE
+                WHEN cardinality(t.compatible) > 0 THEN t.compatible[1]
+                WHEN t.platform <> '' THEN t.platform
+                ELSE %(unknown)s
+            END AS hardware_key,
+            t.platform, t.lab, t.origin,
+            i.issue_id, i.issue_version,
+            i.issue_id IS NULL AND t.full_status IS NOT DISTINCT FROM 'FAIL'
+                AS issue_uncategorized,
+            t.test_id, t.is_boot, t.is_correction,
+            {_ROLLUP_COUNTER_SQL} AS counter
+        FROM tests t
+        LEFT JOIN issues i ON i.test_id = t.test_id
+    ),
+    rollup AS (
+        INSERT INTO tree_tests_rollup (
+            origin, tree_name, git_repository_branch, git_repository_url,
+            git_commit_hash,
+            path_group, build_config_name, build_architecture, build_compiler,
+            hardware_key, test_platform, test_lab, test_origin,
+            issue_id, issue_version, issue_uncategorized, is_boot,
+            pass_tests, fail_tests, skip_tests,
+            error_tests, miss_tests, done_tests,
+            null_tests, total_tests
+        )
+        SELECT
+            checkout_origin, tree_name, git_repository_branch, git_repository_url,
+            git_commit_hash,
+            path_group, config, arch, compiler,
+            hardware_key, platform, lab, origin,
+            issue_id, issue_version, issue_uncategorized,
+            -- is_boot isn't part of the unique constraint, new rows keep the value
+            -- of their first test
+            (array_agg(is_boot ORDER BY test_id))[1],
+            count(*) FILTER (WHERE counter = 'pass_tests'),
+            count(*) FILTER (WHERE counter = 'fail_tests'),
+            count(*) FILTER (WHERE counter = 'skip_tests'),
+            count(*) FILTER (WHERE counter = 'error_tests'),
+            count(*) FILTER (WHERE counter = 'miss_tests'),
+            count(*) FILTER (WHERE counter = 'done_tests'),
+            count(*) FILTER (WHERE counter = 'null_tests')
+                - count(*) FILTER (WHERE is_correction),
+            count(*) FILTER (WHERE NOT is_correction)
+        FROM entries
+        GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16
+        ON CONFLICT ON CONSTRAINT tree_tests_rollup_unique DO UPDATE SET
+            pass_tests = tree_tests_rollup.pass_tests + EXCLUDED.pass_tests,
+            fail_tests = tree_tests_rollup.fail_tests + EXCLUDED.fail_tests,
+            skip_tests = tree_tests_rollup.skip_tests + EXCLUDED.skip_tests,
+            error_tests = tree_tests_rollup.error_tests + EXCLUDED.error_tests,
+            miss_tests = tree_tests_rollup.miss_tests + EXCLUDED.miss_tests,
+            done_tests = tree_tests_rollup.done_tests + EXCLUDED.done_tests,
+            null_tests = tree_tests_rollup.null_tests + EXCLUDED.null_tests,
+            total_tests = tree_tests_rollup.total_tests + EXCLUDED.total_tests
+        RETURNING 1
+    ),
+    processed AS (
+        INSERT INTO processed_items (checkout_id, kind, entity_id, status)
+        SELECT checkout_id, %(rollup_test)s, test_id, status FROM tests
+        {_UPSERT_PROCESSED_SQL}
+    )
+    SELECT (SELECT count(*) FROM rollup), (SELECT count(*) FROM processed)
+"""
+
+_TREE_LISTING_SQL = f"""
+    WITH items AS (
+        SELECT
+            checkout_id, checkout_origin AS origin, tree_name, git_repository_branch,
+            git_repository_url, git_commit_hash,
+            %(tree_listing_test)s AS processed_kind, test_id AS entity_id,
+            CASE WHEN is_boot THEN 'boot' ELSE 'test' END AS kind,
+            status
+        FROM aggregation_ready_tests
+        UNION ALL
+        SELECT
+            checkout_id, checkout_origin, tree_name, git_repository_branch,
+            git_repository_url, git_commit_hash,
+            %(tree_listing_build)s, build_id, 'build', status
+        FROM aggregation_ready_builds
+        WHERE NOT starts_with(build_id, %(dummy_build_prefix)s)
+    ),
+    counted AS (
+        SELECT i.*, (p.checkout_id IS NOT NULL)::int AS decrement
+        FROM items i
+        LEFT JOIN processed_items p
+            ON p.checkout_id = i.checkout_id
+            AND p.kind = i.processed_kind
+            AND p.entity_id = i.entity_id
+        WHERE {_NOT_PROCESSED_SQL.format(status="i.status")}
+    ),
+    counts AS (
+        SELECT
+            origin, tree_name, git_repository_branch, git_repository_url,
+            git_commit_hash, {_LISTING_COUNTS_SQL}
+        FROM counted
+        GROUP BY 1, 2, 3, 4, 5
+    ),
+    listing AS (
+        UPDATE tree_listing
+        SET
+            build_pass = tree_listing.build_pass + c.build_pass,
+            build_failed = tree_listing.build_failed + c.build_failed,
+            build_inc = tree_listing.build_inc + c.build_inc,
+            boot_pass = tree_listing.boot_pass + c.boot_pass,
+            boot_failed = tree_listing.boot_failed + c.boot_failed,
+            boot_inc = tree_listing.boot_inc + c.boot_inc,
+            test_pass = tree_listing.test_pass + c.test_pass,
+            test_failed = tree_listing.test_failed + c.test_failed,
+            test_inc = tree_listing.test_inc + c.test_inc
+        FROM counts c
+        WHERE
+            tree_listing.origin = c.origin
+            AND tree_listing.tree_name IS NOT DISTINCT FROM c.tree_name
+            AND tree_listing.git_repository_branch
+                IS NOT DISTINCT FROM c.git_repository_branch
+            AND tree_listing.git_repository_url IS NOT DISTINCT FROM c.git_repository_url
+            AND tree_listing.git_commit_hash IS NOT DISTINCT FROM c.git_commit_hash
+        RETURNING 1
+    ),
+    processed AS (
+        INSERT INTO processed_items (checkout_id, kind, entity_id, status)
+        SELECT checkout_id, processed_kind, entity_id, status FROM counted
+        {_UPSERT_PROCESSED_SQL}
+    )
+    SELECT (SELECT count(*) FROM listing), (SELECT count(*) FROM processed)
+"""
+
+
+class IngestedBatchResult(NamedTuple):
+    tests_count: int
+    """Number of ingested tests aggregated"""
+    builds_count: int
+    """Number of ingested builds aggregated"""
+    records_written: dict[str, int]
+    """Number of rows written to each aggregate table"""
+
+
+class SqlBatchResult(NamedTuple):
+    last_processed_test_id: Optional[str]
+    last_processed_build_id: Optional[str]
+    pending_test_count: int
+    pending_build_count: int
+    skipped_no_build: int
+    skipped_no_checkout: int
+    tests_count: int
+    """Number of pending tests aggregated"""
+    builds_count: int
+    """Number of pending builds aggregated"""
+    records_written: dict[str, int]
+    """Number of rows written to each aggregate table"""
+    commit_hashes: set[str]
+    """Commit hashes and tags of the checkouts of the tests aggregated"""
+
+
+def _read_pending(
+    cursor,
+    *,
+    sql: str,
+    id_column: str,
+    slot: int,
+    last_processed_id: Optional[str],
+    batch_size: int,
+    shard_sql: RawSQL,
+    shards: Optional[list[int]],
+) -> tuple[int, Optional[str], int]:
+    """
+    Reads a batch of pending items of a slot and copies the ready ones to their
+    temporary table. Returns the number of pending items in the batch, the last id
+    of the batch (or `last_processed_id` if it is empty) and the number of ready items.
+    """
+    filters = ""
+    params: list = [slot]
+    if last_processed_id:
+        filters += f" AND {id_column} > %s"
+        params.append(last_processed_id)
+    if shards is not None:
+        filters += f" AND ({shard_sql.sql}) = ANY(%s)"
+        params.extend([*shard_sql.params, shards])
+
+    cursor.execute(sql.format(filters=filters), [*params, batch_size])
+    pending_count, last_id, ready_count = cursor.fetchone()
+    return pending_count, last_id or last_processed_id, ready_count
+
+
+def _aggregate_ready_items(
+    cursor, *, ready_test_count: int, ready_build_count: int
+) -> dict[str, int]:
+    """
+    Adds the items of the ready tables to the aggregates and records them as
+    processed. Returns the number of rows written to each table.
+    """
+    params = {
+        "dummy_build_prefix": MAESTRO_DUMMY_BUILD_PREFIX,
+        "empty_path_group": EMPTY_PATH_GROUP,
+        "unknown": UNKNOWN_STRING,
+        **{kind.name.lower(): kind.value for kind in ProcessedItemKind},
+    }
+
+    records_written = {
+        "hardware_status": 0,
+        "tree_tests_rollup": 0,
+        "tree_listing": 0,
+        "processed_items": 0,
+    }
+    steps = []
+    if ready_test_count:
+        cursor.execute(
+            LOCK_AGGREGATED_BUILDS_SQL.format(builds="aggregation_ready_tests"),
+            {"lock": AGGREGATION_BUILD_LOCK},
+        )
+        steps += [
+            ("hardware_status", _HARDWARE_STATUS_SQL),
+            ("tree_tests_rollup", _TESTS_ROLLUP_SQL),
+        ]
+    if ready_test_count or ready_build_count:
+        steps.append(("tree_listing", _TREE_LISTING_SQL))
+    for table, sql in steps:
+        cursor.execute(sql, params)
+        written, processed = cursor.fetchone()
+        records_written[table] += written
+        records_written["processed_items"] += processed
+
+    return records_written
+
+
+def aggregate_pending_batch(
+    *, position: "QueuePosition", batch_size: int
+) -> SqlBatchResult:
+    """
+    Aggregates the next batch of pending tests and builds of a shard position, with
+    the same pagination and shard filters as the Python engine.
+    Must be called inside the transaction that saves the new position.
+    """
+    pending_test_count = ready_test_count = 0
+    pending_build_count = ready_build_count = 0
+    last_processed_test_id = position.last_test_id
+    last_processed_build_id = position.last_build_id
+    with connection.cursor() as cursor:
+        cursor.execute(_CREATE_READY_TABLES_SQL)
+
+        if not position.tests_done:
+            pending_test_count, last_processed_test_id, ready_test_count = (
+                _read_pending(
+                    cursor,
+                    sql=_READ_PENDING_TESTS_SQL,
+                    id_column="test_id",
+                    slot=position.slot,
+                    last_processed_id=position.last_test_id,
+                    batch_size=batch_size,
+                    shard_sql=pending_test_shard(position.shard_count),
+                    shards=position.shards,
+                )
+            )
+        if not position.builds_done:
+            pending_build_count, last_processed_build_id, ready_build_count = (
+                _read_pending(
+                    cursor,
+                    sql=_READ_PENDING_BUILDS_SQL,
+                    id_column="build_id",
+                    slot=position.slot,
+                    last_processed_id=position.last_build_id,
+                    batch_size=batch_size,
+                    shard_sql=pending_build_shard(position.shard_count),
+                    shards=position.shards,
+                )
+            )
+
+        records_written = _aggregate_ready_items(
+            cursor,
+            ready_test_count=ready_test_count,
+            ready_build_count=ready_build_count,
+        )
+
+        commit_hashes = set()
+        if ready_test_count:
+            cursor.execute(
+                """
+                SELECT DISTINCT commit
+                FROM checkouts c, unnest(c.git_commit_tags || c.git_commit_hash) commit
+                WHERE commit IS NOT NULL
+                    AND c.id IN (SELECT checkout_id FROM aggregation_ready_tests)
+                """
+            )
+            commit_hashes = {commit for (commit,) in cursor.fetchall()}
+
+    return SqlBatchResult(
+        last_processed_test_id=last_processed_test_id,
+        last_processed_build_id=last_processed_build_id,
+        pending_test_count=pending_test_count,
+        pending_build_count=pending_build_count,
+        skipped_no_build=pending_test_count - ready_test_count,
+        skipped_no_checkout=pending_build_count - ready_build_count,
+        tests_count=ready_test_count,
+        builds_count=ready_build_count,
+        records_written=records_written,
+        commit_hashes=commit_hashes,
+    )
+
+
+def prepare_ingested_tables() -> None:
+    """
+    Creates the temporary tables where the ingester stages the tests and builds
+    of a flush (INGESTED_TESTS_TABLE and INGESTED_BUILDS_TABLE), or empties them.
+    Must be called inside a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_CREATE_READY_TABLES_SQL)
+        cursor.execute(_CREATE_INGESTED_TABLES_SQL)
+        cursor.execute(_CLEAR_INGESTED_TABLES_SQL)
+
+
+def aggregate_ingested_items() -> IngestedBatchResult:
+    """
+    Aggregates the staged tests and builds whose build and checkout are known and
+    that aren't pending. They are left in aggregation_ready_tests and
+    aggregation_ready_builds, so the caller can queue the other ones as pending.
+    Must be called inside the transaction that staged the items.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_READY_INGESTED_TESTS_SQL)
+        tests_count = cursor.rowcount
+        cursor.execute(_READY_INGESTED_BUILDS_SQL)
+        builds_count = cursor.rowcount
+
+        records_written = _aggregate_ready_items(
+            cursor, ready_test_count=tests_count, ready_build_count=builds_count
+        )
+
+    return IngestedBatchResult(
+        tests_count=tests_count,
+        builds_count=builds_count,
+        records_written=records_written,
+    )
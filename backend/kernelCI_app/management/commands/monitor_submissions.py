@@ -4,12 +4,14 @@ import os
 import shutil
 import signal
 import time
+from typing import Optional
 
 from django.core.management.base import BaseCommand
 from prometheus_client import CollectorRegistry, Gauge, multiprocess, start_http_server
 
 from kernelCI_app.constants.ingester import (
     INGEST_CYCLE_BATCH_SIZE,
+    INGEST_SPOOL_WATCHER,
     INGESTER_GRAFANA_LABEL,
     INGESTER_METRICS_PORT,
     PROMETHEUS_MULTIPROC_DIR,
@@ -18,13 +20,18 @@ from kernelCI_app.management.commands.helpers.file_utils import (
     load_tree_names,
     verify_spool_dirs,
 )
+from kernelCI_app.management.commands.helpers.ingest_pool import (
+    CYCLE_WAIT_SEC,
+    IngestWorkerPool,
+)
 from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
+    DEFAULT_DB_WORKERS,
     INGESTER_DIRS,
-    ingest_submissions_parallel,
 )
 from kernelCI_app.management.commands.helpers.log_excerpt_utils import (
     cache_logs_maintenance,
 )
+from kernelCI_app.management.commands.helpers.spool_watcher import SpoolWatcher
 
 logger = logging.getLogger(__name__)
 
@@ -67,35 +74,9 @@ class Command(BaseCommand):
                 "PROMETHEUS_MULTIPROC_DIR is not set, skipping Prometheus metrics"
             )
 
-    def _scan_spool_dir(self, spool_dir: str) -> list[str]:
-        """Scan spool directory, returning only path strings to keep memory bounded."""
-        try:
-            with os.scandir(spool_dir) as it:
-                cached_paths = [
-                    entry.path
-                    for entry in it
-                    if entry.is_file() and entry.name.endswith(".json")
-                ]
-            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            self.stdout.write(
-                f"[{ts}] Spool scan: {len(cached_paths)} .json files pending"
-            )
-            return cached_paths
-        except PermissionError:
-            logger.error(
-                "Permission denied scanning spool directory: %s",
-                spool_dir,
-                exc_info=True,
-            )
-            self.running = False
-            return []
-        except OSError:
-            logger.warning(
-                "Transient OS error scanning spool directory: %s",
-                spool_dir,
-                exc_info=True,
-            )
-            return []
+    def _log(self, message: str) -> None:
+        ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        self.stdout.write(f"[{ts}] {message}")
 
     def add_arguments(self, parser):
         # TODO: add a way to set the folder by env var instead of by argument
@@ -111,11 +92,25 @@ class Command(BaseCommand):
             default=5,
             help="Maximum number of workers to process files in parallel (default: 5)",
         )
+        parser.add_argument(
+            "--parse-workers",
+            type=check_positive_int,
+            help="""Number of workers that only parse and validate files, feeding the
+             DB workers through a bounded queue. Setting this or --db-workers
+             enables the pipelined ingestion (default: same as --max-workers)""",
+        )
+        parser.add_argument(
+            "--db-workers",
+            type=check_positive_int,
+            help=f"""Number of workers that write the parsed files to the database
+             in the pipelined ingestion (default: {DEFAULT_DB_WORKERS})""",
+        )
         parser.add_argument(
             "--interval",
             type=int,
             default=5,
-            help="Check interval in seconds (default: 5)",
+            help="""Max seconds to wait for new files when the spool is empty
+             (default: 5)""",
         )
         parser.add_argument(
             "--trees-file",
@@ -131,6 +126,8 @@ class Command(BaseCommand):
         max_workers: int,
         interval: int,
         trees_file: str,
+        parse_workers: Optional[int] = None,
+        db_workers: Optional[int] = None,
         **options,
     ):
         signal.signal(signal.SIGTERM, self.signal_handler)
@@ -149,47 +146,76 @@ class Command(BaseCommand):
         self.stdout.write(f"Failed directory: {dirs['failed']}")
         self.stdout.write(f"Pending retry directory: {dirs['pending_retry']}")
         self.stdout.write(f"Check interval: {interval} seconds")
-        self.stdout.write(f"Using {max_workers} workers")
+        if parse_workers is None and db_workers is None:
+            self.stdout.write(f"Using {max_workers} workers")
+        else:
+            self.stdout.write(
+                f"Using {parse_workers or max_workers} parse workers"
+                f" and {db_workers or DEFAULT_DB_WORKERS} DB workers"
+            )
 
         verify_spool_dirs(spool_dir)
         tree_names = load_tree_names(trees_file=trees_file)
 
         self.stdout.write("Starting file monitoring... (Press Ctrl+C to stop)")
 
-        cached_files: list[str] = []
-        cache_pos = 0
-
         try:
-            while self.running:
-                # TODO: retry failed files every x cycles
-
-                # Only re-scan directory when cache is depleted
-                if cache_pos >= len(cached_files):
-                    cached_files = self._scan_spool_dir(spool_dir)
-                    cache_pos = 0
-
-                remaining = len(cached_files) - cache_pos
-                QUEUE_SIZE_GAUGE.labels(INGESTER_GRAFANA_LABEL).set(remaining)
-
-                if remaining > 0:
-                    end = min(cache_pos + INGEST_CYCLE_BATCH_SIZE, len(cached_files))
-                    batch = cached_files[cache_pos:end]
-                    cache_pos = end
-                    self.stdout.write(
-                        f"Processing {len(batch)} files"
-                        f" ({len(cached_files) - cache_pos}"
-                        " remaining in cache)"
-                    )
-                    ingest_submissions_parallel(
-                        batch,
-                        tree_names,
-                        dirs,
-                        max_workers,
-                    )
-
-                cache_logs_maintenance()
-
-                time.sleep(interval)
+            with (
+                IngestWorkerPool(
+                    tree_names,
+                    dirs,
+                    max_workers,
+                    parse_workers=parse_workers,
+                    db_workers=db_workers,
+                ) as pool,
+                SpoolWatcher(
+                    spool_dir, use_inotify=INGEST_SPOOL_WATCHER == "inotify"
+                ) as watcher,
+            ):
+                self._log(
+                    f"Spool scan: {len(watcher)} .json files pending,"
+                    f" watching for new files with {watcher.mode}"
+                )
+                last_maintenance = 0.0
+                while self.running:
+                    # TODO: retry failed files every x cycles
+
+                    idle = pool.poll()
+                    if idle:
+                        # The files left in the spool by their ingestion can be
+                        # taken again
+                        watcher.release_taken()
+
+                    # Returns as soon as there are files, so they are ingested
+                    # continuously instead of once per interval. While the workers
+                    # are busy, new files are queued without waiting for them
+                    try:
+                        batch = watcher.take(
+                            INGEST_CYCLE_BATCH_SIZE,
+                            timeout=interval if idle else CYCLE_WAIT_SEC,
+                        )
+                    except PermissionError:
+                        logger.error(
+                            "Permission denied scanning spool directory: %s",
+                            spool_dir,
+                            exc_info=True,
+                        )
+                        break
+                    QUEUE_SIZE_GAUGE.labels(INGESTER_GRAFANA_LABEL).set(len(watcher))
+
+                    if batch:
+                        # Files added to a running cycle show up in its progress
+                        if idle:
+                            self._log(
+                                f"Processing {len(batch)} files"
+                                f" ({len(watcher)} remaining in queue)"
+                            )
+                        pool.submit(batch, should_stop=lambda: not self.running)
+
+                    # The loop runs every CYCLE_WAIT_SEC while the workers are busy
+                    if time.monotonic() - last_maintenance >= interval:
+                        cache_logs_maintenance()
+                        last_maintenance = time.monotonic()
 
         except KeyboardInterrupt:
             logger.info("File monitoring stopped by user")
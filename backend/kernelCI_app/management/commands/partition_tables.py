@@ -0,0 +1,251 @@
+"""
+Management command to partition the builds and tests tables by month.
+
+The tables are converted online, see helpers/partitioning.py: the ingester keeps
+writing to them during the conversion and only waits for the swap at the end.
+"""
+
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from psycopg.errors import DeadlockDetected, LockNotAvailable
+
+from kernelCI_app.constants.partitions import (
+    PARTITION_COPY_BATCH_SIZE,
+    PARTITION_COPY_LOCK_TIMEOUT_MS,
+    PARTITION_COPY_RETRY_SEC,
+    PARTITION_LOCK_TIMEOUT_MS,
+    PARTITION_MONTHS_AHEAD,
+    PARTITION_SWAP_ATTEMPTS,
+)
+from kernelCI_app.helpers.database import is_partitioned
+from kernelCI_app.helpers.logger import out
+from kernelCI_app.management.commands.helpers.partitioning import (
+    PARTITIONABLE_TABLES,
+    UNPARTITIONED_SUFFIX,
+    conversion_exists,
+    conversion_progress,
+    copy_chunk,
+    create_partitions,
+    drop_unpartitioned,
+    lock_table,
+    referencing_foreign_keys,
+    start_conversion,
+    swap_tables,
+    unpartitioned_exists,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the builds and tests tables to tables partitioned by month, online "
+        "and in chunks, and maintain their partitions"
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            "--tables",
+            type=lambda s: [table.strip() for table in s.split(",")],
+            default=list(PARTITIONABLE_TABLES),
+            help="Tables to act on (comma-separated, default: "
+            f"{','.join(PARTITIONABLE_TABLES)})",
+        )
+        parser.add_argument(
+            "--action",
+            choices=["convert", "create-partitions", "drop-unpartitioned"],
+            default="convert",
+            help="convert: convert the tables, or resume their conversion; "
+            "create-partitions: create the partitions of the next months; "
+            "drop-unpartitioned: drop the tables left by the conversion "
+            "(default: convert)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PARTITION_COPY_BATCH_SIZE,
+            help="Number of rows copied per transaction "
+            f"(default: {PARTITION_COPY_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between copied chunks (default: 0)",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=PARTITION_MONTHS_AHEAD,
+            help="Number of monthly partitions created ahead of the current month "
+            f"(default: {PARTITION_MONTHS_AHEAD})",
+        )
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            default=PARTITION_LOCK_TIMEOUT_MS,
+            help="Milliseconds the command can wait for the lock of a table "
+            f"(default: {PARTITION_LOCK_TIMEOUT_MS})",
+        )
+        parser.add_argument(
+            "--no-swap",
+            action="store_true",
+            help="Copy the rows without swapping the tables, to swap them later by "
+            "running the command again",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        for table in options["tables"]:
+            if table not in PARTITIONABLE_TABLES:
+                raise CommandError(
+                    f"Only {', '.join(PARTITIONABLE_TABLES)} can be partitioned "
+                    f"(got {table})"
+                )
+        if options["batch_size"] < 1:
+            raise CommandError(
+                f"--batch-size must be at least 1 (got {options['batch_size']})."
+            )
+        if options["months_ahead"] < 0:
+            raise CommandError("--months-ahead can't be negative")
+
+        for table in options["tables"]:
+            if options["action"] == "create-partitions":
+                self._create_partitions(table, options)
+            elif options["action"] == "drop-unpartitioned":
+                self._drop_unpartitioned(table)
+            else:
+                self._convert(table, options)
+
+    def _is_partitioned(self, table: str) -> bool:
+        with connection.cursor() as cursor:
+            return is_partitioned(cursor, table)
+
+    def _set_lock_timeout(self, options: dict[str, Any], timeout_ms=None) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f"{timeout_ms or options['lock_timeout']}ms"],
+            )
+
+    def _create_partitions(self, table: str, options: dict[str, Any]) -> None:
+        if not self._is_partitioned(table):
+            raise CommandError(f"{table} isn't partitioned, convert it first")
+        with transaction.atomic():
+            self._set_lock_timeout(options)
+            created = create_partitions(table, months_ahead=options["months_ahead"])
+        out(f"{table}: created {len(created)} partitions {', '.join(created)}")
+
+    def _drop_unpartitioned(self, table: str) -> None:
+        if not unpartitioned_exists(table):
+            out(f"{table}: no {table}{UNPARTITIONED_SUFFIX} table to drop")
+            return
+        drop_unpartitioned(table)
+        out(f"{table}: dropped {table}{UNPARTITIONED_SUFFIX}")
+
+    def _convert(self, table: str, options: dict[str, Any]) -> None:
+        if self._is_partitioned(table):
+            out(f"{table} is already partitioned")
+            return
+
+        if conversion_exists(table):
+            progress = conversion_progress(table)
+            out(
+                f"{table}: resuming the conversion started at {progress.started_at}, "
+                f"{progress.copied} rows copied"
+            )
+        else:
+            foreign_keys = referencing_foreign_keys(table)
+            if foreign_keys:
+                raise CommandError(
+                    f"{table} is referenced by foreign keys, drop them first: "
+                    f"{', '.join(foreign_keys)}"
+                )
+            if unpartitioned_exists(table):
+                raise CommandError(
+                    f"{table}{UNPARTITIONED_SUFFIX} already exists, drop it first"
+                )
+            try:
+                with transaction.atomic():
+                    self._set_lock_timeout(options)
+                    partitions = start_conversion(
+                        table, months_ahead=options["months_ahead"]
+                    )
+            except OperationalError as e:
+                if not isinstance(e.__cause__, LockNotAvailable):
+                    raise
+                raise CommandError(
+                    f"Could not lock {table} within {options['lock_timeout']}ms to "
+                    "add the triggers, try again later"
+                ) from e
+            out(f"{table}: created the partitioned table with {partitions} partitions")
+
+        self._copy_rows(table, options)
+
+        if options["no_swap"]:
+            out(f"{table}: rows copied, run the command again to swap the tables")
+            return
+        self._swap(table, options)
+
+    def _copy_rows(self, table: str, options: dict[str, Any]) -> None:
+        """
+        Copies the rows in chunks. A chunk gives up as soon as it waits for rows
+        that are being written, and is tried again, so the ingester is never the
+        one that waits.
+        """
+        t0 = time.time()
+        total = 0
+        while True:
+            try:
+                with transaction.atomic():
+                    self._set_lock_timeout(options, PARTITION_COPY_LOCK_TIMEOUT_MS)
+                    copied = copy_chunk(table, batch_size=options["batch_size"])
+            except OperationalError as e:
+                if not isinstance(e.__cause__, (LockNotAvailable, DeadlockDetected)):
+                    raise
+                out(f"{table}: chunk locked by a concurrent write, retrying")
+                time.sleep(PARTITION_COPY_RETRY_SEC)
+                continue
+            if not copied:
+                break
+            total += copied
+            out(
+                f"{table}: copied {total} rows in {time.time() - t0:.1f}s, "
+                f"{total / max(time.time() - t0, 1e-6):.0f} rows/s"
+            )
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+    def _swap(self, table: str, options: dict[str, Any]) -> None:
+        """
+        Swaps the tables under a short lock, copying the rows that were left
+        first. The lock is given up and asked again if it can't be taken in time,
+        so the ingester isn't stuck behind the command.
+        """
+        for attempt in range(1, PARTITION_SWAP_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    self._set_lock_timeout(options)
+                    lock_table(table)
+                    while copy_chunk(table, batch_size=options["batch_size"]):
+                        pass
+                    swap_tables(table)
+            except OperationalError as e:
+                if not isinstance(e.__cause__, LockNotAvailable):
+                    raise
+                out(
+                    f"{table}: could not lock the table within "
+                    f"{options['lock_timeout']}ms (attempt {attempt})"
+                )
+                time.sleep(attempt)
+                continue
+            out(
+                f"{table}: partitioned, the previous table is kept as "
+                f"{table}{UNPARTITIONED_SUFFIX}"
+            )
+            return
+
+        raise CommandError(
+            f"Could not swap {table} after {PARTITION_SWAP_ATTEMPTS} attempts, run "
+            "the command again to retry"
+        )
@@ -1,11 +1,14 @@
+import multiprocessing
 import time
 from datetime import timedelta
+from multiprocessing.connection import Connection
 from typing import Any
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection, transaction
 from django.utils import timezone
 
+from kernelCI_app.constants.process_pending import ROLLUP_REBUILD_CATCH_UP_PASSES
 from kernelCI_app.helpers.logger import out
 from kernelCI_app.management.commands.helpers.aggregation_helpers import (
     convert_test,
@@ -15,13 +18,28 @@ from kernelCI_app.management.commands.helpers.process_pending_helpers import (
     RollupKey,
     aggregate_tests_rollup,
     fetch_test_issues,
-    get_rollup_key,
+)
+from kernelCI_app.management.commands.helpers.rollup_rebuild import (
+    RebuildTree,
+    claim_tree,
+    lock_rollup_table,
+    mark_tree_failed,
+    mark_tree_rebuilt,
+    rebuild_exists,
+    rebuild_summary,
+    requeue_updated_trees,
+    retry_failed_trees,
+    start_rebuild,
+    swap_rollup_tables,
+    write_shadow_processed_items,
+    write_shadow_tree,
 )
 from kernelCI_app.models import (
     Builds,
     Checkouts,
     PendingTest,
-    ProcessedListingItems,
+    ProcessedItemKind,
+    ProcessedItems,
     Tests,
 )
 
@@ -66,11 +84,29 @@ def _merge_rollup(
         rollup_totals["total_tests"] += data["total_tests"]
 
 
+def _lock_and_swap(pipe: Connection) -> None:
+    """
+    Blocks the writes to tree_tests_rollup until the last trees are rebuilt, and
+    then swaps the shadow table in, unless the rebuild failed.
+    """
+    with transaction.atomic():
+        lock_rollup_table()
+        pipe.send(True)
+        try:
+            pipe.recv()
+        except EOFError:
+            transaction.set_rollback(True)
+            return
+        swap_rollup_tables()
+
+
 class Command(BaseCommand):
     help = (
-        "Recompute tree_tests_rollup and ProcessedListingItems from source data. "
-        "Runbook: stop process_pending_aggregations before running, restart after. "
-        "Running concurrently with the ingester will clobber its additive writes."
+        "Recompute tree_tests_rollup and its ProcessedItems from source data. "
+        "The rollup is rebuilt in a shadow table that replaces it at the end, so "
+        "process_pending_aggregations can keep running. With --checkout-id, the rows "
+        "are replaced in place: stop process_pending_aggregations before running, "
+        "since running concurrently with it will clobber its additive writes."
     )
 
     def add_arguments(self, parser: Any) -> None:
@@ -100,6 +136,17 @@ class Command(BaseCommand):
             action="store_true",
             help="Read and aggregate, but skip all writes",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes rebuilding trees in parallel (default: 1)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume the rebuild that was stopped, ignoring the filters",
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         checkout_id = options.get("checkout_id")
@@ -108,6 +155,19 @@ class Command(BaseCommand):
         batch_size = options["batch_size"]
         dry_run = options["dry_run"]
 
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        if checkout_id is None and not dry_run:
+            self._rebuild(
+                since_days=since_days,
+                limit=limit,
+                batch_size=batch_size,
+                workers=options["workers"],
+                resume=options["resume"],
+            )
+            return
+
         counts = {"ok": 0, "empty": 0, "failed": 0, "buckets": 0, "rows": 0}
 
         for checkout in self._iter_checkouts(
@@ -148,23 +208,21 @@ class Command(BaseCommand):
 
         return checkouts_qs.iterator(chunk_size=100)
 
-    def _process_checkout(
-        self, checkout: Checkouts, *, batch_size: int, dry_run: bool
-    ) -> dict[str, Any]:
-        """Process a single checkout and return result metadata."""
-        checkout_start = time.time()
-
+    def _aggregate_checkout(
+        self, checkout: Checkouts, *, batch_size: int
+    ) -> tuple[dict[RollupKey, dict], list[ProcessedItems], int]:
+        """
+        Returns the rollup of the tests of a checkout, their ProcessedItems and
+        their number.
+        """
         builds = (
             Builds.objects.filter(checkout_id=checkout.id)
             .select_related("checkout")
             .in_bulk(field_name="id")
         )
 
-        if not builds:
-            return {"status": "empty", "buckets": 0, "rows": 0}
-
         rollup_acc: dict[RollupKey, dict] = {}
-        processed_rows: list[ProcessedListingItems] = []
+        processed_rows: list[ProcessedItems] = []
         total_tests = 0
 
         tests_qs = Tests.objects.filter(build_id__in=builds.keys()).select_related(
@@ -174,15 +232,16 @@ class Command(BaseCommand):
         for test_chunk in _chunks(tests_qs.iterator(chunk_size=batch_size), batch_size):
             converted: list[PendingTest] = []
             test_ids: list[str] = []
-            chunk_processed_rows: list[ProcessedListingItems] = []
+            chunk_processed_rows: list[ProcessedItems] = []
 
             for t in test_chunk:
                 converted.append(convert_test(t))
                 test_ids.append(t.id)
                 chunk_processed_rows.append(
-                    ProcessedListingItems(
-                        listing_item_key=get_rollup_key(t.id),
+                    ProcessedItems(
                         checkout_id=checkout.id,
+                        kind=ProcessedItemKind.ROLLUP_TEST,
+                        entity_id=t.id,
                         status=simplify_status(t.status),
                     )
                 )
@@ -195,6 +254,18 @@ class Command(BaseCommand):
             processed_rows.extend(chunk_processed_rows)
             total_tests += len(test_chunk)
 
+        return rollup_acc, processed_rows, total_tests
+
+    def _process_checkout(
+        self, checkout: Checkouts, *, batch_size: int, dry_run: bool
+    ) -> dict[str, Any]:
+        """Process a single checkout and return result metadata."""
+        checkout_start = time.time()
+
+        rollup_acc, processed_rows, total_tests = self._aggregate_checkout(
+            checkout, batch_size=batch_size
+        )
+
         if not processed_rows:
             return {"status": "empty", "buckets": 0, "rows": 0}
 
@@ -207,13 +278,7 @@ class Command(BaseCommand):
 
         with transaction.atomic():
             self._upsert_rollup_replace(rollup_acc)
-            ProcessedListingItems.objects.bulk_create(
-                processed_rows,
-                update_conflicts=True,
-                update_fields=["checkout_id", "status"],
-                unique_fields=["listing_item_key"],
-                batch_size=1000,
-            )
+            self._save_processed_rows(processed_rows)
 
         elapsed = time.time() - checkout_start
         out(
@@ -223,6 +288,172 @@ class Command(BaseCommand):
 
         return {"status": "ok", "buckets": len(rollup_acc), "rows": total_tests}
 
+    def _save_processed_rows(self, processed_rows: list[ProcessedItems]) -> None:
+        ProcessedItems.objects.bulk_create(
+            processed_rows,
+            update_conflicts=True,
+            update_fields=["status"],
+            unique_fields=["checkout_id", "kind", "entity_id"],
+            batch_size=1000,
+        )
+
+    def _rebuild(
+        self,
+        *,
+        since_days: int | None,
+        limit: int | None,
+        batch_size: int,
+        workers: int,
+        resume: bool,
+    ) -> None:
+        """Rebuilds tree_tests_rollup in a shadow table that replaces it at the end."""
+        if resume:
+            if not rebuild_exists():
+                raise CommandError("There is no rebuild to resume")
+            retried = retry_failed_trees()
+            out(f"Resuming the rebuild, retrying {retried} failed trees...")
+        else:
+            if rebuild_exists():
+                raise CommandError(
+                    "A rebuild was stopped before the end, run with --resume"
+                )
+            cutoff = (
+                timezone.now() - timedelta(days=since_days)
+                if since_days is not None
+                else None
+            )
+            with transaction.atomic():
+                trees = start_rebuild(cutoff=cutoff, limit=limit)
+            out(f"Rebuilding {trees} trees with {workers} workers...")
+
+        self._run_rebuild_workers(workers=workers, batch_size=batch_size)
+
+        # process_pending_aggregations adds the new tests to the live table
+        # meanwhile, and the tests whose build or checkout arrived, so their trees
+        # are rebuilt again before the swap
+        for _ in range(ROLLUP_REBUILD_CATCH_UP_PASSES):
+            updated = requeue_updated_trees()
+            if not updated:
+                break
+            out(f"Rebuilding {updated} trees that received tests during the rebuild...")
+            self._run_rebuild_workers(workers=workers, batch_size=batch_size)
+
+        self._swap_rebuilt_rollup(workers=workers, batch_size=batch_size)
+        out("Swapped the rebuilt tree_tests_rollup in")
+
+    def _swap_rebuilt_rollup(self, *, workers: int, batch_size: int) -> None:
+        """
+        Rebuilds the trees that received tests one last time while the writes to
+        tree_tests_rollup are blocked, and swaps the shadow table in.
+        """
+        # The lock is held by another process, so that the trees to rebuild again
+        # are committed after it is taken, for the workers to claim them
+        connection.close()
+        pipe, locker_pipe = multiprocessing.Pipe()
+        locker = multiprocessing.Process(target=_lock_and_swap, args=(locker_pipe,))
+        locker.start()
+        locker_pipe.close()
+
+        try:
+            try:
+                pipe.recv()
+            except EOFError:
+                raise CommandError("Could not lock tree_tests_rollup") from None
+            updated = requeue_updated_trees()
+            out(f"Rebuilding {updated} trees while tree_tests_rollup is locked...")
+            self._run_rebuild_workers(workers=workers, batch_size=batch_size)
+            pipe.send(True)
+        finally:
+            # Without the go, the locker rolls back
+            pipe.close()
+            locker.join()
+
+        if locker.exitcode != 0:
+            raise CommandError("Could not swap tree_tests_rollup, run with --resume")
+
+    def _run_rebuild_workers(self, *, workers: int, batch_size: int) -> None:
+        """Rebuilds the trees left, in `workers` processes."""
+        if workers == 1:
+            self._rebuild_trees(batch_size=batch_size)
+        else:
+            # Workers inherit the connection when forked
+            connection.close()
+            processes = [
+                multiprocessing.Process(
+                    target=self._rebuild_trees, kwargs={"batch_size": batch_size}
+                )
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            if any(process.exitcode != 0 for process in processes):
+                raise CommandError(
+                    "A rebuild worker exited with an error, run with --resume"
+                )
+        self._check_failed_trees()
+
+    def _check_failed_trees(self) -> None:
+        summary = rebuild_summary()
+        out(
+            f"Summary: trees={summary.trees}, rebuilt={summary.rebuilt}, "
+            f"failed={summary.failed}, buckets={summary.buckets}, "
+            f"rows={summary.tests}"
+        )
+        if summary.failed:
+            raise CommandError(
+                f"{summary.failed} trees failed to be rebuilt, "
+                "run with --resume to retry them"
+            )
+
+    def _rebuild_trees(self, *, batch_size: int) -> None:
+        """Rebuilds trees until there is none left."""
+        while True:
+            with transaction.atomic():
+                tree = claim_tree()
+                if tree is None:
+                    return
+
+                tree_start = time.time()
+                try:
+                    with transaction.atomic():
+                        buckets, tests = self._rebuild_tree(tree, batch_size=batch_size)
+                except Exception as e:
+                    out(f"ERROR tree={tree}: {e}")
+                    mark_tree_failed(tree)
+                    continue
+                mark_tree_rebuilt(tree, buckets=buckets, tests=tests)
+
+            out(
+                f"tree={tree} buckets={buckets} tests={tests} "
+                f"elapsed={time.time() - tree_start:.3f}s"
+            )
+
+    def _rebuild_tree(self, tree: RebuildTree, *, batch_size: int) -> tuple[int, int]:
+        """
+        Writes the rollup of all the checkouts of a tree to the shadow table.
+        Returns the number of rollup rows and of tests.
+        """
+        rollup_acc: dict[RollupKey, dict] = {}
+        processed_rows: list[ProcessedItems] = []
+        total_tests = 0
+
+        for checkout in Checkouts.objects.filter(**tree.filters).iterator():
+            checkout_rollup, checkout_rows, checkout_tests = self._aggregate_checkout(
+                checkout, batch_size=batch_size
+            )
+            _merge_rollup(rollup_acc, checkout_rollup)
+            processed_rows.extend(checkout_rows)
+            total_tests += checkout_tests
+
+        write_shadow_tree(
+            tree, [{**key._asdict(), **data} for key, data in rollup_acc.items()]
+        )
+        write_shadow_processed_items(processed_rows)
+
+        return len(rollup_acc), total_tests
+
     def _upsert_rollup_replace(self, rollup_data: dict[RollupKey, dict]) -> None:
         """Upsert rollup data replacing existing rows counts."""
         if not rollup_data:
@@ -1,4 +1,3 @@
-import hashlib
 import os
 import shutil
 import signal
@@ -17,10 +16,34 @@ from kernelCI_app.constants.general import MAESTRO_DUMMY_BUILD_PREFIX
 from kernelCI_app.constants.ingester import PROMETHEUS_MULTIPROC_DIR
 from kernelCI_app.helpers.logger import out
 from kernelCI_app.management.commands.helpers.aggregation_helpers import simplify_status
+from kernelCI_app.management.commands.helpers.aggregation_shards import (
+    UNSHARDED,
+    ShardCoordinator,
+    parse_shard,
+    pending_build_shard,
+    pending_test_shard,
+)
+from kernelCI_app.management.commands.helpers.cache_invalidation import (
+    checkout_commits,
+    invalidate_cached_commits,
+)
+from kernelCI_app.management.commands.helpers.pending_queue import (
+    QueuePosition,
+    next_queue_position,
+    rotate_pending_queue,
+    save_queue_position,
+)
 from kernelCI_app.management.commands.helpers.process_pending_helpers import (
+    ProcessedItemKey,
     aggregate_tests_rollup,
+    fetch_processed_items,
     fetch_test_issues,
-    get_rollup_key,
+    get_hardware_build_entity_id,
+    lock_aggregated_builds,
+)
+from kernelCI_app.management.commands.helpers.sql_aggregation import (
+    SqlBatchResult,
+    aggregate_pending_batch,
 )
 from kernelCI_app.management.commands.helpers.tree_listing import (
     TreeListingRow,
@@ -31,7 +54,8 @@ from kernelCI_app.models import (
     Checkouts,
     PendingBuilds,
     PendingTest,
-    ProcessedListingItems,
+    ProcessedItemKind,
+    ProcessedItems,
     SimplifiedStatusChoices,
 )
 
@@ -80,24 +104,6 @@ class HardwareStatusRecord(ListingItemCount):
     start_time: datetime
 
 
-def get_hardware_key(
-    origin: str, platform: str, checkout_id: str, entity_id: str
-) -> bytes:
-    """Generate a hash (hardware key) from origin, platform, and checkout ID."""
-    return hashlib.sha256(
-        f"{origin}|{platform}|{checkout_id}|{entity_id}".encode("utf-8")
-    ).digest()
-
-
-def get_tree_listing_key(
-    *, origin: str, tree_name: str, git_url: str, git_branch: str, entity_id: str
-) -> bytes:
-    """Generate a hash (tree listing key) from parameters."""
-    return hashlib.sha256(
-        f"{origin}|{tree_name}|{git_url}|{git_branch}|{entity_id}".encode("utf-8")
-    ).digest()
-
-
 SIMPLIFIED_STATUS_TO_COUNT = {
     SimplifiedStatusChoices.PASS: (1, 0, 0),
     SimplifiedStatusChoices.FAIL: (0, 1, 0),
@@ -162,7 +168,10 @@ def _init_hardware_status_record(
 def _collect_hardware_status_contexts(
     tests_instances: Sequence[PendingTest],
     builds_by_id: dict[str, Builds],
-) -> tuple[list[tuple[PendingTest, Builds, Checkouts, bytes, bytes]], set[bytes]]:
+) -> tuple[
+    list[tuple[PendingTest, Builds, Checkouts, ProcessedItemKey, ProcessedItemKey]],
+    set[ProcessedItemKey],
+]:
     """Collect valid test contexts with their associated build and checkout."""
     contexts = []
     keys_to_check = set()
@@ -179,10 +188,14 @@ def _collect_hardware_status_contexts(
 
         checkout: Checkouts = build.checkout
 
-        test_key = get_hardware_key(
-            test.origin, test.platform, checkout.id, test.test_id
+        test_key = ProcessedItemKey(
+            checkout.id, ProcessedItemKind.HARDWARE_TEST, test.test_id
+        )
+        build_key = ProcessedItemKey(
+            checkout.id,
+            ProcessedItemKind.HARDWARE_BUILD,
+            get_hardware_build_entity_id(build.id, test.origin, test.platform),
         )
-        build_key = get_hardware_key(test.origin, test.platform, checkout.id, build.id)
         contexts.append((test, build, checkout, test_key, build_key))
         keys_to_check.add(test_key)
         keys_to_check.add(build_key)
@@ -190,18 +203,16 @@ def _collect_hardware_status_contexts(
     return contexts, keys_to_check
 
 
-def _get_existing_processed(keys_to_check: set[bytes]) -> set[ProcessedListingItems]:
-    """Fetch existing processed entries from the database."""
-    return set(ProcessedListingItems.objects.filter(listing_item_key__in=keys_to_check))
+type ProcessedStatuses = dict[ProcessedItemKey, Optional[SimplifiedStatusChoices]]
+"""Status of processed items by key, as stored in ProcessedItems"""
 
 
 def _check_item_was_processed(
     *,
-    existing_processed: set[ProcessedListingItems],
-    new_processed_entries: set[ProcessedListingItems],
+    existing_processed: ProcessedStatuses,
+    new_processed_entries: ProcessedStatuses,
     status_record: ListingItemCount,
-    listing_item_key: bytes,
-    item_checkout_id: str,
+    item_key: ProcessedItemKey,
     item_status: Optional[SimplifiedStatusChoices],
     decrement_status_type: Literal["build_inc", "boot_inc", "test_inc"],
 ) -> bool:
@@ -211,63 +222,48 @@ def _check_item_was_processed(
 
     Item means either PendingTest or Builds/PendingBuilds.
     """
-    for existing in existing_processed:
-        if (
-            existing.listing_item_key == listing_item_key
-            and existing.checkout_id == item_checkout_id
-        ):
-            if existing.status is not None:
-                return True
-            if existing.status is None and item_status is None:
-                return True
-            # If existing status is null and new status is not null,
-            # we will update this entry as well as the count
-            status_record[decrement_status_type] -= 1
-            break
-
-    for new_entry in new_processed_entries:
-        if (
-            new_entry.listing_item_key == listing_item_key
-            and new_entry.checkout_id == item_checkout_id
-        ):
-            if new_entry.status is not None:
-                return True
-            if new_entry.status is None and item_status is None:
-                return True
-            # It can happen to exist both in existing_processed and new_processed_entries
-            # in which case we do double the decrement, because both previous entries incremented it
-            status_record[decrement_status_type] -= 1
-            new_processed_entries.remove(
-                new_entry
-            )  # no need to process the old entry anymore
-            break
+    if item_key in existing_processed:
+        existing_status = existing_processed[item_key]
+        if existing_status is not None:
+            return True
+        if item_status is None:
+            return True
+        # If existing status is null and new status is not null,
+        # we will update this entry as well as the count
+        status_record[decrement_status_type] -= 1
+
+    if item_key in new_processed_entries:
+        new_status = new_processed_entries[item_key]
+        if new_status is not None:
+            return True
+        if item_status is None:
+            return True
+        # It can happen to exist both in existing_processed and new_processed_entries
+        # in which case we do double the decrement, because both previous entries incremented it
+        status_record[decrement_status_type] -= 1
+        # no need to process the old entry anymore
+        del new_processed_entries[item_key]
 
     return False
 
 
 def _process_test_status(
     test: PendingTest,
-    test_listing_key: bytes,
-    checkout_id: str,
+    test_key: ProcessedItemKey,
     status_record: ListingItemCount,
-    existing_processed: set[ProcessedListingItems],
-    new_processed_entries: set[ProcessedListingItems],
+    existing_processed: ProcessedStatuses,
+    new_processed_entries: ProcessedStatuses,
 ) -> bool:
     """
     Checks if test is already processed, if not,
     updates status record and marks it as processed.
     """
     # TODO: we should be checking if it is already processed before entering this function
-    to_process = ProcessedListingItems(
-        listing_item_key=test_listing_key, checkout_id=checkout_id, status=test.status
-    )
-
     if _check_item_was_processed(
         existing_processed=existing_processed,
         new_processed_entries=new_processed_entries,
         status_record=status_record,
-        listing_item_key=test_listing_key,
-        item_checkout_id=checkout_id,
+        item_key=test_key,
         item_status=test.status,
         decrement_status_type="boot_inc" if test.is_boot else "test_inc",
     ):
@@ -284,19 +280,18 @@ def _process_test_status(
         status_record["test_failed"] += t_fail
         status_record["test_inc"] += t_inc
 
-    new_processed_entries.add(to_process)
+    new_processed_entries[test_key] = test.status
 
     return True
 
 
 def _process_build_status(
     build_id: str,
-    build_checkout_id: str,
     build_status: Optional[SimplifiedStatusChoices],
-    build_listing_key: bytes,
+    build_key: ProcessedItemKey,
     status_record: ListingItemCount,
-    existing_processed: set[ProcessedListingItems],
-    new_processed_entries: set[ProcessedListingItems],
+    existing_processed: ProcessedStatuses,
+    new_processed_entries: ProcessedStatuses,
 ) -> None:
     """Process build status and update status record if not already processed."""
 
@@ -306,18 +301,11 @@ def _process_build_status(
     if build_id.startswith(MAESTRO_DUMMY_BUILD_PREFIX):
         return
 
-    to_process = ProcessedListingItems(
-        listing_item_key=build_listing_key,
-        checkout_id=build_checkout_id,
-        status=build_status,
-    )
-
     if _check_item_was_processed(
         existing_processed=existing_processed,
         new_processed_entries=new_processed_entries,
         status_record=status_record,
-        listing_item_key=build_listing_key,
-        item_checkout_id=build_checkout_id,
+        item_key=build_key,
         item_status=build_status,
         decrement_status_type="build_inc",
     ):
@@ -329,7 +317,7 @@ def _process_build_status(
     status_record["build_failed"] += b_fail
     status_record["build_inc"] += b_inc
 
-    new_processed_entries.add(to_process)
+    new_processed_entries[build_key] = build_status
 
 
 def _collect_tree_listing_contexts(
@@ -338,18 +326,21 @@ def _collect_tree_listing_contexts(
     ready_builds: Sequence[PendingBuilds],
     build_checkouts_by_id: dict[str, Checkouts],
 ) -> tuple[
-    list[tuple[Union[PendingTest, PendingBuilds], Checkouts, bytes]], set[bytes]
+    list[tuple[Union[PendingTest, PendingBuilds], Checkouts, ProcessedItemKey]],
+    set[ProcessedItemKey],
 ]:
     """
     Creates the contexts for all treeListing items,
-    combining the test/build, their respective checkout, and hash key
+    combining the test/build, their respective checkout, and processed item key
     into a single list.
     Since we are working with tests and builds independently, they are combined into a single field.
 
-    Also returns the set of all keys to check in the ProcessedListingItems table.
+    Also returns the set of all keys to check in the ProcessedItems table.
     """
-    keys_to_check: set[bytes] = set()
-    contexts: list[tuple[Union[PendingTest, Builds], Checkouts, bytes]] = []
+    keys_to_check: set[ProcessedItemKey] = set()
+    contexts: list[
+        tuple[Union[PendingTest, PendingBuilds], Checkouts, ProcessedItemKey]
+    ] = []
 
     for test in ready_tests:
         test_id = test.test_id
@@ -358,12 +349,8 @@ def _collect_tree_listing_contexts(
         except KeyError:
             continue
 
-        test_key = get_tree_listing_key(
-            origin=test_checkout.origin,
-            tree_name=test_checkout.tree_name,
-            git_url=test_checkout.git_repository_url,
-            git_branch=test_checkout.git_repository_branch,
-            entity_id=test_id,
+        test_key = ProcessedItemKey(
+            test_checkout.id, ProcessedItemKind.TREE_LISTING_TEST, test_id
         )
         keys_to_check.add(test_key)
         contexts.append((test, test_checkout, test_key))
@@ -375,12 +362,8 @@ def _collect_tree_listing_contexts(
         except KeyError:
             continue
 
-        build_key = get_tree_listing_key(
-            origin=build_checkout.origin,
-            tree_name=build_checkout.tree_name,
-            git_url=build_checkout.git_repository_url,
-            git_branch=build_checkout.git_repository_branch,
-            entity_id=build_id,
+        build_key = ProcessedItemKey(
+            build_checkout.id, ProcessedItemKind.TREE_LISTING_BUILD, build_id
         )
         keys_to_check.add(build_key)
         contexts.append((build, build_checkout, build_key))
@@ -393,19 +376,19 @@ def aggregate_tree_listing(
     test_builds_by_id: dict[str, Builds],
     ready_builds: Sequence[PendingBuilds],
     build_checkouts_by_id: dict[str, Checkouts],
-) -> tuple[dict[str, TreeListingRecord], set[ProcessedListingItems]]:
+) -> tuple[dict[str, TreeListingRecord], ProcessedStatuses]:
     """
     Prepares tree_listing data from pending tests and builds.
 
     Returns a dictionary of treeListing records
     keyed by checkout_id (for updating TreeListing table)
-    and a set of new processed entries (for updating the ProcessedListingItems table).
+    and the new processed entries (for updating the ProcessedItems table).
     """
     if not ready_tests and not ready_builds:
-        return {}, set()
+        return {}, {}
 
     tree_listing_data: dict[str, TreeListingRecord] = {}
-    new_processed_entries: set[ProcessedListingItems] = set()
+    new_processed_entries: ProcessedStatuses = {}
 
     contexts, keys_to_check = _collect_tree_listing_contexts(
         ready_tests,
@@ -415,11 +398,11 @@ def aggregate_tree_listing(
     )
 
     if not contexts:
-        return {}, set()
+        return {}, {}
 
-    existing_processed = _get_existing_processed(keys_to_check)
+    existing_processed = fetch_processed_items(keys_to_check)
 
-    for item, checkout, listing_key in contexts:
+    for item, checkout, item_key in contexts:
         checkout_id = checkout.id
         try:
             status_record = tree_listing_data[checkout_id]
@@ -430,8 +413,7 @@ def aggregate_tree_listing(
         if isinstance(item, PendingTest):
             _process_test_status(
                 test=item,
-                test_listing_key=listing_key,
-                checkout_id=checkout_id,
+                test_key=item_key,
                 status_record=status_record,
                 existing_processed=existing_processed,
                 new_processed_entries=new_processed_entries,
@@ -439,9 +421,8 @@ def aggregate_tree_listing(
         elif isinstance(item, PendingBuilds):
             _process_build_status(
                 build_id=item.build_id,
-                build_checkout_id=checkout_id,
                 build_status=item.status,
-                build_listing_key=listing_key,
+                build_key=item_key,
                 status_record=status_record,
                 existing_processed=existing_processed,
                 new_processed_entries=new_processed_entries,
@@ -453,20 +434,18 @@ def aggregate_tree_listing(
 def aggregate_hardware_status(
     tests_instances: Sequence[PendingTest],
     test_builds_by_id: dict[str, Builds],
-) -> tuple[
-    dict[tuple[str, str, str], HardwareStatusRecord], set[ProcessedListingItems]
-]:
+) -> tuple[dict[tuple[str, str, str], HardwareStatusRecord], ProcessedStatuses]:
     """
     Aggregate hardware status from pending tests, builds, and checkouts.
 
     Returns a dictionary of hardware status records
     keyed by `(test_origin, platform, checkout_id)` (for updating HardwareStatus table)
-    and a set of new processed entries (for updating the ProcessedListingItems table).
+    and the new processed entries (for updating the ProcessedItems table).
 
     This function does not update the database, only prepares the data for it.
     """
     hardware_status_data: dict[tuple[str, str, str], HardwareStatusRecord] = {}
-    new_processed_entries: set[ProcessedListingItems] = set()
+    new_processed_entries: ProcessedStatuses = {}
 
     contexts, keys_to_check = _collect_hardware_status_contexts(
         tests_instances, test_builds_by_id
@@ -475,7 +454,7 @@ def aggregate_hardware_status(
     if not contexts:
         return hardware_status_data, new_processed_entries
 
-    existing_processed = _get_existing_processed(keys_to_check)
+    existing_processed = fetch_processed_items(keys_to_check)
 
     for test, build, checkout, test_h_key, build_h_key in contexts:
         record_key = (test.origin, test.platform, checkout.id)
@@ -491,16 +470,14 @@ def aggregate_hardware_status(
         if _process_test_status(
             test,
             test_h_key,
-            checkout.id,
             status_record,
             existing_processed,
             new_processed_entries,
         ):
             _process_build_status(
                 build_id=build.id,
-                build_checkout_id=checkout.id,
                 build_status=simplify_status(build.status),
-                build_listing_key=build_h_key,
+                build_key=build_h_key,
                 status_record=status_record,
                 existing_processed=existing_processed,
                 new_processed_entries=new_processed_entries,
@@ -510,17 +487,20 @@ def aggregate_hardware_status(
 
 
 class Command(BaseCommand):
-    # WARNING: This command is designed for single-worker execution only.
-    # Running multiple concurrent workers is not safe: select_for_update(skip_locked=True)
-    # releases row locks when Transaction 1 commits, but pending rows are not deleted until
-    # Transaction 2. In that window a second worker can claim and process the same rows,
-    # causing double-counting in tree_listing aggregations.
+    # WARNING: Concurrent workers must each own a different shard (--shard).
+    # Pending rows are not locked nor deleted, a shard only records its position in
+    # the sealed slot of the queue after its batch is aggregated. A second worker of
+    # the same shard would read and process the same rows, causing double-counting in
+    # tree_listing aggregations. The shard coordinator refuses to start a worker whose
+    # shard is already owned.
     help = """
         Process pending tests for hardware status aggregation,
         checking corresponding builds and checkouts in the database.
         Pending tests are generated through the monitor_submissions command.
         """
     running = True
+    coordinator: Optional[ShardCoordinator] = None
+    engine: Literal["python", "sql"] = "python"
 
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
@@ -545,11 +525,30 @@ class Command(BaseCommand):
             default=1,
             help="Sleep interval in seconds when running in loop mode",
         )
+        parser.add_argument(
+            "--shard",
+            type=parse_shard,
+            default=None,
+            help="""Process only a shard of the pending items, as N/M (shard N of M)
+            or auto/M (shards assigned evenly among the auto workers, adjusted
+            when workers join or leave). All concurrent workers must use the same M.
+            By default a single worker processes everything.""",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=["python", "sql"],
+            default="python",
+            help="""Aggregate the batches in Python (default) or with set-based SQL
+            statements run entirely in the database. Both produce the same
+            aggregates.""",
+        )
 
     def handle(self, *args, **options):
         batch_size = options["batch_size"]
         loop = options["loop"]
         interval = options["interval"]
+        shard = options["shard"] or UNSHARDED
+        self.engine = options["engine"]
 
         metrics_port = int(os.environ.get("PROMETHEUS_METRICS_PORT", 8001))
         if PROMETHEUS_MULTIPROC_DIR:
@@ -561,73 +560,55 @@ class Command(BaseCommand):
             start_http_server(metrics_port)
             out(f"Prometheus metrics server started on port {metrics_port}")
 
-        if loop:
-            signal.signal(signal.SIGTERM, self.signal_handler)
-            signal.signal(signal.SIGINT, self.signal_handler)
-
-            out(f"Starting pending aggregation processor (interval={interval}s)...")
-            try:
-                while self.running:
-                    processed_count = self.process_pending_batch(batch_size)
-                    if processed_count == 0:
-                        out(f"Sleeping for {interval} seconds")
-                        time.sleep(interval)
-            except KeyboardInterrupt:
-                out("Stopping pending aggregation processor...")
-            finally:
-                out("Pending aggregation processor shutdown complete")
-        else:
-            self.process_pending_batch(batch_size)
-
-    def _delete_ready_builds(self, *, ready_builds: Sequence[PendingBuilds]) -> int:
-        """
-        Deletes PendingBuilds that have been processed.
-        Returns the number of deleted entries.
-        """
-
-        if not ready_builds:
-            return 0
-
-        t0 = time.time()
-        count = PendingBuilds.objects.filter(
-            build_id__in=[build.build_id for build in ready_builds]
-        ).delete()[0]
-        out(f"Deleted {count} pending builds in {time.time() - t0:.3f}s")
-
-        return count
-
-    def _delete_ready_tests(self, *, ready_tests: Sequence[PendingTest]) -> int:
-        """
-        Deletes PendingTests that have been processed.
-        Returns the number of deleted entries.
-        """
-
-        if not ready_tests:
-            return 0
-
-        t0 = time.time()
-        count = PendingTest.objects.filter(
-            test_id__in=[test.test_id for test in ready_tests]
-        ).delete()[0]
-        out(f"Deleted {count} pending tests in {time.time() - t0:.3f}s")
+        self.coordinator = ShardCoordinator(shard)
+        self.coordinator.join()
+        try:
+            if loop:
+                signal.signal(signal.SIGTERM, self.signal_handler)
+                signal.signal(signal.SIGINT, self.signal_handler)
 
-        return count
+                out(
+                    f"Starting pending aggregation processor "
+                    f"(interval={interval}s, shard={shard}, engine={self.engine})..."
+                )
+                try:
+                    while self.running:
+                        processed_count = self.process_pending_batch(batch_size)
+                        if processed_count == 0:
+                            out(f"Sleeping for {interval} seconds")
+                            time.sleep(interval)
+                except KeyboardInterrupt:
+                    out("Stopping pending aggregation processor...")
+                finally:
+                    out("Pending aggregation processor shutdown complete")
+            else:
+                self.process_pending_batch(batch_size)
+        finally:
+            self.coordinator.leave()
 
     def _process_new_processed_entries(
-        self, new_processed_entries: set[ProcessedListingItems]
+        self, new_processed_entries: ProcessedStatuses
     ) -> None:
         if not new_processed_entries:
             return
 
         t0 = time.time()
-        ProcessedListingItems.objects.bulk_create(
-            new_processed_entries,
+        ProcessedItems.objects.bulk_create(
+            [
+                ProcessedItems(
+                    checkout_id=key.checkout_id,
+                    kind=key.kind,
+                    entity_id=key.entity_id,
+                    status=status,
+                )
+                for key, status in new_processed_entries.items()
+            ],
             update_conflicts=True,
-            update_fields=["checkout_id", "status"],
-            unique_fields=["listing_item_key"],
+            update_fields=["status"],
+            unique_fields=["checkout_id", "kind", "entity_id"],
         )
         out(
-            f"bulk_create ProcessedListingItems: n={len(new_processed_entries)} "
+            f"bulk_create ProcessedItems: n={len(new_processed_entries)} "
             f"in {time.time() - t0:.3f}s"
         )
         AGGREGATION_RECORDS_WRITTEN.labels(table="processed_items").inc(
@@ -747,14 +728,17 @@ class Command(BaseCommand):
             )
 
     def _get_ready_builds(
-        self, *, last_processed_build_id: Optional[str], batch_size: int
+        self,
+        *,
+        position: QueuePosition,
+        batch_size: int,
     ) -> tuple[Sequence[PendingBuilds], dict[str, Checkouts], Optional[str], int, int]:
         """
         Fetches a batch of pending builds along with their associated build and checkout information.
         Args:
-            last_processed_build_id (Optional[str]): The ID of the last processed build from a
-                previous batch. If provided, only builds with IDs greater than this will be fetched.
-                Used for pagination across batches.
+            position (QueuePosition): Position of the shard in the sealed slot of the queue.
+                Only builds of the shard with IDs greater than its last build ID are fetched.
+                Builds whose checkout isn't in the database belong to no shard.
             batch_size (int): The maximum number of pending builds to fetch in this batch.
         Returns a tuple containing:
             - list[PendingBuild]: List of pending builds ready for processing.
@@ -771,12 +755,24 @@ class Command(BaseCommand):
         build_checkouts_by_id: dict[str, Checkouts] = {}
         skipped_no_checkout = 0
         pending_build_count = 0
+        last_processed_build_id = position.last_build_id
 
-        qs = PendingBuilds.objects.select_for_update(skip_locked=True).order_by(
-            "build_id"
-        )
+        if position.builds_done:
+            return (
+                ready_builds,
+                build_checkouts_by_id,
+                last_processed_build_id,
+                skipped_no_checkout,
+                pending_build_count,
+            )
+
+        qs = PendingBuilds.objects.filter(slot=position.slot).order_by("build_id")
         if last_processed_build_id:
             qs = qs.filter(build_id__gt=last_processed_build_id)
+        if position.shards is not None:
+            qs = qs.alias(shard=pending_build_shard(position.shard_count)).filter(
+                shard__in=position.shards
+            )
 
         pending_builds_batch = list(qs[:batch_size])
         pending_build_count = len(pending_builds_batch)
@@ -828,14 +824,17 @@ class Command(BaseCommand):
         )
 
     def _get_ready_tests(
-        self, *, last_processed_test_id: Optional[str], batch_size: int
+        self,
+        *,
+        position: QueuePosition,
+        batch_size: int,
     ) -> tuple[Sequence[PendingTest], dict[str, Builds], Optional[str], int, int]:
         """
         Fetches a batch of pending tests along with their associated build and checkout information.
         Args:
-            last_processed_test_id (Optional[str]): The ID of the last processed test from a
-                previous batch. If provided, only tests with IDs greater than this will be fetched.
-                Used for pagination across batches.
+            position (QueuePosition): Position of the shard in the sealed slot of the queue.
+                Only tests of the shard with IDs greater than its last test ID are fetched.
+                Tests whose build isn't in the database belong to no shard.
             batch_size (int): The maximum number of pending tests to fetch in this batch.
         Returns a tuple containing:
             - list[PendingTest]: List of pending tests and related data ready for processing.
@@ -852,10 +851,24 @@ class Command(BaseCommand):
         test_builds_by_id: dict[str, Builds] = {}
         skipped_no_build = 0
         pending_test_count = 0
+        last_processed_test_id = position.last_test_id
+
+        if position.tests_done:
+            return (
+                ready_tests,
+                test_builds_by_id,
+                last_processed_test_id,
+                skipped_no_build,
+                pending_test_count,
+            )
 
-        qs = PendingTest.objects.select_for_update(skip_locked=True).order_by("test_id")
+        qs = PendingTest.objects.filter(slot=position.slot).order_by("test_id")
         if last_processed_test_id:
             qs = qs.filter(test_id__gt=last_processed_test_id)
+        if position.shards is not None:
+            qs = qs.alias(shard=pending_test_shard(position.shard_count)).filter(
+                shard__in=position.shards
+            )
 
         pending_tests_batch = list(qs[:batch_size])
         pending_test_count = len(pending_tests_batch)
@@ -891,6 +904,7 @@ class Command(BaseCommand):
                 "checkout__git_repository_url",
                 "checkout__git_repository_branch",
                 "checkout__git_commit_hash",
+                "checkout__git_commit_tags",
             )
             .in_bulk(pending_test_build_ids)
         )
@@ -985,35 +999,31 @@ class Command(BaseCommand):
         if not ready_tests:
             return
 
-        rollup_keys_by_test_id = {
-            t.test_id: get_rollup_key(t.test_id) for t in ready_tests
-        }
+        rollup_keys_by_test_id: dict[str, ProcessedItemKey] = {}
+        for test in ready_tests:
+            try:
+                build = test_builds_by_id[test.build_id]
+            except KeyError:
+                continue
+            rollup_keys_by_test_id[test.test_id] = ProcessedItemKey(
+                build.checkout.id, ProcessedItemKind.ROLLUP_TEST, test.test_id
+            )
 
-        existing_processed = _get_existing_processed(
-            set(rollup_keys_by_test_id.values())
-        )
-        existing_by_key = {
-            (e.listing_item_key, e.checkout_id): e for e in existing_processed
-        }
+        existing_processed = fetch_processed_items(set(rollup_keys_by_test_id.values()))
 
         tests_to_process: list[PendingTest] = []
         test_ids = []
         reprocess_test_ids: set[str] = set()
-        new_processed_entries: set[ProcessedListingItems] = set()
+        new_processed_entries: ProcessedStatuses = {}
 
         for test in ready_tests:
-            rollup_key = rollup_keys_by_test_id[test.test_id]
-
             try:
-                build = test_builds_by_id[test.build_id]
-                checkout_id = build.checkout.id
+                rollup_key = rollup_keys_by_test_id[test.test_id]
             except KeyError:
                 continue
 
-            found_existing = existing_by_key.get((rollup_key, checkout_id), None)
-
-            if found_existing:
-                stored_status = found_existing.status
+            if rollup_key in existing_processed:
+                stored_status = existing_processed[rollup_key]
 
                 if stored_status is not None:
                     continue
@@ -1026,13 +1036,7 @@ class Command(BaseCommand):
 
             tests_to_process.append(test)
             test_ids.append(test.test_id)
-            new_processed_entries.add(
-                ProcessedListingItems(
-                    listing_item_key=rollup_key,
-                    checkout_id=checkout_id,
-                    status=test.status,
-                )
-            )
+            new_processed_entries[rollup_key] = test.status
 
         if not tests_to_process:
             return
@@ -1053,6 +1057,7 @@ class Command(BaseCommand):
         ready_tests: Sequence[PendingTest],
         test_builds_by_id: dict[str, Builds],
     ) -> None:
+        lock_aggregated_builds({test.build_id for test in ready_tests})
         hardware_status_data, new_processed_entries_hardware = (
             aggregate_hardware_status(ready_tests, test_builds_by_id)
         )
@@ -1094,60 +1099,193 @@ class Command(BaseCommand):
                 else:
                     raise
 
+    def _process_sql_batch(
+        self,
+        *,
+        position: QueuePosition,
+        batch_size: int,
+        max_retries: int = int(os.getenv("PROCESS_PENDING_MAX_RETRIES", "5")),
+    ) -> SqlBatchResult:
+        """
+        Aggregates a batch and saves the new position of its shard in a single
+        transaction with the SQL engine.
+        """
+        for attempt in range(max_retries):
+            try:
+                with transaction.atomic():
+                    result = aggregate_pending_batch(
+                        position=position, batch_size=batch_size
+                    )
+                    save_queue_position(
+                        self._advance_position(
+                            position,
+                            batch_size=batch_size,
+                            last_processed_test_id=result.last_processed_test_id,
+                            pending_test_count=result.pending_test_count,
+                            last_processed_build_id=result.last_processed_build_id,
+                            pending_build_count=result.pending_build_count,
+                        )
+                    )
+                break
+            except OperationalError as e:
+                if (
+                    isinstance(e.__cause__, DeadlockDetected)
+                    and attempt < max_retries - 1
+                ):
+                    DEADLOCK_RETRIES_TOTAL.labels(table="tree_listing").inc()
+                    wait = min(30, 2 ** (attempt + 2))
+                    out(
+                        f"Deadlock on SQL batch (attempt {attempt + 1}/{max_retries}), "
+                        f"retrying in {wait:.2f}s..."
+                    )
+                    time.sleep(wait)
+                else:
+                    raise
+
+        out(
+            "SQL batch: "
+            + ", ".join(
+                f"{count} {table} records"
+                for table, count in result.records_written.items()
+            )
+        )
+        for table, count in result.records_written.items():
+            AGGREGATION_RECORDS_WRITTEN.labels(table=table).inc(count)
+        return result
+
+    def _claim_shards(self) -> Optional[list[int]]:
+        """
+        Returns the shards to process in the next batch, or None if this worker
+        processes all pending items.
+        """
+        if self.coordinator is None:
+            return None
+        shards = self.coordinator.rebalance()
+        if self.coordinator.spec.count == 1:
+            return None
+        return shards
+
+    @staticmethod
+    def _advance_position(
+        position: QueuePosition,
+        *,
+        batch_size: int,
+        last_processed_test_id: Optional[str],
+        pending_test_count: int,
+        last_processed_build_id: Optional[str],
+        pending_build_count: int,
+    ) -> QueuePosition:
+        """
+        Moves a shard position past a batch. Nothing is added to the sealed slot, so
+        the shard is done with tests or builds once a batch reads less than a full
+        batch of them.
+        """
+        return position._replace(
+            last_test_id=last_processed_test_id,
+            last_build_id=last_processed_build_id,
+            tests_done=position.tests_done or pending_test_count < batch_size,
+            builds_done=position.builds_done or pending_build_count < batch_size,
+        )
+
     def process_pending_batch(self, batch_size: int) -> int:
-        last_processed_test_id = None
-        last_processed_build_id = None
+        shard_count = self.coordinator.spec.count if self.coordinator else 1
         tests_count = 0
         builds_count = 0
+        rotated = False
 
         while True:
+            shards = self._claim_shards()
+            if shards == []:
+                out("No shards assigned to this worker, exiting batch loop")
+                break
+
+            shards = [UNSHARDED.index] if shards is None else shards
+            position = next_queue_position(shard_count=shard_count, shards=shards)
+            if position is None and not rotated:
+                # The queue is rotated at most once, so that a call ends even if
+                # items keep arriving. It may also have been rotated by another
+                # worker in the meantime, so the position is read again either way
+                if rotate_pending_queue(shard_count):
+                    out("Rotated the pending queue")
+                rotated = True
+                position = next_queue_position(shard_count=shard_count, shards=shards)
+            if position is None:
+                out("No pending items found, exiting batch loop")
+                break
+
             out(
                 f"Starting batch processing "
-                f"(last_processed_test_id={str(last_processed_test_id)[:20]}, "
-                f"last_processed_build_id={str(last_processed_build_id)[:20]}, "
+                f"(shard={position.shard}/{position.shard_count}, "
+                f"last_processed_test_id={str(position.last_test_id)[:20]}, "
+                f"last_processed_build_id={str(position.last_build_id)[:20]}, "
                 f"batch_size={batch_size})..."
             )
             t0 = time.time()
 
-            with transaction.atomic():
-                (
-                    ready_tests,
-                    test_builds_by_id,
-                    last_processed_test_id,
-                    skipped_no_build,
-                    pending_test_count,
-                ) = self._get_ready_tests(
-                    last_processed_test_id=last_processed_test_id,
-                    batch_size=batch_size,
+            if self.engine == "sql":
+                result = self._process_sql_batch(
+                    position=position, batch_size=batch_size
                 )
+                skipped_no_build = result.skipped_no_build
+                skipped_no_checkout = result.skipped_no_checkout
+                tests_count += result.tests_count
+                builds_count += result.builds_count
+                invalidate_cached_commits(result.commit_hashes)
+            else:
+                with transaction.atomic():
+                    (
+                        ready_tests,
+                        test_builds_by_id,
+                        last_processed_test_id,
+                        skipped_no_build,
+                        pending_test_count,
+                    ) = self._get_ready_tests(position=position, batch_size=batch_size)
+
+                    if ready_tests:
+                        self._process_hardware_batch(ready_tests, test_builds_by_id)
+                        self._process_tests_rollup_batch(ready_tests, test_builds_by_id)
+
+                    (
+                        ready_builds,
+                        build_checkouts_by_id,
+                        last_processed_build_id,
+                        skipped_no_checkout,
+                        pending_build_count,
+                    ) = self._get_ready_builds(position=position, batch_size=batch_size)
+
+                if ready_tests or ready_builds:
+                    self._process_tree_listing_batch(
+                        ready_tests,
+                        test_builds_by_id,
+                        ready_builds,
+                        build_checkouts_by_id,
+                    )
 
-                if ready_tests:
-                    self._process_hardware_batch(ready_tests, test_builds_by_id)
-                    self._process_tests_rollup_batch(ready_tests, test_builds_by_id)
-
-                (
-                    ready_builds,
-                    build_checkouts_by_id,
-                    last_processed_build_id,
-                    skipped_no_checkout,
-                    pending_build_count,
-                ) = self._get_ready_builds(
-                    last_processed_build_id=last_processed_build_id,
-                    batch_size=batch_size,
+                save_queue_position(
+                    self._advance_position(
+                        position,
+                        batch_size=batch_size,
+                        last_processed_test_id=last_processed_test_id,
+                        pending_test_count=pending_test_count,
+                        last_processed_build_id=last_processed_build_id,
+                        pending_build_count=pending_build_count,
+                    )
                 )
-
-            if ready_tests or ready_builds:
-                self._process_tree_listing_batch(
-                    ready_tests,
-                    test_builds_by_id,
-                    ready_builds,
-                    build_checkouts_by_id,
+                tests_count += len(ready_tests)
+                builds_count += len(ready_builds)
+                # Only the tests rollup is read by queries of specific checkouts
+                invalidate_cached_commits(
+                    set().union(
+                        *(
+                            checkout_commits(
+                                build.checkout.git_commit_hash,
+                                build.checkout.git_commit_tags,
+                            )
+                            for build in test_builds_by_id.values()
+                        )
+                    )
                 )
 
-            with transaction.atomic():
-                tests_count += self._delete_ready_tests(ready_tests=ready_tests)
-                builds_count += self._delete_ready_builds(ready_builds=ready_builds)
-
             out(
                 f"Batch processed: {tests_count} tests aggregated, "
                 f"skipped (no build): {skipped_no_build}; "
@@ -1156,8 +1294,4 @@ class Command(BaseCommand):
                 f"in {time.time() - t0:.3f}s"
             )
 
-            if pending_test_count == 0 and pending_build_count == 0:
-                out("No pending items found, exiting batch loop")
-                break
-
         return tests_count + builds_count
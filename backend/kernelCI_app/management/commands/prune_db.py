@@ -9,19 +9,59 @@ children are newer than the cutoff.
 Rows linked to an incident (an issue) are kept by default, together with their
 ancestors so nothing is orphaned; pass --skip-issue-protection to prune them too.
 
-Only checkouts, builds and tests are touched. Aggregate and derived tables (e.g.
-tree_tests_rollup, hardware_status, latest_checkout) are left untouched and must
-be cleaned up separately.
+When checkouts are pruned, the rows of the derived tables that reference them
+(processed_items, hardware_status, latest_checkout) are deleted with them, as well
+as the tree_tests_rollup and tree_listing rows of the tree commits left without
+checkouts. The counts of the checkouts that are kept aren't recomputed.
+
+The doomed ids are deleted in batches that each commit on their own. With
+--throttle, the batches are paced so the command can run alongside the ingester,
+see PruneThrottle. The partitions of a table partitioned by range of _created,
+see partition_tables, whose rows are all doomed are detached and dropped at once
+instead.
 """
 
-from django.core.management.base import BaseCommand, CommandError
-from django.db import connections
+import time
+from typing import Optional
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from psycopg.errors import LockNotAvailable
+
+from kernelCI_app.constants.prune import (
+    PRUNE_LOCK_TIMEOUT_MS,
+    PRUNE_MAX_REPLICA_LAG_SEC,
+    PRUNE_MAX_TREE_COMMITS_BATCH,
+)
 from kernelCI_app.management.commands.helpers.intervals import parse_interval
+from kernelCI_app.management.commands.helpers.prune_throttle import PruneThrottle
+from kernelCI_app.management.commands.helpers.rollup_rebuild import TREE_COLUMNS
 
 # Strict parent-before-child order: a checkout owns builds, a build owns tests.
 PRUNABLE_TABLES = ("checkouts", "builds", "tests")
 
+# Derived tables with a row per checkout, deleted in the batch of their checkout
+CHECKOUT_DERIVED_TABLES = ("processed_items", "hardware_status", "latest_checkout")
+
+# Derived tables with rows per tree commit, deleted once no checkout of the tree
+# commit is left
+TREE_COMMIT_DERIVED_TABLES = ("tree_tests_rollup", "tree_listing")
+
+_TREE_COLUMNS_SQL = ", ".join(TREE_COLUMNS)
+
+# Range partitions on _created that only hold rows ingested before the cutoff
+_OLD_PARTITIONS_SQL = """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %(table)s::regclass
+        AND pg_get_partkeydef(i.inhparent) = 'RANGE (_created)'
+        AND (
+            regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \\(''([^'']+)''\\)')
+        )[1]::timestamptz <= %(cutoff)s
+    ORDER BY c.relname
+"""
+
 
 class Command(BaseCommand):
     help = "Prune checkouts, builds and tests older than a given age"
@@ -73,6 +113,33 @@ class Command(BaseCommand):
             help="Prune builds and tests linked to issues (default: keep rows with "
             "an associated incident)",
         )
+        parser.add_argument(
+            "--throttle",
+            action="store_true",
+            help="Adapt the batch size to a target batch duration, to the lock waits "
+            "and to the replication lag, so the command can run alongside the "
+            "ingester. --batch-size is then the largest batch.",
+        )
+        parser.add_argument(
+            "--max-replica-lag",
+            type=float,
+            default=PRUNE_MAX_REPLICA_LAG_SEC,
+            help="With --throttle, wait for the replicas when they lag behind by more "
+            f"than this many seconds (default: {PRUNE_MAX_REPLICA_LAG_SEC})",
+        )
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            default=PRUNE_LOCK_TIMEOUT_MS,
+            help="Milliseconds a partition detach, or a batch with --throttle, can "
+            f"wait for a lock before being retried (default: {PRUNE_LOCK_TIMEOUT_MS})",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="With --throttle, seconds to sleep between batches (default: 0)",
+        )
 
     def handle(self, *args, **options):
         try:
@@ -86,6 +153,10 @@ class Command(BaseCommand):
                 "It sets how many rows are deleted per batch, so it needs to be a "
                 "positive number."
             )
+        if options["lock_timeout"] < 1:
+            raise CommandError(
+                f"--lock-timeout must be at least 1 (got {options['lock_timeout']})."
+            )
 
         unknown_tables = [t for t in options["tables"] if t not in PRUNABLE_TABLES]
         if unknown_tables:
@@ -123,6 +194,11 @@ class Command(BaseCommand):
                     t: self._count(cursor, temp_tables[t]) for t in selected_tables
                 }
                 total = sum(counts.values())
+                tree_commits = (
+                    self._pruned_tree_commits(cursor, temp_tables["checkouts"])
+                    if "checkouts" in selected_tables
+                    else []
+                )
 
                 lines = [f"Rows older than {cutoff.isoformat()}:"]
                 lines += [f"* {t}:\t{counts[t]:>8}" for t in selected_tables]
@@ -132,6 +208,12 @@ class Command(BaseCommand):
                 )
                 if protect_incidents:
                     lines.append("Note: rows linked to an incident are kept.")
+                if "checkouts" in selected_tables:
+                    lines.append(
+                        "Note: the rows of the derived tables that reference the "
+                        "pruned checkouts are deleted too, including the rollups of "
+                        f"{len(tree_commits)} tree commits left without checkouts."
+                    )
                 self.stdout.write("\n".join(lines))
 
                 if total == 0:
@@ -159,16 +241,31 @@ class Command(BaseCommand):
                 # Delete child-first (reverse of PRUNABLE_TABLES order): each batch
                 # commits on its own, so a crash mid-run leaves children already gone
                 # before their parents, never the reverse. Reordering this would risk
-                # orphans.
+                # orphans. Derived rows go before the checkouts they reference.
                 deleted = 0
+                derived = dict.fromkeys(
+                    (*CHECKOUT_DERIVED_TABLES, *TREE_COMMIT_DERIVED_TABLES), 0
+                )
                 for table in reversed(selected_tables):
+                    if table == "checkouts":
+                        self._delete_tree_commits_rollups(
+                            cursor, tree_commits, derived, options
+                        )
+                    deleted += self._drop_partitions(
+                        cursor, table, temp_tables[table], cutoff, options
+                    )
                     deleted += self._batch_delete(
-                        cursor, table, temp_tables[table], options["batch_size"]
+                        cursor, table, temp_tables[table], derived, options
                     )
 
                 self.stdout.write(
                     self.style.SUCCESS(f"Successfully pruned {deleted} rows.")
                 )
+                if "checkouts" in selected_tables:
+                    self.stdout.write(
+                        "Deleted derived rows: "
+                        + ", ".join(f"{t}={n}" for t, n in derived.items())
+                    )
             finally:
                 for temp_table in temp_tables.values():
                     cursor.execute(f'DROP TABLE IF EXISTS "{temp_table}"')
@@ -226,31 +323,215 @@ class Command(BaseCommand):
 
     def _materialize(self, cursor, table, temp_table, where, params):
         """Snapshot the doomed ids into a temp table so the nested predicate runs
-        once instead of per batch."""
+        once instead of per batch. Its index lets the batches walk through it."""
         cursor.execute(f'DROP TABLE IF EXISTS "{temp_table}"')
         cursor.execute(
             f'CREATE TEMP TABLE "{temp_table}" AS '
             f'SELECT id FROM "{table}" WHERE {where}',
             params,
         )
+        cursor.execute(f'CREATE UNIQUE INDEX ON "{temp_table}" (id)')
+        cursor.execute(f'ANALYZE "{temp_table}"')
 
     def _count(self, cursor, temp_table):
         cursor.execute(f'SELECT COUNT(*) FROM "{temp_table}"')
         return cursor.fetchone()[0]
 
-    def _batch_delete(self, cursor, table, temp_table, batch_size):
+    def _pruned_tree_commits(self, cursor, temp_table):
+        """Tree commits whose checkouts are all pruned. EXCEPT matches nulls."""
+        cursor.execute(
+            f"SELECT {_TREE_COLUMNS_SQL} FROM checkouts "
+            f'WHERE id IN (SELECT id FROM "{temp_table}") '
+            f"EXCEPT SELECT {_TREE_COLUMNS_SQL} FROM checkouts "
+            f'WHERE id NOT IN (SELECT id FROM "{temp_table}")'
+        )
+        return cursor.fetchall()
+
+    def _throttle(self, options) -> Optional[PruneThrottle]:
+        if not options["throttle"]:
+            return None
+        return PruneThrottle(
+            max_batch_size=options["batch_size"],
+            max_replica_lag_sec=options["max_replica_lag"],
+            pause_sec=options["pause"],
+        )
+
+    def _run_batch(self, cursor, sql, params, throttle, options):
+        """Runs a batch in its own transaction and returns its result row. With a
+        throttle, returns None if the batch waited for a lock over its budget."""
+        try:
+            with transaction.atomic():
+                if throttle is not None:
+                    self._set_lock_timeout(cursor, options)
+                cursor.execute(sql, params)
+                return cursor.fetchone()
+        except OperationalError as e:
+            if throttle is None or not isinstance(e.__cause__, LockNotAvailable):
+                raise
+            throttle.record_lock_timeout()
+            self.stdout.write(
+                f"Lock wait over {options['lock_timeout']}ms, retrying with "
+                f"batch size {throttle.batch_size}"
+            )
+            return None
+
+    def _set_lock_timeout(self, cursor, options):
+        cursor.execute(
+            "SELECT set_config('lock_timeout', %s, true)",
+            [f"{options['lock_timeout']}ms"],
+        )
+
+    def _pace(self, cursor, throttle, size, started):
+        if throttle is None:
+            return
+        throttle.record_batch(size, time.monotonic() - started)
+        lag = throttle.wait(cursor)
+        if lag:
+            self.stdout.write(
+                f"Waited for the replicas to catch up (lag={lag:.1f}s), "
+                f"batch size {throttle.batch_size}"
+            )
+
+    def _batch_delete(self, cursor, table, temp_table, derived, options):
+        """Delete the ids of the temp table in batches, walking through it by id.
+        The derived rows of the checkouts are deleted in the batch of their
+        checkout."""
+        derived_tables = CHECKOUT_DERIVED_TABLES if table == "checkouts" else ()
+        derived_ctes = "".join(
+            f', "deleted_{t}" AS ('
+            f'DELETE FROM "{t}" WHERE checkout_id IN (SELECT id FROM batch) '
+            "RETURNING 1)"
+            for t in derived_tables
+        )
+        derived_counts = "".join(
+            f', (SELECT COUNT(*) FROM "deleted_{t}")' for t in derived_tables
+        )
         sql = (
-            f"WITH batch AS ("
-            f'DELETE FROM "{temp_table}" WHERE id IN '
-            f'(SELECT id FROM "{temp_table}" LIMIT %(batch_size)s) RETURNING id'
-            f') DELETE FROM "{table}" WHERE id IN (SELECT id FROM batch)'
+            f'WITH batch AS (SELECT id FROM "{temp_table}" WHERE id > %(after)s '
+            f"ORDER BY id LIMIT %(batch_size)s){derived_ctes}, "
+            f'deleted AS (DELETE FROM "{table}" WHERE id IN (SELECT id FROM batch) '
+            "RETURNING 1) "
+            f"SELECT (SELECT MAX(id) FROM batch), (SELECT COUNT(*) FROM deleted)"
+            f"{derived_counts}"
         )
+
+        throttle = self._throttle(options)
+        after = ""
         deleted_total = 0
         while True:
-            cursor.execute(sql, {"batch_size": batch_size})
-            deleted = cursor.rowcount
-            if deleted == 0:
+            size = throttle.batch_size if throttle else options["batch_size"]
+            started = time.monotonic()
+            result = self._run_batch(
+                cursor, sql, {"after": after, "batch_size": size}, throttle, options
+            )
+            if result is None:
+                continue
+            last_id, deleted, *derived_deleted = result
+            if last_id is None:
                 break
+            after = last_id
             deleted_total += deleted
+            for derived_table, count in zip(
+                derived_tables, derived_deleted, strict=True
+            ):
+                derived[derived_table] += count
             self.stdout.write(f"Deleted {table}(n={deleted}) total={deleted_total}")
+            self._pace(cursor, throttle, size, started)
         return deleted_total
+
+    def _delete_tree_commits_rollups(self, cursor, tree_commits, derived, options):
+        """Delete the rows of the tree commits left without checkouts from the
+        tables aggregated per tree commit, in batches of tree commits."""
+        throttle = self._throttle(options)
+        start = 0
+        while start < len(tree_commits):
+            size = min(
+                throttle.batch_size if throttle else options["batch_size"],
+                PRUNE_MAX_TREE_COMMITS_BATCH,
+            )
+            batch = tree_commits[start : start + size]
+            condition, params = _tree_commits_condition(batch)
+            ctes = ", ".join(
+                f'"deleted_{t}" AS (DELETE FROM "{t}" WHERE {condition} RETURNING 1)'
+                for t in TREE_COMMIT_DERIVED_TABLES
+            )
+            counts = ", ".join(
+                f'(SELECT COUNT(*) FROM "deleted_{t}")'
+                for t in TREE_COMMIT_DERIVED_TABLES
+            )
+            started = time.monotonic()
+            result = self._run_batch(
+                cursor,
+                f"WITH {ctes} SELECT {counts}",
+                params * len(TREE_COMMIT_DERIVED_TABLES),
+                throttle,
+                options,
+            )
+            if result is None:
+                continue
+            start += len(batch)
+            for table, count in zip(TREE_COMMIT_DERIVED_TABLES, result, strict=True):
+                derived[table] += count
+            self.stdout.write(
+                f"Deleted rollups of tree commits(n={len(batch)}) total={start}"
+            )
+            self._pace(cursor, throttle, size, started)
+
+    def _drop_partitions(self, cursor, table, temp_table, cutoff, options):
+        """Detach and drop the partitions older than the cutoff whose rows are all
+        doomed, and remove their ids from the temp table. A partition whose locks
+        can't be taken within the lock timeout is left to the batches."""
+        cursor.execute(_OLD_PARTITIONS_SQL, {"table": table, "cutoff": cutoff})
+        partitions = [row[0] for row in cursor.fetchall()]
+
+        dropped_total = 0
+        for partition in partitions:
+            try:
+                with transaction.atomic():
+                    self._set_lock_timeout(cursor, options)
+                    # No row can be added to the partition until it is dropped
+                    cursor.execute(f'LOCK TABLE "{partition}" IN SHARE MODE')
+                    cursor.execute(
+                        f"SELECT COUNT(*), COUNT(*) FILTER (WHERE t.id IS NULL) "
+                        f'FROM "{partition}" p LEFT JOIN "{temp_table}" t '
+                        "ON t.id = p.id"
+                    )
+                    rows, kept = cursor.fetchone()
+                    if kept:
+                        continue
+                    cursor.execute(
+                        f'DELETE FROM "{temp_table}" t USING "{partition}" p '
+                        "WHERE t.id = p.id"
+                    )
+                    cursor.execute(
+                        f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"'
+                    )
+                    cursor.execute(f'DROP TABLE "{partition}"')
+            except OperationalError as e:
+                if not isinstance(e.__cause__, LockNotAvailable):
+                    raise
+                self.stdout.write(
+                    f"Could not lock partition {partition} within "
+                    f"{options['lock_timeout']}ms, deleting its rows in batches"
+                )
+                continue
+            dropped_total += rows
+            self.stdout.write(f"Dropped partition {partition}(n={rows})")
+        return dropped_total
+
+
+def _tree_commits_condition(tree_commits):
+    """Condition matching the rows of the tree commits. Each column is compared
+    with `=` or `IS NULL`, which unlike IS NOT DISTINCT FROM can use the indexes."""
+    clauses = []
+    params = []
+    for tree_commit in tree_commits:
+        terms = []
+        for column, value in zip(TREE_COLUMNS, tree_commit, strict=True):
+            if value is None:
+                terms.append(f"{column} IS NULL")
+            else:
+                terms.append(f"{column} = %s")
+                params.append(value)
+        clauses.append("(" + " AND ".join(terms) + ")")
+    return " OR ".join(clauses), params
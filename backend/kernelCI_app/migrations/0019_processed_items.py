@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+# The old keys are sha256 digests, so the entities they were made of are found
+# again by hashing the tests and builds of each checkout the same way.
+CONVERT_PROCESSED_LISTING_ITEMS = """
+WITH checkout_items AS (
+    SELECT c.id AS checkout_id,
+        c.origin || '|' || coalesce(c.tree_name, 'None')
+            || '|' || coalesce(c.git_repository_url, 'None')
+            || '|' || coalesce(c.git_repository_branch, 'None') || '|' AS tree_prefix,
+        b.id AS build_id, t.id AS test_id, t.origin AS test_origin,
+        coalesce(t.environment_misc ->> 'platform', 'None') AS platform
+    FROM checkouts c
+    JOIN builds b ON b.checkout_id = c.id
+    LEFT JOIN tests t ON t.build_id = b.id
+    WHERE c.id IN (SELECT DISTINCT checkout_id FROM processed_listing_items)
+),
+candidates AS (
+    SELECT checkout_id, 1 AS kind, test_id AS entity_id,
+        sha256(convert_to(tree_prefix || test_id, 'UTF8')) AS key
+    FROM checkout_items WHERE test_id IS NOT NULL
+    UNION ALL
+    SELECT DISTINCT checkout_id, 2, build_id,
+        sha256(convert_to(tree_prefix || build_id, 'UTF8'))
+    FROM checkout_items
+    UNION ALL
+    SELECT checkout_id, 3, test_id, sha256(convert_to(
+        test_origin || '|' || platform || '|' || checkout_id || '|' || test_id, 'UTF8'
+    ))
+    FROM checkout_items WHERE test_id IS NOT NULL
+    UNION ALL
+    SELECT DISTINCT checkout_id, 4, build_id || '|' || test_origin || '|' || platform,
+        sha256(convert_to(
+            test_origin || '|' || platform || '|' || checkout_id || '|' || build_id, 'UTF8'
+        ))
+    FROM checkout_items WHERE test_id IS NOT NULL
+    UNION ALL
+    SELECT checkout_id, 5, test_id, sha256(convert_to('rollup|' || test_id, 'UTF8'))
+    FROM checkout_items WHERE test_id IS NOT NULL
+)
+INSERT INTO processed_items (checkout_id, kind, entity_id, status)
+SELECT DISTINCT ON (cand.checkout_id, cand.kind, cand.entity_id)
+    cand.checkout_id, cand.kind, cand.entity_id, p.status
+FROM candidates cand
+JOIN processed_listing_items p
+    ON p.listing_item_key = cand.key AND p.checkout_id = cand.checkout_id
+ORDER BY cand.checkout_id, cand.kind, cand.entity_id
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("kernelCI_app", "0018_hardwareregistryplatformvendor_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessedItems",
+            fields=[
+                (
+                    "pk",
+                    models.CompositePrimaryKey(
+                        "checkout_id",
+                        "kind",
+                        "entity_id",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("checkout_id", models.TextField()),
+                (
+                    "kind",
+                    models.SmallIntegerField(
+                        choices=[
+                            (1, "Tree Listing Test"),
+                            (2, "Tree Listing Build"),
+                            (3, "Hardware Test"),
+                            (4, "Hardware Build"),
+                            (5, "Rollup Test"),
+                        ]
+                    ),
+                ),
+                ("entity_id", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("P", "Pass"), ("F", "Fail"), ("I", "Inconclusive")],
+                        max_length=1,
+                        null=True,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "processed_items",
+            },
+        ),
+        migrations.RunSQL(
+            CONVERT_PROCESSED_LISTING_ITEMS, reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.DeleteModel(
+            name="ProcessedListingItems",
+        ),
+    ]
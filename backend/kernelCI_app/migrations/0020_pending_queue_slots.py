@@ -0,0 +1,189 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:54
+
+from django.db import migrations, models
+
+# Items are written to the active slot of the queue, slot 0 until the queue row is
+# created. The shared lock keeps the queue from being rotated until the transaction
+# that wrote them ends, see PENDING_QUEUE_LOCK in constants/process_pending.py.
+CREATE_PENDING_QUEUE_SLOT_FUNCTION = """
+CREATE FUNCTION pending_queue_slot() RETURNS smallint
+LANGUAGE sql VOLATILE AS $$
+    SELECT pg_advisory_xact_lock_shared(72107);
+    SELECT COALESCE((SELECT active_slot FROM pending_queue WHERE id = 1), 0)::smallint;
+$$;
+
+INSERT INTO pending_queue (id, active_slot, generation) VALUES (1, 0, 0);
+"""
+
+DROP_PENDING_QUEUE_SLOT_FUNCTION = "DROP FUNCTION pending_queue_slot()"
+
+# The items that were pending go to the active slot
+PARTITION_PENDING_TABLE = """
+ALTER TABLE {table} RENAME TO {table}_unpartitioned;
+ALTER INDEX {table}_pkey RENAME TO {table}_unpartitioned_pkey;
+
+CREATE TABLE {table} (
+    LIKE {table}_unpartitioned,
+    slot smallint NOT NULL DEFAULT pending_queue_slot(),
+    PRIMARY KEY ({id_column}, slot)
+) PARTITION BY LIST (slot);
+CREATE TABLE {table}_slot0 PARTITION OF {table} FOR VALUES IN (0);
+CREATE TABLE {table}_slot1 PARTITION OF {table} FOR VALUES IN (1);
+CREATE TABLE {table}_parked PARTITION OF {table} FOR VALUES IN (2);
+
+INSERT INTO {table} SELECT *, 0 FROM {table}_unpartitioned;
+DROP TABLE {table}_unpartitioned;
+"""
+
+# Items of every slot are merged, keeping the values of the newest one
+UNPARTITION_PENDING_TABLE = """
+ALTER TABLE {table} RENAME TO {table}_partitioned;
+ALTER INDEX {table}_pkey RENAME TO {table}_partitioned_pkey;
+
+CREATE TABLE {table} (
+    LIKE {table}_partitioned,
+    PRIMARY KEY ({id_column})
+);
+ALTER TABLE {table} DROP COLUMN slot;
+
+INSERT INTO {table} ({columns})
+SELECT DISTINCT ON ({id_column}) {columns}
+FROM {table}_partitioned
+ORDER BY {id_column}, slot = 2, slot = pending_queue_slot() DESC;
+DROP TABLE {table}_partitioned;
+"""
+
+PENDING_TEST_COLUMNS = (
+    "test_id, origin, platform, compatible, build_id, status, is_boot, path, "
+    "start_time, lab, full_status"
+)
+
+PENDING_BUILD_COLUMNS = "build_id, origin, checkout_id, status"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("kernelCI_app", "0019_processed_items"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingQueue",
+            fields=[
+                (
+                    "id",
+                    models.SmallIntegerField(
+                        default=1, primary_key=True, serialize=False
+                    ),
+                ),
+                ("active_slot", models.SmallIntegerField(default=0)),
+                ("generation", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "pending_queue",
+            },
+        ),
+        migrations.CreateModel(
+            name="PendingQueuePosition",
+            fields=[
+                (
+                    "pk",
+                    models.CompositePrimaryKey(
+                        "generation",
+                        "shard_count",
+                        "shard",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("generation", models.BigIntegerField()),
+                ("shard_count", models.IntegerField()),
+                ("shard", models.IntegerField()),
+                ("last_test_id", models.TextField(null=True)),
+                ("last_build_id", models.TextField(null=True)),
+                ("tests_done", models.BooleanField(default=False)),
+                ("builds_done", models.BooleanField(default=False)),
+            ],
+            options={
+                "db_table": "pending_queue_position",
+            },
+        ),
+        migrations.RunSQL(
+            CREATE_PENDING_QUEUE_SLOT_FUNCTION,
+            reverse_sql=DROP_PENDING_QUEUE_SLOT_FUNCTION,
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    PARTITION_PENDING_TABLE.format(
+                        table="pending_test", id_column="test_id"
+                    ),
+                    reverse_sql=UNPARTITION_PENDING_TABLE.format(
+                        table="pending_test",
+                        id_column="test_id",
+                        columns=PENDING_TEST_COLUMNS,
+                    ),
+                ),
+                migrations.RunSQL(
+                    PARTITION_PENDING_TABLE.format(
+                        table="pending_builds", id_column="build_id"
+                    ),
+                    reverse_sql=UNPARTITION_PENDING_TABLE.format(
+                        table="pending_builds",
+                        id_column="build_id",
+                        columns=PENDING_BUILD_COLUMNS,
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name="pendingbuilds",
+                    name="pk",
+                    field=models.CompositePrimaryKey(
+                        "build_id",
+                        "slot",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AddField(
+                    model_name="pendingbuilds",
+                    name="slot",
+                    field=models.SmallIntegerField(default=None),
+                    preserve_default=False,
+                ),
+                migrations.AddField(
+                    model_name="pendingtest",
+                    name="pk",
+                    field=models.CompositePrimaryKey(
+                        "test_id",
+                        "slot",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AddField(
+                    model_name="pendingtest",
+                    name="slot",
+                    field=models.SmallIntegerField(default=None),
+                    preserve_default=False,
+                ),
+                migrations.AlterField(
+                    model_name="pendingbuilds",
+                    name="build_id",
+                    field=models.TextField(),
+                ),
+                migrations.AlterField(
+                    model_name="pendingtest",
+                    name="test_id",
+                    field=models.TextField(),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:40
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# The default is set after the column is added, otherwise the existing rows would
+# get the time of the migration instead of staying null, and the table rewritten
+ADD_CREATED_COLUMN = """
+ALTER TABLE {table} ADD COLUMN _created timestamp with time zone NULL;
+ALTER TABLE {table} ALTER COLUMN _created SET DEFAULT now();
+"""
+
+DROP_CREATED_COLUMN = "ALTER TABLE {table} DROP COLUMN _created"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("kernelCI_app", "0020_pending_queue_slots"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    ADD_CREATED_COLUMN.format(table=table),
+                    reverse_sql=DROP_CREATED_COLUMN.format(table=table),
+                )
+                for table in ("builds", "tests")
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name=model_name,
+                    name="field_created",
+                    field=models.DateTimeField(
+                        blank=True,
+                        db_column="_created",
+                        db_default=django.db.models.functions.datetime.Now(),
+                        null=True,
+                    ),
+                )
+                for model_name in ("builds", "tests")
+            ],
+        ),
+    ]
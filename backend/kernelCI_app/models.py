@@ -6,7 +6,7 @@ from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.db.models import F, Q
 from django.db.models.expressions import RawSQL
-from django.db.models.functions import MD5, Concat
+from django.db.models.functions import MD5, Concat, Now
 
 
 class StatusChoices(models.TextChoices):
@@ -100,6 +100,12 @@ class Builds(models.Model):
     field_timestamp = models.DateTimeField(
         db_column="_timestamp", blank=True, null=True
     )
+    # When the build was first ingested. Unlike _timestamp it never changes, so it
+    # can be the partition key, see the partition_tables command. Null for the
+    # builds ingested before it was added.
+    field_created = models.DateTimeField(
+        db_column="_created", blank=True, null=True, db_default=Now()
+    )
     checkout = models.ForeignKey(
         Checkouts, db_constraint=False, on_delete=models.DO_NOTHING
     )
@@ -159,6 +165,10 @@ class Tests(models.Model):
     field_timestamp = models.DateTimeField(
         db_column="_timestamp", blank=True, null=True
     )
+    # When the test was first ingested, see Builds.field_created
+    field_created = models.DateTimeField(
+        db_column="_created", blank=True, null=True, db_default=Now()
+    )
     build = models.ForeignKey(Builds, db_constraint=False, on_delete=models.DO_NOTHING)
     id = models.TextField(primary_key=True)
     origin = models.TextField()
@@ -314,7 +324,11 @@ class LatestCheckout(models.Model):
 
 
 class PendingTest(models.Model):
-    test_id = models.TextField(primary_key=True)
+    # A test can be both in the sealed slot and again in the active slot, see
+    # PendingQueue. The slot is filled by the database with the active slot.
+    pk = models.CompositePrimaryKey("test_id", "slot")
+    test_id = models.TextField()
+    slot = models.SmallIntegerField()
     origin = models.CharField(max_length=100)
     platform = models.CharField(max_length=100, null=True)
     compatible = ArrayField(models.TextField(), null=True)
@@ -337,12 +351,29 @@ class PendingTest(models.Model):
         db_table = "pending_test"
 
 
-class ProcessedListingItems(models.Model):
-    listing_item_key = models.BinaryField(
-        max_length=32,
-        primary_key=True,
-    )  # this holds a sha256, thus digest_size = 32 bytes
+class ProcessedItemKind(models.IntegerChoices):
+    """Aggregation an item was counted in, and whether it is a test or a build"""
+
+    TREE_LISTING_TEST = 1
+    TREE_LISTING_BUILD = 2
+    HARDWARE_TEST = 3
+    HARDWARE_BUILD = 4
+    ROLLUP_TEST = 5
+
+
+class ProcessedItems(models.Model):
+    """
+    Items already counted in an aggregation, so that they are only counted once.
+    Keyed by checkout first, so the entries of a checkout are close together in the
+    primary key and can be dropped at once when it leaves the aggregation horizon.
+    """
+
+    pk = models.CompositePrimaryKey("checkout_id", "kind", "entity_id")
     checkout_id = models.TextField()
+    kind = models.SmallIntegerField(choices=ProcessedItemKind.choices)
+    # Test or build id. A build is counted once per hardware_status record, so
+    # HARDWARE_BUILD entities also hold the record's test origin and platform.
+    entity_id = models.TextField()
     # If we already processed an item, but the previous status is null and the new one is not-null,
     # we need to process it again. That's why we store the status here.
     status = models.CharField(
@@ -350,14 +381,13 @@ class ProcessedListingItems(models.Model):
     )
 
     class Meta:
-        db_table = "processed_listing_items"
-        indexes = [
-            models.Index(fields=["checkout_id"], name="phs_checkout_id"),
-        ]
+        db_table = "processed_items"
 
 
 class PendingBuilds(models.Model):
-    build_id = models.TextField(primary_key=True)
+    pk = models.CompositePrimaryKey("build_id", "slot")
+    build_id = models.TextField()
+    slot = models.SmallIntegerField()
     origin = models.CharField(max_length=100)
     checkout_id = models.TextField()
     status = models.CharField(
@@ -368,6 +398,38 @@ class PendingBuilds(models.Model):
         db_table = "pending_builds"
 
 
+class PendingQueue(models.Model):
+    """
+    Single row with the slot of pending_test and pending_builds the ingester writes
+    to. process_pending_aggregations reads the other slot, which is truncated once
+    every shard went through it, and the slots are swapped for a new generation.
+    Without the row, the queue is in slot 0 of generation 0.
+    """
+
+    id = models.SmallIntegerField(primary_key=True, default=1)
+    active_slot = models.SmallIntegerField(default=0)
+    generation = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "pending_queue"
+
+
+class PendingQueuePosition(models.Model):
+    """How far a shard went through the sealed slot of a generation"""
+
+    pk = models.CompositePrimaryKey("generation", "shard_count", "shard")
+    generation = models.BigIntegerField()
+    shard_count = models.IntegerField()
+    shard = models.IntegerField()
+    last_test_id = models.TextField(null=True)
+    last_build_id = models.TextField(null=True)
+    tests_done = models.BooleanField(default=False)
+    builds_done = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "pending_queue_position"
+
+
 class TreeListing(models.Model):
     # Not using composite primary key here because
     # the combination for a unique tree can have null values
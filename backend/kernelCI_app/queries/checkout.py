@@ -8,7 +8,7 @@ ORIGINS_CACHE_TIMEOUT = 12 * 60 * 60  # 12 hours
 
 def get_origins(interval_in_days) -> list[dict[str, str]]:
     origins_query_key = f"origins_query_{interval_in_days}"
-    origins = get_query_cache(key=origins_query_key)
+    origins = get_query_cache(key=origins_query_key, local=True)
 
     if origins is None:
         query = """
@@ -24,12 +24,12 @@ def get_origins(interval_in_days) -> list[dict[str, str]]:
         with connection.cursor() as cursor:
             cursor.execute(query, {"interval_in_days": interval_in_days})
             records = dict_fetchall(cursor=cursor)
-            if records:
-                set_query_cache(
-                    key=origins_query_key,
-                    rows=records,
-                    timeout=ORIGINS_CACHE_TIMEOUT,
-                )
+            set_query_cache(
+                key=origins_query_key,
+                rows=records,
+                timeout=ORIGINS_CACHE_TIMEOUT,
+                local=True,
+            )
             return records
 
     return origins
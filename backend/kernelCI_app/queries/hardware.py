@@ -1,10 +1,15 @@
 from datetime import datetime
+from functools import partial
 from typing import Optional, TypedDict
 
 from django.db import connection
 
-from kernelCI_app.cache import get_query_cache, set_query_cache
-from kernelCI_app.helpers.database import dict_fetchall
+from kernelCI_app.cache import (
+    get_or_set_query_cache,
+    get_query_cache,
+    set_query_cache,
+)
+from kernelCI_app.helpers.database import dict_fetchall, partition_filter
 from kernelCI_app.queries.duration import (
     get_boot_test_duration_clause,
     get_build_duration_clause,
@@ -113,7 +118,7 @@ def get_hardware_selectors(origin: str) -> list[dict]:
     cache_key = "hardwareSelectors"
     cache_params = {"origin": origin}
 
-    rows = get_query_cache(cache_key, cache_params)
+    rows = get_query_cache(cache_key, cache_params, local=True)
     if rows is not None:
         return rows
 
@@ -121,22 +126,24 @@ def get_hardware_selectors(origin: str) -> list[dict]:
     cross_origin_test_origins = {"aspeed", "ti"}
 
     if origin in cross_origin_test_origins:
-        from_where = """
+        from_where = f"""
             FROM tests t
             INNER JOIN builds b ON b.id = t.build_id
             INNER JOIN checkouts c ON c.id = b.checkout_id
             WHERE
                 t.origin = %(origin)s
                 AND t.start_time > (NOW() - INTERVAL '30 days')
+                {partition_filter("tests", alias="t", start="NOW() - INTERVAL '30 days'")}
                 AND t.environment_misc ->> 'platform' IS NOT NULL
         """
     else:
-        from_where = """
+        from_where = f"""
             FROM checkouts c
             INNER JOIN builds b ON b.checkout_id = c.id
             WHERE
                 b.origin = %(origin)s
                 AND b.start_time > (NOW() - INTERVAL '30 days')
+                {partition_filter("builds", alias="b", start="NOW() - INTERVAL '30 days'")}
         """
 
     query = f"""
@@ -171,7 +178,7 @@ def get_hardware_selectors(origin: str) -> list[dict]:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor)
 
-    set_query_cache(key=cache_key, params=cache_params, rows=rows)
+    set_query_cache(key=cache_key, params=cache_params, rows=rows, local=True)
     return rows
 
 
@@ -213,6 +220,8 @@ def get_hardware_listing_data_by_revision(
                 AND c.git_commit_hash = %(git_commit_hash)s
                 AND tests.origin = %(origin)s
                 AND tests.environment_misc ->> 'platform' IS NOT NULL
+                {partition_filter("builds", alias="b", start="c.start_time")}
+                {partition_filter("tests", alias="tests", start="c.start_time")}
         )
         SELECT
             relevant_tests.platform,
@@ -275,6 +284,7 @@ def get_hardware_listing_data_bulk(
                     "tests"."environment_misc" ->> 'platform' IS NOT NULL
                     AND "tests"."start_time" >= %(start_date)s
                     AND "tests"."start_time" <= %(end_date)s
+                    {partition_filter("tests", alias="tests", start="%(start_date)s")}
                     AND EXISTS (
                     SELECT 1
                     FROM (VALUES {values_clause}) AS key_list(hardware_id, origin, lab_name)
@@ -427,9 +437,10 @@ def get_hardware_details_data(
         "end_date": end_datetime,
     }
 
-    records = get_query_cache(cache_key, tests_cache_params)
+    commit_hashes = [tree.head_git_commit_hash for tree in trees_with_selected_commits]
+    records = get_query_cache(cache_key, tests_cache_params, commit_hash=commit_hashes)
 
-    if not records:
+    if records is None:
         records = query_records(
             hardware_id=hardware_id,
             origin=origin,
@@ -437,48 +448,27 @@ def get_hardware_details_data(
             start_date=start_datetime,
             end_date=end_datetime,
         )
-        set_query_cache(key=cache_key, params=tests_cache_params, rows=records)
+        set_query_cache(
+            key=cache_key,
+            params=tests_cache_params,
+            rows=records,
+            commit_hash=commit_hashes,
+        )
 
     return records
 
 
-def get_hardware_details_summary(
+def _query_hardware_details_summary(
     *,
     hardware_id: str,
     origin: str,
     commit_hashes: list[str],
-    builds_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
-    boots_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
-    tests_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
+    builds_duration: tuple[Optional[int], Optional[int]],
+    boots_duration: tuple[Optional[int], Optional[int]],
+    tests_duration: tuple[Optional[int], Optional[int]],
     start_datetime: datetime,
     end_datetime: datetime,
-):
-
-    if builds_duration is None:
-        builds_duration = (None, None)
-    if boots_duration is None:
-        boots_duration = (None, None)
-    if tests_duration is None:
-        tests_duration = (None, None)
-
-    cache_key = "hardwareDetailsSummary"
-
-    tests_cache_params = {
-        "hardware_id": hardware_id,
-        "origin": origin,
-        "commit_hashes": commit_hashes,
-        "start_date": start_datetime.timestamp(),
-        "end_date": end_datetime.timestamp(),
-        "builds_duration": builds_duration,
-        "boots_duration": boots_duration,
-        "tests_duration": tests_duration,
-    }
-
-    query_rows = get_query_cache(cache_key, tests_cache_params)
-
-    if query_rows is not None:
-        return query_rows
-
+) -> list[dict]:
     builds_duration_clause = get_build_duration_clause(builds_duration)
     boots_tests_duration_clause = get_boot_test_duration_clause(
         boots_duration, tests_duration
@@ -525,6 +515,7 @@ def get_hardware_details_summary(
                 AND builds.origin = %(origin)s
                 AND builds.start_time >= %(start_date)s
                 AND builds.start_time <= %(end_date)s
+                {2}
                 AND (checkouts.git_commit_hash = ANY(%(commits)s)) {0}
             GROUP BY checkouts.id, builds.status, tests.environment_compatible, compiler_arch,
                 builds.config_name, lab, platform, is_boot)
@@ -567,12 +558,15 @@ def get_hardware_details_summary(
                 AND tests.origin = %(origin)s
                 AND tests.start_time >= %(start_date)s
                 AND tests.start_time <= %(end_date)s
+                {3}
                 AND (checkouts.git_commit_hash = ANY(%(commits)s)) {1}
             GROUP BY checkouts.id, tests.status, tests.environment_compatible, compiler_arch,
                 builds.config_name, lab, platform, is_boot);
     """.format(
         builds_duration_clause,
         boots_tests_duration_clause,
+        partition_filter("builds", alias="builds", start="%(start_date)s"),
+        partition_filter("tests", alias="tests", start="%(start_date)s"),
     )
 
     build_duration_min, build_duration_max = builds_duration
@@ -595,15 +589,64 @@ def get_hardware_details_summary(
 
     with connection.cursor() as cursor:
         cursor.execute(query, params)
-        query_rows = dict_fetchall(cursor)
-        set_query_cache(key=cache_key, params=tests_cache_params, rows=query_rows)
-        return query_rows
+        return dict_fetchall(cursor)
+
+
+def get_hardware_details_summary(
+    *,
+    hardware_id: str,
+    origin: str,
+    commit_hashes: list[str],
+    builds_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
+    boots_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
+    tests_duration: Optional[tuple[Optional[int], Optional[int]]] = None,
+    start_datetime: datetime,
+    end_datetime: datetime,
+):
+
+    if builds_duration is None:
+        builds_duration = (None, None)
+    if boots_duration is None:
+        boots_duration = (None, None)
+    if tests_duration is None:
+        tests_duration = (None, None)
+
+    cache_key = "hardwareDetailsSummary"
+
+    tests_cache_params = {
+        "hardware_id": hardware_id,
+        "origin": origin,
+        "commit_hashes": commit_hashes,
+        "start_date": start_datetime.timestamp(),
+        "end_date": end_datetime.timestamp(),
+        "builds_duration": builds_duration,
+        "boots_duration": boots_duration,
+        "tests_duration": tests_duration,
+    }
+
+    return get_or_set_query_cache(
+        key=cache_key,
+        params=tests_cache_params,
+        compute=partial(
+            _query_hardware_details_summary,
+            hardware_id=hardware_id,
+            origin=origin,
+            commit_hashes=commit_hashes,
+            builds_duration=builds_duration,
+            boots_duration=boots_duration,
+            tests_duration=tests_duration,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+        ),
+        commit_hash=commit_hashes,
+    )
 
 
 def query_records(
     *, hardware_id: str, origin: str, trees: list[Tree], start_date: int, end_date: int
 ) -> list[dict] | None:
     commit_hashes = [tree.head_git_commit_hash for tree in trees]
+    tests_partition_filter = partition_filter("tests", alias="tests", start="%s")
 
     query = """
             SELECT
@@ -665,10 +708,14 @@ def query_records(
                 AND tests.origin = %s
                 AND tests.start_time >= %s
                 AND tests.start_time <= %s
+                {1}
                 AND checkouts.git_commit_hash IN ({0})
             ORDER BY
                 issues."_timestamp" DESC
-            """.format(",".join(["%s"] * len(commit_hashes)))
+            """.format(
+        ",".join(["%s"] * len(commit_hashes)),
+        tests_partition_filter,
+    )
 
     params = [
         hardware_id,
@@ -676,7 +723,10 @@ def query_records(
         origin,
         start_date,
         end_date,
-    ] + commit_hashes
+    ]
+    if tests_partition_filter:
+        params.append(start_date)
+    params += commit_hashes
 
     # TODO Treat commit_hash collision (it can happen between repos)
     with connection.cursor() as cursor:
@@ -707,6 +757,7 @@ def get_hardware_summary_data(
 
     with connection.cursor() as cursor:
         values_clause = ", ".join(["(%s, %s, %s)"] * len(triples))
+        tests_partition_filter = partition_filter("tests", alias="tests", start="%s")
 
         query = f"""
             SELECT
@@ -747,6 +798,7 @@ def get_hardware_summary_data(
             WHERE
                 tests.start_time >= %s
                 AND tests.start_time <= %s
+                {tests_partition_filter}
                 AND tests.status = 'FAIL'
                 AND EXISTS (
                 SELECT 1
@@ -763,6 +815,8 @@ def get_hardware_summary_data(
             """
 
         params = [start_date, end_date]
+        if tests_partition_filter:
+            params.append(start_date)
         for hardware_id, origin, lab_name in triples:
             params.extend([hardware_id, origin, lab_name])
 
@@ -791,9 +845,9 @@ def get_hardware_trees_head_commits(
         "end_date": end_datetime.timestamp(),
     }
 
-    trees: list[tuple[str, str]] = get_query_cache(cache_key, cache_params)
+    trees: list[tuple[str, str]] = get_query_cache(cache_key, cache_params, local=True)
 
-    if trees:
+    if trees is not None:
         return trees
 
     tree_head_clause = _get_hardware_tree_heads_clause(id_only=False)
@@ -827,6 +881,7 @@ def get_hardware_trees_head_commits(
             AND tests.origin = %(origin)s
             AND TH.start_time >= %(start_date)s
             AND TH.start_time <= %(end_date)s
+            {partition_filter("tests", alias="tests", start="%(start_date)s")}
         )
     ORDER BY
         TH.tree_name ASC,
@@ -850,7 +905,7 @@ def get_hardware_trees_head_commits(
             (str(idx), tree["git_commit_hash"])
             for (idx, tree) in enumerate(tree_records)
         ]
-        set_query_cache(key=cache_key, params=cache_params, rows=trees)
+        set_query_cache(key=cache_key, params=cache_params, rows=trees, local=True)
 
     return trees
 
@@ -875,7 +930,7 @@ def get_hardware_trees_data(
 
     tree_head_clause = _get_hardware_tree_heads_clause(id_only=False)
 
-    if not trees:
+    if trees is None:
         # We need a subquery because if we filter by any hardware, it will get the
         # last head that has that hardware, but not the real head of the trees
         query = f"""
@@ -910,6 +965,7 @@ def get_hardware_trees_data(
                 AND tests.origin = %(origin)s
                 AND TH.start_time >= %(start_date)s
                 AND TH.start_time <= %(end_date)s
+                {partition_filter("tests", alias="tests", start="%(start_date)s")}
             )
         ORDER BY
             TH.tree_name ASC,
@@ -77,7 +77,8 @@ def get_test_status_history(
         "test_start_time": test_start_time,
     }
 
-    if rows := get_query_cache(key=cache_key, params=params):
+    rows = get_query_cache(key=cache_key, params=params)
+    if rows is not None:
         return rows
 
     if platform is None:
@@ -3,9 +3,13 @@ from typing import TYPE_CHECKING, Literal, Optional
 from django.db import connection
 from django.db.models import Q
 
-from kernelCI_app.cache import get_query_cache, set_query_cache
+from kernelCI_app.cache import (
+    get_or_set_query_cache,
+    get_query_cache,
+    set_query_cache,
+)
 from kernelCI_app.constants.general import UNKNOWN_STRING
-from kernelCI_app.helpers.database import dict_fetchall
+from kernelCI_app.helpers.database import dict_fetchall, partition_filter
 from kernelCI_app.helpers.treeCompare import (
     build_boot_test_compare_filter_clauses,
     build_build_compare_filter_clauses,
@@ -20,6 +24,10 @@ from kernelCI_app.queries.duration import (
 if TYPE_CHECKING:
     from kernelCI_app.helpers.filters import FilterParams
 
+# Start of the earliest relevant checkout, before which none of their builds and
+# tests were ingested
+_RELEVANT_CHECKOUTS_START = "SELECT min(start_time) FROM RELEVANT_CHECKOUTS"
+
 
 def _get_tree_listing_count_clause() -> str:
     build_count_clause = """
@@ -194,8 +202,7 @@ def get_tree_details_data(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
-    if rows is None:
+    def query_rows() -> list[tuple]:
         checkout_clauses = create_checkouts_where_clauses(
             git_url=git_url_param,
             git_branch=git_branch_param,
@@ -296,10 +303,11 @@ def get_tree_details_data(
 
         with connection.cursor() as cursor:
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            set_query_cache(key=cache_key, params=params, rows=rows)
+            return cursor.fetchall()
 
-    return rows
+    return get_or_set_query_cache(
+        key=cache_key, params=params, compute=query_rows, commit_hash=commit_hash
+    )
 
 
 def get_tree_details_rollup(
@@ -327,7 +335,7 @@ def get_tree_details_rollup(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
+    rows = get_query_cache(cache_key, params, commit_hash=commit_hash)
     if rows is None:
         checkout_clauses = create_checkouts_where_clauses(
             git_url=git_url_param,
@@ -408,7 +416,9 @@ def get_tree_details_rollup(
         with connection.cursor() as cursor:
             cursor.execute(query, params)
             rows = dict_fetchall(cursor=cursor)
-            set_query_cache(key=cache_key, params=params, rows=rows)
+            set_query_cache(
+                key=cache_key, params=params, rows=rows, commit_hash=commit_hash
+            )
 
     return rows
 
@@ -433,8 +443,7 @@ def get_tree_data(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
-    if rows is None:
+    def query_rows() -> list[tuple]:
         checkout_clauses = create_checkouts_where_clauses(
             git_url=git_url_param,
             git_branch=git_branch_param,
@@ -575,10 +584,11 @@ def get_tree_data(
 
         with connection.cursor() as cursor:
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            set_query_cache(key=cache_key, params=params, rows=rows)
+            return cursor.fetchall()
 
-    return rows
+    return get_or_set_query_cache(
+        key=cache_key, params=params, compute=query_rows, commit_hash=commit_hash
+    )
 
 
 def get_tree_details_builds(
@@ -602,7 +612,7 @@ def get_tree_details_builds(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
+    rows = get_query_cache(cache_key, params, commit_hash=commit_hash)
     if rows is None:
         checkout_clauses = create_checkouts_where_clauses(
             git_url=git_url_param,
@@ -620,6 +630,7 @@ def get_tree_details_builds(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_repository_url,
                 c.git_repository_branch,
                 c.git_commit_tags,
@@ -665,6 +676,7 @@ def get_tree_details_builds(
         FROM
             builds b
         INNER JOIN RELEVANT_CHECKOUTS rc ON b.checkout_id IN (SELECT checkout_id FROM RELEVANT_CHECKOUTS)
+            {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
         LEFT JOIN incidents inc
             ON inc.build_id = b.id AND inc.test_id IS NULL
         LEFT JOIN issues iss
@@ -677,7 +689,9 @@ def get_tree_details_builds(
         with connection.cursor() as cursor:
             cursor.execute(query, params)
             rows = dict_fetchall(cursor=cursor)
-            set_query_cache(key=cache_key, params=params, rows=rows)
+            set_query_cache(
+                key=cache_key, params=params, rows=rows, commit_hash=commit_hash
+            )
 
     return rows
 
@@ -1038,7 +1052,7 @@ def get_tree_compare_boots_tests_diff(
         "filter_pre_join": filter_sql.pre_join,
         "filter_post_join": filter_sql.post_join,
     }
-    rows = get_query_cache(cache_key, cache_params)
+    rows = get_query_cache(cache_key, cache_params, commit_hash=commit_hashes)
     if rows is not None:
         return rows
 
@@ -1056,6 +1070,7 @@ def get_tree_compare_boots_tests_diff(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT DISTINCT ON (c.git_commit_hash)
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_commit_hash
             FROM
                 checkouts c
@@ -1097,7 +1112,9 @@ def get_tree_compare_boots_tests_diff(
             FROM
                 RELEVANT_CHECKOUTS rc
             INNER JOIN builds b ON b.checkout_id = rc.checkout_id
+                {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
             INNER JOIN tests t ON t.build_id = b.id
+                {partition_filter("tests", alias="t", start=_RELEVANT_CHECKOUTS_START)}
                 {path_filter}
             WHERE
                 b.id NOT LIKE 'maestro:dummy_%%'
@@ -1155,7 +1172,9 @@ def get_tree_compare_boots_tests_diff(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor)
-        set_query_cache(key=cache_key, params=cache_params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=cache_params, rows=rows, commit_hash=commit_hashes
+        )
         return rows
 
 
@@ -1424,7 +1443,7 @@ def get_tree_compare_rollup(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
+    rows = get_query_cache(cache_key, params, commit_hash=commit_hashes)
     if rows is not None:
         return rows
 
@@ -1483,7 +1502,9 @@ def get_tree_compare_rollup(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor=cursor)
-        set_query_cache(key=cache_key, params=params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=params, rows=rows, commit_hash=commit_hashes
+        )
 
     return rows
 
@@ -1506,7 +1527,7 @@ def get_tree_compare_builds(
         "git_branch_param": git_branch_param,
     }
 
-    rows = get_query_cache(cache_key, params)
+    rows = get_query_cache(cache_key, params, commit_hash=commit_hashes)
     if rows is not None:
         return rows
 
@@ -1519,6 +1540,7 @@ def get_tree_compare_builds(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT DISTINCT ON (c.git_commit_hash)
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_commit_hash,
                 c.git_repository_url
             FROM
@@ -1541,6 +1563,7 @@ def get_tree_compare_builds(
         FROM
             RELEVANT_CHECKOUTS rc
         INNER JOIN builds b ON b.checkout_id = rc.checkout_id
+            {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
         WHERE
             b.id NOT LIKE 'maestro:dummy_%%'
         GROUP BY
@@ -1553,7 +1576,9 @@ def get_tree_compare_builds(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor=cursor)
-        set_query_cache(key=cache_key, params=params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=params, rows=rows, commit_hash=commit_hashes
+        )
 
     return rows
 
@@ -1595,7 +1620,7 @@ def get_tree_compare_builds_diff(
         "filter_post_join": filter_sql.post_join,
     }
 
-    rows = get_query_cache(cache_key, cache_params)
+    rows = get_query_cache(cache_key, cache_params, commit_hash=commit_hashes)
     if rows is not None:
         return rows
 
@@ -1608,6 +1633,7 @@ def get_tree_compare_builds_diff(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT DISTINCT ON (c.git_commit_hash)
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_commit_hash
             FROM
                 checkouts c
@@ -1641,6 +1667,7 @@ def get_tree_compare_builds_diff(
             FROM
                 RELEVANT_CHECKOUTS rc
             INNER JOIN builds b ON b.checkout_id = rc.checkout_id
+                {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
             WHERE
                 b.id NOT LIKE 'maestro:dummy_%%'
                 {filter_sql.pre_join}
@@ -1689,7 +1716,9 @@ def get_tree_compare_builds_diff(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor=cursor)
-        set_query_cache(key=cache_key, params=cache_params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=cache_params, rows=rows, commit_hash=commit_hashes
+        )
 
     return rows
 
@@ -1755,7 +1784,7 @@ def get_tree_compare_builds_change_counts(
         "unknown_string": UNKNOWN_STRING,
     }
 
-    cached = get_query_cache(cache_key, params)
+    cached = get_query_cache(cache_key, params, commit_hash=commit_hashes)
     if cached is not None:
         return cached[0] if cached else _empty_change_counts()
 
@@ -1768,6 +1797,7 @@ def get_tree_compare_builds_change_counts(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT DISTINCT ON (c.git_commit_hash)
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_commit_hash
             FROM
                 checkouts c
@@ -1801,6 +1831,7 @@ def get_tree_compare_builds_change_counts(
             FROM
                 RELEVANT_CHECKOUTS rc
             INNER JOIN builds b ON b.checkout_id = rc.checkout_id
+                {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
             WHERE
                 b.id NOT LIKE 'maestro:dummy_%%'
             ORDER BY
@@ -1842,7 +1873,9 @@ def get_tree_compare_builds_change_counts(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor=cursor)
-        set_query_cache(key=cache_key, params=params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=params, rows=rows, commit_hash=commit_hashes
+        )
 
     return rows[0] if rows else _empty_change_counts()
 
@@ -1911,7 +1944,7 @@ def _get_tree_compare_boots_tests_change_counts(
         "unknown_string": UNKNOWN_STRING,
     }
 
-    cached = get_query_cache(cache_key, params)
+    cached = get_query_cache(cache_key, params, commit_hash=commit_hashes)
     if cached is not None:
         return cached[0] if cached else _empty_change_counts()
 
@@ -1929,6 +1962,7 @@ def _get_tree_compare_boots_tests_change_counts(
         WITH RELEVANT_CHECKOUTS AS (
             SELECT DISTINCT ON (c.git_commit_hash)
                 c.id AS checkout_id,
+                c.start_time,
                 c.git_commit_hash
             FROM
                 checkouts c
@@ -1970,7 +2004,9 @@ def _get_tree_compare_boots_tests_change_counts(
             FROM
                 RELEVANT_CHECKOUTS rc
             INNER JOIN builds b ON b.checkout_id = rc.checkout_id
+                {partition_filter("builds", alias="b", start=_RELEVANT_CHECKOUTS_START)}
             INNER JOIN tests t ON t.build_id = b.id
+                {partition_filter("tests", alias="t", start=_RELEVANT_CHECKOUTS_START)}
                 {path_filter}
             WHERE
                 b.id NOT LIKE 'maestro:dummy_%%'
@@ -2018,6 +2054,8 @@ def _get_tree_compare_boots_tests_change_counts(
     with connection.cursor() as cursor:
         cursor.execute(query, params)
         rows = dict_fetchall(cursor=cursor)
-        set_query_cache(key=cache_key, params=params, rows=rows)
+        set_query_cache(
+            key=cache_key, params=params, rows=rows, commit_hash=commit_hashes
+        )
 
     return rows[0] if rows else _empty_change_counts()
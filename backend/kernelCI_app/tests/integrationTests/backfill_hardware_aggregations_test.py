@@ -0,0 +1,69 @@
+"""Integration tests for the backfill_hardware_aggregations management command."""
+
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from kernelCI_app.models import LatestCheckout, PendingTest
+from kernelCI_app.tests.factories import BuildFactory, CheckoutFactory, TestFactory
+
+
+def _days_ago(days: int):
+    return timezone.now() - timezone.timedelta(days=days)
+
+
+# The tests are read over a connection of its own, which only sees committed rows
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("workers", [1, 2])
+def test_backfill(workers):
+    """Tests with a platform, of the latest checkout of their tree, are queued."""
+    old_checkout = CheckoutFactory(start_time=_days_ago(3))
+    checkout = CheckoutFactory(
+        start_time=_days_ago(2),
+        origin=old_checkout.origin,
+        tree_name=old_checkout.tree_name,
+        git_repository_url=old_checkout.git_repository_url,
+        git_repository_branch=old_checkout.git_repository_branch,
+    )
+    build = BuildFactory(checkout=checkout)
+    test = TestFactory(
+        build=build,
+        start_time=_days_ago(1),
+        path="boot",
+        status="PASS",
+        environment_misc={"platform": "rpi"},
+    )
+    TestFactory(
+        build=build,
+        start_time=_days_ago(1),
+        environment_misc={"lab": "x"},
+        environment_compatible=None,
+    )
+    TestFactory(
+        build=BuildFactory(checkout=old_checkout),
+        start_time=_days_ago(1),
+        environment_misc={"platform": "rpi"},
+    )
+    TestFactory(
+        build=build, start_time=_days_ago(40), environment_misc={"platform": "rpi"}
+    )
+
+    call_command(
+        "backfill_hardware_aggregations",
+        days=30,
+        truncate=True,
+        workers=workers,
+        stdout=StringIO(),
+    )
+
+    assert list(LatestCheckout.objects.values_list("checkout_id", flat=True)) == [
+        checkout.id
+    ]
+    pending = PendingTest.objects.get()
+    assert pending.test_id == test.id
+    assert pending.platform == "rpi"
+    assert pending.is_boot
+    assert pending.status == "P"
+    assert pending.full_status == "PASS"
@@ -0,0 +1,108 @@
+"""Integration tests for the flushes of the kcidbng ingester."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
+    FileRows,
+    flush_buffers,
+)
+from kernelCI_app.management.commands.helpers.process_submissions import (
+    make_test_row,
+)
+from kernelCI_app.models import Tests
+from kernelCI_app.tests.factories import BuildFactory
+
+INGESTER_PATH = "kernelCI_app.management.commands.helpers.kcidbng_ingester"
+
+
+def _file_rows(spool, name: str, tests: list[dict]) -> FileRows:
+    path = spool / name
+    path.write_text("{}")
+    rows = {"issues": [], "checkouts": [], "builds": [], "tests": [], "incidents": []}
+    rows["tests"] = [make_test_row(test) for test in tests]
+    return FileRows(file=(name, str(path)), rows=rows)
+
+
+def _flush(tmp_path, file_rows: list[FileRows]) -> MagicMock:
+    dirs = {"archive": tmp_path / "archive", "failed": tmp_path / "failed"}
+    for directory in dirs.values():
+        directory.mkdir()
+    stat_fail = MagicMock(value=0)
+
+    flush_buffers(
+        issues_buf=[],
+        checkouts_buf=[],
+        builds_buf=[],
+        tests_buf=[row for _, rows in file_rows for row in rows["tests"]],
+        incidents_buf=[],
+        buffer_files={file for file, _ in file_rows},
+        dirs={name: str(directory) for name, directory in dirs.items()},
+        stat_ok=MagicMock(value=0),
+        stat_fail=stat_fail,
+        counter_lock=MagicMock(),
+        split_by_file=lambda: file_rows,
+    )
+    return stat_fail
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("loader_mode", ["executemany", "copy"])
+def test_bisect_isolates_failing_file(tmp_path, monkeypatch, loader_mode):
+    """Only the file whose rows can't be written is failed, with both loaders."""
+    monkeypatch.setattr(f"{INGESTER_PATH}.INGEST_LOADER_MODE", loader_mode)
+    monkeypatch.setattr(f"{INGESTER_PATH}.INGEST_FLUSH_BISECT", True)
+    build = BuildFactory()
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    test = {"build_id": build.id, "origin": build.origin}
+    file_rows = [
+        _file_rows(spool, "a.json", [{**test, "id": "a"}]),
+        _file_rows(spool, "b.json", [{**test, "id": "b", "start_time": "never"}]),
+        _file_rows(spool, "c.json", [{**test, "id": "c"}]),
+    ]
+
+    stat_fail = _flush(tmp_path, file_rows)
+
+    assert stat_fail.value == 1
+    assert (tmp_path / "failed" / "b.json").exists()
+    assert sorted(path.name for path in (tmp_path / "archive").iterdir()) == [
+        "a.json",
+        "c.json",
+    ]
+    assert sorted(
+        Tests.objects.filter(id__in=["a", "b", "c"]).values_list("id", flat=True)
+    ) == ["a", "c"]
+
+
+@pytest.mark.django_db
+def test_copy_bisect_with_id_in_both_halves(tmp_path, monkeypatch):
+    """The rows of a written half aren't merged again with the next half."""
+    monkeypatch.setattr(f"{INGESTER_PATH}.INGEST_LOADER_MODE", "copy")
+    monkeypatch.setattr(f"{INGESTER_PATH}.INGEST_FLUSH_BISECT", True)
+    build = BuildFactory()
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    test = {"build_id": build.id, "origin": build.origin}
+    file_rows = [
+        _file_rows(spool, "a.json", [{**test, "id": "shared", "status": "FAIL"}]),
+        _file_rows(spool, "b.json", [{**test, "id": "bad", "start_time": "never"}]),
+        _file_rows(
+            spool,
+            "c.json",
+            [{**test, "id": "shared", "status": "PASS"}, {**test, "id": "other"}],
+        ),
+    ]
+
+    stat_fail = _flush(tmp_path, file_rows)
+
+    assert stat_fail.value == 1
+    assert (tmp_path / "failed" / "b.json").exists()
+    assert sorted(path.name for path in (tmp_path / "archive").iterdir()) == [
+        "a.json",
+        "c.json",
+    ]
+    assert Tests.objects.get(id="shared").status == "FAIL"
+    assert Tests.objects.filter(id="other").exists()
+    assert not Tests.objects.filter(id="bad").exists()
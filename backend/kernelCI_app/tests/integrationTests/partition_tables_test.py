@@ -0,0 +1,176 @@
+"""Integration tests for the partition_tables management command."""
+
+import threading
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from kernelCI_app.helpers import database
+from kernelCI_app.helpers.database import is_partitioned
+from kernelCI_app.management.commands.generated.insert_queries import INSERT_QUERIES
+from kernelCI_app.management.commands.helpers.kcidbng_ingester import consume_buffer
+from kernelCI_app.models import Tests
+from kernelCI_app.tests.factories import BuildFactory, CheckoutFactory, TestFactory
+
+
+def _days_ago(days: int):
+    return timezone.now() - timezone.timedelta(days=days)
+
+
+def _partition_of(test_id: str) -> str:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tableoid::regclass::text FROM tests WHERE id = %s", [test_id]
+        )
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture(autouse=True)
+def unpartitioned_after_test():
+    """The conversion is rolled back with the test, so the queries mustn't
+    remember that the tables were partitioned."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("kernelCI_app.helpers.database._partitioned_tables", {})
+        yield
+
+
+@pytest.fixture
+def partitioned_tests(transactional_db):
+    """Converts the tests table, and converts it back since the test commits."""
+    call_command("partition_tables", tables=["tests"], stdout=StringIO())
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'tests_unpartitioned'"
+        )
+        index_names = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DROP TABLE tests")
+        cursor.execute("ALTER TABLE tests_unpartitioned RENAME TO tests")
+        for name in index_names:
+            cursor.execute(
+                f"ALTER INDEX {name} RENAME TO {name.removesuffix('_unpartitioned')}"
+            )
+
+
+def _test_row(**values) -> tuple:
+    fields = INSERT_QUERIES["tests"]["updateable_model_fields"]
+    row = {field: None for field in fields}
+    row.update(values)
+    return tuple(row[field] for field in fields)
+
+
+@pytest.mark.django_db
+def test_convert_ingest_and_prune():
+    """Rows keep their partition through upserts, and old partitions are dropped."""
+    checkout = CheckoutFactory(field_timestamp=_days_ago(1))
+    build = BuildFactory(checkout=checkout, field_timestamp=_days_ago(1))
+    recent_test = TestFactory(build=build, field_timestamp=_days_ago(1), status=None)
+    # Ingested before _created existed
+    old_test = TestFactory(
+        build=build, field_timestamp=_days_ago(400), field_created=None
+    )
+    tests_count = Tests.objects.count()
+
+    call_command("partition_tables", tables=["tests"], stdout=StringIO())
+
+    with connection.cursor() as cursor:
+        assert is_partitioned(cursor, "tests")
+    assert Tests.objects.count() == tests_count
+    old_partition = f"tests_p{_days_ago(400):%Y_%m}"
+    assert _partition_of(old_test.id) == old_partition
+    created = Tests.objects.get(id=recent_test.id).field_created
+
+    row = _test_row(
+        id=recent_test.id,
+        build_id=build.id,
+        origin=recent_test.origin,
+        status="PASS",
+        field_timestamp=timezone.now(),
+    )
+    consume_buffer([row], "tests")
+
+    upserted = Tests.objects.filter(id=recent_test.id)
+    assert upserted.count() == 1
+    assert upserted.get().status == "PASS"
+    assert upserted.get().field_created == created
+
+    out = StringIO()
+    call_command("prune_db", older_than="10 days", yes=True, stdout=out)
+
+    assert not Tests.objects.filter(id=old_test.id).exists()
+    assert Tests.objects.filter(id=recent_test.id).exists()
+    assert f"Dropped partition {old_partition}" in out.getvalue()
+
+
+def test_concurrent_inserts_of_new_test(partitioned_tests):
+    """A new test upserted by two transactions at once is inserted only once."""
+    build = BuildFactory()
+    first_written = threading.Event()
+    commit_first = threading.Event()
+    errors = []
+
+    def upsert(status: str, *, first: bool) -> None:
+        try:
+            if not first:
+                first_written.wait()
+            with transaction.atomic():
+                consume_buffer(
+                    [
+                        _test_row(
+                            id="new_test",
+                            build_id=build.id,
+                            origin=build.origin,
+                            status=status,
+                            field_timestamp=timezone.now(),
+                        )
+                    ],
+                    "tests",
+                )
+                if first:
+                    first_written.set()
+                    commit_first.wait()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            first_written.set()
+            connection.close()
+
+    first = threading.Thread(target=upsert, args=("FAIL",), kwargs={"first": True})
+    second = threading.Thread(target=upsert, args=("PASS",), kwargs={"first": False})
+    first.start()
+    second.start()
+    # The second upsert waits for the first one to commit
+    second.join(timeout=1)
+    commit_first.set()
+    first.join()
+    second.join()
+
+    assert errors == []
+    assert Tests.objects.filter(id="new_test").count() == 1
+    assert Tests.objects.get(id="new_test").status == "FAIL"
+
+
+def test_ingest_with_outdated_partitioning(partitioned_tests):
+    """
+    A write that still takes the table for unpartitioned fails, and the ingester
+    looks the table up again for the next one.
+    """
+    build = BuildFactory()
+    database._partitioned_tables["tests"] = (time.monotonic() + 300, False)
+    row = _test_row(
+        id="swapped_test",
+        build_id=build.id,
+        origin=build.origin,
+        status="PASS",
+        field_timestamp=timezone.now(),
+    )
+
+    with pytest.raises(DatabaseError), transaction.atomic():
+        consume_buffer([row], "tests")
+    consume_buffer([row], "tests")
+
+    assert Tests.objects.filter(id="swapped_test").count() == 1
@@ -0,0 +1,56 @@
+"""Integration tests for the rebuild of the populate_tree_tests_rollup command."""
+
+import pytest
+from django.db import transaction
+from django.utils import timezone
+
+from kernelCI_app.management.commands.helpers.rollup_rebuild import (
+    lock_rollup_table,
+    requeue_updated_trees,
+    start_rebuild,
+    swap_rollup_tables,
+)
+from kernelCI_app.management.commands.populate_tree_tests_rollup import Command
+from kernelCI_app.models import ProcessedItems, Tests, TreeTestsRollup
+from kernelCI_app.tests.factories import BuildFactory, CheckoutFactory, TestFactory
+
+
+def _days_ago(days: int):
+    return timezone.now() - timezone.timedelta(days=days)
+
+
+@pytest.mark.django_db
+def test_rebuild_with_build_ingested_after_the_rebuild():
+    """
+    A test ingested before the rebuild of its tree, whose build arrives after it,
+    is counted in the swapped rollup. The live processed_items are only written at
+    the swap.
+    """
+    checkout = CheckoutFactory(field_timestamp=_days_ago(1))
+    build = BuildFactory(checkout=checkout, field_timestamp=_days_ago(1))
+    TestFactory(build=build, field_timestamp=_days_ago(1))
+    # The build of this test isn't in the database yet when the tree is rebuilt
+    late_build_id = "late_build"
+    late_test = TestFactory(build=build, field_timestamp=_days_ago(1))
+    Tests.objects.filter(id=late_test.id).update(build_id=late_build_id)
+
+    start_rebuild(cutoff=None, limit=None)
+    Command()._rebuild_trees(batch_size=100)
+
+    assert not ProcessedItems.objects.exists()
+    assert requeue_updated_trees() == 0
+
+    BuildFactory(
+        id=late_build_id,
+        checkout=checkout,
+        field_timestamp=timezone.now() + timezone.timedelta(minutes=1),
+    )
+    assert requeue_updated_trees() == 1
+    Command()._rebuild_trees(batch_size=100)
+
+    with transaction.atomic():
+        lock_rollup_table()
+        swap_rollup_tables()
+
+    assert sum(TreeTestsRollup.objects.values_list("total_tests", flat=True)) == 2
+    assert ProcessedItems.objects.count() == 2
@@ -0,0 +1,161 @@
+"""Integration tests for the process_pending_aggregations management command."""
+
+from io import StringIO
+from typing import Optional
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from kernelCI_app.constants.general import MAESTRO_DUMMY_BUILD_PREFIX
+from kernelCI_app.constants.process_pending import PENDING_PARKED_SLOT
+from kernelCI_app.models import Builds, PendingBuilds, PendingTest, ProcessedItems
+from kernelCI_app.tests.factories import BuildFactory, CheckoutFactory
+
+ENGINES = ["python", "sql"]
+
+AGGREGATION_TABLES = [
+    "pending_test",
+    "pending_builds",
+    "tree_listing",
+    "hardware_status",
+    "tree_tests_rollup",
+    "processed_items",
+]
+
+
+def _queue_test(
+    test_id: str,
+    build_id: str,
+    status: Optional[str],
+    *,
+    platform: Optional[str] = "rpi",
+    is_boot: bool = False,
+) -> None:
+    full_status = {"P": "PASS", "F": "FAIL", "I": "SKIP", None: None}[status]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO pending_test (
+                test_id, origin, platform, build_id, status, is_boot, path, lab,
+                full_status, start_time
+            )
+            VALUES (%s, 'maestro', %s, %s, %s, %s, %s, 'lab', %s, '2025-01-01')
+            """,
+            [
+                test_id,
+                platform,
+                build_id,
+                status,
+                is_boot,
+                "boot" if is_boot else "kselftest.case",
+                full_status,
+            ],
+        )
+
+
+def _queue_build(build_id: str, checkout_id: str, status: Optional[str]) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO pending_builds (build_id, origin, checkout_id, status)
+            VALUES (%s, 'maestro', %s, %s)
+            """,
+            [build_id, checkout_id, status],
+        )
+
+
+def _reset_aggregations() -> None:
+    with connection.cursor() as cursor:
+        for table in AGGREGATION_TABLES:
+            cursor.execute(f"TRUNCATE {table}")
+        cursor.execute("TRUNCATE pending_queue_position")
+        cursor.execute("UPDATE pending_queue SET active_slot = 0, generation = 0")
+        cursor.execute(
+            """
+            INSERT INTO tree_listing (
+                checkout_id, origin, tree_name, git_repository_url,
+                git_repository_branch, git_commit_hash, start_time,
+                build_pass, build_failed, build_inc, boot_pass, boot_failed, boot_inc,
+                test_pass, test_failed, test_inc
+            )
+            SELECT id, origin, tree_name, git_repository_url, git_repository_branch,
+                git_commit_hash, start_time, 0, 0, 0, 0, 0, 0, 0, 0, 0
+            FROM checkouts
+            """
+        )
+
+
+def _dump_aggregations() -> dict[str, list[tuple]]:
+    """Returns the rows of the aggregation tables, without their serial ids."""
+    rows = {}
+    with connection.cursor() as cursor:
+        for table in AGGREGATION_TABLES:
+            cursor.execute(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name = %s AND column_name <> 'id'
+                ORDER BY ordinal_position
+                """,
+                [table],
+            )
+            columns = ", ".join(row[0] for row in cursor.fetchall())
+            cursor.execute(f"SELECT {columns} FROM {table} ORDER BY {columns}")
+            rows[table] = cursor.fetchall()
+    return rows
+
+
+def _aggregate(engine: str) -> None:
+    call_command("process_pending_aggregations", "--engine", engine, stdout=StringIO())
+
+
+# The command commits its batches
+@pytest.mark.django_db(transaction=True)
+def test_aggregation_engines_match():
+    """The SQL engine must produce the same aggregations as the Python engine."""
+    checkout = CheckoutFactory()
+    passed_build = BuildFactory(checkout=checkout, status="PASS")
+    corrected_build = BuildFactory(checkout=checkout, status=None)
+    dummy_build = BuildFactory(
+        checkout=checkout, id=f"{MAESTRO_DUMMY_BUILD_PREFIX}build", status="PASS"
+    )
+
+    aggregations = {}
+    for engine in ENGINES:
+        _reset_aggregations()
+        Builds.objects.filter(id=corrected_build.id).update(status=None)
+
+        _queue_build(passed_build.id, checkout.id, "P")
+        _queue_build(corrected_build.id, checkout.id, None)
+        _queue_build(dummy_build.id, checkout.id, "P")
+        _queue_build("build_without_checkout", "missing_checkout", "F")
+        _queue_test("passed", passed_build.id, "P")
+        _queue_test("boot", passed_build.id, "F", is_boot=True)
+        _queue_test("no_platform", passed_build.id, "F", platform=None)
+        _queue_test("corrected", corrected_build.id, None, platform="qemu")
+        _queue_test("dummy", dummy_build.id, "P")
+        _queue_test("without_build", "missing_build", "P")
+        _aggregate(engine)
+
+        # Null statuses are corrected, non-null ones are only counted once
+        Builds.objects.filter(id=corrected_build.id).update(status="PASS")
+        _queue_build(corrected_build.id, checkout.id, "P")
+        _queue_test("corrected", corrected_build.id, "P", platform="qemu")
+        _queue_test("passed", passed_build.id, "F")
+        _aggregate(engine)
+
+        aggregations[engine] = _dump_aggregations()
+
+    assert aggregations["python"]["hardware_status"]
+    assert aggregations["python"]["tree_tests_rollup"]
+    assert aggregations["sql"] == aggregations["python"]
+    # The fixtures went through the corrections and the parking of the items
+    assert ProcessedItems.objects.filter(entity_id="corrected", status="P").exists()
+    assert not ProcessedItems.objects.filter(
+        entity_id="corrected", status=None
+    ).exists()
+    assert PendingTest.objects.get(test_id="without_build").slot == PENDING_PARKED_SLOT
+    assert (
+        PendingBuilds.objects.get(build_id="build_without_checkout").slot
+        == PENDING_PARKED_SLOT
+    )
@@ -7,13 +7,26 @@ from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.utils import timezone
 
-from kernelCI_app.models import Builds, Checkouts, Tests
+from kernelCI_app.models import (
+    Builds,
+    Checkouts,
+    HardwareStatus,
+    LatestCheckout,
+    ProcessedItemKind,
+    ProcessedItems,
+    Tests,
+    TreeListing,
+    TreeTestsRollup,
+)
 from kernelCI_app.tests.factories import (
     BuildFactory,
     CheckoutFactory,
     IncidentFactory,
     TestFactory,
 )
+from kernelCI_app.tests.factories.tree_tests_rollup_factory import (
+    TreeTestsRollupFactory,
+)
 
 
 def _days_ago(days: int):
@@ -237,3 +250,107 @@ def test_skip_issue_protection_deletes_linked_rows():
     assert not Checkouts.objects.filter(id=checkout.id).exists()
     assert not Builds.objects.filter(id=build.id).exists()
     assert not Tests.objects.filter(id=test.id).exists()
+
+
+def _tree_commit(checkout) -> dict:
+    return {
+        "origin": checkout.origin,
+        "tree_name": checkout.tree_name,
+        "git_repository_branch": checkout.git_repository_branch,
+        "git_repository_url": checkout.git_repository_url,
+        "git_commit_hash": checkout.git_commit_hash,
+    }
+
+
+def _derived_rows(checkout) -> None:
+    tree_commit = _tree_commit(checkout)
+    TreeTestsRollupFactory(**tree_commit)
+    TreeListing.objects.create(checkout_id=checkout.id, **tree_commit)
+    HardwareStatus.objects.create(
+        checkout_id=checkout.id,
+        test_origin=checkout.origin,
+        platform="qemu",
+        start_time=checkout.start_time or timezone.now(),
+    )
+    LatestCheckout.objects.create(
+        checkout_id=checkout.id,
+        start_time=checkout.start_time or timezone.now(),
+        origin=checkout.origin,
+        tree_name=checkout.tree_name,
+        git_repository_url=checkout.git_repository_url,
+        git_repository_branch=checkout.git_repository_branch,
+    )
+    ProcessedItems.objects.create(
+        checkout_id=checkout.id,
+        kind=ProcessedItemKind.TREE_LISTING_BUILD,
+        entity_id=f"{checkout.id}-build",
+    )
+
+
+def _has_derived_rows(checkout, *, per_checkout=True) -> list[bool]:
+    tree_commit = _tree_commit(checkout)
+    exists = [
+        TreeTestsRollup.objects.filter(**tree_commit).exists(),
+        TreeListing.objects.filter(**tree_commit).exists(),
+    ]
+    if per_checkout:
+        exists += [
+            HardwareStatus.objects.filter(checkout_id=checkout.id).exists(),
+            LatestCheckout.objects.filter(checkout_id=checkout.id).exists(),
+            ProcessedItems.objects.filter(checkout_id=checkout.id).exists(),
+        ]
+    return exists
+
+
+@pytest.mark.django_db
+def test_derived_rows_of_pruned_checkouts():
+    """The derived rows of a pruned checkout are deleted, even with a null tree
+    column, and the rollups of a tree commit that keeps a checkout are kept."""
+    pruned = CheckoutFactory(field_timestamp=_days_ago(30), tree_name=None)
+    kept = CheckoutFactory(field_timestamp=_days_ago(1))
+    shared_old = CheckoutFactory(field_timestamp=_days_ago(30))
+    shared_recent = CheckoutFactory(
+        field_timestamp=_days_ago(1), **_tree_commit(shared_old)
+    )
+    for checkout in (pruned, kept, shared_old):
+        _derived_rows(checkout)
+
+    output = _prune(yes=True)
+
+    assert "tree_tests_rollup=1" in output
+    assert not Checkouts.objects.filter(id=pruned.id).exists()
+    assert _has_derived_rows(pruned) == [False] * 5
+    assert _has_derived_rows(kept) == [True] * 5
+    assert _has_derived_rows(shared_old) == [True, True, False, False, False]
+    assert Checkouts.objects.filter(id=shared_recent.id).exists()
+
+
+@pytest.mark.django_db
+def test_derived_rows_kept_without_checkouts_selected():
+    checkout = CheckoutFactory(field_timestamp=_days_ago(30))
+    _derived_rows(checkout)
+
+    _prune(yes=True, tables=["builds", "tests"])
+
+    assert _has_derived_rows(checkout) == [True] * 5
+
+
+@pytest.mark.django_db
+def test_throttle_prunes_in_small_batches():
+    """With --throttle, every doomed row is deleted however small the batches."""
+    checkout = CheckoutFactory(field_timestamp=_days_ago(30))
+    build = BuildFactory(checkout=checkout, field_timestamp=_days_ago(30))
+    tests = [TestFactory(build=build, field_timestamp=_days_ago(30)) for _ in range(5)]
+    recent_build = BuildFactory(
+        checkout=CheckoutFactory(field_timestamp=_days_ago(1)),
+        field_timestamp=_days_ago(1),
+    )
+    recent_test = TestFactory(build=recent_build, field_timestamp=_days_ago(1))
+
+    output = _prune(yes=True, throttle=True, batch_size=2)
+
+    assert "Deleted tests(n=2) total=4" in output
+    assert not Tests.objects.filter(id__in=[t.id for t in tests]).exists()
+    assert not Builds.objects.filter(id=build.id).exists()
+    assert not Checkouts.objects.filter(id=checkout.id).exists()
+    assert Tests.objects.filter(id=recent_test.id).exists()
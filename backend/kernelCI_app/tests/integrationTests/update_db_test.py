@@ -0,0 +1,83 @@
+"""Integration tests for the update_db management command."""
+
+import tarfile
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from kernelCI_app.models import Builds, Checkouts, Incidents, Issues, Tests
+from kernelCI_app.tests.factories import (
+    BuildFactory,
+    CheckoutFactory,
+    IncidentFactory,
+    IssueFactory,
+    TestFactory,
+)
+
+
+def _days_ago(days: int):
+    return timezone.now() - timezone.timedelta(days=days)
+
+
+def _values(model, row_id: str) -> dict:
+    """The row's fields, but _created, which is set again by the restore."""
+    values = model.objects.values().get(id=row_id)
+    values.pop("field_created")
+    return values
+
+
+# The tables are copied over connections of their own, which only see committed rows
+@pytest.mark.django_db(transaction=True)
+def test_snapshot_and_restore(tmp_path):
+    """Rows in the interval round-trip through the snapshot, related ones only."""
+    checkout = CheckoutFactory(field_timestamp=_days_ago(1))
+    build = BuildFactory(
+        checkout=checkout, field_timestamp=_days_ago(1), misc={"lab": "a,b\n"}
+    )
+    test = TestFactory(build=build, field_timestamp=_days_ago(1))
+    orphan_test = TestFactory(build=BuildFactory(field_timestamp=_days_ago(20)))
+    orphan_test.field_timestamp = _days_ago(1)
+    orphan_test.save()
+    old_checkout = CheckoutFactory(field_timestamp=_days_ago(20))
+    issue = IssueFactory(field_timestamp=_days_ago(1))
+    incident = IncidentFactory(
+        issue=issue, build=build, test=None, field_timestamp=_days_ago(1)
+    )
+    expected_build = _values(Builds, build.id)
+    expected_test = _values(Tests, test.id)
+
+    call_command(
+        "update_db",
+        "snapshot",
+        start_interval="7 days",
+        related_data_only=True,
+        filepath=str(tmp_path / "snapshot"),
+        workers=2,
+        stdout=StringIO(),
+    )
+
+    with tarfile.open(tmp_path / "snapshot.tar") as archive:
+        assert "tests.csv.gz" in archive.getnames()
+
+    for model in (Incidents, Tests, Builds, Checkouts, Issues):
+        model.objects.all().delete()
+
+    out = StringIO()
+    call_command(
+        "update_db", "restore", filepath=str(tmp_path / "snapshot"), stdout=out
+    )
+
+    assert _values(Builds, build.id) == expected_build
+    assert _values(Tests, test.id) == expected_test
+    assert Incidents.objects.filter(id=incident.id).exists()
+    assert not Tests.objects.filter(id=orphan_test.id).exists()
+    assert not Checkouts.objects.filter(id=old_checkout.id).exists()
+
+    # Restoring again skips the existing rows
+    call_command(
+        "update_db", "restore", filepath=str(tmp_path / "snapshot.tar"), stdout=out
+    )
+    assert Tests.objects.filter(id=test.id).count() == 1
+    assert "Processed 1 tests records, inserted 0" in out.getvalue()
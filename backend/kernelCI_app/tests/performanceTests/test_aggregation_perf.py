@@ -0,0 +1,251 @@
+import multiprocessing
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+SHARD_COUNTS = [1, 2, 4]
+ENGINES = ["python", "sql"]
+CHECKOUT_COUNT = 64
+BUILD_COUNT = 2000
+PENDING_TEST_COUNT = 20000
+
+AGGREGATION_TABLES = [
+    "pending_test",
+    "pending_builds",
+    "tree_listing",
+    "hardware_status",
+    "tree_tests_rollup",
+    "processed_items",
+]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_dashboard_db(django_db_blocker):
+    """Create tables in database for performance tests."""
+    with django_db_blocker.unblock():
+        call_command(
+            "migrate",
+            "kernelCI_app",
+            database="default",
+        )
+
+
+def _create_pending_items() -> None:
+    """Creates checkouts of several trees with their builds, and pending builds and tests."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO checkouts (
+                id, origin, tree_name, git_repository_url, git_repository_branch,
+                git_commit_hash, start_time
+            )
+            SELECT 'perf:c' || i, 'perf', 'tree' || (i %% 16), 'https://git/' || (i %% 16),
+                'master', md5(i::text), now()
+            FROM generate_series(1, %s) i
+            """,
+            [CHECKOUT_COUNT],
+        )
+        cursor.execute(
+            """
+            INSERT INTO builds (
+                id, origin, checkout_id, status, architecture, compiler, config_name
+            )
+            SELECT 'perf:b' || i, 'perf', 'perf:c' || (1 + i %% %s),
+                (array['PASS', 'FAIL', 'ERROR'])[1 + i %% 3], 'x86_64', 'gcc', 'defconfig'
+            FROM generate_series(1, %s) i
+            """,
+            [CHECKOUT_COUNT, BUILD_COUNT],
+        )
+        cursor.execute(
+            """
+            INSERT INTO pending_builds (build_id, origin, checkout_id, status)
+            SELECT 'perf:b' || i, 'perf', 'perf:c' || (1 + i %% %s),
+                (array['P', 'F', 'I'])[1 + i %% 3]
+            FROM generate_series(1, %s) i
+            """,
+            [CHECKOUT_COUNT, BUILD_COUNT],
+        )
+        cursor.execute(
+            """
+            INSERT INTO pending_test (
+                test_id, origin, platform, build_id, status, is_boot, path, lab,
+                full_status, start_time
+            )
+            SELECT 'perf:t' || i, 'perf', 'platform' || (i %% 50), 'perf:b' || (1 + i %% %s),
+                (array['P', 'F', 'I'])[1 + i %% 3], i %% 5 = 0,
+                'suite' || (i %% 20) || '.case' || (i %% 7), 'lab' || (i %% 4),
+                (array['PASS', 'FAIL', 'SKIP'])[1 + i %% 3], now()
+            FROM generate_series(1, %s) i
+            """,
+            [BUILD_COUNT, PENDING_TEST_COUNT],
+        )
+        cursor.execute(
+            """
+            INSERT INTO tree_listing (
+                checkout_id, origin, tree_name, git_repository_url,
+                git_repository_branch, git_commit_hash, start_time,
+                build_pass, build_failed, build_inc, boot_pass, boot_failed, boot_inc,
+                test_pass, test_failed, test_inc
+            )
+            SELECT id, origin, tree_name, git_repository_url, git_repository_branch,
+                git_commit_hash, start_time, 0, 0, 0, 0, 0, 0, 0, 0, 0
+            FROM checkouts WHERE id LIKE 'perf:%%'
+            """
+        )
+        for table in AGGREGATION_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS backup_{table}")
+            cursor.execute(f"CREATE TABLE backup_{table} AS SELECT * FROM {table}")
+
+
+def _restore_pending_items() -> None:
+    """Restores the pending items and aggregations before each benchmark round."""
+    with connection.cursor() as cursor:
+        for table in AGGREGATION_TABLES:
+            cursor.execute(f"TRUNCATE {table}")
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM backup_{table}")
+        cursor.execute("TRUNCATE pending_queue_position")
+        cursor.execute("UPDATE pending_queue SET active_slot = 0, generation = 0")
+    # Workers inherit the connection when forked
+    connection.close()
+
+
+def _run_workers(shard_count: int) -> None:
+    """Runs one process_pending_aggregations worker per shard until the queue is empty."""
+    args = (
+        [[]]
+        if shard_count == 1
+        else [["--shard", f"{index}/{shard_count}"] for index in range(shard_count)]
+    )
+    workers = [
+        multiprocessing.Process(
+            target=call_command, args=("process_pending_aggregations", *worker_args)
+        )
+        for worker_args in args
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.benchmark(group="aggregation-shards")
+@pytest.mark.parametrize("shard_count", SHARD_COUNTS)
+def test_aggregation_perf_shards(benchmark, shard_count):
+    """Benchmark process_pending_aggregations with one worker per shard."""
+    _create_pending_items()
+
+    benchmark.pedantic(
+        _run_workers,
+        args=(shard_count,),
+        setup=_restore_pending_items,
+        rounds=3,
+        iterations=1,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT count(*) FROM pending_queue_position
+            WHERE generation = (SELECT generation FROM pending_queue)
+                AND shard_count = %s AND tests_done AND builds_done
+            """,
+            [shard_count],
+        )
+        assert cursor.fetchone()[0] == shard_count
+
+    tests_per_second = PENDING_TEST_COUNT / benchmark.stats.stats.mean
+
+    benchmark.extra_info["pending_tests"] = PENDING_TEST_COUNT
+    benchmark.extra_info["shard_count"] = shard_count
+    benchmark.extra_info["tests_per_second"] = f"{tests_per_second:.2f}"
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.benchmark(group="aggregation-engines")
+@pytest.mark.parametrize("engine", ENGINES)
+def test_aggregation_perf_engines(benchmark, engine):
+    """Benchmark process_pending_aggregations with the Python and SQL engines."""
+    _create_pending_items()
+
+    benchmark.pedantic(
+        call_command,
+        args=("process_pending_aggregations", "--engine", engine),
+        setup=_restore_pending_items,
+        rounds=3,
+        iterations=1,
+    )
+
+    tests_per_second = PENDING_TEST_COUNT / benchmark.stats.stats.mean
+
+    benchmark.extra_info["pending_tests"] = PENDING_TEST_COUNT
+    benchmark.extra_info["engine"] = engine
+    benchmark.extra_info["tests_per_second"] = f"{tests_per_second:.2f}"
+
+
+SUSTAINED_ROUNDS = 10
+SUSTAINED_TESTS_PER_ROUND = 10000
+
+
+def _ingest_pending_tests(round_index: int) -> None:
+    """Queues a new round of pending tests, like the ingester does between batches."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO pending_test (
+                test_id, origin, platform, build_id, status, is_boot, path, lab,
+                full_status, start_time
+            )
+            SELECT 'perf:r' || %s || ':t' || i, 'perf', 'platform' || (i %% 50),
+                'perf:b' || (1 + i %% %s), (array['P', 'F', 'I'])[1 + i %% 3],
+                i %% 5 = 0, 'suite' || (i %% 20) || '.case' || (i %% 7),
+                'lab' || (i %% 4), (array['PASS', 'FAIL', 'SKIP'])[1 + i %% 3], now()
+            FROM generate_series(1, %s) i
+            """,
+            [round_index, BUILD_COUNT, SUSTAINED_TESTS_PER_ROUND],
+        )
+
+
+def _pending_table_stats() -> tuple[int, int, int]:
+    """Returns the dead tuples, deleted rows and size in bytes of the pending tables."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_stat_force_next_flush()")
+        cursor.execute(
+            """
+            SELECT coalesce(sum(n_dead_tup), 0), coalesce(sum(n_tup_del), 0),
+                coalesce(sum(pg_total_relation_size(relid)), 0)
+            FROM pg_stat_user_tables
+            WHERE relname ~ '^pending_(test|builds)'
+            """
+        )
+        return tuple(int(value) for value in cursor.fetchone())
+
+
+def _run_sustained_ingest() -> None:
+    """Alternates rounds of ingested pending tests with aggregation batches."""
+    for round_index in range(SUSTAINED_ROUNDS):
+        _ingest_pending_tests(round_index)
+        call_command("process_pending_aggregations", "--engine", "sql")
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.benchmark(group="aggregation-sustained")
+def test_aggregation_perf_sustained_ingest(benchmark):
+    """Benchmark the aggregation of a sustained ingest and the bloat it leaves."""
+    _create_pending_items()
+    _restore_pending_items()
+    dead_before, deleted_before, _ = _pending_table_stats()
+
+    benchmark.pedantic(_run_sustained_ingest, rounds=1, iterations=1)
+
+    dead_after, deleted_after, size = _pending_table_stats()
+    total_tests = SUSTAINED_ROUNDS * SUSTAINED_TESTS_PER_ROUND
+    tests_per_second = total_tests / benchmark.stats.stats.mean
+
+    benchmark.extra_info["pending_tests"] = total_tests
+    benchmark.extra_info["tests_per_second"] = f"{tests_per_second:.2f}"
+    benchmark.extra_info["pending_dead_tuples"] = dead_after - dead_before
+    benchmark.extra_info["pending_deleted_rows"] = deleted_after - deleted_before
+    benchmark.extra_info["pending_size_bytes"] = size
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.core.cache.backends.redis import RedisSerializer
+
+from kernelCI_app.helpers.cacheCodec import QueryRowsSerializer, zstandard
+
+BUILD_COUNT = 400
+TESTS_PER_BUILD = 50
+SERIALIZERS = {
+    "pickle": RedisSerializer,
+    "columns": lambda: QueryRowsSerializer(compression="none"),
+    "columns-zlib": lambda: QueryRowsSerializer(compression="zlib"),
+    "columns-zstd": lambda: QueryRowsSerializer(compression="zstd"),
+}
+
+
+def _build_columns(build: int) -> tuple:
+    start = datetime(2025, 1, 1)
+    return (
+        f"maestro:build{build:06x}",
+        "maestro",
+        None,
+        start + timedelta(minutes=build),
+        312.5 + build,
+        ["x86_64", "arm64", "arm"][build % 3],
+        "make KCFLAGS=-Werror -j16 bzImage modules",
+        ["gcc-12", "clang-17"][build % 2],
+        f"defconfig+kselftest+{build % 20}",
+        f"https://files.kernelci.org/build{build:06x}/config",
+        f"https://files.kernelci.org/build{build:06x}/build.log.gz",
+        ["PASS", "FAIL", "ERROR"][build % 3],
+        {"lab": f"lab-{build % 8}", "kernel_type": "bzimage", "dtb": None},
+        "maestro:checkout0001",
+        "https://git.kernel.org/pub/scm/linux/kernel/git/torvalds/linux.git",
+        "master",
+        ["v6.13-rc1"],
+        "maestro",
+    )
+
+
+def _tree_details_rows() -> list[tuple]:
+    """
+    Rows with the columns and the kind of values of get_tree_details_data. Like the
+    rows of a cursor, the values of the build are new objects in each row.
+    """
+    start = datetime(2025, 1, 1)
+    rows = []
+    for build in range(BUILD_COUNT):
+        for test in range(TESTS_PER_BUILD):
+            build_columns = _build_columns(build)
+            rows.append(
+                (
+                    f"maestro:test{build:06x}{test:04x}",
+                    "maestro",
+                    f"board-{test % 30}",
+                    {
+                        "platform": f"board-{test % 30}",
+                        "job_id": f"{build * TESTS_PER_BUILD + test}",
+                        "job_context": {"arch": build_columns[5]},
+                    },
+                    f"kselftest.suite{test % 12}.case{test}",
+                    None,
+                    f"https://files.kernelci.org/test{build:06x}{test:04x}/log.txt.gz",
+                    ["PASS", "FAIL", "SKIP"][test % 3],
+                    start + timedelta(minutes=build, seconds=test),
+                    1.25 * test,
+                    None,
+                    {"runtime": f"lab-{build % 8}", "arch": build_columns[5]},
+                    [f"vendor,board-{test % 30}"],
+                    *build_columns,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
+    return rows
+
+
+@pytest.mark.benchmark(group="cache-codec")
+@pytest.mark.parametrize("serializer_name", SERIALIZERS)
+def test_cache_codec_perf(benchmark, serializer_name):
+    """Benchmark caching and reading back the rows of a tree details query."""
+    if serializer_name == "columns-zstd" and zstandard is None:
+        pytest.skip("zstandard is not installed")
+    serializer = SERIALIZERS[serializer_name]()
+    rows = _tree_details_rows()
+
+    def round_trip() -> bytes:
+        data = serializer.dumps(rows)
+        serializer.loads(data)
+        return data
+
+    data = benchmark.pedantic(round_trip, rounds=5, iterations=1)
+
+    assert serializer.loads(data) == rows
+    benchmark.extra_info["rows"] = len(rows)
+    benchmark.extra_info["entry_bytes"] = len(data)
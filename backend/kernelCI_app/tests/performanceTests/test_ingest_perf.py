@@ -1,7 +1,9 @@
 import glob
 import json
+import multiprocessing
 import os
 import shutil
+import tracemalloc
 import zipfile
 from typing import Any
 from unittest.mock import patch
@@ -11,13 +13,18 @@ import pytest
 
 from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
     MAP_TABLENAMES_TO_COUNTER,
+    SUBMISSION_SECTIONS,
     SubmissionFileMetadata,
     flush_buffers,
     ingest_submissions_parallel,
+    load_file_streaming,
     prepare_file_data,
 )
 from kernelCI_app.management.commands.helpers.process_submissions import (
-    build_instances_from_submission,
+    build_rows_from_submission,
+)
+from kernelCI_app.management.commands.helpers.schema_validation import (
+    validate_submission,
 )
 
 trees_names = {
@@ -32,6 +39,14 @@ SUBMISSIONS_ZIP = os.path.join(SUBMISSIONS_DIR, "submissions.zip")
 WORKER_COUNTS = [1, 3, 5]
 BATCH_SIZES = [1000, 5000, 10000]
 FILE_SUBSETS = [100, 300, 500]
+LOADER_MODES = ["executemany", "copy"]
+PARSER_MODES = ["batch", "streaming"]
+VALIDATOR_MODES = ["kcidb_io", "compiled"]
+STREAMING_BATCH_SIZE = 1000
+
+LOADER_MODE_PATH = (
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_LOADER_MODE"
+)
 
 
 def _load_submission_files(dir_path: str) -> list[str]:
@@ -197,6 +212,43 @@ def test_validation_and_upgrade(benchmark, cleanup_submission_files, file_subset
     )
 
 
+@pytest.mark.benchmark(group="validation-throughput")
+@pytest.mark.parametrize("validator_mode", VALIDATOR_MODES)
+def test_validation_throughput(benchmark, cleanup_submission_files, validator_mode):  # noqa: ARG001
+    """Benchmark schema validation alone, with kcidb_io or with the compiled validator."""
+    submissions = []
+    for file in _load_submission_files(SUBMISSIONS_DIR):
+        with open(file, "r") as f:
+            submissions.append(json.loads(f.read()))
+    items_count = sum(
+        len(submission.get(section, []))
+        for submission in submissions
+        for section in SUBMISSION_SECTIONS
+    )
+    strict = validator_mode == "kcidb_io"
+
+    def validate_submissions(submissions):
+        for submission in submissions:
+            validate_submission(submission, strict=strict)
+
+    # Compiles the validators outside of the measured rounds
+    validate_submissions(submissions)
+
+    benchmark.pedantic(
+        validate_submissions,
+        args=(submissions,),
+        rounds=5,
+        iterations=1,
+    )
+
+    items_per_second = items_count / benchmark.stats.stats.mean
+
+    benchmark.extra_info["files_processed"] = len(submissions)
+    benchmark.extra_info["items_validated"] = items_count
+    benchmark.extra_info["validator_mode"] = validator_mode
+    benchmark.extra_info["items_per_second"] = f"{items_per_second:.2f}"
+
+
 @pytest.mark.benchmark(group="prepare-file")
 @pytest.mark.parametrize("file_subset", FILE_SUBSETS)
 def test_prepare_file_data(benchmark, cleanup_submission_files, file_subset):  # noqa: ARG001
@@ -264,7 +316,7 @@ def _prepare_buffers(
         if not data:
             continue
 
-        instances = build_instances_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
+        instances = build_rows_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
 
         objects_buffers["issues"].extend(instances["issues"])
         objects_buffers["checkouts"].extend(instances["checkouts"])
@@ -273,6 +325,9 @@ def _prepare_buffers(
         objects_buffers["incidents"].extend(instances["incidents"])
         buffer_files.add((os.path.basename(file_path), file_path))
 
+    for buffer in objects_buffers.values():
+        buffer.sort(key=lambda x: x.id)
+
     return [], {
         "issues_buf": objects_buffers["issues"],
         "checkouts_buf": objects_buffers["checkouts"],
@@ -280,32 +335,78 @@ def _prepare_buffers(
         "tests_buf": objects_buffers["tests"],
         "incidents_buf": objects_buffers["incidents"],
         "buffer_files": buffer_files,
-        "archive_dir": os.path.join(SUBMISSIONS_DIR, "archive"),
-        "pending_retry_dir": os.path.join(SUBMISSIONS_DIR, "pending_retry"),
+        "dirs": {
+            "archive": os.path.join(SUBMISSIONS_DIR, "archive"),
+            "failed": os.path.join(SUBMISSIONS_DIR, "failed"),
+            "pending_retry": os.path.join(SUBMISSIONS_DIR, "pending_retry"),
+        },
+        "stat_ok": multiprocessing.Value("i", 0),
+        "stat_fail": multiprocessing.Value("i", 0),
+        "counter_lock": multiprocessing.Lock(),
     }
 
 
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.benchmark(group="flush-buffers")
+@pytest.mark.parametrize("loader_mode", LOADER_MODES)
 @pytest.mark.parametrize("file_subset", FILE_SUBSETS)
-def test_flush_buffers_perf(benchmark, cleanup_submission_files, file_subset):
-    """Benchmark buffer flushing with different file counts (data volumes)."""
+def test_flush_buffers_perf(
+    benchmark, cleanup_submission_files, file_subset, loader_mode
+):
+    """Benchmark buffer flushing with different file counts (data volumes) and loader modes."""
     all_files = _load_submission_files(SUBMISSIONS_DIR)
     files = _get_file_subset(all_files, file_subset)
 
     assert len(files) > 0, "No submissions found"
 
-    benchmark.pedantic(
-        flush_buffers,
-        setup=lambda: _prepare_buffers(files, trees_names),
-        rounds=5,
-        iterations=1,
-    )
+    with patch(LOADER_MODE_PATH, loader_mode):
+        benchmark.pedantic(
+            flush_buffers,
+            setup=lambda: _prepare_buffers(files, trees_names),
+            teardown=_restore_submission_files,
+            rounds=5,
+            iterations=1,
+        )
 
     files_per_second = len(files) / benchmark.stats.stats.mean
 
     benchmark.extra_info["files_processed"] = len(files)
     benchmark.extra_info["file_subset"] = file_subset
+    benchmark.extra_info["loader_mode"] = loader_mode
+    benchmark.extra_info["files_per_second"] = f"{files_per_second:.2f}"
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.benchmark(group="ingest-loader-mode")
+@pytest.mark.parametrize("loader_mode", LOADER_MODES)
+def test_ingest_perf_loader_mode(benchmark, cleanup_submission_files, loader_mode):  # noqa: ARG001
+    """Benchmark the full ingestion with each loader mode, reported side by side."""
+    files = _load_submission_files(SUBMISSIONS_DIR)
+
+    assert len(files) > 0, "No submissions found"
+
+    with patch(LOADER_MODE_PATH, loader_mode):
+        benchmark.pedantic(
+            ingest_submissions_parallel,
+            args=(
+                files,
+                trees_names,
+                {
+                    "archive": os.path.join(SUBMISSIONS_DIR, "archive"),
+                    "failed": os.path.join(SUBMISSIONS_DIR, "failed"),
+                    "pending_retry": os.path.join(SUBMISSIONS_DIR, "pending_retry"),
+                },
+                3,
+            ),
+            rounds=5,
+            iterations=1,
+            teardown=_restore_submission_files,
+        )
+
+    files_per_second = len(files) / benchmark.stats.stats.mean
+
+    benchmark.extra_info["files_processed"] = len(files)
+    benchmark.extra_info["loader_mode"] = loader_mode
     benchmark.extra_info["files_per_second"] = f"{files_per_second:.2f}"
 
 
@@ -348,7 +449,7 @@ def test_ingest_parallel_batch_size(benchmark, cleanup_submission_files, batch_s
 @pytest.mark.benchmark(group="build-instances")
 @pytest.mark.parametrize("file_subset", FILE_SUBSETS)
 def test_build_instances_perf(benchmark, cleanup_submission_files, file_subset):
-    """Benchmark building instances from submission data."""
+    """Benchmark building insert rows from submission data."""
     all_files = _load_submission_files(SUBMISSIONS_DIR)
     files = _get_file_subset(all_files, file_subset)
 
@@ -369,13 +470,13 @@ def test_build_instances_perf(benchmark, cleanup_submission_files, file_subset):
     # Calculate total items to be processed
     total_items = 0
     for data in data_list:
-        instances = build_instances_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
+        instances = build_rows_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
         for key in instances:
             total_items += len(instances[key])
 
     def run_build_instances(data_list):
         for data in data_list:
-            build_instances_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
+            build_rows_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
 
     benchmark.pedantic(
         run_build_instances,
@@ -389,3 +490,77 @@ def test_build_instances_perf(benchmark, cleanup_submission_files, file_subset):
     benchmark.extra_info["items_processed"] = total_items
     benchmark.extra_info["file_subset"] = file_subset
     benchmark.extra_info["items_per_second"] = f"{items_per_second:.2f}"
+
+
+def _write_large_submission(files: list[str], path: str) -> int:
+    """Merges the 5.3 submissions into a single file, returning its size."""
+    version = {"major": 5, "minor": 3}
+    merged: dict[str, Any] = {"version": version}
+    for file_path in files:
+        with open(file_path, "r") as f:
+            data = json.loads(f.read())
+        if data.get("version") != version:
+            continue
+        for section in SUBMISSION_SECTIONS:
+            merged.setdefault(section, []).extend(data.get(section, []))
+
+    with open(path, "w") as f:
+        json.dump(merged, f)
+    return os.path.getsize(path)
+
+
+@pytest.mark.benchmark(group="memory-ceiling")
+@pytest.mark.parametrize("parser_mode", PARSER_MODES)
+def test_large_file_memory_ceiling(
+    benchmark, cleanup_submission_files, tmp_path, parser_mode
+):
+    """
+    Measures the peak memory used to turn a large submission into insert rows.
+    With the streaming parser the peak must follow the batch size, not the file size.
+    """
+    all_files = _load_submission_files(SUBMISSIONS_DIR)
+    large_file_path = str(tmp_path / "large_submission.json")
+    file_size = _write_large_submission(all_files, large_file_path)
+    file_metadata: SubmissionFileMetadata = {
+        "path": large_file_path,
+        "name": os.path.basename(large_file_path),
+        "size": file_size,
+    }
+    peaks: list[int] = []
+
+    def load_batch() -> None:
+        data, _ = prepare_file_data(file_metadata, trees_names)
+        build_rows_from_submission(data, MAP_TABLENAMES_TO_COUNTER)
+
+    def load_streaming() -> None:
+        instances: dict[str, list[Any]] = {table: [] for table in SUBMISSION_SECTIONS}
+
+        def flush() -> bool:
+            for buffer in instances.values():
+                buffer.clear()
+            return True
+
+        load_file_streaming(file_metadata, trees_names, instances, flush)
+
+    def measure_peak() -> None:
+        tracemalloc.start()
+        try:
+            load_batch() if parser_mode == "batch" else load_streaming()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak)
+        finally:
+            tracemalloc.stop()
+
+    with patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_BATCH_SIZE",
+        STREAMING_BATCH_SIZE,
+    ):
+        benchmark.pedantic(measure_peak, rounds=3, iterations=1)
+
+    peak_memory = max(peaks)
+    benchmark.extra_info["parser_mode"] = parser_mode
+    benchmark.extra_info["file_size_mb"] = f"{file_size / (1024 * 1024):.2f}"
+    benchmark.extra_info["peak_memory_mb"] = f"{peak_memory / (1024 * 1024):.2f}"
+
+    if parser_mode == "streaming":
+        assert peak_memory < file_size, "Streaming peak memory grew with file size"
@@ -1,15 +1,26 @@
-from unittest.mock import patch
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
 
 from kernelCI_app.cache import (
     DISCORD_NOTIFICATION_COOLDOWN,
     DISCORD_NOTIFICATION_KEY,
-    _add_to_lookup,
+    LOCAL_CACHE_MAX_ROWS,
+    _CachedRows,
+    _create_cache_key,
     _create_cache_params_hash,
     get_notification_cache,
+    get_or_set_query_cache,
     get_query_cache,
+    invalidate_query_cache,
     set_notification_cache,
     set_query_cache,
+    tagged_query_timeout,
 )
+from kernelCI_app.helpers.cacheBackends import LocalObjectCache
 
 
 class TestCreateCacheParamsHash:
@@ -64,25 +75,6 @@ class TestSetQueryCache:
             key, rows, mock_cache.set.call_args[0][2]
         )
 
-    @patch("kernelCI_app.cache.cache")
-    def test_set_query_cache_with_lookup_keys(self, mock_cache):
-        """Test setting cache with lookup keys."""
-        key = "test_key"
-        rows = ["row1", "row2"]
-        commit_hash = "commit123"
-        build_id = "build456"
-        test_id = "test789"
-
-        set_query_cache(
-            key=key,
-            rows=rows,
-            commit_hash=commit_hash,
-            build_id=build_id,
-            test_id=test_id,
-        )
-
-        mock_cache.set.assert_called_once()
-
 
 class TestGetQueryCache:
     @patch("kernelCI_app.cache.cache")
@@ -178,44 +170,232 @@ class TestGetNotificationCache:
         assert result is None
 
 
-class TestAddToLookup:
-    def test_add_to_lookup_with_none_property_key(self):
-        """Test that None property key returns early."""
-        lookup = {}
-        _add_to_lookup("cache_key", None, lookup)
-        assert lookup == {}
+class TestTaggedQueryCache:
+    # Test cases:
+    # - tagged rows are read back with the same commit hashes, and kept longer
+    # - invalidating a commit evicts the rows tagged with it, and only those
+    # - rows computed before an invalidation aren't stored under the new version
+
+    @pytest.fixture(autouse=True)
+    def local_cache(self):
+        local_cache = LocMemCache("cache_test", {})
+        with patch("kernelCI_app.cache.cache", local_cache):
+            yield local_cache
+        local_cache.clear()
+
+    def test_tagged_rows_are_cached(self, local_cache):
+        with patch.object(local_cache, "set", wraps=local_cache.set) as mock_set:
+            set_query_cache(key="k", params={"p": 1}, rows=["row"], commit_hash="a")
+
+        assert get_query_cache("k", {"p": 1}, commit_hash="a") == ["row"]
+        assert get_query_cache("k", {"p": 1}) is None
+        assert mock_set.call_args.args[2] == tagged_query_timeout
+
+    def test_invalidate_evicts_tagged_rows(self):
+        set_query_cache(key="k1", rows=["row1"], commit_hash=["a", "b"])
+        set_query_cache(key="k2", rows=["row2"], commit_hash="c")
+
+        invalidate_query_cache(commit_hashes={"b"})
+
+        assert get_query_cache("k1", commit_hash=["a", "b"]) is None
+        assert get_query_cache("k2", commit_hash="c") == ["row2"]
+
+    def test_rows_computed_before_invalidation_are_stale(self):
+        assert get_query_cache("k", commit_hash="a") is None
+        invalidate_query_cache(commit_hashes=["a"])
+        set_query_cache(key="k", rows=["stale"], commit_hash="a")
+
+        assert get_query_cache("k", commit_hash="a") is None
+
+
+class TestEmptyQueryCache:
+    # Test cases:
+    # - empty rows are cached, for the shorter timeout, and told apart from a miss
+    # - empty rows are kept in the worker despite the falsy values being misses there
+    # - empty computed rows are fresh for the shorter timeout
+
+    @pytest.fixture(autouse=True)
+    def local_cache(self):
+        local_cache = LocMemCache("empty_test", {})
+        worker_cache = LocalObjectCache("empty_local", {})
+        with (
+            patch("kernelCI_app.cache.cache", local_cache),
+            patch("kernelCI_app.cache.local_cache", worker_cache),
+            patch("kernelCI_app.cache.local_query_timeout", 30),
+            patch("kernelCI_app.cache.empty_query_timeout", 5),
+        ):
+            yield local_cache
+        local_cache.clear()
+        worker_cache.clear()
+
+    def test_empty_rows_are_cached(self, local_cache):
+        with patch.object(local_cache, "set", wraps=local_cache.set) as mock_set:
+            set_query_cache(key="empty", rows=[], commit_hash="a")
+
+        assert get_query_cache("empty", commit_hash="a") == []
+        assert get_query_cache("other") is None
+        assert mock_set.call_args.args[2] == 5
+
+    def test_empty_rows_are_kept_locally(self, local_cache):
+        set_query_cache(key="k", rows=[], local=True)
+        local_cache.clear()
+
+        assert get_query_cache("k", local=True) == []
+
+    def test_empty_computed_rows(self, local_cache):
+        get_or_set_query_cache(key="k", compute=list)
+
+        entry = local_cache.get(_create_cache_key("k", None))
+        assert entry.rows == []
+        assert entry.fresh_until <= time.time() + 5
+
+
+class TestSingleFlightQueryCache:
+    # Test cases:
+    # - rows are computed once, then read from the cache
+    # - stale rows are returned while another worker computes them again
+    # - without rows, the rows computed by the worker holding the lock are awaited
+    # - the lock is released when the computation fails
+    # - invalidating the commit computes the rows again
+
+    @pytest.fixture(autouse=True)
+    def local_cache(self):
+        local_cache = LocMemCache("single_flight_test", {})
+        with patch("kernelCI_app.cache.cache", local_cache):
+            yield local_cache
+        local_cache.clear()
+
+    def test_rows_are_computed_once(self):
+        compute = MagicMock(return_value=["row"])
+
+        for _ in range(2):
+            rows = get_or_set_query_cache(key="k", params={"p": 1}, compute=compute)
+
+        assert rows == ["row"]
+        compute.assert_called_once()
+
+    def test_stale_rows_while_locked(self, local_cache):
+        cache_key = _create_cache_key("k", None)
+        local_cache.set(cache_key, _CachedRows(rows=["stale"], fresh_until=0))
+        local_cache.add(f"{cache_key}-lock", "other worker")
+        compute = MagicMock(return_value=["fresh"])
+
+        assert get_or_set_query_cache(key="k", compute=compute) == ["stale"]
+        compute.assert_not_called()
+
+    def test_waits_for_the_lock_holder(self, local_cache):
+        cache_key = _create_cache_key("k", None)
+        local_cache.add(f"{cache_key}-lock", "other worker")
+        compute = MagicMock(return_value=["mine"])
+
+        def computed_by_other_worker(_seconds):
+            local_cache.set(
+                cache_key, _CachedRows(rows=["theirs"], fresh_until=time.time() + 60)
+            )
+
+        with patch("kernelCI_app.cache.time.sleep", computed_by_other_worker):
+            assert get_or_set_query_cache(key="k", compute=compute) == ["theirs"]
+        compute.assert_not_called()
+
+    def test_lock_released_on_error(self, local_cache):
+        compute = MagicMock(side_effect=RuntimeError)
+
+        with pytest.raises(RuntimeError):
+            get_or_set_query_cache(key="k", compute=compute)
+
+        assert local_cache.get(f"{_create_cache_key('k', None)}-lock") is None
+
+    def test_invalidated_rows_are_computed_again(self):
+        compute = MagicMock(side_effect=[["old"], ["new"]])
+
+        get_or_set_query_cache(key="k", compute=compute, commit_hash="a")
+        invalidate_query_cache(commit_hashes=["a"])
+
+        assert get_or_set_query_cache(key="k", compute=compute, commit_hash="a") == [
+            "new"
+        ]
+
+
+class TestLocalQueryCache:
+    # Test cases:
+    # - local rows are read from the worker without reaching Redis
+    # - local rows are the cached objects, not decoded copies
+    # - rows read from Redis are kept in the worker
+    # - large rows are only kept in Redis
+    # - invalidating a commit evicts the local rows tagged with it
+    # - local tagged rows read the commit versions from the worker
+    # - an invalidation by another process is seen once the local versions expire
+
+    @pytest.fixture(autouse=True)
+    def cache_tiers(self):
+        redis_cache = LocMemCache("redis_test", {})
+        local_cache = LocalObjectCache("local_test", {})
+        with (
+            patch("kernelCI_app.cache.cache", redis_cache),
+            patch("kernelCI_app.cache.local_cache", local_cache),
+            patch("kernelCI_app.cache.local_query_timeout", 30),
+            # Versions remembered by the misses of the other tests
+            patch("kernelCI_app.cache._read_versions", threading.local()),
+        ):
+            yield redis_cache, local_cache
+        redis_cache.clear()
+        local_cache.clear()
+
+    def test_local_rows_skip_redis(self, cache_tiers):
+        redis_cache, _local_cache = cache_tiers
+        set_query_cache(key="k", rows=["row"], local=True)
+        redis_cache.clear()
+
+        assert get_query_cache("k", local=True) == ["row"]
+        assert get_query_cache("k") is None
+
+    def test_local_rows_are_not_copied(self):
+        rows = [{"origin": "maestro"}]
+        set_query_cache(key="k", rows=rows, local=True)
+
+        assert get_query_cache("k", local=True) is rows
+
+    def test_redis_rows_are_kept_locally(self, cache_tiers):
+        redis_cache, local_cache = cache_tiers
+        set_query_cache(key="k", params={"p": 1}, rows=["row"])
+
+        assert get_query_cache("k", {"p": 1}, local=True) == ["row"]
+        redis_cache.clear()
+        assert get_query_cache("k", {"p": 1}, local=True) == ["row"]
+
+    def test_large_rows_only_in_redis(self, cache_tiers):
+        _redis_cache, local_cache = cache_tiers
+        rows = list(range(LOCAL_CACHE_MAX_ROWS + 1))
+
+        set_query_cache(key="k", rows=rows, local=True)
+
+        assert get_query_cache("k", local=True) == rows
+        assert local_cache.get(_create_cache_key("k", None)) is None
 
-    def test_add_to_lookup_new_property_key(self):
-        """Test adding to lookup with new property key."""
-        lookup = {}
-        cache_key = "cache_key"
-        property_key = "property_key"
+    def test_invalidate_evicts_local_rows(self):
+        set_query_cache(key="k", rows=["row"], commit_hash="a", local=True)
 
-        _add_to_lookup(cache_key, property_key, lookup)
+        invalidate_query_cache(commit_hashes=["a"])
 
-        assert property_key in lookup
-        assert list(lookup[property_key]) == [cache_key]
+        assert get_query_cache("k", commit_hash="a", local=True) is None
 
-    def test_add_to_lookup_existing_property_key(self):
-        """Test adding to lookup with existing property key."""
-        lookup = {"property_key": set(["existing_key"])}
-        cache_key = "new_cache_key"
-        property_key = "property_key"
+    def test_local_tagged_rows_skip_redis(self, cache_tiers):
+        redis_cache, _local_cache = cache_tiers
+        set_query_cache(key="k", rows=["row"], commit_hash="a", local=True)
 
-        _add_to_lookup(cache_key, property_key, lookup)
+        with patch.object(redis_cache, "get_many") as mock_get_many:
+            assert get_query_cache("k", commit_hash="a", local=True) == ["row"]
 
-        assert "new_cache_key" in lookup[property_key]
-        assert "existing_key" in lookup[property_key]
+        mock_get_many.assert_not_called()
 
-    def test_add_to_lookup_multiple_calls(self):
-        """Test multiple calls to add_to_lookup."""
-        lookup = {}
-        property_key = "property_key"
+    def test_invalidate_from_other_process(self, cache_tiers):
+        redis_cache, local_cache = cache_tiers
+        set_query_cache(key="k", rows=["row"], commit_hash="a", local=True)
 
-        _add_to_lookup("key1", property_key, lookup)
-        _add_to_lookup("key2", property_key, lookup)
-        _add_to_lookup("key3", property_key, lookup)
+        # invalidate_query_cache of another process only changes Redis
+        with patch.object(local_cache, "delete_many"):
+            invalidate_query_cache(commit_hashes=["a"])
 
-        assert "key1" in lookup[property_key]
-        assert "key2" in lookup[property_key]
-        assert "key3" in lookup[property_key]
+        assert get_query_cache("k", commit_hash="a", local=True) == ["row"]
+        local_cache.clear()
+        assert get_query_cache("k", commit_hash="a", local=True) is None
@@ -0,0 +1,151 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.db import OperationalError
+from django.test import SimpleTestCase
+from psycopg.errors import DeadlockDetected
+
+from kernelCI_app.management.commands.helpers.aggregation_helpers import (
+    aggregate_checkouts_and_pendings,
+    aggregate_rows_inline,
+)
+from kernelCI_app.management.commands.helpers.sql_aggregation import (
+    INGESTED_BUILDS_TABLE,
+    INGESTED_TESTS_TABLE,
+    IngestedBatchResult,
+)
+
+HELPERS_PATH = "kernelCI_app.management.commands.helpers.aggregation_helpers"
+
+
+def _make_test_row(**overrides):
+    defaults = {
+        "id": "test-1",
+        "origin": "maestro",
+        "platform": "rpi",
+        "environment_compatible": None,
+        "build_id": "build-1",
+        "status": "PASS",
+        "path": "boot.login",
+        "start_time": None,
+        "lab": "lab-1",
+    }
+    return SimpleNamespace(**{**defaults, **overrides})
+
+
+def _make_build_row(**overrides):
+    defaults = {
+        "id": "build-1",
+        "origin": "maestro",
+        "checkout_id": "checkout-1",
+        "status": "FAIL",
+    }
+    return SimpleNamespace(**{**defaults, **overrides})
+
+
+def _deadlock() -> OperationalError:
+    error = OperationalError("deadlock detected")
+    error.__cause__ = DeadlockDetected("deadlock detected")
+    return error
+
+
+@patch(f"{HELPERS_PATH}.update_tree_listing")
+@patch(f"{HELPERS_PATH}.aggregate_checkouts")
+class TestAggregateCheckoutsAndPendings(SimpleTestCase):
+    """Test cases for the choice between pending tables and inline aggregation."""
+
+    @patch(f"{HELPERS_PATH}.INGEST_INLINE_AGGREGATION", False)
+    @patch(f"{HELPERS_PATH}.aggregate_rows_inline")
+    @patch(f"{HELPERS_PATH}.aggregate_builds")
+    @patch(f"{HELPERS_PATH}.aggregate_test_rows")
+    def test_pending_tables_by_default(
+        self, mock_tests, mock_builds, mock_inline, mock_checkouts, mock_listing
+    ):
+        tests, builds = [_make_test_row()], [_make_build_row()]
+
+        aggregate_checkouts_and_pendings([], tests, builds)
+
+        mock_tests.assert_called_once_with(tests)
+        mock_builds.assert_called_once_with(builds)
+        mock_inline.assert_not_called()
+
+    @patch(f"{HELPERS_PATH}.INGEST_INLINE_AGGREGATION", True)
+    @patch(f"{HELPERS_PATH}.aggregate_rows_inline")
+    @patch(f"{HELPERS_PATH}.aggregate_builds")
+    @patch(f"{HELPERS_PATH}.aggregate_test_rows")
+    def test_inline_aggregation(
+        self, mock_tests, mock_builds, mock_inline, mock_checkouts, mock_listing
+    ):
+        tests, builds = [_make_test_row()], [_make_build_row()]
+
+        aggregate_checkouts_and_pendings([], tests, builds)
+
+        mock_inline.assert_called_once_with(tests, builds)
+        mock_tests.assert_not_called()
+        mock_builds.assert_not_called()
+
+
+@patch(f"{HELPERS_PATH}.transaction.atomic", MagicMock())
+@patch(f"{HELPERS_PATH}.prepare_ingested_tables")
+@patch(f"{HELPERS_PATH}._upsert_pending_builds")
+@patch(f"{HELPERS_PATH}._upsert_pending_tests")
+class TestAggregateRowsInline(SimpleTestCase):
+    """Test cases for aggregate_rows_inline."""
+
+    # Test cases:
+    # - items staged, aggregated and the rest queued
+    # - deadlock queues every item as pending
+    # - other errors fail the flush
+    # - nothing to aggregate
+
+    @patch(f"{HELPERS_PATH}._queue_not_aggregated", return_value=(0, 0))
+    @patch(f"{HELPERS_PATH}.aggregate_ingested_items")
+    def test_stages_and_aggregates(
+        self, mock_aggregate, mock_queue, mock_tests, mock_builds, mock_prepare
+    ):
+        mock_aggregate.return_value = IngestedBatchResult(1, 1, {})
+
+        aggregate_rows_inline([_make_test_row()], [_make_build_row()])
+
+        mock_prepare.assert_called_once()
+        self.assertEqual(mock_tests.call_args.kwargs["table"], INGESTED_TESTS_TABLE)
+        self.assertEqual(mock_builds.call_args.kwargs["table"], INGESTED_BUILDS_TABLE)
+        test_values = mock_tests.call_args.args[0]
+        # Simplified status and boot flag, like in the pending tables
+        self.assertEqual(test_values[0][5], "P")
+        self.assertTrue(test_values[0][6])
+        self.assertEqual(
+            mock_builds.call_args.args[0], [("build-1", "maestro", "checkout-1", "F")]
+        )
+        mock_queue.assert_called_once()
+
+    @patch(f"{HELPERS_PATH}.connections")
+    @patch(f"{HELPERS_PATH}.aggregate_ingested_items", side_effect=_deadlock())
+    def test_deadlock_queues_pending(
+        self, mock_aggregate, mock_connections, mock_tests, mock_builds, mock_prepare
+    ):
+        mock_connections.__getitem__.return_value.needs_rollback = False
+
+        aggregate_rows_inline([_make_test_row()], [_make_build_row()])
+
+        self.assertEqual(mock_tests.call_count, 2)
+        self.assertEqual(mock_tests.call_args.kwargs, {})
+        self.assertEqual(mock_builds.call_args.kwargs, {})
+
+    @patch(
+        f"{HELPERS_PATH}.aggregate_ingested_items",
+        side_effect=OperationalError("connection lost"),
+    )
+    def test_other_errors_are_raised(
+        self, mock_aggregate, mock_tests, mock_builds, mock_prepare
+    ):
+        with self.assertRaises(OperationalError):
+            aggregate_rows_inline([_make_test_row()], [])
+
+        mock_tests.assert_called_once()
+
+    def test_nothing_to_aggregate(self, mock_tests, mock_builds, mock_prepare):
+        aggregate_rows_inline([], [])
+
+        mock_prepare.assert_not_called()
+        mock_tests.assert_not_called()
@@ -0,0 +1,187 @@
+import argparse
+from unittest.mock import patch
+
+import pytest
+from django.core.management.base import CommandError
+
+from kernelCI_app.constants.process_pending import (
+    SHARD_AUTO_MEMBER_LOCK,
+    SHARD_OWNER_LOCK,
+    SHARD_RESERVED_LOCK,
+)
+from kernelCI_app.management.commands.helpers.aggregation_shards import (
+    ShardCoordinator,
+    ShardSpec,
+    parse_shard,
+    target_shard_count,
+)
+
+SHARDS_PATH = "kernelCI_app.management.commands.helpers.aggregation_shards"
+
+
+class TestParseShard:
+    """Test cases for the --shard argument."""
+
+    # Test cases:
+    # - fixed shard
+    # - shard assigned by the coordinator
+    # - invalid values
+
+    def test_parse_shard_fixed(self):
+        assert parse_shard("2/4") == ShardSpec(index=2, count=4)
+        assert str(parse_shard("2/4")) == "2/4"
+
+    def test_parse_shard_auto(self):
+        assert parse_shard("auto/3") == ShardSpec(index=None, count=3)
+        assert str(parse_shard("auto/3")) == "auto/3"
+
+    @pytest.mark.parametrize("value", ["4/4", "-1/4", "1", "a/4", "1/0", "auto/"])
+    def test_parse_shard_invalid(self, value):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(value)
+
+
+class TestTargetShardCount:
+    """Test cases for the number of shards of each auto worker."""
+
+    # Test cases:
+    # - shards split evenly, rounding up so that every shard has an owner
+    # - reserved shards are left to the fixed workers
+    # - no auto workers
+
+    def test_target_shard_count_even(self):
+        assert target_shard_count(8, 0, 4) == 2
+        assert target_shard_count(8, 0, 3) == 3
+
+    def test_target_shard_count_reserved(self):
+        assert target_shard_count(4, 1, 3) == 1
+        assert target_shard_count(2, 2, 1) == 0
+
+    def test_target_shard_count_no_auto_workers(self):
+        assert target_shard_count(4, 0, 0) == 0
+
+
+class FakeLocks:
+    """Advisory locks of the other workers, as seen from this worker's connection."""
+
+    def __init__(self, owned=(), others=(), reserved=(), auto_members=1):
+        self.owned = set(owned)
+        self.others = set(others)
+        self.reserved = set(reserved)
+        self.auto_members = auto_members
+
+    def try_lock(self, key, value):
+        assert key == SHARD_OWNER_LOCK
+        if value in self.others or value in self.owned:
+            return False
+        self.owned.add(value)
+        return True
+
+    def unlock(self, key, value):
+        assert key == SHARD_OWNER_LOCK
+        self.owned.remove(value)
+
+    def held_locks(self, key, *, own=False):
+        if key == SHARD_OWNER_LOCK:
+            return list(self.owned) if own else list(self.owned | self.others)
+        if key == SHARD_RESERVED_LOCK:
+            return list(self.reserved)
+        if key == SHARD_AUTO_MEMBER_LOCK:
+            return [4] * self.auto_members
+        return []
+
+
+@pytest.fixture
+def fake_locks():
+    locks = FakeLocks()
+    with (
+        patch(f"{SHARDS_PATH}._try_lock", side_effect=locks.try_lock),
+        patch(f"{SHARDS_PATH}._unlock", side_effect=locks.unlock),
+        patch(f"{SHARDS_PATH}._held_locks", side_effect=locks.held_locks),
+        patch(f"{SHARDS_PATH}.out"),
+    ):
+        yield locks
+
+
+class TestShardCoordinatorRebalance:
+    """Test cases for ShardCoordinator.rebalance."""
+
+    # Test cases:
+    # - single auto worker takes every shard
+    # - auto worker releases its extra shards when workers join
+    # - auto worker skips the shards owned by others
+    # - auto worker releases the shards reserved by fixed workers
+    # - fixed worker owns its shard
+    # - fixed worker waits while its shard is owned by an auto worker
+
+    def test_rebalance_single_worker(self, fake_locks):
+        coordinator = ShardCoordinator(ShardSpec(index=None, count=4))
+
+        assert coordinator.rebalance() == [0, 1, 2, 3]
+
+    def test_rebalance_worker_joined(self, fake_locks):
+        fake_locks.owned = {0, 1, 2, 3}
+        fake_locks.auto_members = 2
+        coordinator = ShardCoordinator(ShardSpec(index=None, count=4))
+
+        assert coordinator.rebalance() == [0, 1]
+        assert fake_locks.owned == {0, 1}
+
+    def test_rebalance_shards_owned_by_others(self, fake_locks):
+        fake_locks.others = {0, 1}
+        fake_locks.auto_members = 2
+        coordinator = ShardCoordinator(ShardSpec(index=None, count=4))
+
+        assert coordinator.rebalance() == [2, 3]
+
+    def test_rebalance_reserved_shards(self, fake_locks):
+        fake_locks.owned = {0, 1, 2, 3}
+        fake_locks.reserved = {0}
+        coordinator = ShardCoordinator(ShardSpec(index=None, count=4))
+
+        assert coordinator.rebalance() == [1, 2, 3]
+
+    def test_rebalance_fixed_shard(self, fake_locks):
+        coordinator = ShardCoordinator(ShardSpec(index=2, count=4))
+
+        assert coordinator.rebalance() == [2]
+        assert coordinator.rebalance() == [2]
+
+    def test_rebalance_fixed_shard_not_released(self, fake_locks):
+        fake_locks.others = {2}
+        coordinator = ShardCoordinator(ShardSpec(index=2, count=4))
+
+        assert coordinator.rebalance() == []
+
+
+class TestShardCoordinatorJoin:
+    """Test cases for ShardCoordinator.join."""
+
+    # Test cases:
+    # - other workers use a different shard count
+    # - fixed shard reserved by another worker
+
+    @patch(f"{SHARDS_PATH}.transaction.atomic")
+    @patch(f"{SHARDS_PATH}.connection")
+    @patch(f"{SHARDS_PATH}._held_locks", return_value=[2, 2])
+    def test_join_other_shard_count(self, mock_held, mock_connection, mock_atomic):
+        coordinator = ShardCoordinator(ShardSpec(index=None, count=4))
+
+        with pytest.raises(CommandError, match="running with 2 shard"):
+            coordinator.join()
+
+    @patch(f"{SHARDS_PATH}.ShardCoordinator.leave")
+    @patch(f"{SHARDS_PATH}._try_lock", return_value=False)
+    @patch(f"{SHARDS_PATH}.transaction.atomic")
+    @patch(f"{SHARDS_PATH}.connection")
+    @patch(f"{SHARDS_PATH}._held_locks", return_value=[4])
+    def test_join_fixed_shard_taken(
+        self, mock_held, mock_connection, mock_atomic, mock_try_lock, mock_leave
+    ):
+        coordinator = ShardCoordinator(ShardSpec(index=1, count=4))
+
+        with pytest.raises(CommandError, match="already taken"):
+            coordinator.join()
+
+        mock_try_lock.assert_called_once_with(SHARD_RESERVED_LOCK, 1)
+        mock_leave.assert_called_once()
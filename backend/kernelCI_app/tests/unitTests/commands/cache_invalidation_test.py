@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from kernelCI_app.management.commands.helpers.cache_invalidation import (
+    invalidate_cached_commits,
+    invalidate_written_commits,
+)
+
+INVALIDATION_PATH = "kernelCI_app.management.commands.helpers.cache_invalidation"
+
+
+@patch(f"{INVALIDATION_PATH}.invalidate_query_cache")
+@patch(f"{INVALIDATION_PATH}.transaction.on_commit")
+class TestInvalidateCachedCommits:
+    # Test cases:
+    # - the commits are invalidated on commit, without raising errors
+    # - nothing is registered without commits
+
+    def test_invalidates_on_commit(self, mock_on_commit, mock_invalidate):
+        invalidate_cached_commits(["a", "b", "a"])
+
+        callback = mock_on_commit.call_args.args[0]
+        assert mock_on_commit.call_args.kwargs == {"robust": True}
+        mock_invalidate.assert_not_called()
+        callback()
+        mock_invalidate.assert_called_once_with(commit_hashes={"a", "b"})
+
+    def test_no_commits(self, mock_on_commit, mock_invalidate):
+        invalidate_cached_commits([])
+
+        mock_on_commit.assert_not_called()
+
+
+@patch(f"{INVALIDATION_PATH}.invalidate_cached_commits")
+@patch(f"{INVALIDATION_PATH}.connection")
+class TestInvalidateWrittenCommits:
+    # Test cases:
+    # - only checkouts: their commits and tags, without querying the database
+    # - builds, tests and incidents: the commits of their checkouts are queried
+
+    def test_only_checkouts(self, mock_connection, mock_invalidate):
+        invalidate_written_commits(
+            checkout_rows=[
+                SimpleNamespace(git_commit_hash="a", git_commit_tags=["v1", "v1-rc"]),
+                SimpleNamespace(git_commit_hash=None, git_commit_tags=None),
+            ],
+            build_rows=[],
+            test_rows=[],
+            incident_rows=[],
+        )
+
+        mock_connection.cursor.assert_not_called()
+        mock_invalidate.assert_called_once_with({"a", "v1", "v1-rc"})
+
+    def test_queries_commits_of_items(self, mock_connection, mock_invalidate):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [("b",), ("c",)]
+        mock_connection.cursor.return_value.__enter__.return_value = cursor
+
+        invalidate_written_commits(
+            checkout_rows=[SimpleNamespace(git_commit_hash="a", git_commit_tags=[])],
+            build_rows=[SimpleNamespace(checkout_id="checkout-1")],
+            test_rows=[SimpleNamespace(build_id="build-1")],
+            incident_rows=[
+                SimpleNamespace(build_id=None, test_id="test-1"),
+                SimpleNamespace(build_id="build-2", test_id=None),
+            ],
+        )
+
+        params = cursor.execute.call_args.args[1]
+        assert params["checkout_ids"] == ["checkout-1"]
+        assert sorted(params["build_ids"]) == ["build-1", "build-2"]
+        assert params["test_ids"] == ["test-1"]
+        mock_invalidate.assert_called_once_with({"a", "b", "c"})
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from kernelCI_app.management.commands.helpers.hardware_backfill import (
+    _pending_test_values,
+    day_ranges,
+    queue_pending_tests,
+)
+
+BACKFILL_PATH = "kernelCI_app.management.commands.helpers.hardware_backfill"
+COMMAND_PATH = "kernelCI_app.management.commands.backfill_hardware_aggregations"
+
+START = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class TestDayRanges:
+    # Test cases:
+    # - whole days, most recent first
+    # - the oldest range is cut at the start
+    # - empty interval
+
+    def test_whole_days(self):
+        assert day_ranges(START, START + timedelta(days=2)) == [
+            (START + timedelta(days=1), START + timedelta(days=2)),
+            (START, START + timedelta(days=1)),
+        ]
+
+    def test_partial_day(self):
+        end = START + timedelta(days=1, hours=6)
+
+        assert day_ranges(START, end) == [
+            (START + timedelta(hours=6), end),
+            (START, START + timedelta(hours=6)),
+        ]
+
+    def test_empty(self):
+        assert day_ranges(START, START) == []
+
+
+class TestPendingTestValues:
+    # Test cases:
+    # - same values as convert_test: simplified status, boot path
+    # - test without path nor status
+
+    def test_boot_test(self):
+        row = ("t1", "maestro", "rpi", ["c"], "b1", "FAIL", "boot", START, "lava")
+
+        assert _pending_test_values(row) == (
+            "t1",
+            "maestro",
+            "rpi",
+            ["c"],
+            "b1",
+            "F",
+            True,
+            "boot",
+            START,
+            "lava",
+            "FAIL",
+        )
+
+    def test_no_path(self):
+        row = ("t1", "maestro", None, None, "b1", None, None, None, None)
+
+        values = _pending_test_values(row)
+
+        assert values[5] is None
+        assert values[6] is False
+
+
+@patch(f"{BACKFILL_PATH}.connection")
+class TestQueuePendingTests:
+    # Test cases:
+    # - tests are copied to the temporary table and upserted from it
+
+    def test_copies_and_upserts(self, mock_connection):
+        cursor = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = cursor
+        copy = cursor.copy.return_value.__enter__.return_value
+        row = ("t1", "maestro", "rpi", None, "b1", "PASS", "ltp", START, None)
+
+        queue_pending_tests([row])
+
+        copy.write_row.assert_called_once_with(_pending_test_values(row))
+        upsert = cursor.execute.call_args_list[-1].args[0]
+        assert "INSERT INTO pending_test" in upsert
+        assert "ON CONFLICT (test_id, slot)" in upsert
+
+
+@patch(f"{COMMAND_PATH}.backfill_pending_tests")
+@patch(f"{COMMAND_PATH}.backfill_latest_checkout", return_value=1)
+@patch(f"{COMMAND_PATH}.truncate_hardware_aggregations")
+@patch(f"{COMMAND_PATH}.transaction.atomic", MagicMock())
+class TestCommand:
+    # Test cases:
+    # - every day is backfilled, truncating first with --truncate
+    # - failed days are reported after the other days are backfilled
+    # - invalid options
+
+    def test_backfills_every_day(self, mock_truncate, mock_latest, mock_tests):
+        mock_tests.return_value = 10
+
+        call_command("backfill_hardware_aggregations", days=3, truncate=True)
+
+        mock_truncate.assert_called_once()
+        mock_latest.assert_called_once()
+        assert mock_tests.call_count == 3
+
+    def test_failed_days(self, mock_truncate, mock_latest, mock_tests):
+        mock_tests.side_effect = [10, Exception("boom"), 10]
+
+        with pytest.raises(CommandError, match="1 days failed"):
+            call_command("backfill_hardware_aggregations", days=3)
+
+        mock_truncate.assert_not_called()
+        assert mock_tests.call_count == 3
+
+    @pytest.mark.parametrize("option", ["batch_size", "workers"])
+    def test_invalid_options(self, mock_truncate, mock_latest, mock_tests, option):
+        with pytest.raises(CommandError, match="must be at least 1"):
+            call_command("backfill_hardware_aggregations", **{option: 0})
+
+        mock_latest.assert_not_called()
@@ -10,6 +10,7 @@ from kernelCI_app.management.commands.helpers.file_utils import (
     move_file_to_failed_dir,
     verify_dir,
     verify_spool_dirs,
+    write_failure_reason,
 )
 from kernelCI_app.tests.unitTests.helpers.fixtures.file_utils_data import (
     ARCHIVE_SPOOL_SUBDIR,
@@ -155,6 +156,22 @@ class TestMoveFileToFailedDir:
         mock_basename.assert_called_once()
 
 
+class TestWriteFailureReason:
+    def test_write_failure_reason_success(self, tmp_path):
+        """Test failure reason written next to the failed file."""
+        write_failure_reason(str(tmp_path), BASE_FILE_NAME, "invalid value")
+
+        with open(tmp_path / f"{BASE_FILE_NAME}.error") as f:
+            assert f.read() == "invalid value"
+
+    @patch("kernelCI_app.management.commands.helpers.file_utils.logger")
+    def test_write_failure_reason_missing_dir(self, mock_logger, tmp_path):
+        """Test failure reason that can't be written is only logged."""
+        write_failure_reason(str(tmp_path / "missing"), BASE_FILE_NAME, "error")
+
+        mock_logger.error.assert_called_once()
+
+
 class TestVerifyDir:
     @patch("os.path.exists")
     @patch("os.path.isdir")
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+from kernelCI_app.management.commands.helpers.flush_policy import FlushPolicy
+
+
+def _make_policy(**kwargs) -> FlushPolicy:
+    settings = {
+        "max_batch_size": 1000,
+        "min_batch_size": 100,
+        "max_bytes": 10000,
+        "timeout_sec": 2.0,
+        "target_latency_sec": 1.0,
+        **kwargs,
+    }
+    return FlushPolicy(**settings)
+
+
+class TestFlushReason:
+    """Test cases for FlushPolicy.flush_reason."""
+
+    # Test cases:
+    # - nothing pending
+    # - buffer reached the batch size
+    # - pending bytes reached the limit
+    # - pending data reached the timeout
+    # - pending data under every limit
+
+    def test_flush_reason_nothing_pending(self):
+        policy = _make_policy()
+
+        assert policy.flush_reason(0) is None
+        assert policy.seconds_until_timeout() is None
+
+    def test_flush_reason_rows(self):
+        policy = _make_policy()
+
+        assert policy.flush_reason(1000) == "rows"
+
+    def test_flush_reason_bytes(self):
+        policy = _make_policy()
+        policy.add_pending(6000)
+        policy.add_pending(4000)
+
+        assert policy.flush_reason(10) == "bytes"
+
+    @patch("kernelCI_app.management.commands.helpers.flush_policy.time.monotonic")
+    def test_flush_reason_timeout(self, mock_monotonic):
+        policy = _make_policy()
+        mock_monotonic.return_value = 100.0
+        policy.add_pending(10)
+        # Adding more data doesn't restart the timer
+        mock_monotonic.return_value = 101.0
+        policy.add_pending(10)
+
+        assert policy.seconds_until_timeout() == 1.0
+        mock_monotonic.return_value = 102.0
+        assert policy.flush_reason(10) == "timeout"
+        assert policy.seconds_until_timeout() == 0.0
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.flush_policy.time.monotonic",
+        return_value=100.0,
+    )
+    def test_flush_reason_under_limits(self, mock_monotonic):
+        policy = _make_policy()
+        policy.add_pending(10)
+
+        assert policy.flush_reason(999) is None
+        assert policy.has_pending()
+
+
+class TestRecordFlush:
+    """Test cases for FlushPolicy.record_flush."""
+
+    # Test cases:
+    # - resets the pending data
+    # - slow flush shrinks the batch size, limited by the step
+    # - fast flush grows the batch size, limited by the max batch size
+    # - batch size doesn't go under the min batch size
+    # - small flushes don't change the batch size
+
+    def test_record_flush_resets_pending(self):
+        policy = _make_policy()
+        policy.add_pending(500)
+
+        policy.record_flush(10, 0.1)
+
+        assert not policy.has_pending()
+        assert policy.pending_bytes == 0
+
+    def test_record_flush_slow_flush(self):
+        policy = _make_policy()
+
+        policy.record_flush(1000, 1.25)
+        assert policy.batch_size == 800
+
+        policy.record_flush(800, 100.0)
+        assert policy.batch_size == 400
+
+    def test_record_flush_fast_flush(self):
+        policy = _make_policy()
+        policy.batch_size = 300
+
+        policy.record_flush(300, 0.5)
+        assert policy.batch_size == 600
+
+        policy.record_flush(600, 0.1)
+        assert policy.batch_size == 1000
+
+    def test_record_flush_min_batch_size(self):
+        policy = _make_policy()
+        policy.batch_size = 150
+
+        policy.record_flush(150, 10.0)
+
+        assert policy.batch_size == 100
+
+    def test_record_flush_small_flush(self):
+        policy = _make_policy()
+
+        policy.record_flush(99, 10.0)
+
+        assert policy.batch_size == 1000
@@ -0,0 +1,261 @@
+import signal
+from functools import partial
+from queue import Empty, Full
+from unittest.mock import MagicMock, patch
+
+from kernelCI_app.constants.ingester import INGESTER_GRAFANA_LABEL
+from kernelCI_app.management.commands.helpers.ingest_pool import (
+    IngestWorkerPool,
+    _run_worker,
+)
+from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
+    parse_batch,
+    process_batch,
+    write_batches,
+)
+from kernelCI_app.tests.unitTests.helpers.fixtures.kcidbng_ingester_data import (
+    SUBMISSION_DIRS_MOCK,
+    SUBMISSION_FILENAME_MOCK,
+    SUBMISSION_FILEPATH_MOCK,
+)
+
+FILE_PATH_MOCK = SUBMISSION_FILEPATH_MOCK + SUBMISSION_FILENAME_MOCK
+
+
+def _make_worker(target, args) -> MagicMock:
+    worker = MagicMock(target=target, args=args, exitcode=0)
+    worker.is_alive.return_value = True
+    return worker
+
+
+@patch("kernelCI_app.management.commands.helpers.ingest_pool.CYCLE_WAIT_SEC", 0)
+@patch("kernelCI_app.management.commands.helpers.ingest_pool.RESPAWN_DELAY_SEC", 0)
+@patch("kernelCI_app.management.commands.helpers.ingest_pool.out", MagicMock())
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
+@patch(
+    "kernelCI_app.management.commands.helpers.ingest_pool.update_queue_gauges",
+    MagicMock(),
+)
+@patch("os.path.getsize", MagicMock(return_value=100))
+@patch("multiprocessing.Process", side_effect=_make_worker)
+class TestIngestWorkerPool:
+    """Test cases for IngestWorkerPool."""
+
+    # Test cases:
+    # - workers are started once for all cycles, with their slot
+    # - pipelined pool starts the DB workers before the parse workers
+    # - submit doesn't wait for the workers, poll tells when the files are done
+    # - files submitted while the workers are busy join the current cycle
+    # - pipelined DB workers only flush when idle once the parse workers are done
+    # - exited worker is replaced and its batches are written off
+    # - submit stops queueing when asked to stop
+    # - close discards the batches that no worker took
+    # - close asks the workers to stop and waits for them
+    # - close doesn't wait on a full queue and terminates the workers
+    # - close kills the workers that ignore the termination
+
+    def _make_pool(self, **kwargs) -> IngestWorkerPool:
+        pool = IngestWorkerPool({}, SUBMISSION_DIRS_MOCK, **kwargs)
+        pool.process_queue = MagicMock()
+        pool.process_queue.get_nowait.side_effect = Empty
+        for stage in pool.stages:
+            stage.queue = MagicMock()
+        return pool
+
+    def test_pool_start(self, mock_process):
+        pool = self._make_pool(max_workers=2)
+        pool.start()
+
+        workers = pool.stages[0].workers
+        assert [worker.args[0] for worker in workers] == [process_batch] * 2
+        # The slot is the last argument of the worker
+        assert [worker.args[-1] for worker in workers] == [0, 1]
+        assert all(worker.start.called for worker in workers)
+
+    def test_pool_start_pipelined(self, mock_process):
+        pool = self._make_pool(parse_workers=3, db_workers=1)
+        pool.start()
+
+        started = [kwargs["args"][0] for _, kwargs in mock_process.call_args_list]
+        assert started == [write_batches, parse_batch, parse_batch, parse_batch]
+
+    def test_pool_submit(self, mock_process):
+        pool = self._make_pool(max_workers=2)
+        pool.start()
+        cycle = pool.stages[0].cycle
+
+        pool.submit([FILE_PATH_MOCK])
+
+        batch = pool.process_queue.put.call_args.args[0]
+        assert batch[0]["path"] == FILE_PATH_MOCK
+        assert cycle.input_done.is_set()
+        assert pool.poll() is False
+
+        cycle.take(0)
+        cycle.done(0, 1)
+
+        assert pool.poll() is True
+        assert pool.in_cycle is False
+        # Workers are kept between cycles
+        pool.submit([FILE_PATH_MOCK])
+        assert pool.in_cycle is True
+        assert mock_process.call_count == 2
+
+    def test_pool_submit_while_busy(self, mock_process):
+        pool = self._make_pool(max_workers=1)
+        pool.start()
+        cycle = pool.stages[0].cycle
+
+        pool.submit([FILE_PATH_MOCK])
+        pool.poll()
+        pool.submit([FILE_PATH_MOCK])
+
+        assert pool.process_queue.put.call_count == 2
+        assert cycle.remaining.value == 2
+        assert pool.total_files == 2
+
+    def test_pool_poll_pipelined(self, mock_process):
+        pool = self._make_pool(parse_workers=1, db_workers=1)
+        pool.start()
+        parse_cycle = pool.stages[0].cycle
+        db_cycle = pool.stages[1].cycle
+
+        pool.submit([FILE_PATH_MOCK])
+        parse_cycle.take(0)
+        db_cycle.add(1)
+
+        assert pool.poll() is False
+        assert not db_cycle.input_done.is_set()
+
+        parse_cycle.done(0, 1)
+
+        assert pool.poll() is False
+        assert db_cycle.input_done.is_set()
+
+        db_cycle.take(0)
+        db_cycle.done(0, 1)
+
+        assert pool.poll() is True
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.WORKER_FAILURES_COUNTER"
+    )
+    def test_pool_poll_worker_exited(self, mock_failures_counter, mock_process):
+        pool = self._make_pool(max_workers=2)
+        pool.start()
+        cycle = pool.stages[0].cycle
+        crashed = pool.stages[0].workers[0]
+
+        pool.submit([FILE_PATH_MOCK])
+        cycle.take(0)
+        crashed.is_alive.return_value = False
+        crashed.exitcode = -9
+
+        assert pool.poll() is True
+        assert cycle.remaining.value == 0
+        crashed.join.assert_called_once()
+        mock_failures_counter.labels.assert_called_once_with(
+            ingester=INGESTER_GRAFANA_LABEL, reason="signal"
+        )
+        replacement = pool.stages[0].workers[0]
+        assert replacement is not crashed
+        assert replacement.args[-1] == 0
+        replacement.start.assert_called_once()
+
+    def test_pool_submit_stopped_while_queueing(self, mock_process):
+        pool = self._make_pool(max_workers=1)
+        pool.start()
+        cycle = pool.stages[0].cycle
+        stop = MagicMock(side_effect=[False, True])
+        pool.process_queue.put.side_effect = Full
+
+        pool.submit([FILE_PATH_MOCK], should_stop=stop)
+
+        pool.process_queue.put.assert_called_once()
+        assert cycle.remaining.value == 0
+
+    def test_pool_close_discards_queued_batches(self, mock_process):
+        pool = self._make_pool(max_workers=1)
+        pool.start()
+        cycle = pool.stages[0].cycle
+        pool.submit([FILE_PATH_MOCK])
+        queued_batch = pool.process_queue.put.call_args.args[0]
+        pool.process_queue.get_nowait.side_effect = [queued_batch, Empty]
+        pool.stages[0].workers[0].is_alive.return_value = False
+
+        pool.close()
+
+        assert cycle.remaining.value == 0
+
+    def test_pool_close(self, mock_process):
+        pool = self._make_pool(parse_workers=1, db_workers=1)
+        pool.start()
+        parse_worker = pool.stages[0].workers[0]
+        db_worker = pool.stages[1].workers[0]
+        parse_worker.is_alive.return_value = False
+        db_worker.is_alive.return_value = False
+
+        pool.close()
+
+        assert pool.stages[0].queue.put.call_args.args == (None,)
+        assert pool.stages[1].queue.put.call_args.args == (None,)
+        parse_worker.join.assert_called_once()
+        db_worker.join.assert_called_once()
+        parse_worker.terminate.assert_not_called()
+        assert pool.stages[0].workers == [None]
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.ingest_pool.INGEST_WORKER_DRAIN_TIMEOUT_SEC",
+        0,
+    )
+    @patch("kernelCI_app.management.commands.helpers.ingest_pool.logger")
+    def test_pool_close_full_queue(self, mock_logger, mock_process):
+        pool = self._make_pool(max_workers=2)
+        pool.start()
+        workers = pool.stages[0].workers
+        pool.stages[0].queue.put.side_effect = Full
+        for worker in workers:
+            worker.terminate.side_effect = partial(
+                worker.is_alive.configure_mock, return_value=False
+            )
+
+        pool.close()
+
+        pool.stages[0].queue.put.assert_called_once()
+        assert all(worker.terminate.called for worker in workers)
+        assert all(not worker.kill.called for worker in workers)
+        assert pool.stages[0].workers == [None, None]
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.ingest_pool.INGEST_WORKER_DRAIN_TIMEOUT_SEC",
+        0,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.ingest_pool.TERMINATE_TIMEOUT_SEC", 0
+    )
+    def test_pool_close_kills_stuck_worker(self, mock_process):
+        pool = self._make_pool(max_workers=1)
+        pool.start()
+        worker = pool.stages[0].workers[0]
+        worker.kill.side_effect = lambda: worker.is_alive.configure_mock(
+            return_value=False
+        )
+
+        pool.close()
+
+        worker.terminate.assert_called_once()
+        worker.kill.assert_called_once()
+        assert worker.join.call_count == 3
+        assert pool.stages[0].workers == [None]
+
+
+@patch("signal.signal")
+def test_run_worker_restores_sigterm(mock_signal):
+    """Workers ignore Ctrl+C but exit when the pool terminates them."""
+    target = MagicMock()
+
+    _run_worker(target, "arg")
+
+    mock_signal.assert_any_call(signal.SIGINT, signal.SIG_IGN)
+    mock_signal.assert_any_call(signal.SIGTERM, signal.SIG_DFL)
+    target.assert_called_once_with("arg")
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+from kernelCI_app.management.commands.helpers.json_stream import (
+    iter_json_object_items,
+)
+
+SUBMISSION_MOCK = {
+    "version": {"major": 5, "minor": 3},
+    "checkouts": [{"id": "checkout1", "origin": "maestro"}],
+    "builds": [],
+    "tests": [
+        {"id": "test1", "origin": "maestro", "log_excerpt": "a" * 300},
+        {"id": "test2", "origin": "maestro", "misc": {"nested": [1, 2.5, None]}},
+        {"id": "test3", "misc": {"flags": [True, False], "lab": "Montréal 🐧"}},
+    ],
+    "extra": 12345,
+}
+
+
+def _parse(content: str, chunk_size: int = 8) -> list:
+    return list(
+        iter_json_object_items(
+            io.StringIO(content), ("checkouts", "builds", "tests"), chunk_size
+        )
+    )
+
+
+class TestIterJsonObjectItems:
+    """Test cases for iter_json_object_items function."""
+
+    # Test cases:
+    # - streamed keys yield each element, other keys yield the whole value
+    # - result doesn't depend on the chunk size (values split between chunks)
+    # - empty object
+    # - malformed json
+    # - malformed element raises without reading the rest of the file
+    # - streamed key without an array
+    # - extra data after the object
+
+    def test_iter_json_object_items_yields_elements(self):
+        result = _parse(json.dumps(SUBMISSION_MOCK))
+
+        assert result == [
+            ("version", SUBMISSION_MOCK["version"]),
+            ("checkouts", SUBMISSION_MOCK["checkouts"][0]),
+            ("tests", SUBMISSION_MOCK["tests"][0]),
+            ("tests", SUBMISSION_MOCK["tests"][1]),
+            ("tests", SUBMISSION_MOCK["tests"][2]),
+            ("extra", 12345),
+        ]
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64, 1024 * 1024])
+    def test_iter_json_object_items_chunk_size(self, chunk_size):
+        content = json.dumps(SUBMISSION_MOCK, indent=2)
+
+        result = _parse(content, chunk_size)
+
+        assert result == _parse(json.dumps(SUBMISSION_MOCK), 1024 * 1024)
+
+    def test_iter_json_object_items_empty_object(self):
+        assert _parse(" { } ") == []
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            "",
+            "[]",
+            '{"tests": [{"id": "test1"}',
+            '{"tests": [{"id": "test1"},]}',
+            '{"version": {"major": 5}',
+            '{"version" {"major": 5}}',
+        ],
+    )
+    def test_iter_json_object_items_malformed(self, content):
+        with pytest.raises(json.JSONDecodeError):
+            _parse(content)
+
+    def test_iter_json_object_items_malformed_element_not_buffered(self):
+        tests = ", ".join(json.dumps({"id": f"test{i}"}) for i in range(1000))
+        file = io.StringIO('{"tests": [{"id": test0}, ' + tests + "]}")
+
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_object_items(file, ("tests",), 64))
+
+        assert file.tell() <= 64 * 4
+
+    def test_iter_json_object_items_streamed_key_not_array(self):
+        with pytest.raises(ValueError, match="Expected an array for 'tests'"):
+            _parse('{"tests": {"id": "test1"}}')
+
+    def test_iter_json_object_items_extra_data(self):
+        with pytest.raises(json.JSONDecodeError):
+            _parse('{"tests": []} {"tests": []}')
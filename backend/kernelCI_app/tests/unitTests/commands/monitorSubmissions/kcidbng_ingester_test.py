@@ -1,26 +1,46 @@
+import json
+from queue import Empty
 from unittest.mock import MagicMock, call, mock_open, patch
 
 import pytest
+from django.db import DataError
+from jsonschema.exceptions import ValidationError
 
 from kernelCI_app.constants.ingester import (
     AUTOMATIC_LAB_FIELD,
     INGESTER_GRAFANA_LABEL,
 )
+from kernelCI_app.management.commands.generated.insert_queries import INSERT_QUERIES
+from kernelCI_app.management.commands.helpers.flush_policy import FlushPolicy
 from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
+    CycleTracker,
+    FileRows,
+    IngestBuffers,
     SubmissionFileMetadata,
     _extract_origins_info,
+    _merge_duplicate_rows,
     _standardize_lab_field,
     consume_buffer,
     flush_buffers,
     ingest_submissions_parallel,
+    iter_prepared_items,
+    load_file_streaming,
+    parse_batch,
     prepare_file_data,
+    process_batch,
     standardize_labs,
     standardize_tree_names,
+    write_batches,
+)
+from kernelCI_app.management.commands.helpers.process_submissions import (
+    make_issue_row,
+    make_test_row,
 )
 from kernelCI_app.tests.unitTests.helpers.fixtures.kcidbng_ingester_data import (
     ARCHIVE_SUBMISSIONS_DIR,
     INGEST_BATCH_SIZE_MOCK,
     MAINLINE_URL,
+    STREAMING_SUBMISSION_MOCK,
     SUBMISSION_DIRS_MOCK,
     SUBMISSION_FILE_DATA_MOCK,
     SUBMISSION_FILE_MOCK,
@@ -509,11 +529,191 @@ class TestPrepareFileData:
         mock_file_open.assert_called_once()
 
 
+def _empty_instances() -> dict[str, list]:
+    return {
+        "issues": [],
+        "checkouts": [],
+        "builds": [],
+        "tests": [],
+        "incidents": [],
+    }
+
+
+def _write_submission(tmp_path, content: dict) -> SubmissionFileMetadata:
+    path = tmp_path / SUBMISSION_FILENAME_MOCK
+    path.write_text(json.dumps(content))
+    return SubmissionFileMetadata(
+        name=SUBMISSION_FILENAME_MOCK,
+        path=str(path),
+        size=path.stat().st_size,
+    )
+
+
+class TestIterPreparedItems:
+    """Test cases for iter_prepared_items function."""
+
+    # Test cases:
+    # - items are yielded prepared (tree names and labs standardized)
+    # - items that come before the version are still prepared
+    # - invalid item raises
+
+    def test_iter_prepared_items_success(self, tmp_path):
+        file = _write_submission(tmp_path, STREAMING_SUBMISSION_MOCK)
+
+        result = list(iter_prepared_items(file, TREE_NAMES_MOCK))
+
+        assert [table for table, _ in result] == ["checkouts", "builds", "tests"]
+        assert result[0][1]["tree_name"] == "mainline"
+        assert result[1][1]["misc"]["lab"] == "maestro"
+        assert result[2][1]["misc"]["runtime"] == "maestro"
+
+    def test_iter_prepared_items_version_last(self, tmp_path):
+        content = {
+            "tests": STREAMING_SUBMISSION_MOCK["tests"],
+            "version": STREAMING_SUBMISSION_MOCK["version"],
+        }
+        file = _write_submission(tmp_path, content)
+
+        result = list(iter_prepared_items(file, TREE_NAMES_MOCK))
+
+        assert [item["id"] for _, item in result] == ["maestro:test1"]
+
+    def test_iter_prepared_items_invalid_item(self, tmp_path):
+        content = {
+            **STREAMING_SUBMISSION_MOCK,
+            "tests": [{"id": "maestro:test2", "status": "NOT_A_STATUS"}],
+        }
+        file = _write_submission(tmp_path, content)
+
+        with pytest.raises(ValidationError):
+            list(iter_prepared_items(file, TREE_NAMES_MOCK))
+
+
+class TestLoadFileStreaming:
+    """Test cases for load_file_streaming function."""
+
+    # Test cases:
+    # - empty file
+    # - successful execution
+    # - invalid file keeps only the rows from previous files
+    # - full buffers flush the previous files, keeping the rows of the file
+    # - rows of the file are not flushed before it is fully read
+
+    @patch("os.remove")
+    def test_load_file_streaming_empty_file(self, mock_remove):
+        mock_file = SubmissionFileMetadata(
+            name=SUBMISSION_FILENAME_MOCK,
+            path=SUBMISSION_PATH_MOCK,
+            size=0,
+        )
+        flush = MagicMock()
+
+        loaded, metadata = load_file_streaming(mock_file, {}, _empty_instances(), flush)
+
+        assert loaded is False
+        assert metadata is None
+        mock_remove.assert_called_once_with(SUBMISSION_PATH_MOCK)
+        flush.assert_not_called()
+
+    def test_load_file_streaming_success(self, tmp_path):
+        file = _write_submission(tmp_path, STREAMING_SUBMISSION_MOCK)
+        instances = _empty_instances()
+        flush = MagicMock()
+
+        loaded, metadata = load_file_streaming(file, TREE_NAMES_MOCK, instances, flush)
+
+        assert loaded is True
+        assert metadata["fsize"] == file["size"]
+        assert [c.id for c in instances["checkouts"]] == ["maestro:checkout1"]
+        assert [b.id for b in instances["builds"]] == ["maestro:build1"]
+        assert [t.id for t in instances["tests"]] == ["maestro:test1"]
+        assert instances["checkouts"][0].tree_name == "mainline"
+        flush.assert_not_called()
+
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.logger")
+    def test_load_file_streaming_invalid_file(self, mock_logger, tmp_path):
+        content = {
+            **STREAMING_SUBMISSION_MOCK,
+            "tests": [
+                STREAMING_SUBMISSION_MOCK["tests"][0],
+                {"id": "maestro:test2", "status": "NOT_A_STATUS"},
+            ],
+        }
+        file = _write_submission(tmp_path, content)
+        previous_test = MagicMock()
+        instances = _empty_instances()
+        instances["tests"].append(previous_test)
+
+        loaded, metadata = load_file_streaming(
+            file, TREE_NAMES_MOCK, instances, MagicMock()
+        )
+
+        assert loaded is False
+        assert "error" in metadata
+        assert instances["checkouts"] == []
+        assert instances["builds"] == []
+        assert instances["tests"] == [previous_test]
+        mock_logger.error.assert_called()
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_BATCH_SIZE",
+        1,
+    )
+    def test_load_file_streaming_flushes_full_buffers(self, tmp_path):
+        file = _write_submission(tmp_path, STREAMING_SUBMISSION_MOCK)
+        previous_test = MagicMock()
+        instances = _empty_instances()
+        instances["tests"].append(previous_test)
+        flushed_rows = []
+
+        def flush():
+            flushed_rows.append({t: list(rows) for t, rows in instances.items()})
+            for rows in instances.values():
+                rows.clear()
+            return True
+
+        loaded, _ = load_file_streaming(file, TREE_NAMES_MOCK, instances, flush)
+
+        assert loaded is True
+        # Only the rows of the previous file are flushed
+        assert flushed_rows == [{**_empty_instances(), "tests": [previous_test]}]
+        assert [t.id for t in instances["tests"]] == ["maestro:test1"]
+        assert [c.id for c in instances["checkouts"]] == ["maestro:checkout1"]
+        assert [b.id for b in instances["builds"]] == ["maestro:build1"]
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_BATCH_SIZE",
+        1,
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.logger")
+    def test_load_file_streaming_invalid_file_not_flushed(self, mock_logger, tmp_path):
+        content = {
+            **STREAMING_SUBMISSION_MOCK,
+            "tests": [
+                STREAMING_SUBMISSION_MOCK["tests"][0],
+                {"id": "maestro:test2", "status": "NOT_A_STATUS"},
+            ],
+        }
+        file = _write_submission(tmp_path, content)
+        instances = _empty_instances()
+        flush = MagicMock(return_value=True)
+
+        loaded, metadata = load_file_streaming(file, TREE_NAMES_MOCK, instances, flush)
+
+        assert loaded is False
+        assert "error" in metadata
+        flush.assert_not_called()
+        assert instances == _empty_instances()
+
+
 class TestConsumeBuffer:
     """Test cases for consume_buffer function."""
 
     # Test cases:
     # - buffer with items
+    # - extra aggregation values are not sent to the database
+    # - partitioned table upserts with the partition key of the existing row
+    # - failed write looks up whether the table is partitioned again
     # - empty buffer
     # - trying to insert in an invalid table
 
@@ -527,19 +727,105 @@ class TestConsumeBuffer:
     def test_consume_buffer_with_items(self, mock_time, mock_connections, mock_out):
         """Test consume_buffer with items in buffer."""
         table_name = "issues"
-        # TODO: test with a real example
-        mock_buffer = [MagicMock(), MagicMock()]
+        buffer = [
+            make_issue_row({"id": "issue1", "version": 1, "origin": "maestro"}),
+            make_issue_row({"id": "issue2", "version": 1, "origin": "maestro"}),
+        ]
         mock_cursor = MagicMock()
         mock_connections[
             "default"
         ].cursor.return_value.__enter__.return_value = mock_cursor
 
-        consume_buffer(mock_buffer, table_name)
+        consume_buffer(buffer, table_name)
 
         assert mock_time.call_count == 2
-        mock_cursor.executemany.assert_called_once()
+        mock_cursor.executemany.assert_called_once_with(
+            INSERT_QUERIES[table_name]["query"], buffer
+        )
         mock_out.assert_called_once()
 
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.is_partitioned_cached",
+        MagicMock(return_value=False),
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+    def test_consume_buffer_drops_extra_values(self, mock_connections, mock_out):
+        """Test consume_buffer only sends the insert columns of the test rows."""
+        test_row = make_test_row(
+            {
+                "id": "test1",
+                "origin": "maestro",
+                "build_id": "build1",
+                "environment": {"misc": {"platform": "qemu"}},
+            }
+        )
+        mock_cursor = MagicMock()
+        mock_connections[
+            "default"
+        ].cursor.return_value.__enter__.return_value = mock_cursor
+
+        consume_buffer([test_row], "tests")
+
+        _, params = mock_cursor.executemany.call_args.args
+        fields = INSERT_QUERIES["tests"]["updateable_model_fields"]
+        assert params == [tuple(test_row)[: len(fields)]]
+        assert test_row.platform == "qemu"
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.is_partitioned_cached",
+        return_value=True,
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+    def test_consume_buffer_partitioned_table(
+        self, mock_connections, mock_out, mock_is_partitioned
+    ):
+        """Test consume_buffer looks up the partition key of the updated rows."""
+        test_row = make_test_row(
+            {"id": "test1", "origin": "maestro", "build_id": "build1"}
+        )
+        mock_cursor = MagicMock()
+        mock_connections[
+            "default"
+        ].cursor.return_value.__enter__.return_value = mock_cursor
+
+        consume_buffer([test_row], "tests")
+
+        mock_is_partitioned.assert_called_once_with("tests")
+        query, params = mock_cursor.executemany.call_args.args
+        fields = INSERT_QUERIES["tests"]["updateable_model_fields"]
+        assert query == INSERT_QUERIES["tests"]["partitioned_query"]
+        assert params == [(*tuple(test_row)[: len(fields)], "test1")]
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.is_partitioned_cached",
+        MagicMock(return_value=False),
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.forget_partitioned"
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+    def test_consume_buffer_failed_write(
+        self, mock_connections, mock_out, mock_forget_partitioned
+    ):
+        """Test consume_buffer forgets whether the table was partitioned on errors."""
+        test_row = make_test_row(
+            {"id": "test1", "origin": "maestro", "build_id": "build1"}
+        )
+        mock_cursor = MagicMock()
+        mock_cursor.executemany.side_effect = DataError("no unique constraint")
+        mock_connections[
+            "default"
+        ].cursor.return_value.__enter__.return_value = mock_cursor
+
+        with pytest.raises(DataError):
+            consume_buffer([test_row], "tests")
+
+        mock_forget_partitioned.assert_called_once_with("tests")
+        mock_out.assert_not_called()
+
     @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out")
     @patch("time.time")
     def test_consume_buffer_empty_buffer(self, mock_time, mock_out):
@@ -558,6 +844,85 @@ class TestConsumeBuffer:
             mock_model = MagicMock()
             consume_buffer([mock_model], "another")
 
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_LOADER_MODE",
+        "copy",
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.transaction")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+    @patch("time.time", side_effect=TIME_MOCK)
+    def test_consume_buffer_copy_mode(
+        self, mock_time, mock_connections, mock_out, mock_transaction
+    ):
+        """Test consume_buffer streams rows with COPY and merges them in a single query."""
+        table_name = "issues"
+        insert_props = INSERT_QUERIES[table_name]
+        mock_buffer = [
+            make_issue_row({"id": "issue1", "version": 1, "origin": "maestro"}),
+            make_issue_row({"id": "issue2", "version": 1, "origin": "maestro"}),
+        ]
+        mock_cursor = MagicMock()
+        mock_connections[
+            "default"
+        ].cursor.return_value.__enter__.return_value = mock_cursor
+        mock_copy = mock_cursor.copy.return_value.__enter__.return_value
+
+        consume_buffer(mock_buffer, table_name)
+
+        mock_cursor.executemany.assert_not_called()
+        mock_cursor.execute.assert_has_calls(
+            [
+                call(insert_props["staging_query"]),
+                call(insert_props["merge_query"]),
+            ]
+        )
+        mock_cursor.copy.assert_called_once_with(insert_props["copy_query"])
+        assert mock_copy.write_row.call_count == len(mock_buffer)
+        mock_transaction.atomic.assert_called_once_with(savepoint=False)
+        mock_out.assert_called_once()
+
+
+class TestMergeDuplicateRows:
+    """Test cases for _merge_duplicate_rows function."""
+
+    # Test cases:
+    # - rows without duplicates are kept as they are
+    # - duplicates keep the first non-null value of each field
+    # - duplicates keep the latest timestamp
+
+    FIELDS = ["field_timestamp", "id", "origin", "comment"]
+
+    def test_merge_duplicate_rows_no_duplicates(self):
+        rows = [(1, "a", "maestro", None), (2, "b", "maestro", "comment")]
+
+        assert _merge_duplicate_rows(rows, self.FIELDS) == rows
+
+    def test_merge_duplicate_rows_coalesces_values(self):
+        rows = [
+            (1, "a", "maestro", None),
+            (1, "a", "broonie", "late comment"),
+            (1, "a", "redhat", "ignored comment"),
+        ]
+
+        assert _merge_duplicate_rows(rows, self.FIELDS) == [
+            (1, "a", "maestro", "late comment")
+        ]
+
+    def test_merge_duplicate_rows_keeps_latest_timestamp(self):
+        rows = [
+            (2, "a", "maestro", None),
+            (None, "b", "maestro", None),
+            (5, "a", "maestro", None),
+            (3, "a", "maestro", None),
+            (4, "b", "maestro", None),
+        ]
+
+        assert _merge_duplicate_rows(rows, self.FIELDS) == [
+            (5, "a", "maestro", None),
+            (4, "b", "maestro", None),
+        ]
+
 
 class TestFlushBuffers:
     """Test cases for flush_buffers function."""
@@ -566,6 +931,7 @@ class TestFlushBuffers:
     # - nothing to flush
     # - insertion success
     # - insertion error
+    # - insertion error isolated to a single file by bisecting
 
     @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.consume_buffer")
     @patch("os.rename")
@@ -587,6 +953,9 @@ class TestFlushBuffers:
         mock_consume.assert_not_called()
         mock_rename.assert_not_called()
 
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.invalidate_written_commits"
+    )
     @patch(
         "kernelCI_app.management.commands.helpers.kcidbng_ingester.aggregate_checkouts_and_pendings"
     )
@@ -603,6 +972,7 @@ class TestFlushBuffers:
         mock_consume,
         mock_out,
         mock_aggregate,
+        mock_invalidate,
     ):
         """Test flush_buffers with items in buffers."""
         # Arbitrary amount of items in each buffer
@@ -683,11 +1053,24 @@ class TestFlushBuffers:
         assert mock_time.call_count == 2
         mock_atomic.assert_called_once()
         mock_aggregate.assert_called_once_with(
-            checkouts_instances=checkouts_buf,
-            tests_instances=tests_buf,
-            build_instances=builds_buf,
+            checkout_rows=checkouts_buf,
+            test_rows=tests_buf,
+            build_rows=builds_buf,
+        )
+        mock_invalidate.assert_called_once_with(
+            checkout_rows=checkouts_buf,
+            build_rows=builds_buf,
+            test_rows=tests_buf,
+            incident_rows=incidents_buf,
         )
 
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.write_failure_reason"
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.invalidate_written_commits",
+        MagicMock(),
+    )
     @patch(
         "kernelCI_app.management.commands.helpers.kcidbng_ingester.aggregate_checkouts_and_pendings"
     )
@@ -706,6 +1089,7 @@ class TestFlushBuffers:
         mock_out,
         mock_logger,
         mock_aggregate,
+        mock_write_reason,
     ):
         """Test flush_buffers with a database error (insertion error or any other)."""
         # Arbitrary amount of items in each buffer
@@ -785,6 +1169,499 @@ class TestFlushBuffers:
             "Error during buffer flush: %s", mock_consume.side_effect
         )
         mock_aggregate.assert_not_called()
+        mock_write_reason.assert_called_once_with(
+            SUBMISSION_DIRS_MOCK["failed"], SUBMISSION_FILENAME_MOCK, "Database error"
+        )
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_FLUSH_BISECT",
+        True,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.FLUSH_RETRIES_COUNTER"
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.write_failure_reason"
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.move_file_to_failed_dir"
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.invalidate_written_commits",
+        MagicMock(),
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.aggregate_checkouts_and_pendings"
+    )
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.logger")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.consume_buffer")
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+    @patch("os.rename")
+    @patch("django.db.transaction.atomic")
+    def test_flush_buffers_bisect_isolates_failing_file(
+        self,
+        mock_atomic,
+        mock_rename,
+        mock_connections,
+        mock_consume,
+        mock_logger,
+        mock_aggregate,
+        mock_move_to_failed,
+        mock_write_reason,
+        mock_retries_counter,
+    ):
+        mock_connections.__getitem__.return_value.needs_rollback = False
+        file_rows = []
+        for name in ("a.json", "b.json", "c.json"):
+            rows = _empty_instances()
+            rows["tests"] = [make_test_row({"id": name, "build_id": "build1"})]
+            file_rows.append(FileRows(file=(name, f"/spool/{name}"), rows=rows))
+        tests_buf = [row for _, rows in file_rows for row in rows["tests"]]
+        buffer_files = {file for file, _ in file_rows}
+
+        def consume(buffer, table_name):
+            if any(row.id == "b.json" for row in buffer):
+                raise DataError("invalid value")
+
+        mock_consume.side_effect = consume
+        stat_ok = MagicMock(value=0)
+        stat_fail = MagicMock(value=0)
+
+        flushed = flush_buffers(
+            issues_buf=[],
+            checkouts_buf=[],
+            builds_buf=[],
+            tests_buf=tests_buf,
+            incidents_buf=[],
+            buffer_files=buffer_files,
+            dirs=SUBMISSION_DIRS_MOCK,
+            stat_ok=stat_ok,
+            stat_fail=stat_fail,
+            counter_lock=MagicMock(),
+            split_by_file=lambda: file_rows,
+        )
+
+        assert flushed is False
+        assert sorted(call.args[0] for call in mock_rename.call_args_list) == [
+            "/spool/a.json",
+            "/spool/c.json",
+        ]
+        mock_move_to_failed.assert_called_once_with(
+            "/spool/b.json", SUBMISSION_DIRS_MOCK["failed"]
+        )
+        mock_write_reason.assert_called_once_with(
+            SUBMISSION_DIRS_MOCK["failed"], "b.json", "invalid value"
+        )
+        assert stat_ok.value == 2
+        assert stat_fail.value == 1
+        # All files fail, then the halves [a] and [b, c], then [b] and [c]
+        assert mock_aggregate.call_count == 2
+        assert mock_retries_counter.labels.return_value.inc.call_count == 2
+
+
+PROCESS_BATCH_FILE_MOCK = SubmissionFileMetadata(
+    name=SUBMISSION_FILENAME_MOCK,
+    path=SUBMISSION_PATH_MOCK,
+    size=100,
+)
+
+
+def _make_flush_policy(**kwargs) -> FlushPolicy:
+    settings = {
+        "max_batch_size": 1000,
+        "min_batch_size": 100,
+        "max_bytes": 1024 * 1024,
+        "timeout_sec": 60.0,
+        "target_latency_sec": 1.0,
+        **kwargs,
+    }
+    return FlushPolicy(**settings)
+
+
+def _record_flush(flushed: list[dict[str, int]]):
+    """Mocks flush_buffers, recording the buffer sizes and clearing them like it does"""
+
+    def flush(**kwargs) -> bool:
+        buffers = {
+            name: value
+            for name, value in kwargs.items()
+            if name.endswith("_buf") or name == "buffer_files"
+        }
+        flushed.append({name: len(value) for name, value in buffers.items()})
+        for buffer in buffers.values():
+            buffer.clear()
+        return True
+
+    return flush
+
+
+def _run_process_batch(queue: MagicMock, **kwargs) -> None:
+    process_batch(
+        process_queue=queue,
+        tree_names={},
+        dirs=SUBMISSION_DIRS_MOCK,
+        processed=MagicMock(value=0),
+        stat_ok=MagicMock(value=0),
+        stat_fail=MagicMock(value=0),
+        counter_lock=MagicMock(),
+        **kwargs,
+    )
+
+
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.FLUSHES_COUNTER")
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_STREAMING_PARSER",
+    False,
+)
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.prepare_file_data",
+    return_value=({}, {}),
+)
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.build_rows_from_submission"
+)
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.flush_buffers")
+class TestProcessBatch:
+    """Test cases for the flush scheduling of process_batch."""
+
+    # Test cases:
+    # - flush when a buffer reaches the batch size
+    # - flush on timeout while waiting for the next batch
+    # - files without rows are flushed when the worker finishes
+    # - long-lived worker flushes when the cycle is idle and reports the batch
+
+    def _rows(self, tests: int) -> dict[str, list]:
+        rows = _empty_instances()
+        rows["tests"] = [
+            make_test_row({"id": f"test{index}", "build_id": "build1"})
+            for index in range(tests)
+        ]
+        return rows
+
+    def test_process_batch_flush_on_rows(
+        self,
+        mock_flush,
+        mock_build_rows,
+        mock_prepare,
+        mock_flushes_counter,
+        mock_connections,
+    ):
+        flushed = []
+        mock_flush.side_effect = _record_flush(flushed)
+        mock_build_rows.return_value = self._rows(2)
+        queue = MagicMock()
+        queue.get.side_effect = [[PROCESS_BATCH_FILE_MOCK], None]
+
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(max_batch_size=2, min_batch_size=1),
+        ):
+            _run_process_batch(queue)
+
+        assert len(flushed) == 1
+        assert flushed[0]["tests_buf"] == 2
+        assert flushed[0]["buffer_files"] == 1
+        mock_flushes_counter.labels.assert_called_once_with(
+            ingester=INGESTER_GRAFANA_LABEL, reason="rows"
+        )
+        # Nothing was pending, so the queue was waited without timeout
+        assert queue.get.call_args_list == [call(timeout=None), call(timeout=None)]
+
+    @patch("kernelCI_app.management.commands.helpers.flush_policy.time.monotonic")
+    def test_process_batch_flush_on_timeout(
+        self,
+        mock_monotonic,
+        mock_flush,
+        mock_build_rows,
+        mock_prepare,
+        mock_flushes_counter,
+        mock_connections,
+    ):
+        flushed = []
+        mock_flush.side_effect = _record_flush(flushed)
+        mock_monotonic.return_value = 100.0
+        mock_build_rows.return_value = self._rows(1)
+
+        results = iter([[PROCESS_BATCH_FILE_MOCK], Empty, None])
+
+        def wait_for_batch(timeout):
+            result = next(results)
+            if result is Empty:
+                # No batch arrived before the timeout
+                mock_monotonic.return_value = 100.0 + timeout
+                raise Empty
+            return result
+
+        queue = MagicMock()
+        queue.get.side_effect = wait_for_batch
+
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(),
+        ):
+            _run_process_batch(queue)
+
+        assert len(flushed) == 1
+        assert flushed[0]["tests_buf"] == 1
+        assert queue.get.call_args_list[1] == call(timeout=60.0)
+        mock_flushes_counter.labels.assert_called_once_with(
+            ingester=INGESTER_GRAFANA_LABEL, reason="timeout"
+        )
+
+    def test_process_batch_final_flush_without_rows(
+        self,
+        mock_flush,
+        mock_build_rows,
+        mock_prepare,
+        mock_flushes_counter,
+        mock_connections,
+    ):
+        flushed = []
+        mock_flush.side_effect = _record_flush(flushed)
+        mock_build_rows.return_value = self._rows(0)
+        queue = MagicMock()
+        queue.get.side_effect = [[PROCESS_BATCH_FILE_MOCK], None]
+
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(),
+        ):
+            _run_process_batch(queue)
+
+        assert len(flushed) == 1
+        assert flushed[0]["buffer_files"] == 1
+        mock_flushes_counter.labels.assert_called_once_with(
+            ingester=INGESTER_GRAFANA_LABEL, reason="final"
+        )
+
+    def test_process_batch_cycle_idle(
+        self,
+        mock_flush,
+        mock_build_rows,
+        mock_prepare,
+        mock_flushes_counter,
+        mock_connections,
+    ):
+        flushed = []
+        reported = []
+        mock_flush.side_effect = _record_flush(flushed)
+        mock_build_rows.return_value = self._rows(1)
+        cycle = CycleTracker(slots=2)
+        cycle.add(1)
+        cycle.finish_input()
+        queue = MagicMock()
+        queue.empty.return_value = True
+
+        def next_batch(timeout):
+            reported.append(cycle.remaining.value)
+            return [PROCESS_BATCH_FILE_MOCK] if len(reported) == 1 else None
+
+        queue.get.side_effect = next_batch
+
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(),
+        ):
+            _run_process_batch(queue, cycle=cycle, slot=1)
+
+        assert len(flushed) == 1
+        mock_flushes_counter.labels.assert_called_once_with(
+            ingester=INGESTER_GRAFANA_LABEL, reason="final"
+        )
+        # The batch was reported before waiting for the next one
+        assert reported == [1, 0]
+        assert list(cycle.held) == [0, 0]
+
+
+class TestIngestBuffers:
+    """Test cases for IngestBuffers."""
+
+    # Test cases:
+    # - buffered rows are split by the file they came from
+    # - flush writes sorted rows, which can still be split by file, then empties
+    #   the buffers
+
+    def _make_buffers(self) -> IngestBuffers:
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(),
+        ):
+            return IngestBuffers(
+                SUBMISSION_DIRS_MOCK, MagicMock(), MagicMock(), MagicMock()
+            )
+
+    def _file(self, name: str) -> SubmissionFileMetadata:
+        return SubmissionFileMetadata(name=name, path=f"/spool/{name}", size=10)
+
+    def test_ingest_buffers_file_rows(self):
+        buffers = self._make_buffers()
+        first = _empty_instances()
+        first["tests"] = [make_test_row({"id": "test1", "build_id": "build1"})]
+        second = _empty_instances()
+        second["issues"] = [make_issue_row({"id": "issue1", "version": 1})]
+        buffers.add_file(self._file("a.json"), first)
+        buffers.add_file(self._file("b.json"), second)
+
+        file_rows = buffers.file_rows()
+
+        assert [file for file, _ in file_rows] == [
+            ("a.json", "/spool/a.json"),
+            ("b.json", "/spool/b.json"),
+        ]
+        assert file_rows[0].rows["tests"] == first["tests"]
+        assert file_rows[0].rows["issues"] == []
+        assert file_rows[1].rows["issues"] == second["issues"]
+        assert file_rows[1].rows["tests"] == []
+
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.flush_buffers")
+    def test_ingest_buffers_flush(self, mock_flush_buffers):
+        buffers = self._make_buffers()
+        first = _empty_instances()
+        first["tests"] = [make_test_row({"id": "test2", "build_id": "build1"})]
+        second = _empty_instances()
+        second["tests"] = [make_test_row({"id": "test1", "build_id": "build1"})]
+        buffers.add_file(self._file("a.json"), first)
+        buffers.add_file(self._file("b.json"), second)
+        split_rows = []
+
+        def flush_buffers(*, tests_buf, split_by_file, **kwargs):
+            assert [row.id for row in tests_buf] == ["test1", "test2"]
+            split_rows.extend(split_by_file())
+            return True
+
+        mock_flush_buffers.side_effect = flush_buffers
+
+        buffers.flush()
+
+        assert [rows["tests"] for _, rows in split_rows] == [
+            first["tests"],
+            second["tests"],
+        ]
+        assert buffers.largest_buffer() == 0
+        assert buffers.file_ends == []
+
+
+class TestCycleTracker:
+    """Test cases for CycleTracker."""
+
+    # Test cases:
+    # - messages are done once reported by the worker that took them
+    # - messages held by a worker that exited are written off
+
+    def test_cycle_tracker_done(self):
+        cycle = CycleTracker(slots=2)
+        cycle.add(3)
+        cycle.take(0)
+        cycle.take(1)
+
+        cycle.done(0, 1)
+
+        assert cycle.remaining.value == 2
+        assert list(cycle.held) == [0, 1]
+
+    def test_cycle_tracker_release(self):
+        cycle = CycleTracker(slots=2)
+        cycle.add(3)
+        cycle.take(1)
+        cycle.take(1)
+
+        assert cycle.release(1) == 2
+        assert cycle.remaining.value == 1
+        assert cycle.held_total() == 0
+
+
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.INGEST_STREAMING_PARSER",
+    False,
+)
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.move_file_to_failed_dir"
+)
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.prepare_file_data")
+@patch(
+    "kernelCI_app.management.commands.helpers.kcidbng_ingester.build_rows_from_submission"
+)
+class TestParseBatch:
+    """Test cases for parse_batch function."""
+
+    # Test cases:
+    # - loaded files are sent with their rows, failed files are not sent
+
+    def test_parse_batch_sends_loaded_files(
+        self,
+        mock_build_rows,
+        mock_prepare,
+        mock_move_to_failed,
+        mock_connections,
+    ):
+        failed_file = SubmissionFileMetadata(
+            name="failed.json", path="/tmp/failed.json", size=10
+        )
+        rows = _empty_instances()
+        mock_build_rows.return_value = rows
+        mock_prepare.side_effect = [({}, {}), (None, {"error": "invalid"})]
+        process_queue = MagicMock()
+        process_queue.get.side_effect = [
+            [PROCESS_BATCH_FILE_MOCK, failed_file],
+            None,
+        ]
+        rows_queue = MagicMock()
+        stat_fail = MagicMock(value=0)
+
+        parse_batch(
+            process_queue=process_queue,
+            rows_queue=rows_queue,
+            tree_names={},
+            dirs=SUBMISSION_DIRS_MOCK,
+            processed=MagicMock(value=0),
+            stat_fail=stat_fail,
+            counter_lock=MagicMock(),
+        )
+
+        rows_queue.put.assert_called_once_with((PROCESS_BATCH_FILE_MOCK, rows))
+        mock_move_to_failed.assert_called_once_with(
+            "/tmp/failed.json", SUBMISSION_DIRS_MOCK["failed"]
+        )
+        assert stat_fail.value == 1
+
+
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.connections")
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
+@patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.flush_buffers")
+class TestWriteBatches:
+    """Test cases for write_batches function."""
+
+    # Test cases:
+    # - received rows are flushed together with their files
+
+    def test_write_batches_flushes_received_rows(self, mock_flush, mock_connections):
+        flushed = []
+        mock_flush.side_effect = _record_flush(flushed)
+        rows = _empty_instances()
+        rows["tests"] = [make_test_row({"id": "test1", "build_id": "build1"})]
+        rows_queue = MagicMock()
+        rows_queue.get.side_effect = [(PROCESS_BATCH_FILE_MOCK, rows), None]
+
+        with patch(
+            "kernelCI_app.management.commands.helpers.kcidbng_ingester.FlushPolicy.from_settings",
+            return_value=_make_flush_policy(),
+        ):
+            write_batches(
+                rows_queue=rows_queue,
+                dirs=SUBMISSION_DIRS_MOCK,
+                stat_ok=MagicMock(value=0),
+                stat_fail=MagicMock(value=0),
+                counter_lock=MagicMock(),
+            )
+
+        assert len(flushed) == 1
+        assert flushed[0]["tests_buf"] == 1
+        assert flushed[0]["buffer_files"] == 1
+        mock_connections.close_all.assert_called_once()
 
 
 class TestIngestSubmissionsParallel:
@@ -792,6 +1669,7 @@ class TestIngestSubmissionsParallel:
 
     # Test cases:
     # - successful ingestion
+    # - pipelined ingestion starts parse and DB workers
 
     FILE1_SIZE = 1000
     FILE2_SIZE = 2000
@@ -874,6 +1752,55 @@ class TestIngestSubmissionsParallel:
             ),
         )
 
+    @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
+    @patch(
+        "kernelCI_app.management.commands.helpers.kcidbng_ingester.PARSED_QUEUE_GAUGE"
+    )
+    @patch("multiprocessing.Process")
+    @patch("multiprocessing.Queue")
+    @patch("multiprocessing.Value", MagicMock(return_value=MagicMock(value=0)))
+    @patch("time.sleep", MagicMock())
+    @patch("time.time", MagicMock(side_effect=TIME_MOCK))
+    @patch("os.path.getsize", MagicMock(return_value=FILE1_SIZE))
+    def test_ingest_submissions_parallel_pipelined(
+        self, mock_queue_cls, mock_process, mock_parsed_gauge
+    ):
+        process_queue = MagicMock()
+        process_queue.empty.return_value = True
+        process_queue.qsize.return_value = 0
+        rows_queue = MagicMock()
+        rows_queue.qsize.return_value = 0
+        mock_queue_cls.side_effect = [process_queue, rows_queue]
+        workers = []
+
+        def make_worker(target, args):
+            worker = MagicMock(exitcode=0, target=target)
+            worker.is_alive.return_value = False
+            workers.append(worker)
+            return worker
+
+        mock_process.side_effect = make_worker
+
+        ingest_submissions_parallel(
+            json_files=[SUBMISSION_FILEPATH_MOCK + SUBMISSION_FILENAME_MOCK],
+            tree_names={},
+            dirs=SUBMISSION_DIRS_MOCK,
+            parse_workers=3,
+            db_workers=2,
+        )
+
+        assert [worker.target for worker in workers] == [
+            write_batches,
+            write_batches,
+            parse_batch,
+            parse_batch,
+            parse_batch,
+        ]
+        assert all(worker.join.called for worker in workers)
+        # Only the parse workers read from the files queue
+        assert process_queue.put.call_args_list[-3:] == [call(None)] * 3
+        mock_parsed_gauge.labels.return_value.set.assert_called_with(0)
+
     @patch("kernelCI_app.management.commands.helpers.kcidbng_ingester.out", MagicMock())
     @patch(
         "kernelCI_app.management.commands.helpers.kcidbng_ingester.WORKER_FAILURES_COUNTER"
@@ -1,27 +1,48 @@
-from unittest.mock import MagicMock, mock_open, patch
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import Future
+from unittest.mock import MagicMock, call, patch
 
+import pytest
+
+from kernelCI_app.management.commands.helpers import log_excerpt_utils
 from kernelCI_app.management.commands.helpers.log_excerpt_utils import (
+    CACHE_LOGS_TOUCH_INTERVAL_SEC,
     cache_logs_maintenance,
     extract_log_excerpt,
     get_from_cache,
+    iter_items_with_uploaded_log_excerpts,
     process_log_excerpt_from_item,
     set_in_cache,
     set_log_excerpt_ofile,
+    start_log_excerpt_upload,
     upload_logexcerpt,
 )
 from kernelCI_app.tests.unitTests.helpers.fixtures.log_excerpt_data import (
-    COMPRESSED_LOGEXCERPT,
     EXCERPT_HASH_MOCK,
+    LARGE_LOG_EXCERPT_MOCK,
     LOG_EXCERPT_MOCK,
     LOG_URL_MOCK,
-    MOCK_CACHE_DICT,
     STORAGE_TOKEN_MOCK,
     STORAGE_URL_MOCK,
     SUBMISSION_MOCK,
-    TMP_TEST_FILE_NAME,
     UPLOAD_URL_MOCK,
 )
 
+LARGE_LOG_EXCERPT_HASH = hashlib.sha256(LARGE_LOG_EXCERPT_MOCK.encode()).hexdigest()
+
+
+@pytest.fixture
+def cache_logs_path(tmp_path):
+    """Points the log excerpt cache to an empty sqlite file."""
+    path = str(tmp_path / "logexcerpt_cache.sqlite3")
+    with (
+        patch.object(log_excerpt_utils, "CACHE_LOGS_PATH", path),
+        patch.object(log_excerpt_utils, "_cache_connection", None),
+    ):
+        yield path
+
 
 class TestUploadLogexcerpt:
     """Test upload_logexcerpt function."""
@@ -29,6 +50,7 @@ class TestUploadLogexcerpt:
     # Test cases:
     # - successful upload
     # - couldn't upload log_excerpt
+    # - request error
 
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.VERBOSE", False)
     @patch(
@@ -43,48 +65,30 @@ class TestUploadLogexcerpt:
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.STORAGE_BASE_URL",
         STORAGE_URL_MOCK,
     )
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.requests.post")
-    @patch(
-        "kernelCI_app.management.commands.helpers.log_excerpt_utils.tempfile.NamedTemporaryFile"
-    )
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils._get_session")
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.gzip.compress")
-    @patch("builtins.open", new_callable=mock_open)
-    @patch("os.remove")
-    def test_upload_logexcerpt_success(
-        self, mock_remove, mock_file_open, mock_gzip, mock_temp_file, mock_post
-    ):
-        """Test successful logexcerpt upload."""
-        mock_temp_file_obj = MagicMock()
-        mock_temp_file_obj.name = TMP_TEST_FILE_NAME
-        mock_temp_file_obj.__enter__.return_value = mock_temp_file_obj
-        mock_temp_file_obj.__exit__.return_value = None
-        mock_temp_file.return_value = mock_temp_file_obj
-
-        mock_gzip.return_value = COMPRESSED_LOGEXCERPT
-        mock_file_open.read_data = COMPRESSED_LOGEXCERPT
-
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_post.return_value = mock_response
+    def test_upload_logexcerpt_success(self, mock_gzip, mock_get_session):
+        """Test successful logexcerpt upload, compressed in memory."""
+        mock_gzip.return_value = b"compressed_logexcerpt"
+        mock_post = mock_get_session.return_value.post
+        mock_post.return_value = MagicMock(status_code=200)
 
         result = upload_logexcerpt(LOG_EXCERPT_MOCK, EXCERPT_HASH_MOCK)
 
-        mock_temp_file_obj.write.assert_called_once_with(COMPRESSED_LOGEXCERPT)
-        mock_temp_file_obj.flush.assert_called_once()
         mock_gzip.assert_called_once_with(LOG_EXCERPT_MOCK.encode("utf-8"))
-
-        mock_file_open.assert_called_once_with(TMP_TEST_FILE_NAME, "rb")
-
         mock_post.assert_called_once()
         args, kwargs = mock_post.call_args
         assert args[0] == "http://test-upload.com"
         assert kwargs["headers"] == {"Authorization": f"Bearer {STORAGE_TOKEN_MOCK}"}
+        assert kwargs["files"] == {
+            "file0": ("logexcerpt.txt.gz", b"compressed_logexcerpt"),
+            "path": f"logexcerpt/{EXCERPT_HASH_MOCK}",
+        }
 
         assert (
             result
             == f"{STORAGE_URL_MOCK}/logexcerpt/{EXCERPT_HASH_MOCK}/logexcerpt.txt.gz"
         )
-        assert mock_remove.call_count == 1
 
     @patch(
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.UPLOAD_URL",
@@ -94,35 +98,27 @@ class TestUploadLogexcerpt:
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.STORAGE_TOKEN",
         STORAGE_TOKEN_MOCK,
     )
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.requests.post")
-    @patch(
-        "kernelCI_app.management.commands.helpers.log_excerpt_utils.tempfile.NamedTemporaryFile"
-    )
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.gzip.compress")
-    @patch("builtins.open", new_callable=mock_open)
-    @patch("os.remove")
-    def test_upload_logexcerpt_failed_status_code(
-        self, mock_remove, mock_file_open, mock_gzip, mock_temp_file, mock_post
-    ):
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils._get_session")
+    def test_upload_logexcerpt_failed_status_code(self, mock_get_session):
         """Test logexcerpt upload with failed status code."""
-        mock_temp_file_obj = MagicMock()
-        mock_temp_file_obj.name = TMP_TEST_FILE_NAME
-        mock_temp_file_obj.__enter__.return_value = mock_temp_file_obj
-        mock_temp_file_obj.__exit__.return_value = None
-        mock_temp_file.return_value = mock_temp_file_obj
+        mock_get_session.return_value.post.return_value = MagicMock(
+            status_code=500, text="Internal Server Error"
+        )
 
-        mock_gzip.return_value = COMPRESSED_LOGEXCERPT
-        mock_file_open.read_data = COMPRESSED_LOGEXCERPT
+        result = upload_logexcerpt(LOG_EXCERPT_MOCK, EXCERPT_HASH_MOCK)
+
+        assert result == LOG_EXCERPT_MOCK
 
-        mock_response = MagicMock()
-        mock_response.status_code = 500
-        mock_response.text = "Internal Server Error"
-        mock_post.return_value = mock_response
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils._get_session")
+    def test_upload_logexcerpt_request_error(self, mock_get_session, mock_logger):
+        """Test logexcerpt upload when the request raises."""
+        mock_get_session.return_value.post.side_effect = ConnectionError("timeout")
 
         result = upload_logexcerpt(LOG_EXCERPT_MOCK, EXCERPT_HASH_MOCK)
 
         assert result == LOG_EXCERPT_MOCK
-        assert mock_remove.call_count == 1
+        mock_logger.error.assert_called_once()
 
 
 class TestGetCache:
@@ -131,34 +127,68 @@ class TestGetCache:
     # Test cases:
     # - get and found cache
     # - get and not found cache
+    # - cache is kept when the connection is opened again (e.g. other worker)
+    # - recent entries aren't updated on a hit, old ones are
+    # - cache errors are logged and counted as a miss
 
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS")
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_get_from_cache_existing_key(self, mock_lock, mock_cache):
+    def test_get_from_cache_existing_key(self, cache_logs_path):
         """Test getting an existing key from cache."""
-        mock_cache.__getitem__.side_effect = MOCK_CACHE_DICT.__getitem__
-        mock_cache.get.side_effect = MOCK_CACHE_DICT.get
-
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
 
         result = get_from_cache(EXCERPT_HASH_MOCK)
 
-        assert result == LOG_EXCERPT_MOCK
+        assert result == LOG_URL_MOCK
 
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS")
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_get_from_cache_non_existing_key(self, mock_lock, mock_cache):
+    def test_get_from_cache_non_existing_key(self, cache_logs_path):
         """Test getting a non-existing key from cache."""
-        mock_cache.__getitem__.side_effect = MOCK_CACHE_DICT.__getitem__
-        mock_cache.get.side_effect = MOCK_CACHE_DICT.get
+        result = get_from_cache("non_existing_hash")
 
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
+        assert result is None
 
-        result = get_from_cache("non_existing_hash")
+    def test_get_from_cache_new_connection(self, cache_logs_path):
+        """Test that the cache is persisted in the sqlite file."""
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
+
+        with patch.object(log_excerpt_utils, "_cache_connection", None):
+            result = get_from_cache(EXCERPT_HASH_MOCK)
+
+        assert result == LOG_URL_MOCK
+
+    def test_get_from_cache_touches_old_entries(self, cache_logs_path):
+        """Test that a hit only updates the last use of entries used long ago."""
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
+        set_in_cache("old_hash", LOG_URL_MOCK)
+        connection = log_excerpt_utils._get_cache_connection()
+        connection.execute(
+            "UPDATE logexcerpt_cache SET last_used = 0 WHERE hash = 'old_hash'"
+        )
+
+        def last_used(log_hash):
+            return connection.execute(
+                "SELECT last_used FROM logexcerpt_cache WHERE hash = ?", (log_hash,)
+            ).fetchone()[0]
+
+        recent_last_used = last_used(EXCERPT_HASH_MOCK)
+
+        assert get_from_cache(EXCERPT_HASH_MOCK) == LOG_URL_MOCK
+        assert get_from_cache("old_hash") == LOG_URL_MOCK
+        assert last_used(EXCERPT_HASH_MOCK) == recent_last_used
+        assert last_used("old_hash") > 0
+
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils._get_cache_connection"
+    )
+    def test_get_from_cache_error(self, mock_get_cache_connection, mock_logger):
+        """Test that a cache error is a miss."""
+        mock_get_cache_connection.return_value.execute.side_effect = (
+            sqlite3.OperationalError("database is locked")
+        )
+
+        result = get_from_cache(EXCERPT_HASH_MOCK)
 
         assert result is None
+        mock_logger.warning.assert_called_once()
 
 
 class TestSetCache:
@@ -167,39 +197,96 @@ class TestSetCache:
     # Test cases:
     # - set cache successfully
     # - replaces existing cache value successfully
+    # - cache errors are logged and the value isn't cached
 
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.VERBOSE", False)
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_set_in_cache(self, mock_lock):
+    def test_set_in_cache(self, cache_logs_path):
         """Test setting a value in cache."""
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
-
-        test_cache_dict = {}
-        with patch(
-            "kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS",
-            test_cache_dict,
-        ):
-            set_in_cache(EXCERPT_HASH_MOCK, LOG_EXCERPT_MOCK)
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
 
-            assert EXCERPT_HASH_MOCK in test_cache_dict
-            assert test_cache_dict[EXCERPT_HASH_MOCK] == LOG_EXCERPT_MOCK
+        assert get_from_cache(EXCERPT_HASH_MOCK) == LOG_URL_MOCK
 
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.VERBOSE", False)
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_set_in_cache_replacing(self, mock_lock):
-        """Test setting a value in cache."""
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
+    def test_set_in_cache_replacing(self, cache_logs_path):
+        """Test replacing a value in cache."""
+        set_in_cache(EXCERPT_HASH_MOCK, "old_value")
+
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
+
+        assert get_from_cache(EXCERPT_HASH_MOCK) == LOG_URL_MOCK
+
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils._get_cache_connection"
+    )
+    def test_set_in_cache_error(self, mock_get_cache_connection, mock_logger):
+        """Test that a cache error doesn't fail the caller."""
+        mock_get_cache_connection.return_value.execute.side_effect = (
+            sqlite3.OperationalError("database is locked")
+        )
+
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
+
+        mock_logger.warning.assert_called_once()
+
+
+class TestClaimUpload:
+    """Test _claim_upload and _release_claim functions."""
+
+    # Test cases:
+    # - a claimed excerpt can't be claimed again nor read from the cache
+    # - a released claim can be claimed again
+    # - a cached excerpt can't be claimed
+    # - an old claim is taken over
+    # - cache errors are logged and count as claimed
+
+    def test_claim_upload_twice(self, cache_logs_path):
+        """Test that an excerpt is only claimed once and isn't a cache hit."""
+        assert log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+
+        assert not log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+        assert get_from_cache(EXCERPT_HASH_MOCK) is None
+
+    def test_claim_upload_released(self, cache_logs_path):
+        """Test that a released claim can be claimed by other workers."""
+        log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+
+        log_excerpt_utils._release_claim(EXCERPT_HASH_MOCK)
+
+        assert log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+
+    def test_claim_upload_cached(self, cache_logs_path):
+        """Test that an excerpt that was already uploaded isn't claimed."""
+        set_in_cache(EXCERPT_HASH_MOCK, LOG_URL_MOCK)
+
+        assert not log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
 
-        test_cache_dict = {EXCERPT_HASH_MOCK: "old_value"}
-        with patch(
-            "kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS",
-            test_cache_dict,
-        ):
-            set_in_cache(EXCERPT_HASH_MOCK, LOG_EXCERPT_MOCK)
+        log_excerpt_utils._release_claim(EXCERPT_HASH_MOCK)
+        assert get_from_cache(EXCERPT_HASH_MOCK) == LOG_URL_MOCK
 
-            assert test_cache_dict[EXCERPT_HASH_MOCK] == LOG_EXCERPT_MOCK
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.time.time")
+    def test_claim_upload_expired(self, mock_time, cache_logs_path):
+        """Test that a claim of a worker that didn't finish its upload is taken over."""
+        mock_time.return_value = 1000
+        log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+
+        mock_time.return_value = 1001 + log_excerpt_utils.UPLOAD_CLAIM_TIMEOUT_SEC
+
+        assert log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+        assert not log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils._get_cache_connection"
+    )
+    def test_claim_upload_error(self, mock_get_cache_connection, mock_logger):
+        """Test that a cache error doesn't prevent the upload."""
+        mock_get_cache_connection.return_value.execute.side_effect = (
+            sqlite3.OperationalError("database is locked")
+        )
+
+        assert log_excerpt_utils._claim_upload(EXCERPT_HASH_MOCK)
+        mock_logger.warning.assert_called_once()
 
 
 class TestSetLogExcerptOfile:
@@ -251,6 +338,9 @@ class TestProcessLogExcerptFromItem:
     # - small log excerpt (no processing)
     # - large log excerpt with cache
     # - large log excerpt without cache
+    # - failed upload keeps the original log excerpt and isn't cached
+    # - the same log excerpt is uploaded only once at a time
+    # - a log excerpt claimed by another worker is waited for instead of uploaded
 
     @patch(
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.LOGEXCERPT_THRESHOLD",
@@ -288,6 +378,7 @@ class TestProcessLogExcerptFromItem:
         mock_set_log_excerpt_ofile,
         mock_set_in_cache,
         mock_get_from_cache,
+        cache_logs_path,
     ):
         """Test processing large log excerpt not in cache."""
 
@@ -366,6 +457,105 @@ class TestProcessLogExcerptFromItem:
         assert "output_files" in item
         assert len(item["output_files"]) == 1
 
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.LOGEXCERPT_THRESHOLD",
+        10,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.get_from_cache",
+        return_value=None,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.set_in_cache",
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.upload_logexcerpt",
+    )
+    def test_process_log_excerpt_failed_upload(
+        self,
+        mock_upload_logexcerpt,
+        mock_set_in_cache,
+        mock_get_from_cache,
+        cache_logs_path,
+    ):
+        """Test processing large log excerpt when the upload fails."""
+        mock_upload_logexcerpt.side_effect = lambda log_excerpt, _: log_excerpt
+        item = {"id": "test_build_123", "log_excerpt": LARGE_LOG_EXCERPT_MOCK}
+
+        process_log_excerpt_from_item(item, "build")
+
+        mock_upload_logexcerpt.assert_called_once()
+        mock_set_in_cache.assert_not_called()
+        assert item == {"id": "test_build_123", "log_excerpt": LARGE_LOG_EXCERPT_MOCK}
+        # The claim is released, so that the upload is retried
+        assert log_excerpt_utils._claim_upload(LARGE_LOG_EXCERPT_HASH)
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.LOGEXCERPT_THRESHOLD",
+        10,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.get_from_cache",
+        return_value=None,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.set_in_cache",
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.upload_logexcerpt",
+    )
+    def test_process_log_excerpt_deduplicates_pending_uploads(
+        self,
+        mock_upload_logexcerpt,
+        mock_set_in_cache,
+        mock_get_from_cache,
+        cache_logs_path,
+    ):
+        """Test that an excerpt being uploaded is not uploaded again."""
+        release_upload = threading.Event()
+
+        def slow_upload(log_excerpt, log_hash):
+            release_upload.wait(timeout=5)
+            return LOG_URL_MOCK
+
+        mock_upload_logexcerpt.side_effect = slow_upload
+        first = {"id": "build1", "log_excerpt": LARGE_LOG_EXCERPT_MOCK}
+        second = {"id": "test1", "log_excerpt": LARGE_LOG_EXCERPT_MOCK}
+
+        first_upload = start_log_excerpt_upload(first, "build")
+        second_upload = start_log_excerpt_upload(second, "test")
+        release_upload.set()
+
+        assert first_upload is second_upload
+        assert first_upload.result() == LOG_URL_MOCK
+        mock_upload_logexcerpt.assert_called_once()
+        mock_set_in_cache.assert_called_once()
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.LOGEXCERPT_THRESHOLD",
+        10,
+    )
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.time.sleep")
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.upload_logexcerpt",
+    )
+    def test_process_log_excerpt_claimed_by_other_worker(
+        self, mock_upload_logexcerpt, mock_sleep, cache_logs_path
+    ):
+        """Test that an excerpt uploaded by another worker reuses its url."""
+        # The other worker claims the upload and finishes it while this one waits
+        assert log_excerpt_utils._claim_upload(LARGE_LOG_EXCERPT_HASH)
+        mock_sleep.side_effect = lambda _: set_in_cache(
+            LARGE_LOG_EXCERPT_HASH, LOG_URL_MOCK
+        )
+        item = {"id": "test_build_123", "log_excerpt": LARGE_LOG_EXCERPT_MOCK}
+
+        process_log_excerpt_from_item(item, "build")
+
+        mock_upload_logexcerpt.assert_not_called()
+        mock_sleep.assert_called_once()
+        assert item["output_files"] == [{"name": "log_excerpt", "url": LOG_URL_MOCK}]
+
 
 class TestExtractLogExcerpt:
     """Test extract_log_excerpt function."""
@@ -393,17 +583,31 @@ class TestExtractLogExcerpt:
         STORAGE_TOKEN_MOCK,
     )
     @patch(
-        "kernelCI_app.management.commands.helpers.log_excerpt_utils.process_log_excerpt_from_item"
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.finish_log_excerpt_upload"
     )
-    def test_extract_log_excerpt_with_builds_and_tests(self, mock_process):
-        """Test extract_log_excerpt with builds and tests."""
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.start_log_excerpt_upload"
+    )
+    def test_extract_log_excerpt_with_builds_and_tests(self, mock_start, mock_finish):
+        """Test extract_log_excerpt starts all uploads before waiting for them."""
+        uploads = [Future(), Future()]
+        mock_start.side_effect = uploads
+        mock_finish.side_effect = lambda *_: mock_start.assert_has_calls(
+            [
+                call(item=SUBMISSION_MOCK["builds"][0], item_type="build"),
+                call(item=SUBMISSION_MOCK["tests"][0], item_type="test"),
+            ]
+        )
+
         extract_log_excerpt(SUBMISSION_MOCK)
 
-        assert mock_process.call_count == 2
-        mock_process.assert_any_call(
-            item=SUBMISSION_MOCK["builds"][0], item_type="build"
+        assert mock_start.call_count == 2
+        mock_finish.assert_has_calls(
+            [
+                call(SUBMISSION_MOCK["builds"][0], uploads[0]),
+                call(SUBMISSION_MOCK["tests"][0], uploads[1]),
+            ]
         )
-        mock_process.assert_any_call(item=SUBMISSION_MOCK["tests"][0], item_type="test")
 
     @patch(
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.STORAGE_TOKEN",
@@ -426,45 +630,125 @@ class TestExtractLogExcerpt:
         extract_log_excerpt(input_data)
 
 
+class TestIterItemsWithUploadedLogExcerpts:
+    """Test iter_items_with_uploaded_log_excerpts function."""
+
+    # Test cases:
+    # - without storage token, items are passed through
+    # - items keep their order and have their log excerpt replaced
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.STORAGE_TOKEN", None
+    )
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    def test_iter_items_no_storage_token(self, mock_logger):
+        items = [("version", {"major": 5}), ("tests", {"id": "test1"})]
+
+        result = list(iter_items_with_uploaded_log_excerpts(iter(items)))
+
+        assert result == items
+        mock_logger.warning.assert_called_once()
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.STORAGE_TOKEN",
+        STORAGE_TOKEN_MOCK,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.UPLOAD_LOOKAHEAD",
+        1,
+    )
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils.start_log_excerpt_upload"
+    )
+    def test_iter_items_uploads_log_excerpts(self, mock_start):
+        def start_upload(item, item_type):
+            upload = Future()
+            upload.set_result(f"{LOG_URL_MOCK}/{item_type}")
+            return upload
+
+        mock_start.side_effect = start_upload
+        items = [
+            ("version", {"major": 5}),
+            ("builds", {"id": "build1", "log_excerpt": LOG_EXCERPT_MOCK}),
+            ("tests", {"id": "test1"}),
+            ("tests", {"id": "test2", "log_excerpt": LOG_EXCERPT_MOCK}),
+        ]
+
+        result = list(iter_items_with_uploaded_log_excerpts(iter(items)))
+
+        assert [item.get("id") for _, item in result] == [
+            None,
+            "build1",
+            "test1",
+            "test2",
+        ]
+        assert result[1][1]["output_files"] == [
+            {"name": "log_excerpt", "url": f"{LOG_URL_MOCK}/build"}
+        ]
+        assert result[3][1]["output_files"] == [
+            {"name": "log_excerpt", "url": f"{LOG_URL_MOCK}/test"}
+        ]
+        assert "output_files" not in result[2][1]
+
+
 class TestCacheLogsMaintenance:
     """Test cache_logs_maintenance function."""
 
     # Test cases:
-    # - if cache size exceeds limit, clear cache
+    # - if cache size exceeds limit, remove the least recently used entries
     # - if cache size under limit, do nothing
+    # - cache errors are logged
 
     @patch(
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS_SIZE_LIMIT",
         3,
     )
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.VERBOSE", True)
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS")
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_cache_logs_maintenance_clear_when_over_limit(self, mock_lock, mock_cache):
-        """Test cache maintenance clears cache when over limit."""
-        mock_cache.__len__.return_value = 5
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.time.time")
+    def test_cache_logs_maintenance_removes_least_recently_used(
+        self, mock_time, cache_logs_path
+    ):
+        """Test cache maintenance removes the oldest entries when over limit."""
+        for timestamp in range(5):
+            mock_time.return_value = timestamp
+            set_in_cache(f"hash{timestamp}", LOG_URL_MOCK)
+        # Using an entry that wasn't used for a while makes it recent again
+        mock_time.return_value = 10 + CACHE_LOGS_TOUCH_INTERVAL_SEC
+        get_from_cache("hash0")
 
         cache_logs_maintenance()
 
-        mock_cache.clear.assert_called_once()
+        assert get_from_cache("hash0") == LOG_URL_MOCK
+        assert get_from_cache("hash1") is None
+        assert get_from_cache("hash2") is None
+        assert get_from_cache("hash3") == LOG_URL_MOCK
+        assert get_from_cache("hash4") == LOG_URL_MOCK
 
     @patch(
         "kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS_SIZE_LIMIT",
         10,
     )
     @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.VERBOSE", False)
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.CACHE_LOGS")
-    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.cache_logs_lock")
-    def test_cache_logs_maintenance_no_clear_when_under_limit(
-        self, mock_lock, mock_cache
-    ):
-        """Test cache maintenance doesn't clear cache when under limit."""
-        mock_cache.__len__.return_value = 5
-        mock_lock.__enter__ = MagicMock()
-        mock_lock.__exit__ = MagicMock()
+    def test_cache_logs_maintenance_no_clear_when_under_limit(self, cache_logs_path):
+        """Test cache maintenance doesn't remove entries when under limit."""
+        for index in range(5):
+            set_in_cache(f"hash{index}", LOG_URL_MOCK)
+
+        cache_logs_maintenance()
+
+        assert all(get_from_cache(f"hash{index}") for index in range(5))
+
+    @patch("kernelCI_app.management.commands.helpers.log_excerpt_utils.logger")
+    @patch(
+        "kernelCI_app.management.commands.helpers.log_excerpt_utils._connect_cache_logs"
+    )
+    def test_cache_logs_maintenance_error(self, mock_connect_cache_logs, mock_logger):
+        """Test that a cache error doesn't fail the maintenance."""
+        mock_connect_cache_logs.return_value.execute.side_effect = (
+            sqlite3.OperationalError("database is locked")
+        )
 
         cache_logs_maintenance()
 
-        mock_cache.clear.assert_not_called()
+        mock_logger.warning.assert_called_once()
+        mock_connect_cache_logs.return_value.close.assert_called_once()
@@ -0,0 +1,172 @@
+import copy
+from unittest.mock import patch
+
+import kcidb_io
+import pytest
+from jsonschema.exceptions import ValidationError
+
+from kernelCI_app.management.commands.helpers.schema_validation import (
+    UnsupportedSchemaError,
+    compile_schema,
+    get_compiled_validator,
+    validate_submission,
+)
+from kernelCI_app.tests.unitTests.helpers.fixtures.kcidbng_ingester_data import (
+    STREAMING_SUBMISSION_MOCK,
+)
+
+INVALID_TEST_CHANGES = [
+    {"status": "NOT_A_STATUS"},
+    {"status": None},
+    {"id": "missing_origin_prefix"},
+    {"start_time": "not a date"},
+    {"log_url": 10},
+    {"duration": True},
+    {"unknown_field": "value"},
+    {"environment": {"comment": "nul \0 char"}},
+    {"environment": {"compatible": ["has space"]}},
+    {"number": {"value": 1, "unit": "ms", "prefix": "not_a_prefix"}},
+]
+
+
+def _submission_with_test_changes(changes: dict) -> dict:
+    submission = copy.deepcopy(STREAMING_SUBMISSION_MOCK)
+    submission["tests"][0].update(changes)
+    return submission
+
+
+class TestCompiledValidator:
+    """Test cases for the validator compiled from the kcidb schema."""
+
+    # Test cases:
+    # - accepts a valid submission
+    # - rejects the same invalid submissions as kcidb_io
+    # - rejects a submission without required fields
+    # - every kcidb schema version used by submissions can be compiled
+
+    def test_compiled_validator_valid_submission(self):
+        validator = get_compiled_validator(kcidb_io.schema.V5_3)
+
+        assert validator(STREAMING_SUBMISSION_MOCK) is True
+
+    @pytest.mark.parametrize("changes", INVALID_TEST_CHANGES)
+    def test_compiled_validator_matches_kcidb_io(self, changes):
+        submission = _submission_with_test_changes(changes)
+        validator = get_compiled_validator(kcidb_io.schema.V5_3)
+
+        assert validator(submission) is False
+        assert kcidb_io.schema.V5_3.is_valid(submission) is False
+
+    def test_compiled_validator_missing_required_field(self):
+        submission = copy.deepcopy(STREAMING_SUBMISSION_MOCK)
+        del submission["tests"][0]["build_id"]
+        validator = get_compiled_validator(kcidb_io.schema.V5_3)
+
+        assert validator(submission) is False
+
+    @pytest.mark.parametrize(
+        "version",
+        [version for version in kcidb_io.schema.V5_3.history if version.major >= 4],
+    )
+    def test_compiled_validator_supported_versions(self, version):
+        assert get_compiled_validator(version) is not None
+
+
+class TestCompileSchema:
+    """Test cases for compile_schema function."""
+
+    # Test cases:
+    # - integers accept floats without fraction but not booleans
+    # - $ref ignores the keywords next to it
+    # - additionalProperties with a schema
+    # - keywords for other types are ignored when there is no type
+    # - unsupported keyword
+
+    def test_compile_schema_integer(self):
+        validator = compile_schema({"type": "integer", "minimum": 0})
+
+        assert validator(1) is True
+        assert validator(1.0) is True
+        assert validator(1.5) is False
+        assert validator(True) is False
+        assert validator(-1) is False
+
+    def test_compile_schema_ref_ignores_siblings(self):
+        validator = compile_schema(
+            {
+                "$defs": {"name": {"type": "string"}},
+                "$ref": "#/$defs/name",
+                "maxLength": 1,
+            }
+        )
+
+        assert validator("long name") is True
+        assert validator(1) is False
+
+    def test_compile_schema_additional_properties_schema(self):
+        validator = compile_schema(
+            {
+                "type": "object",
+                "properties": {"id": {"type": "string"}},
+                "additionalProperties": {"type": "integer"},
+            }
+        )
+
+        assert validator({"id": "a", "count": 1}) is True
+        assert validator({"id": "a", "count": "1"}) is False
+
+    def test_compile_schema_untyped_keywords(self):
+        validator = compile_schema({"pattern": "^a", "required": ["id"]})
+
+        assert validator(1) is True
+        assert validator("abc") is True
+        assert validator("bcd") is False
+        assert validator({}) is False
+
+    def test_compile_schema_unsupported_keyword(self):
+        with pytest.raises(UnsupportedSchemaError):
+            compile_schema({"oneOf": [{"type": "string"}, {"type": "integer"}]})
+
+
+class TestValidateSubmission:
+    """Test cases for validate_submission function."""
+
+    # Test cases:
+    # - valid submission doesn't use kcidb_io
+    # - invalid submission raises the kcidb_io error
+    # - strict mode only uses kcidb_io
+    # - schema that can't be compiled falls back to kcidb_io
+
+    @patch("kcidb_io.schema.V5_3.validate")
+    def test_validate_submission_valid(self, mock_kcidb_validate):
+        validate_submission(STREAMING_SUBMISSION_MOCK, strict=False)
+
+        mock_kcidb_validate.assert_not_called()
+
+    def test_validate_submission_invalid(self):
+        submission = _submission_with_test_changes({"status": "NOT_A_STATUS"})
+
+        with pytest.raises(ValidationError, match="NOT_A_STATUS"):
+            validate_submission(submission, strict=False)
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.schema_validation.get_compiled_validator"
+    )
+    @patch("kcidb_io.schema.V5_3.validate")
+    def test_validate_submission_strict(self, mock_kcidb_validate, mock_get_validator):
+        validate_submission(STREAMING_SUBMISSION_MOCK, strict=True)
+
+        mock_get_validator.assert_not_called()
+        mock_kcidb_validate.assert_called_once_with(STREAMING_SUBMISSION_MOCK)
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.schema_validation.get_compiled_validator",
+        return_value=None,
+    )
+    @patch("kcidb_io.schema.V5_3.validate")
+    def test_validate_submission_not_compiled(
+        self, mock_kcidb_validate, mock_get_validator
+    ):
+        validate_submission(STREAMING_SUBMISSION_MOCK, strict=False)
+
+        mock_kcidb_validate.assert_called_once_with(STREAMING_SUBMISSION_MOCK)
@@ -0,0 +1,114 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from kernelCI_app.management.commands.helpers.spool_watcher import SpoolWatcher
+
+
+def _write(path, name: str, mtime: float = None) -> str:
+    file_path = os.path.join(path, name)
+    with open(file_path, "w") as f:
+        f.write("{}")
+    if mtime is not None:
+        os.utime(file_path, (mtime, mtime))
+    return file_path
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "poll"])
+def make_watcher(request, tmp_path):
+    watchers = []
+
+    def _make(**kwargs) -> SpoolWatcher:
+        watcher = SpoolWatcher(str(tmp_path), use_inotify=request.param, **kwargs)
+        if request.param and watcher.mode != "inotify":
+            pytest.skip("inotify is not available")
+        watchers.append(watcher)
+        return watcher
+
+    yield _make
+    for watcher in watchers:
+        watcher.close()
+
+
+class TestSpoolWatcher:
+    """Test cases for SpoolWatcher, with inotify and with polling."""
+
+    # Test cases:
+    # - files already in the spool are queued oldest first
+    # - take returns at most max_files
+    # - new files are queued in arrival order
+    # - files renamed into the spool are queued, temporary names are ignored
+    # - files removed from the spool after being queued are not taken
+    # - files left in the spool after being taken are queued again by the rescan,
+    #   once the taken files are released
+    # - take waits up to the timeout when there are no files
+
+    def test_spool_watcher_initial_files(self, tmp_path, make_watcher):
+        second = _write(tmp_path, "b.json", mtime=200)
+        first = _write(tmp_path, "a.json", mtime=100)
+        _write(tmp_path, "c.txt")
+        os.mkdir(tmp_path / "archive")
+
+        watcher = make_watcher()
+
+        assert len(watcher) == 2
+        assert watcher.take(10, timeout=0) == [first, second]
+
+    def test_spool_watcher_max_files(self, tmp_path, make_watcher):
+        for i in range(3):
+            _write(tmp_path, f"{i}.json", mtime=i)
+        watcher = make_watcher()
+
+        assert len(watcher.take(2, timeout=0)) == 2
+        assert len(watcher) == 1
+
+    def test_spool_watcher_new_files(self, tmp_path, make_watcher):
+        watcher = make_watcher()
+        second = _write(tmp_path, "b.json", mtime=200)
+        first = _write(tmp_path, "a.json", mtime=100)
+
+        taken = watcher.take(10, timeout=1)
+        if watcher.mode == "inotify":
+            assert taken == [second, first]
+        else:
+            assert taken == [first, second]
+
+    def test_spool_watcher_renamed_files(self, tmp_path, make_watcher):
+        watcher = make_watcher()
+        temp_path = _write(tmp_path, "a.json.tmp")
+        final_path = os.path.join(tmp_path, "a.json")
+
+        os.rename(temp_path, final_path)
+
+        assert watcher.take(10, timeout=1) == [final_path]
+
+    def test_spool_watcher_removed_files(self, tmp_path, make_watcher):
+        moved = _write(tmp_path, "a.json", mtime=100)
+        deleted = _write(tmp_path, "b.json", mtime=200)
+        kept = _write(tmp_path, "c.json", mtime=300)
+        watcher = make_watcher()
+
+        os.mkdir(tmp_path / "archive")
+        os.rename(moved, tmp_path / "archive" / "a.json")
+        os.remove(deleted)
+
+        assert watcher.take(10, timeout=1) == [kept]
+
+    def test_spool_watcher_rescan(self, tmp_path, make_watcher):
+        left = _write(tmp_path, "a.json")
+        watcher = make_watcher(rescan_interval=0)
+
+        assert watcher.take(10, timeout=0) == [left]
+        # Still being ingested
+        assert watcher.take(10, timeout=0) == []
+        watcher.release_taken()
+        assert watcher.take(10, timeout=0) == [left]
+
+    @patch("kernelCI_app.management.commands.helpers.spool_watcher.time.sleep")
+    def test_spool_watcher_timeout(self, mock_sleep, make_watcher):
+        watcher = make_watcher()
+
+        assert watcher.take(10, timeout=0.01) == []
+        if watcher.mode == "poll":
+            mock_sleep.assert_called_once_with(0.01)
@@ -0,0 +1,61 @@
+from datetime import date, datetime, timezone
+
+from kernelCI_app.management.commands.helpers.partitioning import (
+    month_partitions,
+    partitioned_index_statement,
+)
+
+
+class TestMonthPartitions:
+    """Test cases for the monthly partitions of a table."""
+
+    # Test cases:
+    # - one partition per month, from the month of the first date
+    # - partitions across a year boundary
+
+    def test_months(self):
+        partitions = month_partitions("tests", date(2025, 3, 15), date(2025, 4, 1))
+
+        assert [p.name for p in partitions] == ["tests_p2025_03", "tests_p2025_04"]
+        assert partitions[0].start == datetime(2025, 3, 1, tzinfo=timezone.utc)
+        assert partitions[0].end == partitions[1].start
+        assert partitions[1].end == datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+    def test_year_boundary(self):
+        partitions = month_partitions("builds", date(2025, 12, 31), date(2026, 1, 31))
+
+        assert [p.name for p in partitions] == ["builds_p2025_12", "builds_p2026_01"]
+        assert partitions[1].end == datetime(2026, 2, 1, tzinfo=timezone.utc)
+
+
+class TestPartitionedIndexStatement:
+    """Test cases for the indexes of the partitioned table."""
+
+    # Test cases:
+    # - index and table names are suffixed
+    # - expression and partial indexes keep their definition
+
+    def test_suffixed(self):
+        statement = partitioned_index_statement(
+            "CREATE INDEX tests_origin ON public.tests USING btree (origin)",
+            "tests",
+        )
+
+        assert statement == (
+            "CREATE INDEX tests_origin_partitioned "
+            "ON tests_partitioned USING btree (origin)"
+        )
+
+    def test_partial_expression_index(self):
+        statement = partitioned_index_statement(
+            "CREATE INDEX tests_origin_time_platform ON public.tests USING btree "
+            "(origin, start_time) WHERE ((environment_misc ->> 'platform'::text) "
+            "IS NOT NULL)",
+            "tests",
+        )
+
+        assert statement == (
+            "CREATE INDEX tests_origin_time_platform_partitioned "
+            "ON tests_partitioned USING btree (origin, start_time) "
+            "WHERE ((environment_misc ->> 'platform'::text) IS NOT NULL)"
+        )
@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from kernelCI_app.constants.process_pending import PENDING_QUEUE_LOCK
+from kernelCI_app.management.commands.helpers.pending_queue import (
+    QueuePosition,
+    next_queue_position,
+    rotate_pending_queue,
+)
+
+QUEUE_PATH = "kernelCI_app.management.commands.helpers.pending_queue"
+
+
+def _saved_position(shard, **overrides):
+    defaults = {
+        "shard": shard,
+        "last_test_id": None,
+        "last_build_id": None,
+        "tests_done": False,
+        "builds_done": False,
+    }
+    return SimpleNamespace(**{**defaults, **overrides})
+
+
+@patch(f"{QUEUE_PATH}.PendingQueuePosition")
+@patch(f"{QUEUE_PATH}.PendingQueue")
+class TestNextQueuePosition:
+    """Test cases for the choice of the next shard to go through the sealed slot."""
+
+    # Test cases:
+    # - first shard without a saved position
+    # - saved position of a shard that isn't done
+    # - every shard done
+    # - queue without its row
+
+    def test_first_shard_without_position(self, mock_queue, mock_positions):
+        mock_queue.objects.first.return_value = SimpleNamespace(
+            active_slot=0, generation=3
+        )
+        mock_positions.objects.filter.return_value = []
+
+        position = next_queue_position(shard_count=4, shards=[2, 1])
+
+        assert position == QueuePosition(generation=3, slot=1, shard_count=4, shard=1)
+        assert position.shards == [1]
+
+    def test_resumes_saved_position(self, mock_queue, mock_positions):
+        mock_queue.objects.first.return_value = SimpleNamespace(
+            active_slot=1, generation=3
+        )
+        mock_positions.objects.filter.return_value = [
+            _saved_position(1, tests_done=True, builds_done=True),
+            _saved_position(2, last_test_id="test-9", tests_done=True),
+        ]
+
+        position = next_queue_position(shard_count=4, shards=[1, 2])
+
+        assert position == QueuePosition(
+            generation=3,
+            slot=0,
+            shard_count=4,
+            shard=2,
+            last_test_id="test-9",
+            tests_done=True,
+        )
+
+    def test_every_shard_done(self, mock_queue, mock_positions):
+        mock_queue.objects.first.return_value = SimpleNamespace(
+            active_slot=0, generation=3
+        )
+        mock_positions.objects.filter.return_value = [
+            _saved_position(0, tests_done=True, builds_done=True)
+        ]
+
+        assert next_queue_position(shard_count=1, shards=[0]) is None
+
+    def test_queue_without_row(self, mock_queue, mock_positions):
+        mock_queue.objects.first.return_value = None
+        mock_queue.return_value = SimpleNamespace(active_slot=0, generation=0)
+        mock_positions.objects.filter.return_value = []
+
+        position = next_queue_position(shard_count=1, shards=[0])
+
+        assert position == QueuePosition(generation=0, slot=1, shard_count=1, shard=0)
+        assert position.shards is None
+
+
+@patch(f"{QUEUE_PATH}.transaction.atomic", MagicMock())
+@patch(f"{QUEUE_PATH}.connection")
+class TestRotatePendingQueue:
+    """Test cases for the rotation of the pending queue."""
+
+    # Test cases:
+    # - sealed slot not consumed or nothing new: no lock taken
+    # - rotated after the check is repeated under the lock
+    # - queue rotated by another worker while waiting for the lock
+
+    def _cursor(self, mock_connection):
+        cursor = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = cursor
+        return cursor
+
+    @patch(f"{QUEUE_PATH}._rotation_params", return_value=None)
+    def test_not_rotated_without_lock(self, mock_params, mock_connection):
+        cursor = self._cursor(mock_connection)
+
+        assert rotate_pending_queue(4) is False
+
+        mock_params.assert_called_once_with(cursor, 4)
+        cursor.execute.assert_not_called()
+
+    @patch(f"{QUEUE_PATH}._rotation_params")
+    def test_rotated(self, mock_params, mock_connection):
+        cursor = self._cursor(mock_connection)
+        params = {
+            "active": 0,
+            "sealed": 1,
+            "parked": 2,
+            "generation": 3,
+            "shard_count": 4,
+        }
+        mock_params.return_value = params
+
+        assert rotate_pending_queue(4) is True
+
+        queries = [call.args[0] for call in cursor.execute.call_args_list]
+        assert cursor.execute.call_args_list[0].args[1] == [PENDING_QUEUE_LOCK]
+        assert queries[1] == "TRUNCATE pending_test_slot1, pending_builds_slot1"
+        # The sealed slot becomes the active one in the next generation
+        assert cursor.execute.call_args_list[-2].args[1] == [1, 4]
+        assert cursor.execute.call_args_list[-1].args[1] == [3]
+
+    @patch(f"{QUEUE_PATH}._rotation_params")
+    def test_rotated_by_another_worker(self, mock_params, mock_connection):
+        cursor = self._cursor(mock_connection)
+        mock_params.side_effect = [{"sealed": 1}, None]
+
+        assert rotate_pending_queue(4) is False
+
+        cursor.execute.assert_called_once_with(
+            "SELECT pg_advisory_xact_lock(%s)", [PENDING_QUEUE_LOCK]
+        )
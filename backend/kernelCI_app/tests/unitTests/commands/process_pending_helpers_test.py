@@ -1,17 +1,20 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from django.test import SimpleTestCase
 
 from kernelCI_app.constants.general import UNKNOWN_STRING
 from kernelCI_app.management.commands.helpers.process_pending_helpers import (
     EMPTY_PATH_GROUP,
+    ProcessedItemKey,
     RollupEntryData,
     RollupKey,
     accumulate_rollup_entry,
     aggregate_tests_rollup,
     extract_path_group,
+    fetch_processed_items,
+    get_hardware_build_entity_id,
 )
-from kernelCI_app.models import StatusChoices
+from kernelCI_app.models import ProcessedItemKind, StatusChoices
 
 
 def _make_checkout(
@@ -709,3 +712,53 @@ class TestAggregateTestsRollupWithReprocess(SimpleTestCase):
         self.assertEqual(record["fail_tests"], 1)
         self.assertEqual(record["total_tests"], 1)
         self.assertEqual(record["null_tests"], 0)
+
+
+class TestFetchProcessedItems(SimpleTestCase):
+    """Test cases for fetch_processed_items."""
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.process_pending_helpers.ProcessedItems"
+    )
+    def test_returns_only_requested_keys(self, mock_processed_items):
+        """Rows matching the columns of different keys are not returned."""
+        mock_processed_items.objects.filter.return_value.values_list.return_value = [
+            ("c1", 1, "t1", "P"),
+            ("c1", 1, "t2", None),
+            ("c2", 1, "t1", "F"),
+        ]
+        keys = {
+            ProcessedItemKey("c1", ProcessedItemKind.TREE_LISTING_TEST, "t1"),
+            ProcessedItemKey("c2", ProcessedItemKind.TREE_LISTING_TEST, "t2"),
+        }
+
+        result = fetch_processed_items(keys)
+
+        self.assertEqual(
+            result,
+            {ProcessedItemKey("c1", ProcessedItemKind.TREE_LISTING_TEST, "t1"): "P"},
+        )
+        mock_processed_items.objects.filter.assert_called_once_with(
+            checkout_id__in={"c1", "c2"},
+            kind=ProcessedItemKind.TREE_LISTING_TEST,
+            entity_id__in={"t1", "t2"},
+        )
+
+    @patch(
+        "kernelCI_app.management.commands.helpers.process_pending_helpers.ProcessedItems"
+    )
+    def test_queries_each_kind(self, mock_processed_items):
+        """The same entity is looked up separately for each kind."""
+        mock_processed_items.objects.filter.return_value.values_list.return_value = []
+        build_entity = get_hardware_build_entity_id("b1", "maestro", "rpi")
+        keys = {
+            ProcessedItemKey("c1", ProcessedItemKind.TREE_LISTING_BUILD, "b1"),
+            ProcessedItemKey("c1", ProcessedItemKind.HARDWARE_BUILD, build_entity),
+        }
+
+        self.assertEqual(fetch_processed_items(keys), {})
+        self.assertEqual(build_entity, "b1|maestro|rpi")
+        self.assertEqual(mock_processed_items.objects.filter.call_count, 2)
+
+    def test_empty_keys(self):
+        self.assertEqual(fetch_processed_items(set()), {})
@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock, patch
+
+from kernelCI_app.management.commands.helpers.prune_throttle import PruneThrottle
+
+THROTTLE_PATH = "kernelCI_app.management.commands.helpers.prune_throttle"
+
+
+def _make_throttle(**kwargs) -> PruneThrottle:
+    settings = {
+        "max_batch_size": 1000,
+        "min_batch_size": 100,
+        "target_batch_sec": 1.0,
+        "max_replica_lag_sec": 10,
+        **kwargs,
+    }
+    return PruneThrottle(**settings)
+
+
+def _cursor(*lags) -> MagicMock:
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(lag,) for lag in lags]
+    return cursor
+
+
+class TestRecordBatch:
+    """Test cases for the adaptation of the batch size to the batch duration."""
+
+    # Test cases:
+    # - starts from the smallest batch
+    # - fast batches grow by a bounded step up to the largest batch
+    # - slow batch shrinks, down to the smallest batch
+    # - lock timeout halves the batch size
+
+    def test_starts_small(self):
+        assert _make_throttle().batch_size == 100
+
+    def test_fast_batches_grow(self):
+        throttle = _make_throttle()
+
+        throttle.record_batch(100, 0.01)
+        assert throttle.batch_size == 200
+
+        for _ in range(5):
+            throttle.record_batch(throttle.batch_size, 0.01)
+        assert throttle.batch_size == 1000
+
+    def test_slow_batch_shrinks(self):
+        throttle = _make_throttle(min_batch_size=10)
+        throttle.batch_size = 800
+
+        throttle.record_batch(800, 4.0)
+        assert throttle.batch_size == 200
+
+        throttle.record_batch(200, 100.0)
+        assert throttle.batch_size == 10
+
+    def test_lock_timeout_halves(self):
+        throttle = _make_throttle()
+        throttle.batch_size = 500
+
+        throttle.record_lock_timeout()
+        assert throttle.batch_size == 250
+
+
+@patch(f"{THROTTLE_PATH}.time.sleep")
+class TestWait:
+    """Test cases for the wait between batches."""
+
+    # Test cases:
+    # - replicas within the lag budget: only the pause
+    # - lagging replicas: waits for them and shrinks the batch size
+
+    def test_no_lag(self, mock_sleep):
+        throttle = _make_throttle(pause_sec=0.5)
+
+        assert throttle.wait(_cursor(2.0)) == 0
+        mock_sleep.assert_called_once_with(0.5)
+
+    def test_waits_for_replicas(self, mock_sleep):
+        throttle = _make_throttle()
+        throttle.batch_size = 800
+
+        assert throttle.wait(_cursor(30.0, 12.0, 0)) == 30.0
+        assert mock_sleep.call_count == 2
+        assert throttle.batch_size == 200
@@ -0,0 +1,64 @@
+from kernelCI_app.management.commands.helpers.rollup_rebuild import (
+    SHADOW_TABLE,
+    TREE_COLUMNS,
+    RebuildTree,
+    _create_shadow_table_statements,
+)
+from kernelCI_app.models import TreeTestsRollup
+
+
+class TestRebuildTree:
+    """Test cases for the trees listed in the checkpoint table."""
+
+    # Test cases:
+    # - filters of the checkouts of a tree, with null columns
+    # - short name of a tree without a commit hash
+
+    def test_filters(self):
+        tree = RebuildTree(
+            id=1,
+            origin="maestro",
+            tree_name="mainline",
+            git_repository_branch=None,
+            git_repository_url="https://git.example.org/linux.git",
+            git_commit_hash="abc",
+        )
+
+        assert tree.filters == {
+            "origin": "maestro",
+            "tree_name": "mainline",
+            "git_repository_branch": None,
+            "git_repository_url": "https://git.example.org/linux.git",
+            "git_commit_hash": "abc",
+        }
+        assert tuple(tree.filters) == TREE_COLUMNS
+
+    def test_str_without_commit_hash(self):
+        tree = RebuildTree(1, "maestro", "next", "master", None, None)
+
+        assert str(tree) == "maestro/next/master@None"
+
+
+class TestCreateShadowTableStatements:
+    """Test cases for the creation of the shadow table."""
+
+    # Test cases:
+    # - every constraint and index of the model is created with the shadow suffix
+    # - the unique constraint treats nulls as equal, like the live one
+
+    def test_constraints_and_indexes_suffixed(self):
+        statements = _create_shadow_table_statements()
+        meta = TreeTestsRollup._meta
+
+        assert statements[0].startswith(f"CREATE TABLE {SHADOW_TABLE} ")
+        assert all(SHADOW_TABLE in statement for statement in statements)
+        for name in [c.name for c in meta.constraints] + [i.name for i in meta.indexes]:
+            assert any(f"{name}_shadow " in statement for statement in statements)
+        assert len(statements) == 2 + len(meta.constraints) + len(meta.indexes)
+
+    def test_unique_nulls_not_distinct(self):
+        statements = _create_shadow_table_statements()
+        constraint = TreeTestsRollup._meta.constraints[0]
+
+        unique = next(s for s in statements if f"{constraint.name}_shadow" in s)
+        assert "UNIQUE NULLS NOT DISTINCT" in unique
@@ -0,0 +1,86 @@
+import gzip
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+from kernelCI_app.management.commands.helpers.snapshot import (
+    copy_file_to_table,
+    copy_query_to_file,
+)
+
+SNAPSHOT_PATH = "kernelCI_app.management.commands.helpers.snapshot"
+
+CSV_ROWS = [b"id,misc\n", b'a,"{""k"": ""x,\ny""}"\n', b"b,\n"]
+
+
+def _copy_cursor(*, rows=(), rowcount=0) -> MagicMock:
+    cursor = MagicMock()
+    cursor.copy.return_value.__enter__.return_value = MagicMock(
+        __iter__=lambda _: iter(rows)
+    )
+    cursor.rowcount = rowcount
+    return cursor
+
+
+class TestCopyQueryToFile:
+    # Test cases:
+    # - the output of COPY is gzipped into the file, with progress
+
+    def test_gzips_copy_output(self):
+        cursor = _copy_cursor(rows=CSV_ROWS, rowcount=2)
+        file = BytesIO()
+        progress = []
+
+        rows = copy_query_to_file(
+            cursor, "SELECT 1", ["1 day"], file, on_progress=progress.append
+        )
+
+        assert rows == 2
+        assert gzip.decompress(file.getvalue()) == b"".join(CSV_ROWS)
+        assert progress == [len(row) for row in CSV_ROWS]
+        statement, params = cursor.copy.call_args.args
+        assert statement.startswith("COPY (SELECT 1) TO STDOUT")
+        assert params == ["1 day"]
+
+
+@patch(f"{SNAPSHOT_PATH}.connection")
+class TestCopyFileToTable:
+    # Test cases:
+    # - the columns come from the header, the rows are copied without it
+    # - partitioned table: the rows whose id exists are skipped
+
+    def _copy(self, mock_connection, *, partitioned=False):
+        mock_connection.ops.quote_name = lambda name: f'"{name}"'
+        cursor = _copy_cursor(rowcount=2)
+        cursor.fetchone.return_value = ("p",) if partitioned else ("r",)
+        mock_connection.cursor.return_value.__enter__.return_value = cursor
+
+        read, inserted = copy_file_to_table(
+            "builds",
+            BytesIO(gzip.compress(b"".join(CSV_ROWS))),
+            on_progress=lambda _: None,
+        )
+        insert = next(
+            call.args[0]
+            for call in cursor.execute.call_args_list
+            if "INSERT INTO" in call.args[0]
+        )
+        return cursor, (read, inserted), insert
+
+    def test_copies_rows_after_header(self, mock_connection):
+        cursor, (read, inserted), insert = self._copy(mock_connection)
+        copy = cursor.copy.return_value.__enter__.return_value
+
+        assert (read, inserted) == (2, 2)
+        assert b"".join(call.args[0] for call in copy.write.call_args_list) == (
+            b"".join(CSV_ROWS[1:])
+        )
+        assert '("id", "misc")' in cursor.copy.call_args.args[0]
+        assert 'INSERT INTO "builds" ("id", "misc")' in insert
+        assert "ON CONFLICT DO NOTHING" in insert
+        assert "NOT EXISTS" not in insert
+
+    def test_partitioned_skips_existing_ids(self, mock_connection):
+        _, _, insert = self._copy(mock_connection, partitioned=True)
+
+        assert "NOT EXISTS" in insert
+        assert "existing.id = _restore_staging.id" in insert
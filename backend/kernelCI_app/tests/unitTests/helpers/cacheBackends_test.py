@@ -0,0 +1,59 @@
+import pytest
+
+from kernelCI_app.helpers.cacheBackends import LocalObjectCache
+
+
+class TestLocalObjectCache:
+    # Test cases:
+    # - the cached object itself is returned, without being copied
+    # - the least recently used entries are evicted past MAX_ENTRIES
+    # - expired entries are misses
+    # - add only sets missing keys
+    # - incr updates the cached value
+
+    @pytest.fixture
+    def local_cache(self):
+        local_cache = LocalObjectCache(
+            "cache_backends_test",
+            {"TIMEOUT": 30, "OPTIONS": {"MAX_ENTRIES": 2, "CULL_FREQUENCY": 2}},
+        )
+        yield local_cache
+        local_cache.clear()
+
+    def test_returns_the_cached_object(self, local_cache):
+        rows = [{"origin": "maestro"}]
+
+        local_cache.set("k", rows)
+
+        assert local_cache.get("k") is rows
+
+    def test_evicts_least_recently_used(self, local_cache):
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        local_cache.get("a")
+
+        local_cache.set("c", 3)
+
+        assert local_cache.get("a") == 1
+        assert local_cache.get("b") is None
+        assert local_cache.get("c") == 3
+
+    def test_expired_entries_are_misses(self, local_cache):
+        local_cache.set("k", [1], timeout=0)
+
+        assert local_cache.get("k", "default") == "default"
+        assert not local_cache.has_key("k")
+
+    def test_add(self, local_cache):
+        assert local_cache.add("k", [1])
+        assert not local_cache.add("k", [2])
+
+        assert local_cache.get("k") == [1]
+
+    def test_incr(self, local_cache):
+        local_cache.set("k", 1)
+
+        assert local_cache.incr("k", 2) == 3
+        assert local_cache.get("k") == 3
+        with pytest.raises(ValueError):
+            local_cache.incr("missing")
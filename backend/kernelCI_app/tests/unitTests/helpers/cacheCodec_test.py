@@ -0,0 +1,99 @@
+import pickle
+from datetime import datetime
+from typing import NamedTuple
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from kernelCI_app.helpers.cacheCodec import (
+    COMPRESSION_MIN_SIZE,
+    QueryRowsSerializer,
+)
+
+TUPLE_ROWS = [
+    (f"test{i}", "maestro", {"platform": f"board{i % 3}"}, datetime(2025, 1, 1), None)
+    for i in range(200)
+]
+DICT_ROWS = [
+    {"count": i, "status": "PASS", "known_issues": [None], "platform": "board"}
+    for i in range(200)
+]
+
+
+class _Entry(NamedTuple):
+    rows: list
+    fresh_until: float
+
+
+class TestQueryRowsSerializer:
+    # Test cases:
+    # - rows of tuples and of dicts are read back equal, as lists
+    # - rows of different shapes and other values are read back equal
+    # - integers aren't pickled
+    # - large entries are compressed, small ones aren't
+    # - entries pickled by Django's RedisSerializer are read
+    # - rows wrapped in a NamedTuple are read back equal
+    # - unknown compressions are rejected
+
+    @pytest.mark.parametrize("compression", ["zlib", "none"])
+    @pytest.mark.parametrize("rows", [TUPLE_ROWS, DICT_ROWS])
+    def test_rows_round_trip(self, compression, rows):
+        serializer = QueryRowsSerializer(compression=compression)
+
+        result = serializer.loads(serializer.dumps(rows))
+
+        assert result == rows
+        assert type(result) is list
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            [("a", 1), ("b", 2, 3)],
+            [{"a": 1}, {"b": 2}],
+            [("a",), {"a": 1}],
+            [(), ()],
+            [1, "a"],
+            [("a", 1)],
+            [],
+            {"key": [("a", 1), ("b", 2)]},
+            "string",
+            None,
+            True,
+        ],
+    )
+    def test_other_values_round_trip(self, value):
+        serializer = QueryRowsSerializer(compression="zlib")
+
+        assert serializer.loads(serializer.dumps(value)) == value
+
+    def test_integers_are_not_pickled(self):
+        serializer = QueryRowsSerializer(compression="zlib")
+
+        assert serializer.dumps(42) == 42
+        assert serializer.loads(b"42") == 42
+
+    def test_large_entries_are_compressed(self):
+        serializer = QueryRowsSerializer(compression="zlib")
+        pickled = pickle.dumps(TUPLE_ROWS, pickle.HIGHEST_PROTOCOL)
+
+        data = serializer.dumps(TUPLE_ROWS)
+
+        assert len(pickled) >= COMPRESSION_MIN_SIZE
+        assert len(data) < len(pickled) / 4
+        assert serializer.dumps(["small", "list"])[:1] == pickle.PROTO
+
+    def test_reads_pickled_entries(self):
+        serializer = QueryRowsSerializer(compression="zlib")
+        pickled = pickle.dumps(DICT_ROWS, pickle.HIGHEST_PROTOCOL)
+
+        assert serializer.loads(pickled) == DICT_ROWS
+
+    def test_named_tuple_rows(self):
+        serializer = QueryRowsSerializer(compression="zlib")
+        entry = _Entry(rows=TUPLE_ROWS, fresh_until=1.5)
+
+        assert serializer.loads(serializer.dumps(entry)) == entry
+
+    def test_unknown_compression(self):
+        with pytest.raises(ImproperlyConfigured):
+            QueryRowsSerializer(compression="brotli")
@@ -1,6 +1,10 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from kernelCI_app.helpers.database import dict_fetchall
+from kernelCI_app.helpers.database import (
+    dict_fetchall,
+    is_partitioned,
+    partition_filter,
+)
 
 
 class TestDictFetchall:
@@ -43,3 +47,54 @@ class TestDictFetchall:
 
         expected = [{"id": 1}, {"id": 2}, {"id": 3}]
         assert result == expected
+
+
+class TestIsPartitioned:
+    def test_partitioned_table(self):
+        """Test is_partitioned with a partitioned table."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = ("p",)
+
+        assert is_partitioned(mock_cursor, "tests") is True
+
+    def test_regular_or_missing_table(self):
+        """Test is_partitioned with a regular table and a missing one."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.side_effect = [("r",), None]
+
+        assert is_partitioned(mock_cursor, "tests") is False
+        assert is_partitioned(mock_cursor, "missing") is False
+
+
+@patch.dict("kernelCI_app.helpers.database._partitioned_tables", clear=True)
+@patch("kernelCI_app.helpers.database.connection")
+class TestPartitionFilter:
+    # Test cases:
+    # - unpartitioned table: no condition
+    # - partitioned table: bound on the partition key, with the margin
+    # - the partitioning is cached per table
+
+    def test_unpartitioned_table(self, mock_connection):
+        mock_cursor = mock_connection.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = ("r",)
+
+        assert partition_filter("tests", alias="t", start="%(start_date)s") == ""
+
+    def test_partitioned_table(self, mock_connection):
+        mock_cursor = mock_connection.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = ("p",)
+
+        assert partition_filter("tests", alias="t", start="%(start_date)s") == (
+            "AND t._created >= "
+            "COALESCE((%(start_date)s) - INTERVAL '7 days', '-infinity')"
+        )
+
+    def test_cached(self, mock_connection):
+        mock_cursor = mock_connection.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = ("p",)
+
+        partition_filter("tests", alias="t", start="now()")
+        partition_filter("tests", alias="tests", start="now()")
+        partition_filter("builds", alias="b", start="now()")
+
+        assert mock_cursor.execute.call_count == 2
@@ -11,6 +11,35 @@ SUBMISSION_FILE_DATA_MOCK = {"test": "data"}
 SUBMISSION_FILENAME_MOCK = "test_submission.json"
 SUBMISSION_FILEPATH_MOCK = "/tmp/"
 
+STREAMING_SUBMISSION_MOCK = {
+    "version": {"major": 5, "minor": 3},
+    "checkouts": [
+        {
+            "id": "maestro:checkout1",
+            "origin": "maestro",
+            "tree_name": "wrong_mainline_name",
+            "git_repository_url": MAINLINE_URL,
+        }
+    ],
+    "builds": [
+        {
+            "id": "maestro:build1",
+            "origin": "maestro",
+            "checkout_id": "maestro:checkout1",
+            "status": "PASS",
+        }
+    ],
+    "tests": [
+        {
+            "id": "maestro:test1",
+            "origin": "maestro",
+            "build_id": "maestro:build1",
+            "status": "FAIL",
+            "path": "boot",
+        }
+    ],
+}
+
 
 INGEST_BATCH_SIZE_MOCK = 255
 
@@ -1,3 +1,4 @@
+import json
 from unittest.mock import MagicMock, patch
 
 from django.db import IntegrityError
@@ -5,11 +6,12 @@ from django.test import SimpleTestCase
 from django.utils import timezone
 from pydantic import ValidationError
 
+from kernelCI_app.management.commands.generated.insert_queries import INSERT_QUERIES
 from kernelCI_app.management.commands.helpers.kcidbng_ingester import (
     MAP_TABLENAMES_TO_COUNTER,
 )
 from kernelCI_app.management.commands.helpers.process_submissions import (
-    build_instances_from_submission,
+    build_rows_from_submission,
     flatten_dict_specific,
     get_model_fields,
     insert_items,
@@ -18,7 +20,9 @@ from kernelCI_app.management.commands.helpers.process_submissions import (
     make_checkout_instance,
     make_incident_instance,
     make_issue_instance,
+    make_row,
     make_test_instance,
+    make_test_row,
 )
 from kernelCI_app.models import Builds, Checkouts, Incidents, Issues, Tests
 
@@ -287,23 +291,114 @@ class TestMakeIncidentInstance(SimpleTestCase):
         self.assertEqual(actual_fields, expected_fields)
 
 
-class TestBuildInstancesFromSubmission(SimpleTestCase):
-    @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_instance"
-    )
+@patch("kernelCI_app.management.commands.helpers.process_submissions.timezone.now")
+class TestMakeRow(SimpleTestCase):
+    def test_make_row_follows_insert_columns(self, mock_now):
+        mock_now.return_value = MOCK_TIME
+        checkout_data = {
+            "id": "checkout",
+            "origin": "test_origin",
+            "git_commit_tags": ["v6.1"],
+            "misc": {"key": "value"},
+            "extra_field": "should_be_filtered",
+        }
+
+        result = make_row("checkouts", checkout_data)
+
+        self.assertEqual(
+            list(result._fields),
+            INSERT_QUERIES["checkouts"]["updateable_model_fields"],
+        )
+        self.assertEqual(result.id, "checkout")
+        self.assertEqual(result.git_commit_tags, ["v6.1"])
+        self.assertEqual(result.misc, json.dumps({"key": "value"}))
+        self.assertIsNone(result.patchset_files)
+        self.assertEqual(result.field_timestamp, MOCK_TIME)
+
+    def test_make_row_missing_fields_use_model_defaults(self, mock_now):
+        mock_now.return_value = MOCK_TIME
+
+        result = make_row("issues", {"id": "issue"})
+
+        self.assertEqual(result.origin, "")
+        self.assertIsNone(result.version)
+        self.assertIsNone(result.misc)
+
+    def test_make_row_matches_model_instance(self, mock_now):
+        mock_now.return_value = MOCK_TIME
+        build_data = {
+            "id": "build",
+            "origin": "test_origin",
+            "checkout_id": "checkout",
+            "status": "PASS",
+            "input_files": [{"name": "file", "url": "http://file"}],
+            "misc": None,
+        }
+
+        result = make_row("builds", build_data)
+        instance = make_build_instance(build_data)
+
+        expected = tuple(
+            (
+                json.dumps(getattr(instance, field))
+                if field in ("input_files", "output_files", "misc")
+                and getattr(instance, field) is not None
+                else getattr(instance, field)
+            )
+            for field in INSERT_QUERIES["builds"]["updateable_model_fields"]
+        )
+        self.assertEqual(tuple(result), expected)
+
+
+@patch("kernelCI_app.management.commands.helpers.process_submissions.timezone.now")
+class TestMakeTestRow(SimpleTestCase):
+    def test_make_test_row_with_all_fields(self, mock_now):
+        mock_now.return_value = MOCK_TIME
+        test_data = {
+            "id": "test",
+            "origin": "test_origin",
+            "build_id": "build",
+            "environment": {
+                "comment": "Test environment",
+                "misc": {"platform": "x86_64"},
+            },
+            "number": {"value": 42.5, "unit": "seconds"},
+            "misc": {"runtime": "lava"},
+        }
+
+        result = make_test_row(test_data)
+
+        self.assertEqual(result.environment_comment, "Test environment")
+        self.assertEqual(result.environment_misc, json.dumps({"platform": "x86_64"}))
+        self.assertEqual(result.number_value, 42.5)
+        self.assertEqual(result.platform, "x86_64")
+        self.assertEqual(result.lab, "lava")
+
+    def test_make_test_row_without_misc(self, mock_now):
+        mock_now.return_value = MOCK_TIME
+
+        result = make_test_row({"id": "test", "origin": "test_origin"})
+
+        self.assertIsNone(result.environment_misc)
+        self.assertIsNone(result.platform)
+        self.assertIsNone(result.lab)
+
+
+class TestBuildRowsFromSubmission(SimpleTestCase):
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_checkout_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_row"
     )
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_build_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_checkout_row"
     )
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_test_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_build_row"
     )
+    @patch("kernelCI_app.management.commands.helpers.process_submissions.make_test_row")
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_incident_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_incident_row"
     )
-    def test_build_instances_from_submission_with_all_types(
+    def test_build_rows_from_submission_with_all_types(
         self,
         mock_make_incident,
         mock_make_test,
@@ -332,9 +427,7 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
             ],
         }
 
-        result = build_instances_from_submission(
-            submission_data, MAP_TABLENAMES_TO_COUNTER
-        )
+        result = build_rows_from_submission(submission_data, MAP_TABLENAMES_TO_COUNTER)
 
         expected = {
             "issues": [mock_make_issue.return_value],
@@ -351,8 +444,8 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
         mock_make_test.assert_called_once()
         mock_make_incident.assert_called_once()
 
-    def test_build_instances_from_submission_with_empty_data(self):
-        result = build_instances_from_submission({}, MAP_TABLENAMES_TO_COUNTER)
+    def test_build_rows_from_submission_with_empty_data(self):
+        result = build_rows_from_submission({}, MAP_TABLENAMES_TO_COUNTER)
 
         expected = {
             "issues": [],
@@ -365,9 +458,9 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
 
     @patch("kernelCI_app.management.commands.helpers.process_submissions.logger")
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_row"
     )
-    def test_build_instances_from_submission_with_validation_error(
+    def test_build_rows_from_submission_with_validation_error(
         self, mock_make_issue, mock_logger
     ):
         submission_data = {"issues": [{"id": "issue", "version": 1, "origin": "test"}]}
@@ -375,18 +468,16 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
             "TestModel", []
         )
 
-        result = build_instances_from_submission(
-            submission_data, MAP_TABLENAMES_TO_COUNTER
-        )
+        result = build_rows_from_submission(submission_data, MAP_TABLENAMES_TO_COUNTER)
 
         self.assertEqual(len(result["issues"]), 0)
         mock_logger.error.assert_called_once()
 
     @patch("kernelCI_app.management.commands.helpers.process_submissions.logger")
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_row"
     )
-    def test_build_instances_from_submission_with_non_dict_items(
+    def test_build_rows_from_submission_with_non_dict_items(
         self, mock_make_issue, mock_logger
     ):
         submission_data = {
@@ -397,18 +488,16 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
             ]
         }
 
-        result = build_instances_from_submission(
-            submission_data, MAP_TABLENAMES_TO_COUNTER
-        )
+        result = build_rows_from_submission(submission_data, MAP_TABLENAMES_TO_COUNTER)
 
         self.assertEqual(len(result["issues"]), 2)
         self.assertEqual(mock_make_issue.call_count, 2)
         mock_logger.warning.assert_called_once()
 
     @patch(
-        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_instance"
+        "kernelCI_app.management.commands.helpers.process_submissions.make_issue_row"
     )
-    def test_build_instances_from_submission_continues_on_error(self, mock_make_issue):
+    def test_build_rows_from_submission_continues_on_error(self, mock_make_issue):
         submission_data = {
             "issues": [
                 {"id": "issue_1", "version": 1, "origin": "test"},
@@ -424,9 +513,7 @@ class TestBuildInstancesFromSubmission(SimpleTestCase):
             mock_issue_3,
         ]
 
-        result = build_instances_from_submission(
-            submission_data, MAP_TABLENAMES_TO_COUNTER
-        )
+        result = build_rows_from_submission(submission_data, MAP_TABLENAMES_TO_COUNTER)
 
         self.assertEqual(len(result["issues"]), 2)
         self.assertEqual(result["issues"][0], mock_issue_1)
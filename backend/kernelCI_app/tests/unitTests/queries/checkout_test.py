@@ -37,7 +37,7 @@ class TestGetOrigins:
     @patch("kernelCI_app.queries.checkout.set_query_cache")
     @patch("kernelCI_app.queries.checkout.dict_fetchall")
     @patch("kernelCI_app.queries.checkout.connection")
-    def test_get_origins_empty_result_does_not_cache(
+    def test_get_origins_empty_result_is_cached(
         self, mock_connection, mock_dict_fetchall, mock_set_cache, mock_get_cache
     ):
         mock_get_cache.return_value = None
@@ -48,4 +48,14 @@ class TestGetOrigins:
         result = get_origins(7)
 
         assert result == []
-        mock_set_cache.assert_not_called()
+        assert mock_set_cache.call_args.kwargs["rows"] == []
+
+    @patch("kernelCI_app.queries.checkout.get_query_cache")
+    @patch("kernelCI_app.queries.checkout.connection")
+    def test_get_origins_cached_empty_result(self, mock_connection, mock_get_cache):
+        mock_get_cache.return_value = []
+
+        result = get_origins(7)
+
+        assert result == []
+        mock_connection.cursor.assert_not_called()
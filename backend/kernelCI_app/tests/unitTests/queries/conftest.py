@@ -1,8 +1,19 @@
-from unittest.mock import MagicMock, Mock
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
 
 from kernelCI_app.typeModels.hardwareDetails import Tree
 
 
+@pytest.fixture(autouse=True)
+def unpartitioned_tables():
+    """The queries are built for unpartitioned tables, without database access."""
+    with patch(
+        "kernelCI_app.helpers.database.is_partitioned_cached", return_value=False
+    ):
+        yield
+
+
 def setup_mock_cursor(mock_connection):
     mock_cursor = MagicMock()
     mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
@@ -56,6 +56,24 @@ class TestGetHardwareDetailsData:
         mock_query_records.assert_called_once()
         mock_set_cache.assert_called_once()
 
+    @patch("kernelCI_app.queries.hardware.get_query_cache")
+    @patch("kernelCI_app.queries.hardware.query_records")
+    def test_get_hardware_details_data_cached_empty(
+        self, mock_query_records, mock_get_cache
+    ):
+        mock_get_cache.return_value = []
+
+        result = get_hardware_details_data(
+            hardware_id="hardware",
+            origin="maestro",
+            trees_with_selected_commits=[TEST_TREE],
+            start_datetime=START_DATE,
+            end_datetime=END_DATE,
+        )
+
+        assert result == []
+        mock_query_records.assert_not_called()
+
 
 class TestGetHardwareTreesData:
     @patch("kernelCI_app.queries.hardware.get_query_cache")
@@ -11,10 +11,10 @@ from kernelCI_app.tests.unitTests.queries.conftest import (
 
 
 class TestGetTreeDetailsData:
-    @patch("kernelCI_app.queries.tree.get_query_cache")
-    def test_get_tree_details_data_from_cache(self, mock_get_cache):
+    @patch("kernelCI_app.queries.tree.get_or_set_query_cache")
+    def test_get_tree_details_data_from_cache(self, mock_cache):
         cached_data = [("row1", "row2")]
-        mock_get_cache.return_value = cached_data
+        mock_cache.return_value = cached_data
 
         result = get_tree_details_data(
             origin_param="maestro",
@@ -25,19 +25,17 @@ class TestGetTreeDetailsData:
 
         assert result == cached_data
 
-    @patch("kernelCI_app.queries.tree.get_query_cache")
-    @patch("kernelCI_app.queries.tree.set_query_cache")
+    @patch("kernelCI_app.queries.tree.get_or_set_query_cache")
     @patch("kernelCI_app.queries.tree.create_checkouts_where_clauses")
     @patch("kernelCI_app.queries.tree.connection")
     def test_get_tree_details_data_from_database(
         self,
         mock_connection,
         mock_create_clauses,
-        mock_set_cache,
-        mock_get_cache,
+        mock_cache,
     ):
         expected_data = [("row1", "row2")]
-        mock_get_cache.return_value = None
+        mock_cache.side_effect = lambda **kwargs: kwargs["compute"]()
         mock_create_clauses.return_value = {
             "git_branch_clause": "git_repository_branch = %(git_branch_param)s",
             "tree_name_clause": "",
@@ -54,7 +52,7 @@ class TestGetTreeDetailsData:
         )
 
         assert result == expected_data
-        mock_set_cache.assert_called_once()
+        assert mock_cache.call_args.kwargs["commit_hash"] == "abc123"
 
 
 class TestGetLatestTree: